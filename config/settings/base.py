@@ -431,6 +431,8 @@ DOC_PROCESSING_URL = env("DOC_PROCESSING_URL", default="")
 PROGRESS_URL = env("PROGRESS_URL", default="")
 IMPORT_URL = env("IMPORT_URL", default="")
 PROGRESS_TIMEOUT = env.int("PROGRESS_TIMEOUT", default=1)
+TELEMETRY_URL = env("TELEMETRY_URL", default="")
+TELEMETRY_TIMEOUT = env.int("TELEMETRY_TIMEOUT", default=10)
 SIDEKICK_PROCESSING_URL = env("SIDEKICK_PROCESSING_URL", default="")
 
 # Auth
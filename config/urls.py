@@ -43,6 +43,7 @@ from documentcloud.projects.views import (
 )
 from documentcloud.sidekick.routers import SidekickRouter
 from documentcloud.sidekick.views import SidekickViewSet
+from documentcloud.statistics.views import ProcessingStatisticsView
 from documentcloud.users.views import MessageView, UserViewSet
 
 
@@ -92,6 +93,11 @@ urlpatterns = [
     path("api/", include(sidekick_router.urls)),
     path("api/", include("documentcloud.oembed.urls")),
     path("api/messages/", MessageView.as_view(), name="message-create"),
+    path(
+        "api/statistics/processing/",
+        ProcessingStatisticsView.as_view(),
+        name="processing-statistics",
+    ),
     # Social Django
     path("accounts/logout/", account_logout, name="logout"),
     path("accounts/", include("social_django.urls", namespace="social")),
@@ -22,6 +22,7 @@ if environment == "local-minio":
         encode_response,
         get_http_data,
         get_pubsub_data,
+        get_pubsub_published,
     )
     from .local.httpsub import httpsub
     from .local.processing_token import processing_auth
@@ -36,6 +37,7 @@ elif environment == "local-s3":
         encode_response,
         get_http_data,
         get_pubsub_data,
+        get_pubsub_published,
     )
     from .local.httpsub import httpsub
     from .local.processing_token import processing_auth
@@ -48,6 +50,7 @@ elif environment == "local":
         encode_response,
         get_http_data,
         get_pubsub_data,
+        get_pubsub_published,
     )
     from .local.httpsub import httpsub
     from .local.processing_token import processing_auth
@@ -61,6 +64,7 @@ elif environment == "aws":
         encode_response,
         get_http_data,
         get_pubsub_data,
+        get_pubsub_published,
     )
     from .aws.httpsub import httpsub
     from .aws.processing_token import processing_auth
@@ -74,6 +78,7 @@ elif environment == "gcp":
         encode_response,
         get_http_data,
         get_pubsub_data,
+        get_pubsub_published,
     )
     from .gcp.httpsub import httpsub
     from .gcp.processing_token import processing_auth
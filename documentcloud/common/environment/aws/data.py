@@ -1,5 +1,36 @@
 # Standard Library
+import base64
 import json
+import zlib
+from datetime import datetime, timezone
+
+# Third Party
+import environ
+
+env = environ.Env()
+
+# Messages larger than this are compressed (0 to disable)
+PUBSUB_COMPRESS_THRESHOLD = env.int("PUBSUB_COMPRESS_THRESHOLD", default=16 * 1024)
+
+# Prefix marking a compressed message, which can never start a JSON document
+COMPRESSED_PREFIX = "z:"
+
+
+def compress_message(message):
+    """Compress a message if it is over the threshold"""
+    if not PUBSUB_COMPRESS_THRESHOLD or len(message) <= PUBSUB_COMPRESS_THRESHOLD:
+        return message
+    compressed = base64.b64encode(zlib.compress(message.encode("utf8"))).decode()
+    return f"{COMPRESSED_PREFIX}{compressed}"
+
+
+def decompress_message(message):
+    """Reverse compress_message"""
+    if not message.startswith(COMPRESSED_PREFIX):
+        return message
+    return zlib.decompress(base64.b64decode(message[len(COMPRESSED_PREFIX) :])).decode(
+        "utf8"
+    )
 
 
 def get_http_data(request):
@@ -9,7 +40,21 @@ def get_http_data(request):
 
 def get_pubsub_data(data):
     """Extract data from a pubsub request."""
-    return json.loads(data["Records"][0]["Sns"]["Message"])
+    return json.loads(decompress_message(data["Records"][0]["Sns"]["Message"]))
+
+
+def get_pubsub_published(data):
+    """The time a pubsub request's message was published, in seconds since the
+    epoch, or None if unknown"""
+    try:
+        timestamp = data["Records"][0]["Sns"]["Timestamp"]
+    except (KeyError, IndexError, TypeError):
+        return None
+    return (
+        datetime.strptime(timestamp, "%Y-%m-%dT%H:%M:%S.%fZ")
+        .replace(tzinfo=timezone.utc)
+        .timestamp()
+    )
 
 
 def encode_pubsub_data(data):
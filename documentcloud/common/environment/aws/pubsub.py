@@ -1,9 +1,24 @@
+# Standard Library
+import os
+import threading
+from collections import defaultdict
+from concurrent.futures import ThreadPoolExecutor, wait
+from contextlib import contextmanager
+
 # Third Party
 import boto3
 import environ
 
+# Local
+from .data import compress_message
+
 env = environ.Env()
 
+# SNS accepts at most 10 messages and 256KB of payload per batch
+PUBSUB_BATCH_SIZE = env.int("PUBSUB_BATCH_SIZE", default=10)
+PUBSUB_BATCH_BYTES = env.int("PUBSUB_BATCH_BYTES", default=256 * 1024)
+PUBSUB_THREADS = env.int("PUBSUB_THREADS", default=8)
+
 
 class AwsPubsub:
     def __init__(self):
@@ -11,11 +26,90 @@ class AwsPubsub:
         self.arn_prefix = env.str("AWS_ARN_PREFIX")
         self.sns = boto3.client("sns")
 
+        # Batching state, only active within a `batch` block
+        self.lock = threading.Lock()
+        self.batching = 0
+        self.pending = defaultdict(list)
+        self.sends = []
+        self.executor = None
+        self.pid = None
+
     def topic_path(self, _namespace, name):
         return f"{self.arn_prefix}:{name}"
 
     def publish(self, topic_path, data):
-        self.sns.publish(TopicArn=topic_path, Message=data.decode("utf8"))
+        message = compress_message(data.decode("utf8"))
+        with self.lock:
+            if self.batching:
+                messages = self.pending[topic_path]
+                size = sum(len(pending) for pending in messages)
+                if messages and size + len(message) > PUBSUB_BATCH_BYTES:
+                    # Send what is pending to make room for this message
+                    self._send(topic_path, messages)
+                    messages = self.pending[topic_path]
+                messages.append(message)
+                if len(messages) >= PUBSUB_BATCH_SIZE:
+                    self._send(topic_path, messages)
+                return
+        self.sns.publish(TopicArn=topic_path, Message=message)
+
+    @contextmanager
+    def batch(self):
+        """Batch messages published within the block, sending full batches
+        concurrently and flushing the rest when the block exits"""
+        with self.lock:
+            self._check_fork()
+            self.batching += 1
+        try:
+            yield self
+        finally:
+            with self.lock:
+                self.batching -= 1
+            if not self.batching:
+                self.flush()
+
+    def flush(self):
+        """Send all pending messages and wait for every send to complete"""
+        with self.lock:
+            for topic_path, messages in list(self.pending.items()):
+                if messages:
+                    self._send(topic_path, messages)
+            sends = self.sends
+            self.sends = []
+        wait(sends)
+        # Raise any errors from sending
+        for send in sends:
+            send.result()
+
+    def _check_fork(self):
+        # Executor threads and pending messages are not inherited by forked
+        # processes, so start afresh in a new process
+        if self.pid != os.getpid():
+            self.pid = os.getpid()
+            self.executor = ThreadPoolExecutor(max_workers=PUBSUB_THREADS)
+            self.pending = defaultdict(list)
+            self.sends = []
+
+    def _send(self, topic_path, messages):
+        # Must be called with the lock held
+        del self.pending[topic_path]
+        self.sends.append(
+            self.executor.submit(self._publish_batch, topic_path, messages)
+        )
+
+    def _publish_batch(self, topic_path, messages):
+        if len(messages) == 1:
+            self.sns.publish(TopicArn=topic_path, Message=messages[0])
+            return
+        response = self.sns.publish_batch(
+            TopicArn=topic_path,
+            PublishBatchRequestEntries=[
+                {"Id": str(i), "Message": message} for i, message in enumerate(messages)
+            ],
+        )
+        # Retry failed entries individually, raising if they fail again
+        for failed in response.get("Failed", []):
+            self.sns.publish(TopicArn=topic_path, Message=messages[int(failed["Id"])])
 
 
 publisher = AwsPubsub()
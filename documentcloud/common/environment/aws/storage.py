@@ -9,6 +9,7 @@ import boto3
 import environ
 import requests
 import smart_open
+from boto3.s3.transfer import TransferConfig
 from botocore.client import Config
 
 # Local
@@ -24,6 +25,11 @@ ACLS = {
 }
 
 AWS_RETRIES_MAX_ATTEMPTS = env.int("AWS_RETRIES_MAX_ATTEMPTS", default=10)
+# Files are transferred in parts of this size, several parts at a time
+AWS_TRANSFER_CHUNK_SIZE = env.int("AWS_TRANSFER_CHUNK_SIZE", default=16 * 1024 * 1024)
+AWS_TRANSFER_CONCURRENCY = env.int("AWS_TRANSFER_CONCURRENCY", default=8)
+# The smallest part of a multipart upload, other than the last
+MULTIPART_MIN_SIZE = 5 * 1024 * 1024
 
 
 def grouper(iterable, num, fillvalue=None):
@@ -33,6 +39,39 @@ def grouper(iterable, num, fillvalue=None):
     return zip_longest(*args, fillvalue=fillvalue)
 
 
+def plan_parts(parts, read_range):
+    """Plan the parts of a multipart upload composing a file from parts which are
+    either (source, start, end) ranges of existing files or bytes.
+
+    Ranges are copied server side, except where they would make a part smaller
+    than a multipart upload allows, in which case they are read and uploaded
+    along with the bytes next to them.
+    """
+    planned = []
+    buffer = bytearray()
+    for part in parts:
+        if isinstance(part, (bytes, bytearray)):
+            buffer.extend(part)
+            continue
+        source, start, end = part
+        if buffer and len(buffer) < MULTIPART_MIN_SIZE:
+            # Fill the pending bytes up to a full part from the start of the range
+            length = min(end - start, MULTIPART_MIN_SIZE - len(buffer))
+            buffer.extend(read_range(source, start, start + length))
+            start += length
+        if end - start < MULTIPART_MIN_SIZE:
+            if start < end:
+                buffer.extend(read_range(source, start, end))
+            continue
+        if buffer:
+            planned.append(bytes(buffer))
+            buffer = bytearray()
+        planned.append((source, start, end))
+    if buffer:
+        planned.append(bytes(buffer))
+    return planned
+
+
 class AwsStorage:
     def __init__(self, resource_kwargs=None, minio=False):
 
@@ -76,6 +115,14 @@ class AwsStorage:
             f"s3://{file_name}", mode, transport_params=transport_params
         )
 
+    def read_range(self, file_name, start, end):
+        """Read the bytes from start up to end with a single ranged request"""
+        bucket, key = self.bucket_key(file_name)
+        response = self.s3_client.get_object(
+            Bucket=bucket, Key=key, Range=f"bytes={start}-{end - 1}"
+        )
+        return response["Body"].read()
+
     def simple_upload(
         self, file_name, contents, content_type=None, access=access_choices.PRIVATE
     ):
@@ -92,6 +139,44 @@ class AwsStorage:
         with io.BytesIO(contents) as mem_file:
             self.s3_client.upload_fileobj(mem_file, bucket, key, ExtraArgs=extra_args)
 
+    def upload_file(
+        self, file_name, local_path, content_type=None, access=access_choices.PRIVATE
+    ):
+        """Upload a local file, with a concurrent multipart upload if it is large"""
+        bucket, key = self.bucket_key(file_name)
+        extra_args = {"ACL": ACLS[access]}
+
+        if content_type is None:
+            # attempt to guess content type if not specified
+            content_type = mimetypes.guess_type(file_name)[0]
+        if content_type is not None:
+            # set content type if we have one
+            extra_args["ContentType"] = content_type
+
+        self.s3_client.upload_file(
+            local_path,
+            bucket,
+            key,
+            ExtraArgs=extra_args,
+            Config=self.transfer_config(),
+        )
+
+    def download_file(self, file_name, local_path):
+        """Download a file to a local path, with concurrent ranged reads if it
+        is large"""
+        bucket, key = self.bucket_key(file_name)
+        self.s3_client.download_file(
+            bucket, key, local_path, Config=self.transfer_config()
+        )
+
+    @staticmethod
+    def transfer_config():
+        return TransferConfig(
+            multipart_threshold=AWS_TRANSFER_CHUNK_SIZE,
+            multipart_chunksize=AWS_TRANSFER_CHUNK_SIZE,
+            max_concurrency=AWS_TRANSFER_CONCURRENCY,
+        )
+
     def async_upload(
         self, file_names, contents, content_types=None, access=access_choices.PRIVATE
     ):
@@ -208,6 +293,18 @@ class AwsStorage:
         for chunk in key_chunks:
             bucket.delete_objects(Delete={"Objects": chunk})
 
+    def delete_files(self, file_names):
+        """Delete the given files, as opposed to every file with a prefix"""
+        buckets = {}
+        for file_name in file_names:
+            bucket, key = self.bucket_key(file_name)
+            buckets.setdefault(bucket, []).append({"Key": key})
+        for bucket, keys in buckets.items():
+            bucket = self.s3_resource.Bucket(bucket)
+            # can only delete 1000 at a time
+            for i in range(0, len(keys), 1000):
+                bucket.delete_objects(Delete={"Objects": keys[i : i + 1000]})
+
     def set_access_path(self, file_prefix, access):
         """Set access for all keys with a given prefix"""
         if self.minio:
@@ -251,6 +348,87 @@ class AwsStorage:
         loop = asyncio.get_event_loop()
         loop.run_until_complete(main())
 
+    def async_copy(self, sources, destinations, access=access_choices.PRIVATE):
+        """Copy given files server side in parallel"""
+        # import aioboto3 locally to avoid needing it installed on lambda
+        # Third Party
+        import aioboto3
+
+        extra_args = {}
+        if not self.minio:
+            # minio does not support object ACLs
+            extra_args["ACL"] = ACLS[access]
+
+        async def main():
+            session = aioboto3.Session()
+            async with session.client("s3", **self.resource_kwargs) as as3_client:
+                tasks = []
+                for source, destination in zip(sources, destinations):
+                    source_bucket, source_key = self.bucket_key(source)
+                    bucket, key = self.bucket_key(destination)
+                    tasks.append(
+                        as3_client.copy_object(
+                            CopySource={"Bucket": source_bucket, "Key": source_key},
+                            Bucket=bucket,
+                            Key=key,
+                            **extra_args,
+                        )
+                    )
+                await asyncio.gather(*tasks)
+
+        loop = asyncio.get_event_loop()
+        loop.run_until_complete(main())
+
+    def compose(self, file_name, parts, access=access_choices.PRIVATE):
+        """Write a file made of (source, start, end) ranges of existing files and
+        bytes, copying the ranges server side where possible"""
+        bucket, key = self.bucket_key(file_name)
+        extra_args = {}
+        if not self.minio:
+            # minio does not support object ACLs
+            extra_args["ACL"] = ACLS[access]
+        content_type = mimetypes.guess_type(file_name)[0]
+        if content_type is not None:
+            extra_args["ContentType"] = content_type
+
+        upload_id = self.s3_client.create_multipart_upload(
+            Bucket=bucket, Key=key, **extra_args
+        )["UploadId"]
+        try:
+            completed = []
+            for number, part in enumerate(plan_parts(parts, self.read_range), start=1):
+                if isinstance(part, tuple):
+                    source, start, end = part
+                    source_bucket, source_key = self.bucket_key(source)
+                    etag = self.s3_client.upload_part_copy(
+                        Bucket=bucket,
+                        Key=key,
+                        UploadId=upload_id,
+                        PartNumber=number,
+                        CopySource={"Bucket": source_bucket, "Key": source_key},
+                        CopySourceRange=f"bytes={start}-{end - 1}",
+                    )["CopyPartResult"]["ETag"]
+                else:
+                    etag = self.s3_client.upload_part(
+                        Bucket=bucket,
+                        Key=key,
+                        UploadId=upload_id,
+                        PartNumber=number,
+                        Body=part,
+                    )["ETag"]
+                completed.append({"ETag": etag, "PartNumber": number})
+            self.s3_client.complete_multipart_upload(
+                Bucket=bucket,
+                Key=key,
+                UploadId=upload_id,
+                MultipartUpload={"Parts": completed},
+            )
+        except Exception:
+            self.s3_client.abort_multipart_upload(
+                Bucket=bucket, Key=key, UploadId=upload_id
+            )
+            raise
+
     def async_download(self, file_names):
         """Download given files in parallel"""
         # import aioboto3 locally to avoid needing it installed on lambda
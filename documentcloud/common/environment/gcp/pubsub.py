@@ -1,4 +1,55 @@
+# Standard Library
+import threading
+from concurrent.futures import wait
+from contextlib import contextmanager
+
 # Third Party
 from google.cloud import pubsub_v1
 
-publisher = pubsub_v1.PublisherClient()
+
+class GcpPubsub:
+    """Wraps the Pub/Sub client, which batches messages itself, so that
+    publishes can be awaited when a batch block exits"""
+
+    def __init__(self):
+        self.client = pubsub_v1.PublisherClient()
+        self.lock = threading.Lock()
+        self.batching = 0
+        self.sends = []
+
+    def topic_path(self, namespace, name):
+        return self.client.topic_path(namespace, name)
+
+    def publish(self, topic_path, data):
+        future = self.client.publish(topic_path, data)
+        with self.lock:
+            if self.batching:
+                self.sends.append(future)
+        return future
+
+    @contextmanager
+    def batch(self):
+        """Send messages published within the block without waiting on each,
+        flushing them when the block exits"""
+        with self.lock:
+            self.batching += 1
+        try:
+            yield self
+        finally:
+            with self.lock:
+                self.batching -= 1
+            if not self.batching:
+                self.flush()
+
+    def flush(self):
+        """Wait for every publish to complete"""
+        with self.lock:
+            sends = self.sends
+            self.sends = []
+        wait(sends)
+        # Raise any errors from sending
+        for send in sends:
+            send.result()
+
+
+publisher = GcpPubsub()
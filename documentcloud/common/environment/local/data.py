@@ -13,6 +13,11 @@ def get_pubsub_data(data):
     return json.loads(base64.b64decode(data["data"]).decode("utf-8"))
 
 
+def get_pubsub_published(_data):
+    """Messages are not timestamped when published"""
+    return None
+
+
 def encode_pubsub_data(data):
     """Encode data into the proper format for a pubsub request."""
     return json.dumps(data).encode("utf8")
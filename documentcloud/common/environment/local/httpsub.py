@@ -26,6 +26,13 @@ def progress_callback(request, _context):
     return get_progress(request.json())
 
 
+def telemetry_callback(request, _context):
+    # DocumentCloud
+    from documentcloud.documents.processing.utils.main import get_telemetry
+
+    return get_telemetry(request.json())
+
+
 def import_callback(request, _context):
     # DocumentCloud
     from documentcloud.documents.processing.utils.main import import_documents
@@ -42,5 +49,10 @@ def sidekick_callback(request, _context):
 
 adapter.register_uri("POST", env("DOC_PROCESSING_URL"), json=process_callback)
 adapter.register_uri("POST", env("PROGRESS_URL"), json=progress_callback)
+adapter.register_uri(
+    "POST",
+    env("TELEMETRY_URL", default="mock://telemetry.dev.documentcloud.org"),
+    json=telemetry_callback,
+)
 adapter.register_uri("POST", env("IMPORT_URL"), json=import_callback)
 adapter.register_uri("POST", env("SIDEKICK_PROCESSING_URL"), json=sidekick_callback)
@@ -1,6 +1,7 @@
 # Standard Library
 import base64
 import json
+from contextlib import contextmanager
 
 # Third Party
 import environ
@@ -40,6 +41,15 @@ class LocalPubSubClient:
             if ERROR_IF_NO_TOPIC:
                 raise ValueError(f"Topic not registered: {topic_path}")
 
+    @contextmanager
+    def batch(self):
+        """Messages are handed to their callbacks as they are published, so
+        there is nothing to batch locally"""
+        yield self
+
+    def flush(self):
+        pass
+
 
 # Define pub sub client and topic subscriptions
 publisher = LocalPubSubClient()
@@ -56,11 +56,72 @@ class LocalStorage:
         # pylint: disable=unused-argument
         return LocalStorageFile(self, filename, mode)
 
+    def read_range(self, filename, start, end):
+        with self.open(filename, "rb") as local_file:
+            local_file.seek(start)
+            return local_file.read(end - start)
+
     def simple_upload(self, filename, contents, content_type=None, access=None):
         # pylint: disable=unused-argument
         with self.open(filename, "wb") as local_file:
             local_file.write(contents)
 
+    def upload_file(self, filename, local_path, content_type=None, access=None):
+        # pylint: disable=unused-argument
+        with self.open(filename, "wb") as local_file, open(
+            local_path, "rb"
+        ) as source_file:
+            shutil.copyfileobj(source_file, local_file)
+
+    def download_file(self, filename, local_path):
+        with self.open(filename, "rb") as local_file, open(
+            local_path, "wb"
+        ) as target_file:
+            shutil.copyfileobj(local_file, target_file)
+
+    def async_upload(self, file_names, contents, content_types=None, access=None):
+        # pylint: disable=unused-argument
+        for file_name, content in zip(file_names, contents):
+            self.simple_upload(file_name, content)
+
+    def async_download(self, file_names):
+        contents = []
+        for file_name in file_names:
+            if self.exists(file_name):
+                with self.open(file_name, "rb") as local_file:
+                    contents.append(local_file.read())
+            else:
+                contents.append(b"")
+        return contents
+
+    def async_copy(self, sources, destinations, access=None):
+        # pylint: disable=unused-argument
+        for source, destination in zip(sources, destinations):
+            with self.open(source, "rb") as source_file:
+                self.simple_upload(destination, source_file.read())
+
+    def compose(self, file_name, parts, access=None):
+        # pylint: disable=unused-argument
+        contents = []
+        for part in parts:
+            if isinstance(part, (bytes, bytearray)):
+                contents.append(part)
+            else:
+                contents.append(self.read_range(*part))
+        self.simple_upload(file_name, b"".join(contents))
+
+    def list(self, file_prefix, marker=None, limit=None):
+        """List files in the given path"""
+        root = os.path.join(settings.MEDIA_ROOT, file_prefix)
+        file_names = sorted(
+            os.path.relpath(os.path.join(directory, file_name), settings.MEDIA_ROOT)
+            for directory, _, file_names in os.walk(root)
+            for file_name in file_names
+        )
+        if marker is not None:
+            file_names = [file_name for file_name in file_names if file_name > marker]
+        return file_names[:limit]
+
     def presign_url(self, file_name, _method_name, use_custom_domain=False):
         # pylint: disable=unused-argument
         return file_name
@@ -71,6 +132,9 @@ class LocalStorage:
     def delete(self, file_prefix):
         """To be mocked in tests"""
 
+    def delete_files(self, file_names):
+        """To be mocked in tests"""
+
     def copy(self, src, dst, acl="private"):
         # pylint: disable=unused-argument
         shutil.copy(src, dst)
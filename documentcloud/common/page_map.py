@@ -0,0 +1,52 @@
+"""
+Where the pages of a modified document come from.
+
+A modification builds a document from page specs, each taking pages from the
+document itself or from another document, optionally rotating them.  The page
+map is shared between processing, which carries the assets of the pages over
+to their new positions, and post processing, which moves the notes and
+sections of the pages along with them.
+"""
+
+# Standard Library
+from collections import defaultdict
+
+# Used to map modification rotations to quarter turns clockwise
+ANGLE_TABLE = {"": 0, "cc": 1, "hw": 2, "ccw": 3}
+
+
+def iterate_page_spec(page_spec):
+    for spec in page_spec:
+        if isinstance(spec, list):
+            # Page range
+            yield from range(spec[0], spec[1] + 1)
+        else:
+            # Individual page
+            yield spec
+
+
+def build_page_map(doc_id, modifications):
+    """Map the source document id and page number of each page of a modified
+    document to a list of its new page numbers and rotations.  Pages taken from
+    the modified document itself have a source document id of `doc_id`.
+
+    Returns:
+        The page map and the page count of the modified document.
+    """
+    # (doc_id, old_page) -> [(new_page, rotation), ...]
+    page_map = defaultdict(list)
+    page_number = 0
+
+    # build a map from original page to new page(s)
+    for modification in modifications:
+        source_id = modification.get("id", doc_id)
+        modifiers = modification.get("modifications", [])
+        rotation = 0
+        for modifier in modifiers:
+            rotation += ANGLE_TABLE.get(modifier.get("angle", ""), 0)
+
+        for old_page in iterate_page_spec(modification["page_spec"]):
+            page_map[(source_id, old_page)].append((page_number, rotation))
+            page_number += 1
+
+    return page_map, page_number
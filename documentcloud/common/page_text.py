@@ -0,0 +1,227 @@
+"""
+A store for the text of a document's pages, sharded into json files of
+PAGE_TEXT_SHARD_SIZE pages alongside a small manifest, so that reading or
+writing a few pages only moves the shards containing them.
+
+The legacy json text file, holding every page, is still served for downloads.
+It is rewritten in full when all of the text is written at once, and otherwise
+marked as stale until `regenerate_legacy` rebuilds it from the shards, which
+reads the shards rather than every page's old text.  Documents whose text
+has not been sharded yet are read from the legacy file, and sharded the first
+time their pages are written.
+"""
+
+# Standard Library
+import json
+
+# Third Party
+import environ
+
+# Local
+from . import path
+
+env = environ.Env()
+
+PAGE_TEXT_SHARD_SIZE = env.int("PAGE_TEXT_SHARD_SIZE", default=100)
+
+MANIFEST_VERSION = 1
+
+
+class PageTextStore:
+    """Reads and writes the page text of a single document"""
+
+    def __init__(self, storage, doc_id, slug):
+        self.storage = storage
+        self.doc_id = doc_id
+        self.slug = slug
+        self._manifest = None
+
+    def manifest(self):
+        """The manifest of the shards, or None if the text is not sharded"""
+        if self._manifest is None:
+            manifest_path = path.page_text_manifest_path(self.doc_id, self.slug)
+            if self.storage.exists(manifest_path):
+                with self.storage.open(manifest_path, "rb") as manifest_file:
+                    self._manifest = json.loads(manifest_file.read())
+        return self._manifest
+
+    def read_legacy(self):
+        """Read the legacy json text file"""
+        try:
+            with self.storage.open(
+                path.json_text_path(self.doc_id, self.slug), "rb"
+            ) as json_file:
+                return json.loads(json_file.read())
+        except ValueError:
+            return {"pages": [], "updated": None}
+
+    def read_pages(self, page_numbers):
+        """Read the text of the given pages, returning a dict from page number
+        to the page's json, without the pages which have no text"""
+        manifest = self.manifest()
+        if manifest is None:
+            pages = self.read_legacy()["pages"]
+            return {
+                page_number: pages[page_number]
+                for page_number in page_numbers
+                if page_number < len(pages)
+            }
+
+        shard_size = manifest["shard_size"]
+        shards = self._read_shards(
+            sorted({page_number // shard_size for page_number in page_numbers})
+        )
+        pages = {}
+        for page_number in page_numbers:
+            shard_pages = shards[page_number // shard_size]
+            if page_number % shard_size < len(shard_pages):
+                pages[page_number] = shard_pages[page_number % shard_size]
+        return pages
+
+    def read_all(self):
+        """Read the text of every page, in the legacy json text format"""
+        manifest = self.manifest()
+        if manifest is None:
+            return self.read_legacy()
+
+        page_count = manifest["page_count"]
+        shard_size = manifest["shard_size"]
+        shard_count = -(-page_count // shard_size)
+        shards = self._read_shards(list(range(shard_count)))
+        pages = []
+        for shard in range(shard_count):
+            # Shards may be short if pages were added past their end later
+            shard_pages = shards[shard]
+            pages.extend(shard_pages)
+            pages.extend([{} for _ in range(shard_size - len(shard_pages))])
+        return {"updated": manifest["updated"], "pages": pages[:page_count]}
+
+    def write_pages(self, pages, updated, access, page_count=0):
+        """Write the text of some pages, each a json page with a `page` key,
+        padding the text to at least `page_count` pages.  The legacy json text
+        file is marked as stale."""
+        page_count = max([page_count] + [page["page"] + 1 for page in pages])
+        manifest = self.manifest()
+        if manifest is None:
+            # Shard the legacy text, patching in the pages
+            json_text = self.read_legacy()
+            json_text["pages"].extend(
+                [{} for _ in range(page_count - len(json_text["pages"]))]
+            )
+            for page in pages:
+                json_text["pages"][page["page"]] = page
+            json_text["updated"] = updated
+            self.write_all(json_text, access, legacy=False)
+            return
+
+        shard_size = manifest["shard_size"]
+        page_count = max(manifest["page_count"], page_count)
+        shards = self._read_shards(
+            sorted({page["page"] // shard_size for page in pages})
+        )
+        for page in pages:
+            shard_pages = shards[page["page"] // shard_size]
+            index = page["page"] % shard_size
+            if index >= len(shard_pages):
+                shard_pages.extend([{} for _ in range(index + 1 - len(shard_pages))])
+            shard_pages[index] = page
+
+        self._upload(
+            shards,
+            {**manifest, "page_count": page_count, "updated": updated},
+            access,
+            stale=True,
+        )
+
+    def write_all(self, json_text, access, legacy=True):
+        """Write the text of every page from the legacy json text format, also
+        writing the legacy json text file unless `legacy` is false"""
+        old_manifest = self.manifest()
+        pages = json_text["pages"]
+        shard_size = PAGE_TEXT_SHARD_SIZE
+        shards = {
+            shard: pages[shard * shard_size : (shard + 1) * shard_size]
+            for shard in range(-(-len(pages) // shard_size))
+        }
+        manifest = {
+            "version": MANIFEST_VERSION,
+            "page_count": len(pages),
+            "shard_size": shard_size,
+            "updated": json_text.get("updated"),
+        }
+        if legacy:
+            # Write the legacy file first, so it is never marked as fresh
+            # before it is up to date
+            self.storage.simple_upload(
+                path.json_text_path(self.doc_id, self.slug),
+                json.dumps(json_text).encode("utf-8"),
+                access=access,
+            )
+        self._upload(shards, manifest, access, stale=not legacy)
+
+        if old_manifest is not None:
+            # Remove any shards past the end of the text
+            old_shard_count = -(
+                -old_manifest["page_count"] // old_manifest["shard_size"]
+            )
+            for shard in range(len(shards), old_shard_count):
+                self.storage.delete(
+                    path.page_text_shard_path(self.doc_id, self.slug, shard)
+                )
+
+    def is_stale(self):
+        """Whether the legacy json text file is out of date with the shards"""
+        return self.storage.exists(path.page_text_stale_path(self.doc_id, self.slug))
+
+    def regenerate_legacy(self, access):
+        """Regenerate the legacy json text file from the shards, returning the
+        text of every page"""
+        # Clear the stale marker before reading, so that any pages written
+        # while regenerating mark the file as stale again
+        self.storage.delete(path.page_text_stale_path(self.doc_id, self.slug))
+        json_text = self.read_all()
+        self.storage.simple_upload(
+            path.json_text_path(self.doc_id, self.slug),
+            json.dumps(json_text).encode("utf-8"),
+            access=access,
+        )
+        return json_text
+
+    def _read_shards(self, shards):
+        file_names = [
+            path.page_text_shard_path(self.doc_id, self.slug, shard) for shard in shards
+        ]
+        contents = self.storage.async_download(file_names)
+        shard_pages = {}
+        for shard, file_name, content in zip(shards, file_names, contents):
+            if content:
+                shard_pages[shard] = json.loads(content)["pages"]
+            elif self.storage.exists(file_name):
+                # Downloads which fail are returned empty, the same as missing
+                # files, but a shard is never empty.  The text must not be
+                # written over with a shard of placeholders.
+                raise OSError(f"Unable to read page text shard: {file_name}")
+            else:
+                # Shards may be missing if pages were added past their end
+                shard_pages[shard] = []
+        return shard_pages
+
+    def _upload(self, shards, manifest, access, stale):
+        file_names = []
+        file_contents = []
+        for shard, pages in shards.items():
+            file_names.append(path.page_text_shard_path(self.doc_id, self.slug, shard))
+            file_contents.append(json.dumps({"pages": pages}).encode("utf-8"))
+        if stale:
+            file_names.append(path.page_text_stale_path(self.doc_id, self.slug))
+            file_contents.append(b"")
+        # Write the manifest last, so it never refers to shards not yet written
+        self.storage.async_upload(file_names, file_contents, access=access)
+        self.storage.simple_upload(
+            path.page_text_manifest_path(self.doc_id, self.slug),
+            json.dumps(manifest).encode("utf-8"),
+            access=access,
+        )
+        self._manifest = manifest
+        if not stale:
+            self.storage.delete(path.page_text_stale_path(self.doc_id, self.slug))
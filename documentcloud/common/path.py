@@ -15,6 +15,7 @@ PAGESIZE_SUFFIX = "pagesize"
 IMAGE_SUFFIX = "gif"
 TEXT_SUFFIX = "txt"
 SELECTABLE_TEXT_SUFFIX = "position.json"
+PACKED_POSITIONS_SUFFIX = "positions"
 JSON_TEXT_SUFFIX = "txt.json"
 
 
@@ -67,6 +68,27 @@ def json_text_path(doc_id, slug):
     return file_path(doc_id, slug, JSON_TEXT_SUFFIX)
 
 
+def page_text_shards_path(doc_id):
+    """The path to the sharded page text directory for this document"""
+    return path(doc_id) + "text/"
+
+
+def page_text_shard_path(doc_id, slug, shard):
+    """The path to a shard of the page text"""
+    return page_text_shards_path(doc_id) + f"{slug}-{shard:05d}.{JSON_TEXT_SUFFIX}"
+
+
+def page_text_manifest_path(doc_id, slug):
+    """The path to the manifest of the page text shards"""
+    return page_text_shards_path(doc_id) + f"{slug}.manifest.json"
+
+
+def page_text_stale_path(doc_id, slug):
+    """The path to the marker that the json text file is out of date with the
+    page text shards"""
+    return page_text_shards_path(doc_id) + f"{slug}.stale"
+
+
 def pages_path(doc_id):
     """The path to the pages directory for this document"""
     return path(doc_id) + "pages/"
@@ -87,6 +109,22 @@ def page_text_position_path(doc_id, slug, page_number):
     return pages_path(doc_id) + f"{slug}-p{page_number + 1}.{SELECTABLE_TEXT_SUFFIX}"
 
 
+def text_positions_path(doc_id, slug):
+    """The path to the packed text positions file for all pages"""
+    return file_path(doc_id, slug, PACKED_POSITIONS_SUFFIX)
+
+
+def artifacts_path(doc_id):
+    """The path where intermediate processing files for this document are kept,
+    apart from the document's files"""
+    return f"{DOCUMENT_BUCKET}/artifacts/{doc_id}/"
+
+
+def artifact_path(doc_id, kind, key):
+    """The path to an intermediate processing file spilled out of Redis"""
+    return artifacts_path(doc_id) + f"{kind}/{key}"
+
+
 def sidekick_path(proj_id):
     """The path where this projects's sidekick files are located"""
     return f"{DOCUMENT_BUCKET}/sidekick/{proj_id}/"
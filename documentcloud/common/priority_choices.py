@@ -0,0 +1,10 @@
+"""
+Processing priority constants, shared by the API and the serverless environment
+"""
+
+# Documents a user is waiting on, such as a single upload or a redaction
+INTERACTIVE = "interactive"
+# Documents processed in bulk, such as bulk uploads and reprocessing
+BULK = "bulk"
+
+PRIORITIES = (INTERACTIVE, BULK)
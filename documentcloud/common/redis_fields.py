@@ -11,6 +11,30 @@ def error_retry_lock():
     return "error_retry_lock"
 
 
+def scheduler_lock():
+    return "scheduler:lock"
+
+
+def scheduler_jobs():
+    return "scheduler:jobs"
+
+
+def scheduler_queue(priority, org_id):
+    return f"scheduler:queue:{priority}:{org_id}"
+
+
+def scheduler_orgs(priority):
+    return f"scheduler:orgs:{priority}"
+
+
+def scheduler_running():
+    return "scheduler:running"
+
+
+def scheduler_credits():
+    return "scheduler:credits"
+
+
 def images_remaining(doc_id):
     return f"{doc_id}:image"
 
@@ -27,12 +51,8 @@ def page_count(doc_id):
     return f"{doc_id}:pages"
 
 
-def dimensions(doc_id):
-    return f"{doc_id}:dimensions"
-
-
-def page_dimension(doc_id, page_dimension_):
-    return f"{doc_id}:dim{page_dimension_}"
+def page_dimensions(doc_id):
+    return f"{doc_id}:pageDimensions"
 
 
 def page_text(doc_id):
@@ -40,7 +60,19 @@ def page_text(doc_id):
 
 
 def page_text_pdf(doc_id):
-    return f"{doc_id}:pagetextpdf"
+    return artifacts(doc_id, "pagetextpdf")
+
+
+def page_text_positions(doc_id):
+    return artifacts(doc_id, "pagepositions")
+
+
+def artifacts(doc_id, kind):
+    return f"{doc_id}:{kind}"
+
+
+def artifacts_spilled(doc_id):
+    return f"{doc_id}:artifactsSpilled"
 
 
 def is_running(doc_id):
@@ -69,3 +101,35 @@ def import_pagespecs(org_id):
 
 def import_docs_remaining(org_id):
     return f"{org_id}:docsRemaining"
+
+
+def batch_timings(stage):
+    return f"batchTimings:{stage}"
+
+
+def batch_stats(stage):
+    return f"batchStats:{stage}"
+
+
+def telemetry(stage, bucket):
+    return f"telemetry:{stage}:{bucket}"
+
+
+def telemetry_stages():
+    return "telemetry:stages"
+
+
+def asset_cache(key):
+    return f"assetCache:{key}"
+
+
+def asset_cache_key(doc_id):
+    return f"{doc_id}:assetCacheKey"
+
+
+def asset_cache_entry(doc_id):
+    return f"{doc_id}:assetCacheEntry"
+
+
+def checkpoint(token):
+    return f"checkpoint:{token}"
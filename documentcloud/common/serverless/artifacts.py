@@ -0,0 +1,139 @@
+"""
+A store for the intermediate files passed between processing functions, such as
+the text-only PDFs of OCRd pages.
+
+Each kind of file for a document is indexed by key in a Redis hash.  Values are
+compressed, and those still larger than the spill threshold are written to
+object storage instead, leaving only a marker in Redis, so that large jobs do
+not fill up the shared Redis instance.  The kinds with values spilled to storage
+are kept in a Redis set, so that storage is only cleaned up when there is
+something to remove.
+"""
+
+# Standard Library
+import zlib
+from concurrent.futures import ThreadPoolExecutor
+
+# Third Party
+import environ
+
+# Local
+from .. import path, redis_fields
+
+env = environ.Env()
+
+ARTIFACT_SPILL_THRESHOLD = env.int(
+    "ARTIFACT_SPILL_THRESHOLD", default=64 * 1024
+)  # Values larger than this once compressed are spilled to storage (0 for all)
+ARTIFACT_COMPRESS_LEVEL = env.int("ARTIFACT_COMPRESS_LEVEL", default=6)
+ARTIFACT_THREADS = env.int(
+    "ARTIFACT_THREADS", default=8
+)  # Number of spilled values to fetch from storage at once
+
+# The first byte of a value in Redis marks how it is stored
+RAW = b"r"
+COMPRESSED = b"z"
+SPILLED = b"s"
+
+
+class ArtifactStore:
+    """Stores intermediate files by document, kind and key"""
+
+    def __init__(
+        self,
+        storage,
+        ttl,
+        spill_threshold=ARTIFACT_SPILL_THRESHOLD,
+        compress_level=ARTIFACT_COMPRESS_LEVEL,
+        threads=ARTIFACT_THREADS,
+    ):
+        # pylint: disable=too-many-arguments
+        self.storage = storage
+        self.ttl = ttl
+        self.spill_threshold = spill_threshold
+        self.compress_level = compress_level
+        self.threads = threads
+
+    def put(self, redis, doc_id, kind, key, contents):
+        """Store a value.  `redis` may be a pipeline, in which case only a value
+        spilled to storage is written before the pipeline is executed."""
+        compressed = zlib.compress(contents, self.compress_level)
+        if len(compressed) < len(contents):
+            value = COMPRESSED + compressed
+        else:
+            value = RAW + contents
+
+        if len(value) > self.spill_threshold:
+            self.storage.simple_upload(path.artifact_path(doc_id, kind, key), value)
+            value = SPILLED
+            spilled_field = redis_fields.artifacts_spilled(doc_id)
+            redis.sadd(spilled_field, kind)
+            redis.expire(spilled_field, self.ttl)
+
+        field = redis_fields.artifacts(doc_id, kind)
+        redis.hset(field, f"{key}", value)
+        redis.expire(field, self.ttl)
+
+    def keys(self, redis, doc_id, kind):
+        """The keys stored for a kind of value"""
+        return [
+            key.decode("utf8")
+            for key in redis.hkeys(redis_fields.artifacts(doc_id, kind))
+        ]
+
+    def get_many(self, redis, doc_id, kind, keys):
+        """Fetch the values of several keys, with a single Redis round trip and
+        concurrent reads of any spilled values.  Missing values are None."""
+        keys = [f"{key}" for key in keys]
+        if not keys:
+            return []
+        values = redis.hmget(redis_fields.artifacts(doc_id, kind), keys)
+
+        spilled = [i for i, value in enumerate(values) if value == SPILLED]
+        if spilled:
+            with ThreadPoolExecutor(
+                max_workers=min(self.threads, len(spilled))
+            ) as executor:
+                for i, value in zip(
+                    spilled,
+                    executor.map(
+                        lambda i: self._read_spilled(doc_id, kind, keys[i]), spilled
+                    ),
+                ):
+                    values[i] = value
+
+        return [decode_value(value) for value in values]
+
+    def get(self, redis, doc_id, kind, key):
+        """Fetch a single value, or None if it is missing"""
+        return self.get_many(redis, doc_id, kind, [key])[0]
+
+    def delete(self, redis, doc_id, kind):
+        """Remove every value of a kind, including any spilled to storage"""
+        if redis.srem(redis_fields.artifacts_spilled(doc_id), kind):
+            self.storage.delete(path.artifact_path(doc_id, kind, ""))
+        redis.delete(redis_fields.artifacts(doc_id, kind))
+
+    def delete_spilled(self, redis, doc_id):
+        """Remove the values of every kind spilled to storage"""
+        spilled_field = redis_fields.artifacts_spilled(doc_id)
+        for kind in redis.smembers(spilled_field):
+            self.storage.delete(path.artifact_path(doc_id, kind.decode("utf8"), ""))
+        redis.delete(spilled_field)
+
+    def _read_spilled(self, doc_id, kind, key):
+        with self.storage.open(path.artifact_path(doc_id, kind, key), "rb") as file_:
+            return file_.read()
+
+
+def decode_value(value):
+    """Decode a value as stored in Redis or storage"""
+    if value is None or value == b"":
+        return value
+    marker, contents = value[:1], value[1:]
+    if marker == COMPRESSED:
+        return zlib.decompress(contents)
+    if marker == RAW:
+        return contents
+    # Values written before the store was introduced were stored as is
+    return value
@@ -0,0 +1,167 @@
+"""
+Content-addressed reuse of processed assets.
+
+When a document finishes processing, it is recorded as the source of the
+assets for its file hash and OCR settings.  A later upload of the same file
+with the same OCR settings copies the page images, text, text positions and
+page index of the source server side rather than processing it again.
+
+An entry is only used while its source still has the text it was recorded
+with, so that edits to the source's text, redactions and modifications are
+never carried over to another document.  Entries expire after
+ASSET_CACHE_TTL.
+"""
+
+# Standard Library
+import json
+import logging
+
+# Third Party
+import environ
+
+# Local
+from .. import path, redis_fields
+from ..environment import storage
+from ..page_text import PageTextStore
+from .utils import REDIS_TTL
+
+env = environ.Env()
+logger = logging.getLogger(__name__)
+
+ASSET_CACHE_ENABLED = env.bool(
+    "ASSET_CACHE_ENABLED", default=True
+)  # Reuse the processed assets of earlier uploads of the same file
+ASSET_CACHE_TTL = env.int(
+    "ASSET_CACHE_TTL", default=30 * 86400
+)  # How long a processed document may be reused for
+ASSET_COPY_BATCH = env.int(
+    "ASSET_COPY_BATCH", default=500
+)  # Number of files to copy at once
+
+# A document's files which are not processed assets
+EXCLUDED_DIRECTORIES = ("original/", "revisions/")
+
+
+def cache_key(file_hash, ocr_code, ocr_engine, force_ocr):
+    """The key of the assets of a file processed with the given OCR settings"""
+    return f"{file_hash}:{ocr_code}:{ocr_engine}:{int(bool(force_ocr))}"
+
+
+def remember(redis, doc_id, key):
+    """Keep the cache key of a document being processed, to record it as a
+    source once it finishes"""
+    if ASSET_CACHE_ENABLED:
+        redis.set(redis_fields.asset_cache_key(doc_id), key, ex=REDIS_TTL)
+
+
+def text_updated(doc_id, slug):
+    """The last time the document's text was written"""
+    manifest = PageTextStore(storage, doc_id, slug).manifest()
+    return manifest["updated"] if manifest is not None else None
+
+
+def store(redis, doc_id, slug, page_spec):
+    """Record a document which has finished processing as the source of the
+    assets for its cache key"""
+    if not ASSET_CACHE_ENABLED:
+        return
+    key = redis.get(redis_fields.asset_cache_key(doc_id))
+    if key is None:
+        return
+    key = key.decode("utf8")
+    page_count = int(redis.get(redis_fields.page_count(doc_id)))
+    entry = {
+        "doc_id": doc_id,
+        "slug": slug,
+        "page_count": page_count,
+        "page_spec": page_spec,
+        "updated": text_updated(doc_id, slug),
+    }
+    pipeline = redis.pipeline()
+    pipeline.set(redis_fields.asset_cache(key), json.dumps(entry), ex=ASSET_CACHE_TTL)
+    pipeline.set(redis_fields.asset_cache_entry(doc_id), key, ex=ASSET_CACHE_TTL)
+    pipeline.execute()
+    logger.info("[ASSET CACHE] stored doc_id %s as %s", doc_id, key)
+
+
+def forget(redis, doc_id):
+    """Stop reusing a document's assets, for when they are about to change"""
+    key = redis.get(redis_fields.asset_cache_entry(doc_id))
+    if key is None:
+        return
+    key = key.decode("utf8")
+    entry = redis.get(redis_fields.asset_cache(key))
+    if entry is not None and json.loads(entry)["doc_id"] == doc_id:
+        redis.delete(redis_fields.asset_cache(key))
+    redis.delete(redis_fields.asset_cache_entry(doc_id))
+
+
+def lookup(redis, key, doc_id, page_count):
+    """The entry of a prior document whose assets can be reused for a document,
+    or None if there is none"""
+    if not ASSET_CACHE_ENABLED:
+        return None
+    entry = redis.get(redis_fields.asset_cache(key))
+    if entry is None:
+        return None
+    entry = json.loads(entry)
+    if entry["doc_id"] == doc_id or entry["page_count"] != page_count:
+        return None
+    if entry["updated"] is None or entry["updated"] != text_updated(
+        entry["doc_id"], entry["slug"]
+    ):
+        # The source's text has changed, or it has been deleted
+        logger.info(
+            "[ASSET CACHE] doc_id %s is out of date for %s", entry["doc_id"], key
+        )
+        redis.delete(redis_fields.asset_cache(key))
+        return None
+    return entry
+
+
+def asset_paths(source_id, source_slug, doc_id, slug):
+    """The (source, destination) paths of the assets to copy between documents"""
+    source_path = path.path(source_id)
+    paths = []
+    for file_name in storage.list(source_path):
+        relative = file_name[len(source_path) :]
+        directory, _, base_name = relative.rpartition("/")
+        directory = f"{directory}/" if directory else ""
+        if directory.startswith(EXCLUDED_DIRECTORIES) or not base_name.startswith(
+            source_slug
+        ):
+            continue
+        paths.append(
+            (
+                file_name,
+                path.path(doc_id) + directory + slug + base_name[len(source_slug) :],
+            )
+        )
+    return paths
+
+
+def copy_files(paths, access):
+    """Copy (source, destination) paths server side in batches, in order"""
+    for start in range(0, len(paths), ASSET_COPY_BATCH):
+        batch = paths[start : start + ASSET_COPY_BATCH]
+        storage.async_copy(
+            [source for source, _ in batch],
+            [destination for _, destination in batch],
+            access=access,
+        )
+
+
+def copy_assets(entry, doc_id, slug, access):
+    """Copy the assets of the entry's document to a document"""
+    paths = asset_paths(entry["doc_id"], entry["slug"], doc_id, slug)
+    # Copy the page text manifest last, so the document's text is never read
+    # before all of it is there
+    manifest_path = path.page_text_manifest_path(doc_id, slug)
+    paths.sort(key=lambda paths_: paths_[1] == manifest_path)
+    copy_files(paths, access)
+    logger.info(
+        "[ASSET CACHE] copied %d files from doc_id %s to doc_id %s",
+        len(paths),
+        entry["doc_id"],
+        doc_id,
+    )
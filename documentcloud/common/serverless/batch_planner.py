@@ -0,0 +1,191 @@
+"""
+Plans how to split a document's pages into batches for each processing stage.
+
+Each stage records how long its recent invocations took per page in Redis.
+Batches are sized so that each is expected to take about the stage's target
+time, so that small documents are processed in a single invocation and large
+documents or slow stages are spread over more of them.  Until a stage has
+recorded any timings, or if adaptive batching is off, its static batch size is
+used instead.
+"""
+
+# Standard Library
+import logging
+import math
+
+# Third Party
+import environ
+
+# Local
+from .. import redis_fields
+
+env = environ.Env()
+logger = logging.getLogger(__name__)
+
+ADAPTIVE_BATCHES = env.bool(
+    "ADAPTIVE_BATCHES", default=True
+)  # Size batches from recent timings instead of the static batch sizes
+BATCH_TARGET_SECONDS = env.float(
+    "BATCH_TARGET_SECONDS", default=60
+)  # Time each batch should take, well within the first function timeout
+BATCH_MAX_FANOUT = env.int(
+    "BATCH_MAX_FANOUT", default=100
+)  # Most batches to split a single document's pages into for one stage
+BATCH_TIMING_SAMPLES = env.int(
+    "BATCH_TIMING_SAMPLES", default=50
+)  # Number of recent invocations to keep the timings of for each stage
+BATCH_TIMING_PERCENTILE = env.float(
+    "BATCH_TIMING_PERCENTILE", default=0.9
+)  # Percentile of the recent timings to plan with, to leave room for slow pages
+
+# Stages which plan their batches
+IMAGE_STAGE = "image"
+OCR_STAGE = "ocr"
+TEXT_POSITION_STAGE = "textposition"
+
+# The share of a page's cost which does not depend on its size in the PDF
+PAGE_FIXED_COST = 0.5
+
+
+def percentile(values, fraction):
+    """The value at the given fraction of the sorted values"""
+    values = sorted(values)
+    return values[min(int(len(values) * fraction), len(values) - 1)]
+
+
+def page_weights(page_index, page_numbers):
+    """The relative cost of loading each page, from the bytes the page index
+    has to read for it, scaled so that the average page weighs 1"""
+    sizes = [
+        sum(end - start for start, end in page_index.page_ranges(page_number))
+        for page_number in page_numbers
+    ]
+    mean = sum(sizes) / len(sizes) if sizes else 0
+    if not mean:
+        return None
+    return [PAGE_FIXED_COST + (1 - PAGE_FIXED_COST) * size / mean for size in sizes]
+
+
+class BatchPlanner:
+    """Sizes the batches of a single processing stage"""
+
+    def __init__(
+        self,
+        redis,
+        stage,
+        default_batch,
+        max_batch,
+        target_seconds=BATCH_TARGET_SECONDS,
+    ):
+        # pylint: disable=too-many-arguments
+        self.redis = redis
+        self.stage = stage
+        self.default_batch = default_batch
+        self.max_batch = max(max_batch, default_batch)
+        self.target_seconds = target_seconds
+
+    def record(self, page_count, elapsed):
+        """Record that an invocation of the stage took `elapsed` seconds to
+        process `page_count` pages"""
+        if not ADAPTIVE_BATCHES or page_count <= 0:
+            return
+        key = redis_fields.batch_timings(self.stage)
+        pipeline = self.redis.pipeline(transaction=False)
+        pipeline.lpush(key, elapsed / page_count)
+        pipeline.ltrim(key, 0, BATCH_TIMING_SAMPLES - 1)
+        pipeline.execute()
+
+    def seconds_per_page(self):
+        """The recent time the stage takes per page, or None if unknown"""
+        timings = self.redis.lrange(
+            redis_fields.batch_timings(self.stage), 0, BATCH_TIMING_SAMPLES - 1
+        )
+        if not timings:
+            return None
+        return percentile(
+            [float(timing) for timing in timings], BATCH_TIMING_PERCENTILE
+        )
+
+    def batch_size(self, page_count, seconds_per_page=None):
+        """The number of pages to put in each batch when splitting `page_count`
+        pages"""
+        if not ADAPTIVE_BATCHES:
+            return self.default_batch
+        if seconds_per_page is None:
+            seconds_per_page = self.seconds_per_page()
+        if seconds_per_page is None:
+            return self.default_batch
+        if seconds_per_page > 0:
+            batch_size = int(self.target_seconds / seconds_per_page)
+        else:
+            batch_size = self.max_batch
+        # Make larger batches than the timings call for rather than fan a
+        # document out over too many invocations
+        batch_size = max(batch_size, math.ceil(page_count / BATCH_MAX_FANOUT))
+        return max(min(batch_size, self.max_batch), 1)
+
+    def plan_size(self, doc_id, page_count):
+        """The batch size to split `page_count` pages of a document into, for
+        pages queued for the stage as they become ready"""
+        seconds_per_page = self.seconds_per_page() if ADAPTIVE_BATCHES else None
+        batch_size = self.batch_size(page_count, seconds_per_page)
+        self.log(
+            doc_id,
+            page_count,
+            batch_size,
+            -(-page_count // batch_size),
+            seconds_per_page,
+        )
+        return batch_size
+
+    def plan(self, doc_id, page_numbers, weights=None):
+        """Split the page numbers into batches.  Pages may be given weights,
+        relative costs averaging 1, so that batches of heavier pages are made
+        smaller."""
+        seconds_per_page = self.seconds_per_page() if ADAPTIVE_BATCHES else None
+        batch_size = self.batch_size(len(page_numbers), seconds_per_page)
+        if weights is None or seconds_per_page is None:
+            batches = [
+                page_numbers[i : i + batch_size]
+                for i in range(0, len(page_numbers), batch_size)
+            ]
+        else:
+            batches = []
+            batch = []
+            batch_weight = 0
+            for page_number, weight in zip(page_numbers, weights):
+                if batch and (
+                    batch_weight + weight > batch_size or len(batch) >= self.max_batch
+                ):
+                    batches.append(batch)
+                    batch = []
+                    batch_weight = 0
+                batch.append(page_number)
+                batch_weight += weight
+            if batch:
+                batches.append(batch)
+        self.log(doc_id, len(page_numbers), batch_size, len(batches), seconds_per_page)
+        return batches
+
+    def log(self, doc_id, page_count, batch_size, batch_count, seconds_per_page):
+        """Log a planning decision and count it in the stage's metrics"""
+        logger.info(
+            "[BATCH PLAN] doc_id %s stage %s pages %d seconds_per_page %s "
+            "batch_size %d batches %d",
+            doc_id,
+            self.stage,
+            page_count,
+            seconds_per_page,
+            batch_size,
+            batch_count,
+        )
+        if page_count <= 0:
+            return
+        key = redis_fields.batch_stats(self.stage)
+        pipeline = self.redis.pipeline(transaction=False)
+        pipeline.hincrby(key, "plans", 1)
+        pipeline.hincrby(key, "pages", page_count)
+        pipeline.hincrby(key, "batches", batch_count)
+        if seconds_per_page is None:
+            pipeline.hincrby(key, "defaults", 1)
+        pipeline.execute()
@@ -0,0 +1,98 @@
+"""
+Progress checkpoints for functions working through a batch of items.
+
+A function handed a batch of work, such as the pages to extract images from,
+records each item with `done` once it has finished it.  When the function runs
+out of time, only the items it did not finish are published again, split into
+smaller batches, instead of the whole batch being redone.
+
+A function which times out is killed along with any messages it was still
+holding to publish, so the messages published for the items are sent before
+the items are recorded.  The items finished by a function running in a process
+of its own are kept in Redis, so that they outlive the process.
+
+Functions may instead run cooperatively in the invoking process, checking
+`expired` between items and returning early once their deadline has passed.
+"""
+
+# Standard Library
+import json
+import time
+
+# Third Party
+import environ
+
+# Local
+from ..environment import publisher
+from .utils import REDIS_TTL
+
+env = environ.Env()
+
+CHECKPOINT_SPLIT = env.int(
+    "CHECKPOINT_SPLIT", default=2
+)  # How many batches to split the unfinished items of a timed out function into
+
+# The checkpoint of the function running in this process
+_state = {"redis": None, "key": None, "deadline": None, "done": []}
+
+
+def start(redis=None, key=None, deadline=None):
+    """Start the checkpoint of a function, kept in Redis under `key` if given,
+    with the time it should return by if it runs cooperatively"""
+    _state.update(redis=redis, key=key, deadline=deadline, done=[])
+
+
+def done(*items):
+    """Record items of the function's batch as finished"""
+    if not items:
+        return
+    _state["done"].extend(items)
+    if _state["key"] is not None:
+        # Send what has been published for the items before recording them
+        publisher.flush()
+        pipeline = _state["redis"].pipeline()
+        pipeline.rpush(_state["key"], *[json.dumps(item) for item in items])
+        pipeline.expire(_state["key"], REDIS_TTL)
+        pipeline.execute()
+
+
+def expired():
+    """Whether the function has passed its deadline and should return early"""
+    return _state["deadline"] is not None and time.time() >= _state["deadline"]
+
+
+def finish():
+    """Remove the checkpoint from Redis once the function has returned"""
+    if _state["key"] is not None and _state["done"]:
+        _state["redis"].delete(_state["key"])
+
+
+def finished(redis=None, key=None):
+    """The items recorded as finished, by a function in this process or, if
+    `key` is given, by a function in another process"""
+    if key is None:
+        return list(_state["done"])
+    items = [json.loads(item) for item in redis.lrange(key, 0, -1)]
+    redis.delete(key)
+    return items
+
+
+def remaining(items, finished_items):
+    """The items of a batch which were not finished"""
+    finished_items = {json.dumps(item) for item in finished_items}
+    return [item for item in items if json.dumps(item) not in finished_items]
+
+
+def split(items, batches=CHECKPOINT_SPLIT):
+    """Split items into at most `batches` batches of similar size, keeping their
+    order"""
+    batches = max(min(batches, len(items)), 1)
+    size, extra = divmod(len(items), batches)
+    splits = []
+    start_index = 0
+    for index in range(batches):
+        end_index = start_index + size + (1 if index < extra else 0)
+        if end_index > start_index:
+            splits.append(items[start_index:end_index])
+        start_index = end_index
+    return splits
@@ -6,6 +6,8 @@ handling baked in.
 # Standard Library
 import logging
 import sys
+import time
+import uuid
 from concurrent import futures
 from functools import wraps
 
@@ -16,38 +18,148 @@ from pebble.common import ProcessExpired
 
 # Local
 from .. import redis_fields
-from ..environment import encode_pubsub_data, get_pubsub_data, publisher
-from . import utils
+from ..environment import (
+    encode_pubsub_data,
+    get_pubsub_data,
+    get_pubsub_published,
+    publisher,
+)
+from . import checkpoint, telemetry, utils
 
 env = environ.Env()
 
 USE_TIMEOUT = env.bool("USE_TIMEOUT", True)
 TIMEOUTS = env.list("TIMEOUTS", cast=int)
 DEFAULT_TIMEOUTS = TIMEOUTS if USE_TIMEOUT else None
+COOPERATIVE_TIMEOUT = env.bool(
+    "COOPERATIVE_TIMEOUT", default=False
+)  # Run checkpointed functions in this process with a deadline, not a timeout
 RUN_COUNT = "runcount"
 
 
 def pubsub_function(
-    redis, pubsub_topic, timeouts=DEFAULT_TIMEOUTS, skip_processing_check=False
+    redis,
+    pubsub_topic,
+    timeouts=DEFAULT_TIMEOUTS,
+    skip_processing_check=False,
+    work_key=None,
 ):
-    # pylint: disable=unnecessary-lambda-assignment
+    """Wrap a cloud function with timeouts, retries and error handling.
+
+    `work_key` names the list of items in the data which the function works
+    through, recording each with `checkpoint.done` as it finishes it.  When the
+    function runs out of time, only the items it did not finish are retried.
+    With COOPERATIVE_TIMEOUT, such functions are not run in a process of their
+    own, but check `checkpoint.expired` between items and return early.
+    """
+    # pylint: disable=unnecessary-lambda-assignment, too-many-statements
     def decorator(func):
         def wrapper(*args, **kwargs):
+            def record(**metrics):
+                # Add the invocation to the stage's telemetry
+                telemetry.record(
+                    redis,
+                    func.__name__,
+                    doc_class,
+                    {
+                        "invocations": 1,
+                        "retries": 1 if run_count else 0,
+                        "queue_wait_seconds": queue_wait,
+                        "pages": len(
+                            data.get("pages") or data.get("paths_and_numbers") or []
+                        ),
+                        **metrics,
+                    },
+                )
+
+            def send_error(**kwargs):
+                # A batch of documents has no doc_id of its own, so the error is
+                # sent for each of its documents, releasing each of their slots
+                if skip_processing_check:
+                    doc_ids = [None]
+                elif doc_id is None and "documents" in data:
+                    doc_ids = [document.get("doc_id") for document in data["documents"]]
+                else:
+                    doc_ids = [doc_id]
+                for doc_id_ in doc_ids:
+                    utils.send_error(redis, doc_id_, **kwargs)
+
             def err_handle_func(*args_, **kwargs_):
                 # We want to handle arbitrary exceptions from within the concurrent
-                # thread so that Sentry has the full traceback
+                # thread so that Sentry has the full traceback.  Messages the
+                # function publishes are batched and flushed before it returns,
+                # so errors sending them are handled as well
+                nonlocal failed
+                telemetry.reset()
+                checkpoint.start(redis, checkpoint_key, deadline)
+                start = time.time()
+                errors = 0
                 try:
-                    return func(*args_, **kwargs_)
+                    with publisher.batch():
+                        return func(*args_, **kwargs_)
                 except Exception as exc:  # pylint: disable=broad-except
                     # Handle any error that comes up during function execution
-                    utils.send_error(
-                        redis, None if skip_processing_check else doc_id, exc=exc
-                    )
+                    errors = 1
+                    failed = True
+                    send_error(exc=exc)
                     return f"An error has occurred: {exc}"
+                finally:
+                    checkpoint.finish()
+                    record(
+                        run_seconds=time.time() - start,
+                        errors=errors,
+                        **telemetry.added(),
+                    )
+
+            def retry(finished_items=None):
+                # Publish the function again for the work it did not finish
+                if work_key is None or finished_items is None:
+                    logging.warning(
+                        "Function timed out: doc_id: %s retrying (run %d)",
+                        doc_id,
+                        run_count + 2,
+                    )
+                    data[RUN_COUNT] = run_count + 1
+                    publisher.publish(pubsub_topic, data=encode_pubsub_data(data))
+                    return
+
+                items = data.get(work_key) or []
+                remaining = checkpoint.remaining(items, finished_items)
+                if not remaining:
+                    # The function finished every item just as it ran out of time
+                    return
+                # Only runs which made no progress count towards the retries
+                next_run_count = (
+                    run_count + 1 if len(remaining) == len(items) else run_count
+                )
+                logging.warning(
+                    "Function ran out of time: doc_id: %s retrying %d of %d items (run %d)",
+                    doc_id,
+                    len(remaining),
+                    len(items),
+                    next_run_count + 1,
+                )
+                for batch in checkpoint.split(remaining):
+                    publisher.publish(
+                        pubsub_topic,
+                        data=encode_pubsub_data(
+                            {**data, work_key: batch, RUN_COUNT: next_run_count}
+                        ),
+                    )
 
             # Get data
             data = get_pubsub_data(args[0])
             doc_id = data.get("doc_id")
+            run_count = data.get(RUN_COUNT, 0)
+            # Found before the function runs, as it may clean up the
+            # document's Redis fields, and kept on the data for retries
+            doc_class = telemetry.message_doc_class(redis, data)
+            published = get_pubsub_published(args[0])
+            queue_wait = max(time.time() - published, 0) if published else 0
+            cooperative = COOPERATIVE_TIMEOUT and work_key is not None
+            checkpoint_key = None
+            deadline = None
+            failed = False
 
             # Return prematurely if there is an error or all processing is complete
             # extra checks are to skip processing check if this is an import
@@ -66,38 +178,47 @@ def pubsub_function(
 
             if USE_TIMEOUT and timeouts is not None:
                 # Handle exceeding maximum number of retries
-                run_count = data.get(RUN_COUNT, 0)
                 if run_count >= len(timeouts):
                     # Error out
-                    utils.send_error(
-                        redis,
-                        None if skip_processing_check else doc_id,
-                        message="Function has timed out (max retries exceeded)",
-                    )
+                    send_error(message="Function has timed out (max retries exceeded)")
                     return "ok"
 
-                # Set up the timeout
                 timeout_seconds = timeouts[run_count]
-                concurrent_func = concurrent.process(timeout=timeout_seconds)(
-                    err_handle_func
-                )
-                future = concurrent_func(*args, **kwargs)
-                func_ = future.result
+                if cooperative:
+                    # The function returns early by itself once the deadline
+                    # has passed
+                    deadline = time.time() + timeout_seconds
+                    func_ = lambda: err_handle_func(*args, **kwargs)
+                else:
+                    # Set up the timeout
+                    if work_key is not None:
+                        checkpoint_key = redis_fields.checkpoint(uuid.uuid4().hex)
+                    concurrent_func = concurrent.process(timeout=timeout_seconds)(
+                        err_handle_func
+                    )
+                    future = concurrent_func(*args, **kwargs)
+                    func_ = future.result
             else:
                 func_ = lambda: err_handle_func(*args, **kwargs)
 
             try:
                 # Run the function as originally intended
-                return func_()
+                result = func_()
             except futures.TimeoutError:
-                # Retry the function with increased run count
-                logging.warning(
-                    "Function timed out: doc_id: %s retrying (run %d)",
-                    doc_id,
-                    run_count + 2,
+                record(timeouts=1, run_seconds=timeout_seconds)
+                # Retry the function for the items it did not finish, or with
+                # increased run count if it does not record its progress
+                retry(
+                    checkpoint.finished(redis, checkpoint_key)
+                    if checkpoint_key is not None
+                    else None
                 )
-                data[RUN_COUNT] = run_count + 1
-                publisher.publish(pubsub_topic, data=encode_pubsub_data(data))
+                return None
+
+            if cooperative and not failed and checkpoint.expired():
+                # The function returned early, so retry what it did not finish
+                retry(checkpoint.finished())
+            return result
 
         return wraps(func)(wrapper)
 
@@ -114,9 +235,15 @@ def pubsub_function_import(redis, finish_pubsub_topic):
             org_id = data.get("org_id")
             slug = data.get("slug")
 
+            def batch_func(*args_, **kwargs_):
+                # Messages the function publishes are batched and flushed
+                # before it returns
+                with publisher.batch():
+                    return func(*args_, **kwargs_)
+
             # Set up the timeout
             timeout_seconds = 800  # lambda timeout is 900
-            concurrent_func = concurrent.process(timeout=timeout_seconds)(func)
+            concurrent_func = concurrent.process(timeout=timeout_seconds)(batch_func)
             future = concurrent_func(*args, **kwargs)
 
             try:
@@ -0,0 +1,434 @@
+"""
+Fair-share scheduling of document processing jobs.
+
+Jobs are queued by priority and organization, and only started while there
+are slots free for them:
+  * at most SCHEDULER_SLOTS documents process at once
+  * bulk documents may only take SCHEDULER_BULK_SLOTS of those, so that there
+    is always room for interactive documents
+  * each organization may only have SCHEDULER_ORG_SLOTS documents of each
+    priority processing at once
+
+When both priorities have a job ready, the next one is picked by smooth
+weighted round robin on their weights, so bulk jobs are slowed but never
+starved.  Organizations take turns within each priority.  Slots are freed when
+a document finishes processing, and reclaimed after SCHEDULER_SLOT_TTL in case
+a document never reports back.
+
+Only processing jobs are scheduled.  Imports are started as they always were,
+without taking a slot.
+"""
+
+# Standard Library
+import json
+import logging
+import threading
+import time
+from collections import Counter, defaultdict, deque
+
+# Third Party
+import environ
+
+# Local
+from .. import redis_fields
+from ..environment import encode_pubsub_data, publisher
+from ..priority_choices import BULK, INTERACTIVE, PRIORITIES
+
+env = environ.Env()
+logger = logging.getLogger(__name__)
+
+SCHEDULER_ENABLED = env.bool(
+    "SCHEDULER_ENABLED", default=False
+)  # Queue processing jobs for fair-share scheduling instead of starting them
+SCHEDULER_SLOTS = env.int(
+    "SCHEDULER_SLOTS", default=100
+)  # Most documents to process at once
+SCHEDULER_BULK_SLOTS = env.int(
+    "SCHEDULER_BULK_SLOTS", default=60
+)  # Most bulk documents to process at once, leaving the rest for interactive
+SCHEDULER_ORG_SLOTS = env.int(
+    "SCHEDULER_ORG_SLOTS", default=20
+)  # Most documents of each priority an organization may process at once
+SCHEDULER_INTERACTIVE_WEIGHT = env.int("SCHEDULER_INTERACTIVE_WEIGHT", default=4)
+SCHEDULER_BULK_WEIGHT = env.int("SCHEDULER_BULK_WEIGHT", default=1)
+SCHEDULER_SLOT_TTL = env.int(
+    "SCHEDULER_SLOT_TTL", default=3600
+)  # Seconds after which the slot of a document which never finished is reclaimed
+SCHEDULER_LOCK_TIMEOUT = env.int("SCHEDULER_LOCK_TIMEOUT", default=30)
+SCHEDULER_BATCH_MAX = env.int(
+    "SCHEDULER_BATCH_MAX", default=10
+)  # Most batchable jobs started together to publish as a single message
+
+
+class Scheduler:
+    """The fair-share scheduling policy, over queues and slots kept by a
+    subclass.  `dispatch` is called with the job of each document started."""
+
+    def __init__(
+        self,
+        dispatch,
+        slots=SCHEDULER_SLOTS,
+        bulk_slots=SCHEDULER_BULK_SLOTS,
+        org_slots=SCHEDULER_ORG_SLOTS,
+        weights=None,
+        slot_ttl=SCHEDULER_SLOT_TTL,
+    ):
+        # pylint: disable=too-many-arguments
+        self.dispatch = dispatch
+        self.slots = slots
+        self.priority_slots = {INTERACTIVE: slots, BULK: min(bulk_slots, slots)}
+        self.org_slots = org_slots
+        self.weights = weights or {
+            INTERACTIVE: SCHEDULER_INTERACTIVE_WEIGHT,
+            BULK: SCHEDULER_BULK_WEIGHT,
+        }
+        self.slot_ttl = slot_ttl
+
+    def submit(self, doc_id, priority, org_id, job):
+        """Queue a job for a document, starting any jobs which now have a slot"""
+        if priority not in PRIORITIES:
+            priority = INTERACTIVE
+        org_id = "" if org_id is None else str(org_id)
+        with self.lock():
+            self.push(str(doc_id), priority, org_id, job)
+            jobs = self.schedule()
+        logger.info(
+            "[SCHEDULER] queued doc_id %s priority %s org_id %s",
+            doc_id,
+            priority,
+            org_id,
+        )
+        self.dispatch_all(jobs)
+
+    def release(self, doc_id):
+        """Free a document's slot, or remove its job if it has not started yet,
+        starting any jobs which now have a slot"""
+        doc_id = str(doc_id)
+        if not self.holds(doc_id):
+            # Documents which never took a slot, such as imports, do not need
+            # to wait on the lock
+            return
+        with self.lock():
+            self.cancel(doc_id)
+            self.finish(doc_id)
+            jobs = self.schedule()
+        self.dispatch_all(jobs)
+
+    def dispatch_all(self, jobs):
+        for doc_id, job in jobs:
+            logger.info("[SCHEDULER] starting doc_id %s", doc_id)
+            self.dispatch(job)
+
+    def schedule(self):
+        """Start as many queued jobs as there are slots free for, returning the
+        document ids and jobs started"""
+        # pylint: disable=too-many-locals
+        now = time.time()
+        running = self.running()
+        for doc_id, (_priority, _org_id, started) in list(running.items()):
+            if started < now - self.slot_ttl:
+                logger.warning("[SCHEDULER] reclaiming slot of doc_id %s", doc_id)
+                self.finish(doc_id)
+                del running[doc_id]
+
+        counts = Counter()
+        org_counts = Counter()
+        for priority, org_id, _started in running.values():
+            counts[priority] += 1
+            org_counts[priority, org_id] += 1
+
+        credits = self.credits()
+        jobs = []
+        while sum(counts.values()) < self.slots:
+            # The next organization in turn under its limit, for each priority
+            # which has a slot free
+            ready = {}
+            for priority in PRIORITIES:
+                if counts[priority] >= self.priority_slots[priority]:
+                    continue
+                for org_id in self.waiting_orgs(priority):
+                    if org_counts[priority, org_id] < self.org_slots:
+                        ready[priority] = org_id
+                        break
+            if not ready:
+                break
+
+            # Smooth weighted round robin between the priorities which are ready
+            for priority in ready:
+                credits[priority] = credits.get(priority, 0) + self.weights[priority]
+            priority = max(ready, key=lambda p: credits[p])
+            credits[priority] -= sum(self.weights[p] for p in ready)
+
+            org_id = ready[priority]
+            popped = self.pop(priority, org_id)
+            if popped is None:
+                # The job was cancelled while queued
+                continue
+            doc_id, job = popped
+            self.start(doc_id, priority, org_id, now)
+            counts[priority] += 1
+            org_counts[priority, org_id] += 1
+            jobs.append((doc_id, job))
+
+        self.set_credits(credits)
+        return jobs
+
+    # State kept by subclasses
+
+    def lock(self):
+        """A context manager serializing changes to the state"""
+        raise NotImplementedError
+
+    def push(self, doc_id, priority, org_id, job):
+        """Queue a job at the back of its organization's queue, putting the
+        organization at the back of the priority's turns if it was not waiting"""
+        raise NotImplementedError
+
+    def pop(self, priority, org_id):
+        """Take the job from the front of an organization's queue, moving the
+        organization to the back of the priority's turns.  Returns the
+        document id and job, or None if the job was cancelled."""
+        raise NotImplementedError
+
+    def cancel(self, doc_id):
+        """Remove a document's queued job"""
+        raise NotImplementedError
+
+    def holds(self, doc_id):
+        """Whether a document has a queued job or a slot"""
+        raise NotImplementedError
+
+    def waiting_orgs(self, priority):
+        """The organizations with queued jobs of a priority, in turn order"""
+        raise NotImplementedError
+
+    def running(self):
+        """A dict of the running documents to their priority, organization and
+        start time"""
+        raise NotImplementedError
+
+    def start(self, doc_id, priority, org_id, started):
+        """Take a slot for a document"""
+        raise NotImplementedError
+
+    def finish(self, doc_id):
+        """Free a document's slot"""
+        raise NotImplementedError
+
+    def credits(self):
+        """The weighted round robin credit of each priority"""
+        raise NotImplementedError
+
+    def set_credits(self, credits):
+        raise NotImplementedError
+
+
+class LocalScheduler(Scheduler):
+    """Keeps the scheduler's state in memory, for a single process"""
+
+    def __init__(self, dispatch, **kwargs):
+        super().__init__(dispatch, **kwargs)
+        self._lock = threading.RLock()
+        self.jobs = {}
+        self.queues = defaultdict(deque)
+        self.orgs = defaultdict(list)
+        self._running = {}
+        self._credits = {}
+
+    def lock(self):
+        return self._lock
+
+    def push(self, doc_id, priority, org_id, job):
+        self.jobs[doc_id] = job
+        self.queues[priority, org_id].append(doc_id)
+        if org_id not in self.orgs[priority]:
+            self.orgs[priority].append(org_id)
+
+    def pop(self, priority, org_id):
+        queue = self.queues[priority, org_id]
+        doc_id = queue.popleft()
+        self.orgs[priority].remove(org_id)
+        if queue:
+            self.orgs[priority].append(org_id)
+        if doc_id not in self.jobs:
+            return None
+        return doc_id, self.jobs.pop(doc_id)
+
+    def cancel(self, doc_id):
+        self.jobs.pop(doc_id, None)
+
+    def holds(self, doc_id):
+        return doc_id in self.jobs or doc_id in self._running
+
+    def waiting_orgs(self, priority):
+        return list(self.orgs[priority])
+
+    def running(self):
+        return dict(self._running)
+
+    def start(self, doc_id, priority, org_id, started):
+        self._running[doc_id] = (priority, org_id, started)
+
+    def finish(self, doc_id):
+        self._running.pop(doc_id, None)
+
+    def credits(self):
+        return dict(self._credits)
+
+    def set_credits(self, credits):
+        self._credits = dict(credits)
+
+
+class RedisScheduler(Scheduler):
+    """Keeps the scheduler's state in Redis, shared by every function"""
+
+    def __init__(self, redis, **kwargs):
+        super().__init__(publish_job, **kwargs)
+        self.redis = redis
+
+    def dispatch_all(self, jobs):
+        for doc_id, _job in jobs:
+            logger.info("[SCHEDULER] starting doc_id %s", doc_id)
+        for job in batch_jobs([job for _doc_id, job in jobs]):
+            self.dispatch(job)
+
+    def lock(self):
+        return self.redis.lock(
+            redis_fields.scheduler_lock(),
+            timeout=SCHEDULER_LOCK_TIMEOUT,
+            blocking_timeout=SCHEDULER_LOCK_TIMEOUT,
+        )
+
+    def push(self, doc_id, priority, org_id, job):
+        pipeline = self.redis.pipeline()
+        pipeline.hset(redis_fields.scheduler_jobs(), doc_id, json.dumps(job))
+        pipeline.rpush(redis_fields.scheduler_queue(priority, org_id), doc_id)
+        _, length = pipeline.execute()
+        if length == 1:
+            self.redis.rpush(redis_fields.scheduler_orgs(priority), org_id)
+
+    def pop(self, priority, org_id):
+        queue = redis_fields.scheduler_queue(priority, org_id)
+        orgs = redis_fields.scheduler_orgs(priority)
+        doc_id = self.redis.lpop(queue).decode("utf8")
+        pipeline = self.redis.pipeline()
+        pipeline.hget(redis_fields.scheduler_jobs(), doc_id)
+        pipeline.hdel(redis_fields.scheduler_jobs(), doc_id)
+        pipeline.lrem(orgs, 0, org_id)
+        pipeline.llen(queue)
+        job, _, _, length = pipeline.execute()
+        if length:
+            self.redis.rpush(orgs, org_id)
+        if job is None:
+            return None
+        return doc_id, json.loads(job)
+
+    def cancel(self, doc_id):
+        self.redis.hdel(redis_fields.scheduler_jobs(), doc_id)
+
+    def holds(self, doc_id):
+        pipeline = self.redis.pipeline()
+        pipeline.hexists(redis_fields.scheduler_jobs(), doc_id)
+        pipeline.hexists(redis_fields.scheduler_running(), doc_id)
+        return any(pipeline.execute())
+
+    def waiting_orgs(self, priority):
+        return [
+            org_id.decode("utf8")
+            for org_id in self.redis.lrange(
+                redis_fields.scheduler_orgs(priority), 0, -1
+            )
+        ]
+
+    def running(self):
+        return {
+            doc_id.decode("utf8"): tuple(json.loads(value))
+            for doc_id, value in self.redis.hgetall(
+                redis_fields.scheduler_running()
+            ).items()
+        }
+
+    def start(self, doc_id, priority, org_id, started):
+        self.redis.hset(
+            redis_fields.scheduler_running(),
+            doc_id,
+            json.dumps([priority, org_id, started]),
+        )
+
+    def finish(self, doc_id):
+        self.redis.hdel(redis_fields.scheduler_running(), doc_id)
+
+    def credits(self):
+        return {
+            priority.decode("utf8"): float(credit)
+            for priority, credit in self.redis.hgetall(
+                redis_fields.scheduler_credits()
+            ).items()
+        }
+
+    def set_credits(self, credits):
+        if credits:
+            self.redis.hset(redis_fields.scheduler_credits(), mapping=credits)
+
+
+def batch_jobs(jobs, batch_max=SCHEDULER_BATCH_MAX):
+    """Combine the batchable jobs for each topic into jobs for batches of up to
+    `batch_max` documents, whose data lists each document's data under
+    "documents".  Other jobs, and batches of one, are kept as they are."""
+    combined = []
+    batches = {}
+    for job in jobs:
+        if not job.get("batch"):
+            combined.append(job)
+            continue
+        topic = json.dumps(job["topic"])
+        if topic not in batches or len(batches[topic]["documents"]) >= batch_max:
+            batches[topic] = {"topic": job["topic"], "documents": [], "first": job}
+            combined.append(batches[topic])
+        batches[topic]["documents"].append(job["data"])
+
+    for i, job in enumerate(combined):
+        if "documents" in job:
+            if len(job["documents"]) == 1:
+                combined[i] = job["first"]
+            else:
+                combined[i] = {
+                    "topic": job["topic"],
+                    "data": {"documents": job["documents"]},
+                }
+    return combined
+
+
+def publish_job(job):
+    """Publish a job's data to its topic"""
+    topic = job["topic"]
+    if isinstance(topic, list):
+        # Local topic paths are tuples, which are stored as lists
+        topic = tuple(topic)
+    publisher.publish(topic, data=encode_pubsub_data(job["data"]))
+
+
+def submit(redis, doc_id, priority, org_id, topic, data, batch=False):
+    """Publish a processing job's data to a topic once it is scheduled.  The
+    data of batchable jobs started together may be published together."""
+    # pylint: disable=too-many-arguments
+    job = {"topic": topic, "data": data, "batch": batch}
+    if SCHEDULER_ENABLED:
+        RedisScheduler(redis).submit(doc_id, priority, org_id, job)
+    else:
+        publish_job(job)
+
+
+def release(redis, doc_id):
+    """Free the slot of a document which has finished processing.  Failures are
+    logged rather than raised, so that they never stop the document's completion
+    or error from being handled, and its slot is reclaimed after its time to
+    live instead."""
+    if not SCHEDULER_ENABLED:
+        return
+    try:
+        RedisScheduler(redis).release(doc_id)
+    except Exception as exc:  # pylint: disable=broad-except
+        logger.error(
+            "[SCHEDULER] unable to release doc_id %s: %s", doc_id, exc, exc_info=exc
+        )
@@ -0,0 +1,152 @@
+"""
+Per-stage processing telemetry, kept as time-bucketed counters in Redis.
+
+Each invocation of a processing function adds to the counters of its stage
+for the current TELEMETRY_BUCKET_SECONDS bucket, broken down by the class of
+document being processed, so stages can be compared by the time they take,
+their throughput and how often they fail.  Buckets expire after
+TELEMETRY_RETENTION_SECONDS.
+"""
+
+# Standard Library
+import logging
+import time
+from collections import Counter
+
+# Third Party
+import environ
+
+# Local
+from .. import redis_fields
+
+env = environ.Env()
+logger = logging.getLogger(__name__)
+
+TELEMETRY_ENABLED = env.bool("TELEMETRY_ENABLED", default=True)
+TELEMETRY_BUCKET_SECONDS = env.int(
+    "TELEMETRY_BUCKET_SECONDS", default=300
+)  # Length of the time buckets counters are kept in
+TELEMETRY_RETENTION_SECONDS = env.int(
+    "TELEMETRY_RETENTION_SECONDS", default=8 * 86400
+)  # How long to keep each bucket for
+
+METRICS = (
+    "invocations",
+    "errors",
+    "timeouts",
+    "retries",
+    "run_seconds",
+    "queue_wait_seconds",
+    "pages",
+    "bytes_read",
+)
+# The metrics kept in seconds, the rest being counts
+TIME_METRICS = ("run_seconds", "queue_wait_seconds")
+
+# Documents are classed by their page count, from the smallest class up
+DOC_CLASSES = ((10, "small"), (100, "medium"), (1000, "large"))
+LARGEST_DOC_CLASS = "huge"
+UNKNOWN_DOC_CLASS = "unknown"
+# The message field a document's class is cached in
+DOC_CLASS_FIELD = "doc_class"
+
+# Metrics added by the function running in this process
+_metrics = Counter()
+
+
+def add(**metrics):
+    """Add to the metrics of the running function, such as the bytes it read"""
+    _metrics.update(metrics)
+
+
+def reset():
+    """Clear the metrics added by a previous function"""
+    _metrics.clear()
+
+
+def added():
+    """The metrics added by the running function"""
+    return dict(_metrics)
+
+
+def doc_class(page_count):
+    """The class of a document with the given page count"""
+    if page_count is None:
+        return UNKNOWN_DOC_CLASS
+    for max_pages, name in DOC_CLASSES:
+        if page_count <= max_pages:
+            return name
+    return LARGEST_DOC_CLASS
+
+
+def message_doc_class(redis, data):
+    """The class of the document a message is for, from the page count in the
+    message or else in Redis.  It is cached on the message, so that it is
+    looked up once and is still known once the document's Redis fields have
+    been cleaned up."""
+    if TELEMETRY_ENABLED and data.get(DOC_CLASS_FIELD) is None:
+        try:
+            page_count = data.get("page_count")
+            if page_count is None and data.get("doc_id"):
+                page_count = redis.get(redis_fields.page_count(data["doc_id"]))
+            if page_count is not None:
+                data[DOC_CLASS_FIELD] = doc_class(int(page_count))
+        except Exception as exc:  # pylint: disable=broad-except
+            logger.warning("[TELEMETRY] unable to find the document class: %s", exc)
+    return data.get(DOC_CLASS_FIELD) or UNKNOWN_DOC_CLASS
+
+
+def bucket(timestamp):
+    """The start of the bucket the timestamp falls in"""
+    return int(timestamp) // TELEMETRY_BUCKET_SECONDS * TELEMETRY_BUCKET_SECONDS
+
+
+def record(redis, stage, class_, metrics, timestamp=None):
+    """Add an invocation's metrics to the counters of its stage and class of
+    document.  Telemetry is best effort, so errors are logged rather than
+    raised."""
+    if not TELEMETRY_ENABLED:
+        return
+    try:
+        key = redis_fields.telemetry(
+            stage, bucket(time.time() if timestamp is None else timestamp)
+        )
+        pipeline = redis.pipeline(transaction=False)
+        for metric, value in metrics.items():
+            if value:
+                pipeline.hincrbyfloat(key, f"{class_}:{metric}", value)
+        pipeline.expire(key, TELEMETRY_RETENTION_SECONDS)
+        pipeline.sadd(redis_fields.telemetry_stages(), stage)
+        pipeline.execute()
+    except Exception as exc:  # pylint: disable=broad-except
+        logger.warning("[TELEMETRY] unable to record %s: %s", stage, exc)
+
+
+def read(redis, start, end, stages=None):
+    """Read the counters of the buckets from `start` to `end`, as a list of
+    dicts with the stage, bucket, document class and each metric"""
+    if stages is None:
+        stages = sorted(
+            stage.decode("utf8")
+            for stage in redis.smembers(redis_fields.telemetry_stages())
+        )
+    keys = [
+        (stage, bucket_)
+        for stage in stages
+        for bucket_ in range(bucket(start), int(end) + 1, TELEMETRY_BUCKET_SECONDS)
+    ]
+    pipeline = redis.pipeline(transaction=False)
+    for stage, bucket_ in keys:
+        pipeline.hgetall(redis_fields.telemetry(stage, bucket_))
+
+    rows = []
+    for (stage, bucket_), fields in zip(keys, pipeline.execute()):
+        classes = {}
+        for field, value in fields.items():
+            class_, metric = field.decode("utf8").split(":", 1)
+            classes.setdefault(class_, dict.fromkeys(METRICS, 0))[metric] = float(value)
+        for class_, metrics in sorted(classes.items()):
+            rows.append(
+                {"stage": stage, "bucket": bucket_, "doc_class": class_, **metrics}
+            )
+    return rows
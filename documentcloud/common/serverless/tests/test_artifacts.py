@@ -0,0 +1,110 @@
+# Standard Library
+import io
+
+# Third Party
+from fakeredis import FakeRedis
+
+# DocumentCloud
+from documentcloud.common import path
+from documentcloud.common.serverless.artifacts import (
+    SPILLED,
+    ArtifactStore,
+    decode_value,
+)
+
+
+class MemoryStorage:
+    """Storage holding files in memory, recording the prefixes deleted"""
+
+    def __init__(self):
+        self.files = {}
+        self.deleted = []
+
+    def open(self, file_name, _mode):
+        return io.BytesIO(self.files[file_name])
+
+    def simple_upload(self, file_name, contents):
+        self.files[file_name] = contents
+
+    def delete(self, file_prefix):
+        self.deleted.append(file_prefix)
+        for file_name in list(self.files):
+            if file_name.startswith(file_prefix):
+                del self.files[file_name]
+
+
+class TestArtifactStore:
+    def test_put_get(self):
+        redis = FakeRedis()
+        store = ArtifactStore(MemoryStorage(), 60)
+        store.put(redis, 1, "pdf", 0, b"a" * 1000)
+        store.put(redis, 1, "pdf", 2, b"\x00\xff")
+        assert sorted(store.keys(redis, 1, "pdf")) == ["0", "2"]
+        assert store.get_many(redis, 1, "pdf", [2, 1, 0]) == [
+            b"\x00\xff",
+            None,
+            b"a" * 1000,
+        ]
+        assert store.get_many(redis, 1, "pdf", []) == []
+        # Values are compressed when it makes them smaller
+        assert len(redis.hget("1:pdf", "0")) < 1000
+        assert store.storage.files == {}
+
+    def test_pipeline(self):
+        redis = FakeRedis()
+        store = ArtifactStore(MemoryStorage(), 60)
+        pipeline = redis.pipeline()
+        store.put(pipeline, 1, "pdf", 0, b"contents")
+        assert store.get(redis, 1, "pdf", 0) is None
+        pipeline.execute()
+        assert store.get(redis, 1, "pdf", 0) == b"contents"
+
+    def test_spill(self):
+        redis = FakeRedis()
+        storage = MemoryStorage()
+        store = ArtifactStore(storage, 60, spill_threshold=10)
+        store.put(redis, 1, "pdf", 0, b"small")
+        store.put(redis, 1, "pdf", 1, bytes(range(100)))
+        assert redis.hget("1:pdf", "1") == SPILLED
+        assert list(storage.files) == [path.artifact_path(1, "pdf", 1)]
+        assert store.get_many(redis, 1, "pdf", [0, 1]) == [
+            b"small",
+            bytes(range(100)),
+        ]
+
+        store.delete(redis, 1, "pdf")
+        assert storage.files == {}
+        assert store.keys(redis, 1, "pdf") == []
+
+    def test_delete_without_spill(self):
+        redis = FakeRedis()
+        storage = MemoryStorage()
+        store = ArtifactStore(storage, 60)
+        store.put(redis, 1, "pdf", 0, b"small")
+        store.delete(redis, 1, "pdf")
+        store.delete_spilled(redis, 1)
+        # Storage is left alone when nothing was spilled to it
+        assert storage.deleted == []
+        assert store.get(redis, 1, "pdf", 0) is None
+
+    def test_delete_spilled(self):
+        redis = FakeRedis()
+        storage = MemoryStorage()
+        store = ArtifactStore(storage, 60, spill_threshold=0)
+        store.put(redis, 1, "pdf", 0, b"contents")
+        store.put(redis, 1, "positions", 0, b"contents")
+        store.delete_spilled(redis, 1)
+        assert sorted(storage.deleted) == [
+            path.artifact_path(1, "pdf", ""),
+            path.artifact_path(1, "positions", ""),
+        ]
+        assert storage.files == {}
+        store.delete_spilled(redis, 1)
+        assert len(storage.deleted) == 2
+
+    def test_decode_value(self):
+        assert decode_value(None) is None
+        assert decode_value(b"") == b""
+        assert decode_value(b"rraw") == b"raw"
+        # Values written before the store are returned as is
+        assert decode_value(b"%PDF-1.7") == b"%PDF-1.7"
@@ -0,0 +1,75 @@
+# Standard Library
+from unittest.mock import patch
+
+# Third Party
+from fakeredis import FakeRedis
+
+# DocumentCloud
+from documentcloud.common import path
+from documentcloud.common.serverless import asset_cache
+
+ASSET_CACHE = "documentcloud.common.serverless.asset_cache"
+
+
+def stored(redis, doc_id, updated=1):
+    """Record a finished document with the given text timestamp"""
+    key = asset_cache.cache_key("abc", "eng", "tess4", False)
+    asset_cache.remember(redis, doc_id, key)
+    redis.set(f"{doc_id}:pages", 3)
+    with patch(f"{ASSET_CACHE}.text_updated", return_value=updated):
+        asset_cache.store(redis, doc_id, "source", "0-2:8.5x11")
+    return key
+
+
+class TestAssetCache:
+    def test_lookup(self):
+        redis = FakeRedis()
+        key = stored(redis, 1)
+        with patch(f"{ASSET_CACHE}.text_updated", return_value=1):
+            entry = asset_cache.lookup(redis, key, 2, 3)
+            assert entry["doc_id"] == 1
+            assert entry["page_spec"] == "0-2:8.5x11"
+            # A document never reuses itself, nor a different page count
+            assert asset_cache.lookup(redis, key, 1, 3) is None
+            assert asset_cache.lookup(redis, key, 2, 4) is None
+        # Other OCR settings have their own assets
+        assert (
+            asset_cache.lookup(
+                redis, asset_cache.cache_key("abc", "eng", "tess4", True), 2, 3
+            )
+            is None
+        )
+
+    def test_text_changed(self):
+        redis = FakeRedis()
+        key = stored(redis, 1)
+        # The source's text was edited since it was stored
+        with patch(f"{ASSET_CACHE}.text_updated", return_value=2):
+            assert asset_cache.lookup(redis, key, 2, 3) is None
+        with patch(f"{ASSET_CACHE}.text_updated", return_value=1):
+            assert asset_cache.lookup(redis, key, 2, 3) is None
+
+    def test_forget(self):
+        redis = FakeRedis()
+        key = stored(redis, 1)
+        asset_cache.forget(redis, 1)
+        with patch(f"{ASSET_CACHE}.text_updated", return_value=1):
+            assert asset_cache.lookup(redis, key, 2, 3) is None
+
+    def test_asset_paths(self):
+        source = path.path(1)
+        files = [
+            f"{source}source.pdf",
+            f"{source}source.txt.json",
+            f"{source}pages/source-p1-large.gif",
+            f"{source}text/source.manifest.json",
+            f"{source}original/source.docx",
+            f"{source}revisions/0000-source.pdf",
+        ]
+        with patch(f"{ASSET_CACHE}.storage.list", return_value=files):
+            assert asset_cache.asset_paths(1, "source", 2, "copy") == [
+                (files[0], path.doc_path(2, "copy")),
+                (files[1], path.json_text_path(2, "copy")),
+                (files[2], path.page_image_path(2, "copy", 0, "large")),
+                (files[3], path.page_text_manifest_path(2, "copy")),
+            ]
@@ -0,0 +1,69 @@
+# Standard Library
+from unittest.mock import patch
+
+# Third Party
+from fakeredis import FakeRedis
+
+# DocumentCloud
+from documentcloud.common.serverless.batch_planner import BatchPlanner, page_weights
+
+
+class PageIndex:
+    """A page index holding a single range of the given size for each page"""
+
+    def __init__(self, sizes):
+        self.sizes = sizes
+
+    def page_ranges(self, page_number):
+        return [(0, self.sizes[page_number])]
+
+
+class TestBatchPlanner:
+    def test_default(self):
+        planner = BatchPlanner(FakeRedis(), "image", 3, 10)
+        assert planner.plan(1, list(range(7))) == [[0, 1, 2], [3, 4, 5], [6]]
+        assert planner.redis.hgetall("batchStats:image") == {
+            b"plans": b"1",
+            b"pages": b"7",
+            b"batches": b"3",
+            b"defaults": b"1",
+        }
+
+    def test_timings(self):
+        planner = BatchPlanner(FakeRedis(), "image", 3, 10, target_seconds=10)
+        planner.record(4, 8)
+        # 2 seconds a page fits 5 pages in the target time
+        assert planner.batch_size(100) == 5
+        # Slow pages make smaller batches
+        planner.record(1, 5)
+        assert planner.batch_size(100) == 2
+        # Fast pages are capped at the most pages in a batch
+        planner = BatchPlanner(FakeRedis(), "image", 3, 10, target_seconds=10)
+        planner.record(100, 1)
+        assert planner.batch_size(1000) == 10
+        assert planner.plan(1, list(range(8))) == [list(range(8))]
+
+    @patch("documentcloud.common.serverless.batch_planner.BATCH_MAX_FANOUT", 4)
+    def test_max_fanout(self):
+        planner = BatchPlanner(FakeRedis(), "ocr", 1, 10, target_seconds=10)
+        planner.record(1, 10)
+        assert planner.batch_size(3) == 1
+        assert planner.batch_size(20) == 5
+
+    @patch("documentcloud.common.serverless.batch_planner.ADAPTIVE_BATCHES", False)
+    def test_not_adaptive(self):
+        planner = BatchPlanner(FakeRedis(), "ocr", 2, 10, target_seconds=10)
+        planner.record(1, 1)
+        assert planner.plan_size(1, 10) == 2
+
+    def test_weights(self):
+        planner = BatchPlanner(FakeRedis(), "image", 3, 10, target_seconds=8)
+        planner.record(1, 2)
+        # Heavy pages are split into smaller batches than light pages
+        weights = page_weights(PageIndex([300, 300, 300, 300, 0, 0, 0, 0]), range(8))
+        assert planner.plan(1, list(range(8)), weights) == [
+            [0, 1],
+            [2, 3, 4, 5],
+            [6, 7],
+        ]
+        assert page_weights(PageIndex([0, 0]), range(2)) is None
@@ -0,0 +1,48 @@
+# Standard Library
+from unittest.mock import patch
+
+# Third Party
+from fakeredis import FakeRedis
+
+# DocumentCloud
+from documentcloud.common.serverless import checkpoint
+
+
+class TestCheckpoint:
+    def test_remaining(self):
+        items = [[0, "a.gif"], [1, "b.gif"], [2, "c.gif"]]
+        assert checkpoint.remaining(items, [(1, "b.gif")]) == [
+            [0, "a.gif"],
+            [2, "c.gif"],
+        ]
+        assert checkpoint.remaining([3, 4], []) == [3, 4]
+
+    def test_split(self):
+        assert checkpoint.split([1, 2, 3, 4, 5], 2) == [[1, 2, 3], [4, 5]]
+        assert checkpoint.split([1, 2], 4) == [[1], [2]]
+        assert checkpoint.split([1, 2], 1) == [[1, 2]]
+        assert checkpoint.split([], 2) == []
+
+    @patch("documentcloud.common.serverless.checkpoint.publisher")
+    def test_done(self, mock_publisher):
+        # In this process
+        checkpoint.start()
+        checkpoint.done(1, 2)
+        assert checkpoint.finished() == [1, 2]
+        assert mock_publisher.flush.call_count == 0
+
+        # In another process, through Redis
+        redis = FakeRedis()
+        checkpoint.start(redis, "checkpoint:1")
+        checkpoint.done([3, "c.gif"])
+        checkpoint.done()
+        assert mock_publisher.flush.call_count == 1
+        assert checkpoint.finished(redis, "checkpoint:1") == [[3, "c.gif"]]
+        assert not redis.exists("checkpoint:1")
+
+    def test_expired(self):
+        checkpoint.start()
+        assert not checkpoint.expired()
+        checkpoint.start(deadline=0)
+        assert checkpoint.expired()
+        checkpoint.start()
@@ -6,8 +6,9 @@ import ctypes
 import os.path
 import time
 import uuid
+from contextlib import contextmanager
 from functools import wraps
-from unittest.mock import call, patch
+from unittest.mock import ANY, call, patch
 
 # Third Party
 import pytest
@@ -22,6 +23,7 @@ from documentcloud.common.environment import (
 )
 from documentcloud.common.environment.local.pubsub import encode_published_pubsub_data
 from documentcloud.common.environment.local.storage import storage
+from documentcloud.common.serverless import checkpoint
 from documentcloud.common.serverless.error_handling import pubsub_function
 from documentcloud.documents.processing.info_and_image.pdfium import (
     StorageHandler,
@@ -45,12 +47,14 @@ def encode(data):
     return encode_published_pubsub_data(encode_pubsub_data(data))
 
 
-def with_timeout(timeouts):
+def with_timeout(timeouts, work_key=None):
     def decorator(func):
         def wrapper(*args, **kwargs):
             topic_name = uuid.uuid4()
             topic = ("test_error_handling", topic_name)
-            wrapped_fn = pubsub_function(redis, topic, timeouts)(func)
+            wrapped_fn = pubsub_function(redis, topic, timeouts, work_key=work_key)(
+                func
+            )
             publisher.register_internal_callback(topic, wrapped_fn)
             return wrapped_fn(*args, **kwargs)
 
@@ -117,6 +121,62 @@ def timeout_on_second_try(data):
     communicate_data("Done", data)
 
 
+@with_timeout([1])
+def error_on_first_try(data):
+    data = get_pubsub_data(data)
+    communicate_data("Pending", data)
+    raise ValueError("Unable to convert")
+
+
+@with_timeout([1, 1], work_key="pages")
+def finish_two_pages(data):
+    # Hangs on batches of more than two pages, after finishing the first two
+    data = get_pubsub_data(data)
+    communicate_data("Pending", data)
+    for page in data["pages"][:2]:
+        checkpoint.done(page)
+    if len(data["pages"]) > 2:
+        time.sleep(2)
+    communicate_data("Done", data)
+
+
+@with_timeout([1, 1], work_key="pages")
+def finish_no_pages(data):
+    data = get_pubsub_data(data)
+    communicate_data("Pending", data)
+    time.sleep(2)
+    communicate_data("Done", data)
+
+
+@with_timeout([1, 1], work_key="pages")
+def finish_pages_cooperatively(data):
+    # Each page takes most of a second, checking the deadline before each one
+    data = get_pubsub_data(data)
+    communicate_data("Pending", data)
+    for page in data["pages"]:
+        if checkpoint.expired():
+            return
+        time.sleep(0.7)
+        checkpoint.done(page)
+    communicate_data("Done", data)
+
+
+def finished_from(mock_done):
+    """Read the pages a function in another process finished from the calls to
+    a shared mock of `checkpoint.done`, instead of from Redis"""
+
+    def finished(_redis=None, _key=None):
+        return [page for done_call in mock_done.mock_calls for page in done_call.args]
+
+    return finished
+
+
+@contextmanager
+def failing_batch():
+    yield
+    raise ValueError("Unable to publish")
+
+
 @with_timeout([1])
 def timeout_cfunctype(_data):
     pdf = os.path.join(
@@ -214,3 +274,121 @@ class TestErrorHandling:
         mock_send_error.assert_called_with(
             redis, 1, message="Function has timed out (max retries exceeded)"
         )
+
+    @patch("documentcloud.common.serverless.error_handling.USE_TIMEOUT", True)
+    @patch(
+        "documentcloud.common.serverless.tests.test_error_handling.communicate_data",
+        new_callable=SharedMock,
+    )
+    @patch("documentcloud.common.serverless.utils.send_error", new_callable=SharedMock)
+    @patch.object(publisher, "batch", failing_batch)
+    def test_publish_error(self, mock_send_error, mock_communicate_data):
+        success_on_first_try(encode({"doc_id": 1}))
+        assert mock_send_error.call_count == 1
+        assert mock_communicate_data.mock_calls == [
+            call("Pending", {"doc_id": 1}),
+            call("Done", {"doc_id": 1}),
+        ]
+
+    @patch("documentcloud.common.serverless.error_handling.USE_TIMEOUT", True)
+    @patch(
+        "documentcloud.common.serverless.tests.test_error_handling.communicate_data",
+        new_callable=SharedMock,
+    )
+    @patch("documentcloud.common.serverless.utils.send_error", new_callable=SharedMock)
+    def test_batch_error(self, mock_send_error, mock_communicate_data):
+        # A batch has no doc_id, so each of its documents is sent the error
+        batch = {"documents": [{"doc_id": 1}, {"doc_id": 2}]}
+        error_on_first_try(encode(batch))
+        assert mock_communicate_data.mock_calls == [call("Pending", batch)]
+        assert mock_send_error.mock_calls == [
+            call(redis, 1, exc=ANY),
+            call(redis, 2, exc=ANY),
+        ]
+
+    @patch("documentcloud.common.serverless.error_handling.USE_TIMEOUT", True)
+    @patch(
+        "documentcloud.common.serverless.tests.test_error_handling.communicate_data",
+        new_callable=SharedMock,
+    )
+    @patch("documentcloud.common.serverless.utils.send_error", new_callable=SharedMock)
+    def test_batch_timeout(self, mock_send_error, mock_communicate_data):
+        batch = {"documents": [{"doc_id": 1}, {"doc_id": 2}]}
+        timeout_on_first_try(encode(batch))
+        assert mock_communicate_data.mock_calls == [call("Pending", batch)]
+        message = "Function has timed out (max retries exceeded)"
+        assert mock_send_error.mock_calls == [
+            call(redis, 1, message=message),
+            call(redis, 2, message=message),
+        ]
+
+    @patch("documentcloud.common.serverless.error_handling.USE_TIMEOUT", True)
+    @patch(
+        "documentcloud.common.serverless.tests.test_error_handling.communicate_data",
+        new_callable=SharedMock,
+    )
+    @patch("documentcloud.common.serverless.utils.send_error", new_callable=SharedMock)
+    @patch("documentcloud.common.serverless.checkpoint.done", new_callable=SharedMock)
+    def test_retry_unfinished(self, mock_done, mock_send_error, mock_communicate_data):
+        with patch.object(checkpoint, "finished", finished_from(mock_done)):
+            finish_two_pages(encode({"doc_id": 1, "pages": [0, 1, 2, 3, 4]}))
+        assert mock_send_error.call_count == 0
+        # Only the unfinished pages are retried, split in two, and the run made
+        # progress so it does not count towards the retries
+        assert mock_communicate_data.mock_calls == [
+            call("Pending", {"doc_id": 1, "pages": [0, 1, 2, 3, 4]}),
+            call("Pending", {"doc_id": 1, "pages": [2, 3], "runcount": 0}),
+            call("Done", {"doc_id": 1, "pages": [2, 3], "runcount": 0}),
+            call("Pending", {"doc_id": 1, "pages": [4], "runcount": 0}),
+            call("Done", {"doc_id": 1, "pages": [4], "runcount": 0}),
+        ]
+
+    @patch("documentcloud.common.serverless.error_handling.USE_TIMEOUT", True)
+    @patch(
+        "documentcloud.common.serverless.tests.test_error_handling.communicate_data",
+        new_callable=SharedMock,
+    )
+    @patch("documentcloud.common.serverless.utils.send_error", new_callable=SharedMock)
+    @patch("documentcloud.common.serverless.checkpoint.done", new_callable=SharedMock)
+    def test_retry_no_progress(self, mock_done, mock_send_error, mock_communicate_data):
+        with patch.object(checkpoint, "finished", finished_from(mock_done)):
+            finish_no_pages(encode({"doc_id": 1, "pages": [0, 1]}))
+        # A run which finished nothing counts towards the retries
+        assert mock_communicate_data.mock_calls == [
+            call("Pending", {"doc_id": 1, "pages": [0, 1]}),
+            call("Pending", {"doc_id": 1, "pages": [0], "runcount": 1}),
+            call("Pending", {"doc_id": 1, "pages": [1], "runcount": 1}),
+        ]
+        assert mock_send_error.call_count == 2
+
+    @patch("documentcloud.common.serverless.error_handling.USE_TIMEOUT", True)
+    @patch("documentcloud.common.serverless.error_handling.COOPERATIVE_TIMEOUT", True)
+    @patch(
+        "documentcloud.common.serverless.tests.test_error_handling.communicate_data",
+        new_callable=SharedMock,
+    )
+    @patch("documentcloud.common.serverless.utils.send_error", new_callable=SharedMock)
+    @patch("documentcloud.common.serverless.error_handling.logging.warning")
+    def test_retry_cooperative(
+        self, mock_warning, mock_send_error, mock_communicate_data
+    ):
+        finish_pages_cooperatively(encode({"doc_id": 1, "pages": [0, 1, 2, 3, 4]}))
+        assert mock_send_error.call_count == 0
+        # The second run finishes both its pages, but only after its deadline,
+        # so nothing is left to retry
+        assert mock_communicate_data.mock_calls == [
+            call("Pending", {"doc_id": 1, "pages": [0, 1, 2, 3, 4]}),
+            call("Pending", {"doc_id": 1, "pages": [2, 3], "runcount": 0}),
+            call("Done", {"doc_id": 1, "pages": [2, 3], "runcount": 0}),
+            call("Pending", {"doc_id": 1, "pages": [4], "runcount": 0}),
+            call("Done", {"doc_id": 1, "pages": [4], "runcount": 0}),
+        ]
+        assert mock_warning.mock_calls == [
+            call(
+                "Function ran out of time: doc_id: %s retrying %d of %d items (run %d)",
+                1,
+                3,
+                5,
+                1,
+            )
+        ]
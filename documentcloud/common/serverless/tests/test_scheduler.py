@@ -0,0 +1,205 @@
+# Standard Library
+from unittest.mock import MagicMock, patch
+
+# Third Party
+from fakeredis import FakeRedis
+from redis.exceptions import LockError
+
+# DocumentCloud
+from documentcloud.common import redis_fields
+from documentcloud.common.priority_choices import BULK, INTERACTIVE
+from documentcloud.common.serverless.scheduler import (
+    LocalScheduler,
+    RedisScheduler,
+    batch_jobs,
+    release,
+)
+
+
+def scheduler(**kwargs):
+    """A local scheduler recording the jobs it dispatches"""
+    dispatched = []
+    kwargs.setdefault("weights", {INTERACTIVE: 4, BULK: 1})
+    return LocalScheduler(dispatched.append, **kwargs), dispatched
+
+
+def redis_scheduler(redis, **kwargs):
+    """A Redis scheduler recording the jobs it dispatches instead of publishing
+    them"""
+    dispatched = []
+    kwargs.setdefault("weights", {INTERACTIVE: 4, BULK: 1})
+    sched = RedisScheduler(redis, **kwargs)
+    sched.dispatch = dispatched.append
+    return sched, dispatched
+
+
+class TestScheduler:
+    def test_slots(self):
+        sched, dispatched = scheduler(slots=2, bulk_slots=2, org_slots=10)
+        for doc_id in range(3):
+            sched.submit(doc_id, INTERACTIVE, 1, {"doc_id": doc_id})
+        assert dispatched == [{"doc_id": 0}, {"doc_id": 1}]
+
+        # Releasing a slot starts the next job
+        sched.release(0)
+        assert dispatched[-1] == {"doc_id": 2}
+
+    def test_bulk_slots(self):
+        sched, dispatched = scheduler(slots=3, bulk_slots=1, org_slots=10)
+        sched.submit(1, BULK, 1, {"doc_id": 1})
+        sched.submit(2, BULK, 1, {"doc_id": 2})
+        # Bulk jobs may not take the slots left for interactive jobs
+        assert dispatched == [{"doc_id": 1}]
+        sched.submit(3, INTERACTIVE, 1, {"doc_id": 3})
+        assert dispatched == [{"doc_id": 1}, {"doc_id": 3}]
+
+    def test_org_slots(self):
+        sched, dispatched = scheduler(slots=3, bulk_slots=3, org_slots=1)
+        sched.submit(1, BULK, "big", {"doc_id": 1})
+        sched.submit(2, BULK, "big", {"doc_id": 2})
+        sched.submit(3, BULK, "small", {"doc_id": 3})
+        # A second organization is not held up behind the first's queue
+        assert dispatched == [{"doc_id": 1}, {"doc_id": 3}]
+        sched.release(1)
+        assert dispatched[-1] == {"doc_id": 2}
+
+    def test_weights(self):
+        sched, dispatched = scheduler(slots=1, bulk_slots=1, org_slots=10)
+        sched.submit(0, INTERACTIVE, 1, {"doc_id": 0})
+        for doc_id in range(1, 11):
+            sched.submit(doc_id, BULK, 1, {"doc_id": doc_id})
+        for doc_id in range(11, 21):
+            sched.submit(doc_id, INTERACTIVE, 1, {"doc_id": doc_id})
+        for _ in range(10):
+            sched.release(dispatched[-1]["doc_id"])
+        # Interactive jobs are started four times as often as bulk jobs, which
+        # are still not starved
+        started = ["b" if job["doc_id"] <= 10 else "i" for job in dispatched[1:11]]
+        assert started.count("b") == 2
+        assert started.count("i") == 8
+
+    def test_cancel(self):
+        sched, dispatched = scheduler(slots=1, bulk_slots=1, org_slots=10)
+        sched.submit(1, INTERACTIVE, 1, {"doc_id": 1})
+        sched.submit(2, INTERACTIVE, 1, {"doc_id": 2})
+        sched.submit(3, INTERACTIVE, 1, {"doc_id": 3})
+        # Cancelling a queued job removes it
+        sched.release(2)
+        sched.release(1)
+        assert dispatched == [{"doc_id": 1}, {"doc_id": 3}]
+
+    def test_reclaim(self):
+        sched, dispatched = scheduler(slots=1, bulk_slots=1, org_slots=10)
+        with patch("time.time", return_value=0):
+            sched.submit(1, INTERACTIVE, 1, {"doc_id": 1})
+        # A slot never released is reclaimed after its time to live
+        with patch("time.time", return_value=sched.slot_ttl + 1):
+            sched.submit(2, INTERACTIVE, 1, {"doc_id": 2})
+        assert dispatched == [{"doc_id": 1}, {"doc_id": 2}]
+
+    def test_batch_jobs(self):
+        jobs = [
+            {"topic": "convert", "data": {"doc_id": 1}, "batch": True},
+            {"topic": "process", "data": {"doc_id": 2}, "batch": False},
+            {"topic": "convert", "data": {"doc_id": 3}, "batch": True},
+            {"topic": "convert", "data": {"doc_id": 4}, "batch": True},
+            {"topic": ["local", "convert"], "data": {"doc_id": 5}, "batch": True},
+        ]
+        assert batch_jobs(jobs, batch_max=2) == [
+            {"topic": "convert", "data": {"documents": [{"doc_id": 1}, {"doc_id": 3}]}},
+            jobs[1],
+            jobs[3],
+            jobs[4],
+        ]
+
+
+class TestRedisScheduler:
+    def test_push_pop(self):
+        sched, _dispatched = redis_scheduler(FakeRedis())
+        sched.push("1", BULK, "org", {"doc_id": 1})
+        sched.push("2", BULK, "org", {"doc_id": 2})
+        sched.push("3", BULK, "other", {"doc_id": 3})
+        assert sched.waiting_orgs(BULK) == ["org", "other"]
+        assert sched.waiting_orgs(INTERACTIVE) == []
+
+        # The organization goes to the back of the turns while it has jobs left
+        assert sched.pop(BULK, "org") == ("1", {"doc_id": 1})
+        assert sched.waiting_orgs(BULK) == ["other", "org"]
+        assert sched.pop(BULK, "other") == ("3", {"doc_id": 3})
+        assert sched.waiting_orgs(BULK) == ["org"]
+
+        # A cancelled job is skipped
+        sched.cancel("2")
+        assert sched.pop(BULK, "org") is None
+        assert sched.waiting_orgs(BULK) == []
+
+    def test_slots(self):
+        redis = FakeRedis()
+        sched, dispatched = redis_scheduler(redis, slots=2, bulk_slots=1)
+        for doc_id in range(3):
+            sched.submit(doc_id, BULK, 1, {"doc_id": doc_id})
+        sched.submit(3, INTERACTIVE, 1, {"doc_id": 3})
+        assert dispatched == [{"doc_id": 0}, {"doc_id": 3}]
+        assert set(sched.running()) == {"0", "3"}
+        assert set(redis.hkeys(redis_fields.scheduler_credits())) == {
+            INTERACTIVE.encode("utf8"),
+            BULK.encode("utf8"),
+        }
+
+        # Releasing a slot starts the next job, which another scheduler sharing
+        # the state may do
+        other, other_dispatched = redis_scheduler(redis, slots=2, bulk_slots=1)
+        other.release(0)
+        assert other_dispatched == [{"doc_id": 1}]
+        assert set(sched.running()) == {"1", "3"}
+
+    def test_reclaim(self):
+        sched, dispatched = redis_scheduler(FakeRedis(), slots=1, bulk_slots=1)
+        with patch("time.time", return_value=0):
+            sched.submit(1, INTERACTIVE, 1, {"doc_id": 1})
+            sched.submit(2, INTERACTIVE, 1, {"doc_id": 2})
+        assert dispatched == [{"doc_id": 1}]
+        # A slot never released is reclaimed after its time to live
+        with patch("time.time", return_value=sched.slot_ttl + 1):
+            sched.submit(3, INTERACTIVE, 1, {"doc_id": 3})
+        assert dispatched == [{"doc_id": 1}, {"doc_id": 2}]
+        assert list(sched.running()) == ["2"]
+
+    def test_release_without_slot(self):
+        redis = FakeRedis()
+        sched, _dispatched = redis_scheduler(redis, slots=1, bulk_slots=1)
+        sched.submit(1, INTERACTIVE, 1, {"doc_id": 1})
+        sched.submit(2, INTERACTIVE, 1, {"doc_id": 2})
+        assert sched.holds("1")
+        assert sched.holds("2")
+        # Documents which never took a slot do not take the lock
+        with patch.object(sched, "lock", side_effect=LockError):
+            sched.release(3)
+        assert not sched.holds("3")
+
+    @patch("documentcloud.common.serverless.scheduler.SCHEDULER_ENABLED", True)
+    def test_release_failure(self):
+        redis = FakeRedis()
+        sched, _dispatched = redis_scheduler(redis)
+        sched.submit(1, INTERACTIVE, 1, {"doc_id": 1})
+        # Failing to release a slot is logged rather than raised, for the
+        # document's completion to be handled anyway
+        with patch.object(RedisScheduler, "lock", side_effect=LockError), patch(
+            "documentcloud.common.serverless.scheduler.logger"
+        ) as mock_logger:
+            release(redis, 1)
+        assert mock_logger.error.call_count == 1
+        assert sched.holds("1")
+
+    @patch("documentcloud.common.serverless.scheduler.SCHEDULER_ENABLED", True)
+    def test_release(self):
+        redis = FakeRedis()
+        sched, _dispatched = redis_scheduler(redis)
+        sched.submit(1, INTERACTIVE, 1, {"doc_id": 1})
+        release(redis, 1)
+        assert not sched.holds("1")
+        # Releasing a document without a slot does nothing
+        mock_redis = MagicMock()
+        mock_redis.pipeline.return_value.execute.return_value = [False, False]
+        release(mock_redis, 2)
+        assert mock_redis.lock.call_count == 0
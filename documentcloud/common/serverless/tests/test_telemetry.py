@@ -0,0 +1,69 @@
+# Standard Library
+from unittest.mock import patch
+
+# Third Party
+from fakeredis import FakeRedis
+
+# DocumentCloud
+from documentcloud.common.serverless import telemetry
+
+
+class TestTelemetry:
+    def test_doc_class(self):
+        assert telemetry.doc_class(None) == "unknown"
+        assert telemetry.doc_class(1) == "small"
+        assert telemetry.doc_class(100) == "medium"
+        assert telemetry.doc_class(5000) == "huge"
+
+    def test_message_doc_class(self):
+        redis = FakeRedis()
+        redis.set("1:pages", 20)
+        data = {"doc_id": 1}
+        assert telemetry.message_doc_class(redis, data) == "medium"
+        # The class is cached on the message, so outlives the Redis fields
+        redis.delete("1:pages")
+        assert telemetry.message_doc_class(redis, data) == "medium"
+        assert data["doc_class"] == "medium"
+        # A page count in the message is used without looking in Redis
+        assert telemetry.message_doc_class({}, {"doc_id": 2, "page_count": 5}) == (
+            "small"
+        )
+        assert telemetry.message_doc_class(redis, {"doc_id": 2}) == "unknown"
+        assert telemetry.message_doc_class({}, {"doc_id": 2}) == "unknown"
+
+    @patch("documentcloud.common.serverless.telemetry.TELEMETRY_BUCKET_SECONDS", 60)
+    def test_record(self):
+        redis = FakeRedis()
+        for timestamp in (0, 30, 90):
+            telemetry.record(
+                redis,
+                "extract_image",
+                "medium",
+                {"invocations": 1, "run_seconds": 2.5, "errors": 0},
+                timestamp=timestamp,
+            )
+        telemetry.record(redis, "ocr", "unknown", {"invocations": 1}, timestamp=0)
+
+        rows = telemetry.read(redis, 0, 119)
+        assert [
+            (row["stage"], row["bucket"], row["doc_class"], row["invocations"])
+            for row in rows
+        ] == [
+            ("extract_image", 0, "medium", 2),
+            ("extract_image", 60, "medium", 1),
+            ("ocr", 0, "unknown", 1),
+        ]
+        assert rows[0]["run_seconds"] == 5.0
+        assert rows[0]["errors"] == 0
+
+    def test_record_errors(self):
+        # Telemetry never raises into the function being measured
+        telemetry.record({}, "extract_image", "small", {"invocations": 1})
+
+    def test_added(self):
+        telemetry.reset()
+        telemetry.add(bytes_read=10)
+        telemetry.add(bytes_read=5)
+        assert telemetry.added() == {"bytes_read": 15}
+        telemetry.reset()
+        assert telemetry.added() == {}
@@ -0,0 +1,16 @@
+# Third Party
+from fakeredis import FakeRedis
+
+# DocumentCloud
+from documentcloud.common.serverless import utils
+
+
+class TestUtils:
+    def test_page_dimensions(self):
+        redis = FakeRedis()
+        utils.write_page_dimensions(redis, 1, [])
+        assert utils.read_page_dimensions(redis, 1) == []
+        utils.write_page_dimensions(redis, 1, [(10, "8.5x11"), (2, "11x8.5")])
+        utils.write_page_dimensions(redis, 1, [(2, "8.5x11")])
+        assert utils.read_page_dimensions(redis, 1) == [(2, "8.5x11"), (10, "8.5x11")]
+        assert redis.ttl("1:pageDimensions") > 0
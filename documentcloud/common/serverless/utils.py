@@ -16,8 +16,10 @@ import requests
 from redis.lock import Lock
 
 # Local
-from .. import redis_fields
-from ..environment import encode_pubsub_data, publisher
+from .. import path, redis_fields, text_positions
+from ..environment import encode_pubsub_data, publisher, storage
+from . import scheduler
+from .artifacts import ArtifactStore
 
 env = environ.Env()
 
@@ -57,6 +59,11 @@ RETRY_ERROR_TOPIC = publisher.topic_path(
 )
 REDIS_TTL = env.int("REDIS_TTL", default=86400)
 
+# Intermediate files, such as text-only PDFs, are kept out of Redis when large
+ARTIFACTS = ArtifactStore(storage, REDIS_TTL)
+PAGE_TEXT_PDF = "pagetextpdf"
+PAGE_TEXT_POSITIONS = "pagepositions"
+
 
 def get_redis():
     """Opens a connection to Redis and returns it"""
@@ -149,6 +156,7 @@ def send_complete(redis, doc_id):
 
     # Clean out Redis
     clean_up(redis, doc_id)
+    scheduler.release(redis, doc_id)
 
 
 def send_error(redis, doc_id, exc=None, message=None):
@@ -174,6 +182,7 @@ def send_error(redis, doc_id, exc=None, message=None):
     # Clean out Redis
     if doc_id:
         clean_up(redis, doc_id)
+        scheduler.release(redis, doc_id)
 
 
 def send_modification_post_processing(redis, doc_id, json_):
@@ -185,6 +194,7 @@ def send_modification_post_processing(redis, doc_id, json_):
 
     # Clean out Redis
     clean_up(redis, doc_id)
+    scheduler.release(redis, doc_id)
 
 
 def initialize(redis, doc_id):
@@ -199,33 +209,54 @@ def still_processing(redis, doc_id):
 
 def clean_up(redis, doc_id):
     """Removes all keys associated with a document id in redis"""
+    redis.delete(
+        redis_fields.images_remaining(doc_id),
+        redis_fields.texts_remaining(doc_id),
+        redis_fields.text_positions_remaining(doc_id),
+        redis_fields.page_count(doc_id),
+        redis_fields.is_running(doc_id),
+        redis_fields.image_bits(doc_id),
+        redis_fields.text_bits(doc_id),
+        redis_fields.text_position_bits(doc_id),
+        redis_fields.page_dimensions(doc_id),
+        redis_fields.page_text(doc_id),
+        redis_fields.page_text_pdf(doc_id),
+        redis_fields.page_text_positions(doc_id),
+        redis_fields.asset_cache_key(doc_id),
+    )
 
-    dimensions_field = redis_fields.dimensions(doc_id)
-
-    def remove_all(pipeline):
-        # Remove all simple fields
-        pipeline.delete(
-            redis_fields.images_remaining(doc_id),
-            redis_fields.texts_remaining(doc_id),
-            redis_fields.text_positions_remaining(doc_id),
-            redis_fields.page_count(doc_id),
-            redis_fields.is_running(doc_id),
-            redis_fields.image_bits(doc_id),
-            redis_fields.text_bits(doc_id),
-            redis_fields.text_position_bits(doc_id),
-            redis_fields.page_text(doc_id),
-            redis_fields.page_text_pdf(doc_id),
-        )
+    # Remove any intermediate files spilled out of Redis
+    ARTIFACTS.delete_spilled(redis, doc_id)
+
+
+# Registers a batch of pages for a task, decrementing the remaining count once
+# for each page not registered before.  Returns the remaining count, or nil if
+# every page had already been registered, so a duplicate registration never
+# reports the task as newly finished
+# KEYS: remaining count field, page bits field
+# ARGV: page numbers
+REGISTER_PAGES_SCRIPT = """
+local remaining = false
+for _, page_number in ipairs(ARGV) do
+    if redis.call("GETBIT", KEYS[2], page_number) == 0 then
+        redis.call("SETBIT", KEYS[2], page_number, 1)
+        remaining = redis.call("DECR", KEYS[1])
+    end
+end
+return remaining
+"""
 
-        # Remove any existing dimensions that may be lingering
-        existing_dimensions = pipeline.smembers(dimensions_field)
-        if existing_dimensions is not None:
-            for dimension in existing_dimensions:
-                dimension = dimension.decode("utf8")
-                pipeline.delete(redis_fields.page_dimension(doc_id, dimension))
-        pipeline.delete(dimensions_field)
 
-    redis.transaction(remove_all, dimensions_field)
+def pages_with_bit(redis, bits_field, page_numbers):
+    """Returns the set of pages whose bits are set, in a single round trip."""
+    pipeline = redis.pipeline(transaction=False)
+    for page_number in page_numbers:
+        pipeline.getbit(bits_field, page_number)
+    return {
+        page_number
+        for page_number, bit in zip(page_numbers, pipeline.execute())
+        if bit != 0
+    }
 
 
 def page_extracted(redis, doc_id, page_number):
@@ -234,67 +265,114 @@ def page_extracted(redis, doc_id, page_number):
     return redis.getbit(image_bits_field, page_number) != 0
 
 
+def pages_extracted(redis, doc_id, page_numbers):
+    """Returns the set of pages which have already had their images extracted."""
+    return pages_with_bit(redis, redis_fields.image_bits(doc_id), page_numbers)
+
+
 def page_ocrd(redis, doc_id, page_number):
     """Returns if the page has already been OCRd."""
     text_bits_field = redis_fields.text_bits(doc_id)
     return redis.getbit(text_bits_field, page_number) != 0
 
 
-def register_page_task(redis, page_number, remaining_field, bits_field):
-    """Registers a generic Redis page task, returning the remaining count."""
+def pages_ocrd(redis, doc_id, page_numbers):
+    """Returns the set of pages which have already been OCRd."""
+    return pages_with_bit(redis, redis_fields.text_bits(doc_id), page_numbers)
+
 
-    # Start a pipeline to atomically decrement remaining and toggle page
-    def decrement_remaining(pipeline):
-        existing_value = pipeline.getbit(bits_field, page_number)
-        if existing_value == 1:
-            # Page has already been extracted
-            pipeline.multi()
-            pipeline.get(remaining_field)
-            return
+def register_pages_task(redis, page_numbers, remaining_field, bits_field):
+    """Registers a generic Redis page task for a batch of pages atomically,
+    returning the remaining count."""
+    register_pages = redis.register_script(REGISTER_PAGES_SCRIPT)
+    return register_pages(keys=[remaining_field, bits_field], args=page_numbers)
 
-        pipeline.multi()
-        pipeline.decr(remaining_field)
-        pipeline.setbit(bits_field, page_number, 1)
 
-    return redis.transaction(decrement_remaining, bits_field)[0]
+def register_page_task(redis, page_number, remaining_field, bits_field):
+    """Registers a generic Redis page task, returning the remaining count."""
+    return register_pages_task(redis, [page_number], remaining_field, bits_field)
 
 
-def register_page_extracted(redis, doc_id, page_number):
-    """Register a single page as being extracted. Return true if all done."""
+def register_pages_extracted(redis, doc_id, page_numbers):
+    """Register pages as being extracted. Return true if all done."""
     # Decrement the images remaining
-    images_remaining = register_page_task(
+    images_remaining = register_pages_task(
         redis,
-        page_number,
+        page_numbers,
         redis_fields.images_remaining(doc_id),
         redis_fields.image_bits(doc_id),
     )
     return images_remaining == 0
 
 
-def register_page_ocrd(redis, doc_id, page_number):
-    """Register a single page as being OCRd. Return true if all done."""
+def register_page_extracted(redis, doc_id, page_number):
+    """Register a single page as being extracted. Return true if all done."""
+    return register_pages_extracted(redis, doc_id, [page_number])
+
+
+def register_pages_ocrd(redis, doc_id, page_numbers):
+    """Register pages as being OCRd. Return true if all done."""
     # Decrement the texts remaining
-    texts_remaining = register_page_task(
+    texts_remaining = register_pages_task(
         redis,
-        page_number,
+        page_numbers,
         redis_fields.texts_remaining(doc_id),
         redis_fields.text_bits(doc_id),
     )
     return texts_remaining == 0
 
 
-def register_text_position_extracted(redis, doc_id, page_number):
-    """Register a single page text position extraction. Return true if all done."""
-    # Decrement the texts remaining
-    text_positions_remaining = register_page_task(
+def register_page_ocrd(redis, doc_id, page_number):
+    """Register a single page as being OCRd. Return true if all done."""
+    return register_pages_ocrd(redis, doc_id, [page_number])
+
+
+def register_text_positions_extracted(redis, doc_id, page_numbers):
+    """Register pages' text position extraction. Return true if all done."""
+    # Decrement the text positions remaining
+    text_positions_remaining = register_pages_task(
         redis,
-        page_number,
+        page_numbers,
         redis_fields.text_positions_remaining(doc_id),
         redis_fields.text_position_bits(doc_id),
     )
     return text_positions_remaining == 0
 
 
+def register_text_position_extracted(redis, doc_id, page_number):
+    """Register a single page text position extraction. Return true if all done."""
+    return register_text_positions_extracted(redis, doc_id, [page_number])
+
+
+def write_page_dimensions(redis, doc_id, page_dimensions):
+    """Write (page number, dimension) pairs to each page's slot in Redis, in
+    a single round trip."""
+    if not page_dimensions:
+        return
+    page_dimensions_field = redis_fields.page_dimensions(doc_id)
+    pipeline = redis.pipeline(transaction=False)
+    pipeline.hset(
+        page_dimensions_field,
+        mapping={
+            f"{page_number}": page_dimension
+            for page_number, page_dimension in page_dimensions
+        },
+    )
+    pipeline.expire(page_dimensions_field, REDIS_TTL)
+    pipeline.execute()
+
+
+def read_page_dimensions(redis, doc_id):
+    """Read the (page number, dimension) pairs of every page written, sorted by
+    page number, in a single read."""
+    return sorted(
+        (int(page_number), page_dimension.decode("utf8"))
+        for page_number, page_dimension in redis.hgetall(
+            redis_fields.page_dimensions(doc_id)
+        ).items()
+    )
+
+
 def write_page_text(redis, doc_id, page_number, page_text, ocr, ocr_code="eng"):
     """Write page text to Redis."""
     redis.hset(
@@ -305,12 +383,87 @@ def write_page_text(redis, doc_id, page_number, page_text, ocr, ocr_code="eng"):
     redis.expire(redis_fields.page_text(doc_id), REDIS_TTL)
 
 
+def write_page_texts(redis, doc_id, page_texts, ocr, ocr_code="eng"):
+    """Write the text of several pages to Redis.  Pass a pipeline to send the
+    writes in a single round trip."""
+    if not page_texts:
+        return
+    for page_number, page_text in page_texts.items():
+        redis.hset(
+            redis_fields.page_text(doc_id),
+            f"{page_number}",
+            json.dumps({"text": page_text, "ocr": ocr, "ocr_code": ocr_code}),
+        )
+    redis.expire(redis_fields.page_text(doc_id), REDIS_TTL)
+
+
 def write_page_text_pdf(redis, doc_id, page_number, page_text_pdf_contents):
-    """Write text-only pdf file to Redis."""
-    redis.hset(
-        redis_fields.page_text_pdf(doc_id), f"{page_number}", page_text_pdf_contents
+    """Write text-only pdf file to the artifact store."""
+    ARTIFACTS.put(redis, doc_id, PAGE_TEXT_PDF, page_number, page_text_pdf_contents)
+
+
+def page_text_pdf_pages(redis, doc_id):
+    """The page numbers which have text-only pdf files, in order."""
+    return sorted(int(key) for key in ARTIFACTS.keys(redis, doc_id, PAGE_TEXT_PDF))
+
+
+def read_page_text_pdfs(redis, doc_id, page_numbers):
+    """Read the text-only pdf files of several pages in bulk."""
+    return ARTIFACTS.get_many(redis, doc_id, PAGE_TEXT_PDF, page_numbers)
+
+
+def delete_page_text_pdfs(redis, doc_id):
+    """Remove all the text-only pdf files."""
+    ARTIFACTS.delete(redis, doc_id, PAGE_TEXT_PDF)
+
+
+def write_page_text_positions(redis, doc_id, page_positions):
+    """Write the encoded text positions of pages to the artifact store, to be
+    packed once every page's text positions have been extracted."""
+    pipeline = redis.pipeline()
+    for page_number, words in page_positions.items():
+        ARTIFACTS.put(
+            pipeline,
+            doc_id,
+            PAGE_TEXT_POSITIONS,
+            page_number,
+            text_positions.encode_page(words),
+        )
+    pipeline.execute()
+
+
+def pack_text_positions(redis, doc_id, slug, access, partial):
+    """Pack the stored text positions into the document's packed text positions
+    file.  For partial updates, the pages not stored are kept from the existing
+    file."""
+    page_numbers = [
+        int(key) for key in ARTIFACTS.keys(redis, doc_id, PAGE_TEXT_POSITIONS)
+    ]
+    if not page_numbers:
+        return
+
+    blocks = dict(
+        zip(
+            page_numbers,
+            ARTIFACTS.get_many(redis, doc_id, PAGE_TEXT_POSITIONS, page_numbers),
+        )
+    )
+    page_count = redis.get(redis_fields.page_count(doc_id))
+    page_count = int(page_count) if page_count is not None else max(blocks) + 1
+
+    file_name = path.text_positions_path(doc_id, slug)
+    existing = None
+    if partial and storage.exists(file_name):
+        with storage.open(file_name, "rb") as packed_file:
+            existing = packed_file.read()
+
+    storage.simple_upload(
+        file_name,
+        text_positions.update_packed(existing, page_count, blocks),
+        content_type="application/octet-stream",
+        access=access,
     )
-    redis.expire(redis_fields.page_text_pdf(doc_id), REDIS_TTL)
+    ARTIFACTS.delete(redis, doc_id, PAGE_TEXT_POSITIONS)
 
 
 def get_all_page_text(redis, doc_id):
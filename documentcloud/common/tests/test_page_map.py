@@ -0,0 +1,31 @@
+# DocumentCloud
+from documentcloud.common.page_map import build_page_map, iterate_page_spec
+
+
+def test_iterate_page_spec():
+    assert list(iterate_page_spec([0, [2, 4], 1])) == [0, 2, 3, 4, 1]
+
+
+def test_build_page_map():
+    page_map, page_count = build_page_map(
+        1,
+        [
+            {"page_spec": [[1, 2]]},
+            {"page_spec": [0], "modifications": [{"type": "rotate", "angle": "cc"}]},
+            {"id": 2, "page_spec": [0]},
+            {
+                "page_spec": [1],
+                "modifications": [
+                    {"type": "rotate", "angle": "ccw"},
+                    {"type": "rotate", "angle": "cc"},
+                ],
+            },
+        ],
+    )
+    assert page_count == 5
+    assert dict(page_map) == {
+        (1, 1): [(0, 0), (4, 4)],
+        (1, 2): [(1, 0)],
+        (1, 0): [(2, 1)],
+        (2, 0): [(3, 0)],
+    }
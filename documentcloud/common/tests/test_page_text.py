@@ -0,0 +1,147 @@
+# Standard Library
+import io
+import json
+from unittest.mock import patch
+
+# Third Party
+import pytest
+
+# DocumentCloud
+from documentcloud.common import path
+from documentcloud.common.page_text import PageTextStore
+
+
+class MemoryStorage:
+    """Storage holding files in memory, recording the files written"""
+
+    def __init__(self):
+        self.files = {}
+        self.written = []
+
+    def exists(self, file_name):
+        return file_name in self.files
+
+    def open(self, file_name, _mode):
+        if file_name not in self.files:
+            raise ValueError("Missing file")
+        return io.BytesIO(self.files[file_name])
+
+    def simple_upload(self, file_name, contents, access=None):
+        # pylint: disable=unused-argument
+        self.files[file_name] = contents
+        self.written.append(file_name)
+
+    def async_upload(self, file_names, contents, access=None):
+        for file_name, content in zip(file_names, contents):
+            self.simple_upload(file_name, content, access)
+
+    def async_download(self, file_names):
+        return [self.files.get(file_name, b"") for file_name in file_names]
+
+    def delete(self, file_prefix):
+        for file_name in list(self.files):
+            if file_name.startswith(file_prefix):
+                del self.files[file_name]
+
+
+def page(page_number, contents):
+    return {"page": page_number, "contents": contents}
+
+
+def json_text(page_count):
+    return {
+        "updated": 1,
+        "pages": [page(i, f"Page {i}") for i in range(page_count)],
+    }
+
+
+class TestPageTextStore:
+    def test_legacy(self):
+        storage = MemoryStorage()
+        storage.files[path.json_text_path(1, "doc")] = json.dumps(json_text(3)).encode()
+        store = PageTextStore(storage, 1, "doc")
+        assert store.read_all() == json_text(3)
+        assert store.read_pages([0, 2, 5]) == {
+            0: page(0, "Page 0"),
+            2: page(2, "Page 2"),
+        }
+
+    @patch("documentcloud.common.page_text.PAGE_TEXT_SHARD_SIZE", 2)
+    def test_write_all(self):
+        storage = MemoryStorage()
+        PageTextStore(storage, 1, "doc").write_all(json_text(5), "private")
+        store = PageTextStore(storage, 1, "doc")
+        assert store.manifest()["page_count"] == 5
+        assert store.read_all() == json_text(5)
+        assert store.read_pages([1, 4]) == {1: page(1, "Page 1"), 4: page(4, "Page 4")}
+        assert not store.is_stale()
+
+        # Shrinking the text removes the shards past its end
+        store.write_all(json_text(2), "private")
+        assert not storage.exists(path.page_text_shard_path(1, "doc", 1))
+        assert PageTextStore(storage, 1, "doc").read_all() == json_text(2)
+
+    @patch("documentcloud.common.page_text.PAGE_TEXT_SHARD_SIZE", 2)
+    def test_write_pages(self):
+        storage = MemoryStorage()
+        PageTextStore(storage, 1, "doc").write_all(json_text(6), "private")
+        storage.written = []
+
+        store = PageTextStore(storage, 1, "doc")
+        store.write_pages([page(3, "New")], 2, "private")
+        # Only the touched shard and the manifest are written
+        assert sorted(storage.written) == sorted(
+            [
+                path.page_text_shard_path(1, "doc", 1),
+                path.page_text_stale_path(1, "doc"),
+                path.page_text_manifest_path(1, "doc"),
+            ]
+        )
+        assert store.is_stale()
+
+        expected = json_text(6)
+        expected["pages"][3] = page(3, "New")
+        expected["updated"] = 2
+        assert PageTextStore(storage, 1, "doc").read_all() == expected
+
+        assert store.regenerate_legacy("private") == expected
+        assert not store.is_stale()
+        assert json.loads(storage.files[path.json_text_path(1, "doc")]) == expected
+
+    @patch("documentcloud.common.page_text.PAGE_TEXT_SHARD_SIZE", 2)
+    def test_write_pages_past_end(self):
+        storage = MemoryStorage()
+        PageTextStore(storage, 1, "doc").write_all(json_text(3), "private")
+        store = PageTextStore(storage, 1, "doc")
+        store.write_pages([page(6, "New")], 2, "private", page_count=8)
+        pages = PageTextStore(storage, 1, "doc").read_all()["pages"]
+        assert pages == json_text(3)["pages"] + [{}, {}, {}, page(6, "New"), {}]
+
+    @patch("documentcloud.common.page_text.PAGE_TEXT_SHARD_SIZE", 2)
+    def test_write_pages_legacy(self):
+        storage = MemoryStorage()
+        storage.files[path.json_text_path(1, "doc")] = json.dumps(json_text(3)).encode()
+        store = PageTextStore(storage, 1, "doc")
+        store.write_pages([page(1, "New")], 2, "private")
+        assert store.is_stale()
+        assert PageTextStore(storage, 1, "doc").read_pages([0, 1]) == {
+            0: page(0, "Page 0"),
+            1: page(1, "New"),
+        }
+        # The legacy file is left as is until regenerated
+        assert json.loads(storage.files[path.json_text_path(1, "doc")]) == json_text(3)
+
+    @patch("documentcloud.common.page_text.PAGE_TEXT_SHARD_SIZE", 2)
+    def test_failed_read(self):
+        storage = MemoryStorage()
+        PageTextStore(storage, 1, "doc").write_all(json_text(4), "private")
+        storage.written = []
+        # A failed download is returned empty, like a missing file
+        with patch.object(storage, "async_download", return_value=[b""]):
+            store = PageTextStore(storage, 1, "doc")
+            with pytest.raises(OSError):
+                store.read_pages([2])
+            with pytest.raises(OSError):
+                store.write_pages([page(3, "New")], 2, "private")
+        assert storage.written == []
+        assert PageTextStore(storage, 1, "doc").read_all() == json_text(4)
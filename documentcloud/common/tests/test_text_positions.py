@@ -0,0 +1,100 @@
+# Third Party
+import pytest
+
+# DocumentCloud
+from documentcloud.common.text_positions import (
+    HEADER,
+    MAGIC,
+    PackedTextPositions,
+    decode_page,
+    encode_page,
+    pack,
+    read_packed_page,
+    update_packed,
+)
+
+WORDS = [
+    {
+        "text": "Hello",
+        "x1": 0.125,
+        "x2": 0.25,
+        "y1": 0.5,
+        "y2": 0.625,
+        "upright": True,
+        "direction": 1,
+    },
+    {
+        "text": "wörld",
+        "x1": 0.375,
+        "x2": 0.5,
+        "y1": 0.5,
+        "y2": 0.625,
+        "upright": False,
+        "direction": -1,
+    },
+]
+
+
+class RangeStorage:
+    """Storage serving ranged reads of a single file, recording each read"""
+
+    def __init__(self, contents):
+        self.contents = contents
+        self.reads = []
+
+    def read_range(self, _file_name, start, end):
+        self.reads.append((start, end))
+        return self.contents[start:end]
+
+
+class TestTextPositions:
+    def test_columns(self):
+        block = encode_page(WORDS)
+        assert decode_page(block) == WORDS
+        assert decode_page(encode_page([])) == []
+
+    def test_json_fallback(self):
+        words = [
+            {"text": "a", "x1": 0.5, "metadata": {"type": "word"}},
+            {"text": "b", "x1": 0.5},
+        ]
+        assert decode_page(encode_page(words)) == words
+
+    def test_float_precision(self):
+        words = [{"text": "a", "x1": 0.1, "confidence": 99}]
+        (word,) = decode_page(encode_page(words))
+        assert word["x1"] == pytest.approx(0.1)
+        assert word["confidence"] == 99
+
+    def test_pack(self):
+        contents = pack([encode_page(WORDS), None, encode_page(WORDS[:1])])
+        packed = PackedTextPositions(contents)
+        assert packed.page_count == 3
+        assert packed.page(0) == WORDS
+        assert packed.page(1) is None
+        assert packed.page(2) == WORDS[:1]
+        assert packed.page(3) is None
+
+    def test_read_packed_page(self):
+        storage = RangeStorage(pack([None, encode_page(WORDS)]))
+        assert read_packed_page(storage, "doc.positions", 1) == WORDS
+        assert len(storage.reads) == 2
+        assert read_packed_page(storage, "doc.positions", 0) is None
+        assert read_packed_page(storage, "doc.positions", 5) is None
+
+    def test_update_packed(self):
+        contents = update_packed(None, 2, {0: encode_page(WORDS)})
+        contents = update_packed(contents, 3, {2: encode_page(WORDS[1:])})
+        packed = PackedTextPositions(contents)
+        assert [packed.page(i) for i in range(3)] == [WORDS, None, WORDS[1:]]
+        packed = PackedTextPositions(update_packed(contents, 1, {}))
+        assert packed.page_count == 1
+        assert packed.page(0) == WORDS
+
+    def test_invalid(self):
+        with pytest.raises(ValueError):
+            PackedTextPositions(b"[]")
+        with pytest.raises(ValueError):
+            PackedTextPositions(HEADER.pack(MAGIC, 2, 0))
+        with pytest.raises(ValueError):
+            PackedTextPositions(pack([None])[:-1])
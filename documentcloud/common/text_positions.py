@@ -0,0 +1,245 @@
+"""
+A compact encoding of the positions of the words on a document's pages, packed
+into a single file per document.
+
+Each page's words are encoded in columns: coordinates and other numbers are
+struct-packed and strings are replaced by indices into a per-page string table.
+Pages whose words do not fit in columns, such as words with nested metadata,
+are encoded as JSON instead.  Each page is compressed separately, so a single
+page can be fetched with ranged reads of the page table and the page's block.
+
+Layout (little-endian):
+    header: magic, version, page count
+    page table: (offset, length) of each page's block, (0, 0) if it has none
+    page blocks: each a zlib compressed page encoding
+
+Page encoding:
+    format, word count, column count, string count
+    columns: (name string index, type) for each column
+    string table: length of each string, then the UTF-8 bytes of each string
+    column data: the packed values of each column, in column order
+"""
+
+# Standard Library
+import json
+import struct
+import zlib
+
+# Third Party
+import environ
+
+env = environ.Env()
+
+TEXT_POSITION_PACKED = env.bool(
+    "TEXT_POSITION_PACKED", default=False
+)  # Write packed text positions instead of a json file for each page
+
+MAGIC = b"DCTP"
+VERSION = 1
+
+HEADER = struct.Struct("<4sHI")
+PAGE = struct.Struct("<QI")
+COUNTS = struct.Struct("<BIHI")
+COLUMN = struct.Struct("<Ic")
+
+FORMAT_COLUMNS = 0
+FORMAT_JSON = 1
+
+# Column types, as struct format characters
+FLOAT = b"f"
+INT = b"i"
+BOOL = b"?"
+STRING = b"I"
+
+INT_MIN = -(2**31)
+INT_MAX = 2**31 - 1
+
+
+def column_type(values):
+    """The type of column to store values in, or None if they do not fit one"""
+    types = {type(value) for value in values}
+    if types == {str}:
+        return STRING
+    if types == {bool}:
+        return BOOL
+    if types == {int} and all(INT_MIN <= value <= INT_MAX for value in values):
+        return INT
+    if types and types <= {int, float}:
+        return FLOAT
+    return None
+
+
+def encode_columns(words):
+    """Encode words in columns, or return None if they do not fit in columns"""
+    if not words:
+        return None
+    names = list(words[0])
+    if any(list(word) != names for word in words):
+        return None
+
+    columns = []
+    for name in names:
+        values = [word[name] for word in words]
+        type_ = column_type(values)
+        if type_ is None:
+            return None
+        columns.append((name, type_, values))
+
+    strings = {}
+
+    def string_index(value):
+        return strings.setdefault(value, len(strings))
+
+    column_headers = [
+        COLUMN.pack(string_index(name), type_) for name, type_, _values in columns
+    ]
+    column_data = []
+    for _name, type_, values in columns:
+        if type_ == STRING:
+            values = [string_index(value) for value in values]
+        column_data.append(struct.pack(f"<{len(values)}{type_.decode()}", *values))
+
+    encoded_strings = [string.encode("utf8") for string in strings]
+    return b"".join(
+        [
+            COUNTS.pack(FORMAT_COLUMNS, len(words), len(columns), len(strings)),
+            *column_headers,
+            struct.pack(
+                f"<{len(encoded_strings)}I", *(len(s) for s in encoded_strings)
+            ),
+            *encoded_strings,
+            *column_data,
+        ]
+    )
+
+
+def encode_page(words):
+    """Encode a page's words to a compressed block"""
+    contents = encode_columns(words)
+    if contents is None:
+        contents = COUNTS.pack(FORMAT_JSON, 0, 0, 0) + json.dumps(words).encode("utf8")
+    return zlib.compress(contents)
+
+
+def decode_page(block):
+    """Decode a page's words from a compressed block"""
+    contents = memoryview(zlib.decompress(block))
+    format_, word_count, column_count, string_count = COUNTS.unpack_from(contents)
+    offset = COUNTS.size
+    if format_ == FORMAT_JSON:
+        return json.loads(bytes(contents[offset:]).decode("utf8"))
+    if format_ != FORMAT_COLUMNS:
+        raise ValueError(f"Unsupported text position page format: {format_}")
+
+    column_headers = [
+        COLUMN.unpack_from(contents, offset + i * COLUMN.size)
+        for i in range(column_count)
+    ]
+    offset += column_count * COLUMN.size
+
+    lengths = struct.unpack_from(f"<{string_count}I", contents, offset)
+    offset += string_count * 4
+    strings = []
+    for length in lengths:
+        strings.append(bytes(contents[offset : offset + length]).decode("utf8"))
+        offset += length
+
+    columns = []
+    for name_index, type_ in column_headers:
+        format_string = f"<{word_count}{type_.decode()}"
+        values = struct.unpack_from(format_string, contents, offset)
+        offset += struct.calcsize(format_string)
+        if type_ == STRING:
+            values = [strings[value] for value in values]
+        columns.append((strings[name_index], values))
+
+    return [{name: values[i] for name, values in columns} for i in range(word_count)]
+
+
+def pack(blocks):
+    """Pack encoded page blocks, None for pages without text positions, into a
+    single file"""
+    table = []
+    offset = HEADER.size + len(blocks) * PAGE.size
+    for block in blocks:
+        if block is None:
+            table.append(PAGE.pack(0, 0))
+        else:
+            table.append(PAGE.pack(offset, len(block)))
+            offset += len(block)
+    return b"".join(
+        [
+            HEADER.pack(MAGIC, VERSION, len(blocks)),
+            *table,
+            *(block for block in blocks if block is not None),
+        ]
+    )
+
+
+def check_header(contents):
+    """Check a packed file's header, returning its page count"""
+    if len(contents) < HEADER.size:
+        raise ValueError("Packed text positions are truncated")
+    magic, version, page_count = HEADER.unpack_from(contents)
+    if magic != MAGIC:
+        raise ValueError("Not packed text positions")
+    if version != VERSION:
+        raise ValueError(f"Unsupported packed text positions version: {version}")
+    return page_count
+
+
+class PackedTextPositions:
+    """Lazily decoded view over a packed text positions file"""
+
+    def __init__(self, contents):
+        self.contents = memoryview(contents)
+        self.page_count = check_header(self.contents)
+        if len(self.contents) < HEADER.size + self.page_count * PAGE.size:
+            raise ValueError("Packed text positions are truncated")
+
+    def block(self, page_number):
+        """The encoded block for a page, or None if it has none"""
+        if not 0 <= page_number < self.page_count:
+            return None
+        offset, length = PAGE.unpack_from(
+            self.contents, HEADER.size + page_number * PAGE.size
+        )
+        if not length:
+            return None
+        return bytes(self.contents[offset : offset + length])
+
+    def blocks(self):
+        """The encoded blocks for every page"""
+        return [self.block(page_number) for page_number in range(self.page_count)]
+
+    def page(self, page_number):
+        """The words on a page, or None if it has no text positions"""
+        block = self.block(page_number)
+        return decode_page(block) if block is not None else None
+
+
+def read_packed_page(storage, file_name, page_number):
+    """Read a single page's words from a packed file in storage, with one ranged
+    read of the page table and one of the page's block.  Returns None if the
+    page has no text positions."""
+    table_end = HEADER.size + (page_number + 1) * PAGE.size
+    contents = storage.read_range(file_name, 0, table_end)
+    page_count = check_header(contents)
+    if not 0 <= page_number < page_count:
+        return None
+    offset, length = PAGE.unpack_from(contents, table_end - PAGE.size)
+    if not length:
+        return None
+    return decode_page(storage.read_range(file_name, offset, offset + length))
+
+
+def update_packed(contents, page_count, blocks):
+    """Pack a file for `page_count` pages from the blocks of an existing packed
+    file, which may be None, replacing the pages in `blocks`, a dict of page
+    numbers to encoded blocks"""
+    existing = PackedTextPositions(contents).blocks() if contents else []
+    existing = (existing + [None] * page_count)[:page_count]
+    for page_number, block in blocks.items():
+        if 0 <= page_number < page_count:
+            existing[page_number] = block
+    return pack(existing)
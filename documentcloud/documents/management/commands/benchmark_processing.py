@@ -0,0 +1,81 @@
+# Django
+from django.core.management.base import BaseCommand, CommandError
+
+# Standard Library
+import json
+
+# Third Party
+import environ
+
+env = environ.Env()
+
+
+class Command(BaseCommand):
+    """Benchmark the processing pipeline end to end on a corpus of PDFs"""
+
+    def add_arguments(self, parser):
+        parser.add_argument("directory", help="Directory of PDFs to process")
+        parser.add_argument(
+            "--force-ocr",
+            action="store_true",
+            help="OCR every page, even those with text",
+        )
+        parser.add_argument(
+            "--output",
+            help="File to save the results to "
+            "(defaults to processing-benchmark-<commit>.json)",
+        )
+        parser.add_argument(
+            "--compare", help="Results file from a previous run to compare against"
+        )
+
+    def handle(self, *args, **kwargs):
+        if env.str("ENVIRONMENT") != "local":
+            raise CommandError("The benchmark may only be run with local storage")
+
+        # The benchmark imports the processing functions, so only import it
+        # when it is run
+        # DocumentCloud
+        from documentcloud.documents.processing.benchmark import compare, run_benchmark
+
+        baseline = None
+        if kwargs["compare"]:
+            with open(kwargs["compare"], encoding="utf8") as baseline_file:
+                baseline = json.load(baseline_file)
+
+        try:
+            results = run_benchmark(kwargs["directory"], kwargs["force_ocr"])
+        except (OSError, ValueError) as exc:
+            raise CommandError(str(exc)) from exc
+
+        self.stdout.write(
+            f"{results['documents']} documents, {results['pages']} pages "
+            f"in {results['seconds']:.2f}s, "
+            f"{results['pages_per_second'] or 0:.2f} pages/s, "
+            f"{results['bytes_read']} bytes read, "
+            f"{results['bytes_written']} bytes written, "
+            f"{results['errors']} errors"
+        )
+        for stage, stats in results["stages"].items():
+            latencies = ", ".join(
+                f"{measure} {seconds * 1000:.1f}ms"
+                for measure, seconds in stats["run_seconds"].items()
+            )
+            self.stdout.write(f"\t{stage}: {stats['invocations']} runs, {latencies}")
+        self.stdout.write(f"Peak RSS: {results['peak_rss_mb']:.1f}MB")
+
+        output = (
+            kwargs["output"]
+            or f"processing-benchmark-{results['commit'] or 'unknown'}.json"
+        )
+        with open(output, "w", encoding="utf8") as output_file:
+            json.dump(results, output_file, indent=2)
+        self.stdout.write(f"Results saved to {output}")
+
+        if baseline is not None:
+            self.stdout.write(f"Compared to {baseline.get('commit')}:")
+            for measure, before, after, change in compare(results, baseline):
+                change = f"{change:+.1%}" if change is not None else "n/a"
+                self.stdout.write(
+                    f"\t{measure}: {before:.4g} -> {after:.4g} ({change})"
+                )
@@ -19,9 +19,10 @@ import requests
 from listcrunch import uncrunch
 
 # DocumentCloud
-from documentcloud.common import path
+from documentcloud.common import path, text_positions
 from documentcloud.common.environment import storage
 from documentcloud.common.extensions import EXTENSIONS
+from documentcloud.common.page_text import PageTextStore
 from documentcloud.core.choices import Language
 from documentcloud.core.fields import AutoCreatedField, AutoLastModifiedField
 from documentcloud.core.utils import slugify
@@ -374,13 +375,37 @@ class Document(models.Model):
             )
             return ""
 
-    def get_all_page_text(self):
+    def get_page_positions(self, page_number):
+        """The positions of the words on a page, read from the packed text
+        positions file if the document has one"""
+        packed_path = path.text_positions_path(self.pk, self.slug)
         try:
+            if storage.exists(packed_path):
+                return (
+                    text_positions.read_packed_page(storage, packed_path, page_number)
+                    or []
+                )
             return json.loads(
-                storage.open(path.json_text_path(self.pk, self.slug), "rb")
+                storage.open(
+                    path.page_text_position_path(self.pk, self.slug, page_number),
+                    "rb",
+                )
                 .read()
                 .decode("utf8")
             )
+        except (ValueError, OSError) as exc:
+            logger.error(
+                "Error getting page positions: Document: %d Page: %d Exception: %s",
+                self.pk,
+                page_number,
+                exc,
+                exc_info=sys.exc_info(),
+            )
+            return []
+
+    def get_all_page_text(self):
+        try:
+            return PageTextStore(storage, self.pk, self.slug).read_all()
         except ValueError as exc:
             logger.error(
                 "Error getting all page text: Document: %d Exception: %s",
@@ -391,18 +416,15 @@ class Document(models.Model):
             return {"pages": [], "updated": None}
 
     def set_page_text(self, page_text_infos):
-        # get the json text
-        json_text = self.get_all_page_text()
-
+        """Set the text of the given pages, returning their text in the json
+        text format.  Only the given pages are written to the page text store,
+        then the concatenated and json text files are regenerated from it."""
         # set the individual text pages
         timestamp = int(round(time.time() * 1000))
-        json_text["updated"] = timestamp
-        if len(json_text["pages"]) < self.page_count:
-            json_text["pages"].extend(
-                [{} for _ in range(self.page_count - len(json_text["pages"]))]
-            )
+        json_text = {"updated": timestamp, "pages": []}
         file_names = []
         file_contents = []
+        packed_blocks = {}
         for page_text_info in page_text_infos:
             page = page_text_info["page_number"]
             text = page_text_info["text"]
@@ -410,39 +432,65 @@ class Document(models.Model):
             file_names.append(path.page_text_path(self.pk, self.slug, page))
             file_contents.append(text.encode("utf8"))
             # overwrite the text in the JSON format
-            json_text["pages"][page] = {
-                "page": page,
-                "contents": text,
-                "ocr": ocr,
-                "updated": timestamp,
-            }
+            json_text["pages"].append(
+                {
+                    "page": page,
+                    "contents": text,
+                    "ocr": ocr,
+                    "updated": timestamp,
+                }
+            )
             if page_text_info.get("positions"):
-                file_names.append(
-                    path.page_text_position_path(self.pk, self.slug, page)
-                )
                 positions = [
                     {**p.pop("metadata", {}), **p} for p in page_text_info["positions"]
                 ]
-                file_contents.append(json.dumps(positions).encode("utf-8"))
-
-        # set the full text
-        concatenated_text = b"\n\n".join(
-            [p["contents"].encode("utf-8") for p in json_text["pages"]]
-        )
-        file_names.append(path.text_path(self.pk, self.slug))
-        file_contents.append(concatenated_text)
-
-        # set the json text
-        file_names.append(path.json_text_path(self.pk, self.slug))
-        file_contents.append(json.dumps(json_text).encode("utf-8"))
+                if text_positions.TEXT_POSITION_PACKED:
+                    packed_blocks[page] = text_positions.encode_page(positions)
+                else:
+                    file_names.append(
+                        path.page_text_position_path(self.pk, self.slug, page)
+                    )
+                    file_contents.append(json.dumps(positions).encode("utf-8"))
+
+        if packed_blocks:
+            # update the changed pages in the packed text positions
+            packed_path = path.text_positions_path(self.pk, self.slug)
+            existing = None
+            if storage.exists(packed_path):
+                existing = storage.open(packed_path, "rb").read()
+            file_names.append(packed_path)
+            file_contents.append(
+                text_positions.update_packed(existing, self.page_count, packed_blocks)
+            )
 
         # upload the text to S3
         logger.info("[SET PAGE TEXT] upload %d", self.pk)
         # reverse the lists to upload the larger files first
         storage.async_upload(file_names[::-1], file_contents[::-1], access=self.access)
 
+        # set the json text
+        PageTextStore(storage, self.pk, self.slug).write_pages(
+            json_text["pages"], timestamp, self.access, self.page_count
+        )
+        self.regenerate_text()
+
         return json_text
 
+    def regenerate_text(self):
+        """Regenerate the concatenated and json text files from the page text
+        store, if they are out of date with it"""
+        store = PageTextStore(storage, self.pk, self.slug)
+        if not store.is_stale():
+            return
+        logger.info("[REGENERATE TEXT] %d", self.pk)
+        json_text = store.regenerate_legacy(self.access)
+        concatenated_text = b"\n\n".join(
+            [p.get("contents", "").encode("utf-8") for p in json_text["pages"]]
+        )
+        storage.simple_upload(
+            path.text_path(self.pk, self.slug), concatenated_text, access=self.access
+        )
+
     def solr(self, fields=None, index_text=False):
         """Get a solr document to index the current document
 
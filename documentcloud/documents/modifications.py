@@ -1,26 +1,14 @@
-# Standard Library
 # Django
 from django.db import transaction
 
-from collections import defaultdict
+# Standard Library
 from copy import copy
 
 # DocumentCloud
+from documentcloud.common.page_map import build_page_map
 from documentcloud.documents.choices import Status
 from documentcloud.documents.models import Document, Note, Section
 
-ANGLE_TABLE = {"": 0, "cc": 1, "hw": 2, "ccw": 3}
-
-
-def iterate_page_spec(page_spec):
-    for spec in page_spec:
-        if isinstance(spec, list):
-            # Page range
-            yield from range(spec[0], spec[1] + 1)
-        else:
-            # Individual page
-            yield spec
-
 
 def remove_note(note, updates, _deletes):
     """Removed notes are detached to page notes on the first page"""
@@ -107,27 +95,7 @@ def _build_page_map(document, modifications):
     """The page map is a dictionary mapping the source document id and  page number to a
     list of the new page numbers in the modified document and the rotation
     """
-    # (document.id, old_page) -> [(new_page, rotation), ...]
-    page_map = defaultdict(list)
-    page_number = 0
-
-    # build a map from original page to new page(s)
-    for modification in modifications:
-        doc_id = modification.get("id", document.pk)
-        page_spec = modification["page_spec"]
-        modifiers = modification.get("modifications", [])
-        for old_page in iterate_page_spec(page_spec):
-
-            rotation = 0
-            for modifier in modifiers:
-                rotation += ANGLE_TABLE.get(modifier.get("angle", ""), 0)
-
-            page_map[(doc_id, old_page)].append((page_number, rotation))
-
-            page_number += 1
-
-    document.page_count = page_number
-
+    page_map, document.page_count = build_page_map(document.pk, modifications)
     return page_map
 
 
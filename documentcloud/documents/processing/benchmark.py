@@ -0,0 +1,261 @@
+"""
+End to end benchmark of the processing pipeline on a corpus of real PDFs.
+
+Each PDF in a directory is copied into local storage and pushed through
+`process_doc`, so that pages are rendered by pdfium and OCRd by Tesseract as
+they are in production.  The processing functions run in this process, through
+the local pubsub client with Celery eager, so each invocation's telemetry is
+collected for latency percentiles.  Every byte read from and written to storage
+is counted, as is the peak memory used.
+"""
+
+# Django
+from django.conf import settings
+
+# Standard Library
+import os
+import resource
+import shutil
+import subprocess
+import threading
+import time
+from collections import Counter, defaultdict
+from contextlib import contextmanager
+from datetime import datetime, timezone
+from unittest.mock import patch
+
+# DocumentCloud
+from config import celery_app
+from documentcloud.common import path
+from documentcloud.common.environment import storage
+from documentcloud.common.environment.local.storage import LocalStorage
+from documentcloud.common.serverless.batch_planner import percentile
+from documentcloud.documents.choices import Access
+from documentcloud.documents.processing.utils.main import process_doc
+
+# Benchmark documents use negative ids counting down from here, to stay clear of
+# real documents and the pipeline tests
+FIRST_DOC_ID = -1000
+SLUG = "benchmark"
+
+PERCENTILES = (0.5, 0.9, 0.99)
+
+
+class CountingFile:
+    """A storage file counting the bytes read from and written to it"""
+
+    def __init__(self, file_, counts):
+        self.file = file_
+        self.counts = counts
+
+    def read(self, *args):
+        data = self.file.read(*args)
+        self.counts["bytes_read"] += len(data)
+        return data
+
+    def write(self, data):
+        self.counts["bytes_written"] += len(data)
+        return self.file.write(data)
+
+    def __getattr__(self, name):
+        return getattr(self.file, name)
+
+
+@contextmanager
+def count_storage(counts):
+    """Count the bytes moved to and from local storage for the duration of the
+    context.  Files uploaded or downloaded whole are counted by their size, and
+    everything else by the bytes read from and written to files it opens."""
+    storage_open = storage.open
+    storage_upload_file = storage.upload_file
+    storage_download_file = storage.download_file
+    # Set while a whole file is transferred, so its opens are not counted twice
+    whole_file = threading.local()
+
+    @contextmanager
+    def counting_open(*args, **kwargs):
+        with storage_open(*args, **kwargs) as file_:
+            if getattr(whole_file, "active", False):
+                yield file_
+            else:
+                yield CountingFile(file_, counts)
+
+    @contextmanager
+    def transferring_whole_file():
+        whole_file.active = True
+        try:
+            yield
+        finally:
+            whole_file.active = False
+
+    def counting_upload_file(file_name, local_path, *args, **kwargs):
+        with transferring_whole_file():
+            storage_upload_file(file_name, local_path, *args, **kwargs)
+        counts["bytes_written"] += os.path.getsize(local_path)
+
+    def counting_download_file(file_name, local_path):
+        with transferring_whole_file():
+            storage_download_file(file_name, local_path)
+        counts["bytes_read"] += os.path.getsize(local_path)
+
+    with patch.object(storage, "open", counting_open), patch.object(
+        storage, "upload_file", counting_upload_file
+    ), patch.object(storage, "download_file", counting_download_file):
+        yield
+
+
+def git_commit():
+    """The commit being benchmarked, if known"""
+    try:
+        return (
+            subprocess.run(
+                ["git", "rev-parse", "--short", "HEAD"],
+                capture_output=True,
+                check=True,
+                text=True,
+            ).stdout.strip()
+            or None
+        )
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def peak_rss_mb():
+    """The peak resident set size of this process so far"""
+    # ru_maxrss is in kilobytes on Linux
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+
+
+def summarize(values):
+    """Percentiles of a list of latencies"""
+    if not values:
+        return {}
+    summary = {
+        f"p{int(fraction * 100)}": percentile(values, fraction)
+        for fraction in PERCENTILES
+    }
+    summary["max"] = max(values)
+    return summary
+
+
+def corpus_files(directory):
+    """The PDFs of a corpus directory, in name order"""
+    return sorted(
+        os.path.join(directory, file_name)
+        for file_name in os.listdir(directory)
+        if file_name.lower().endswith(".pdf")
+    )
+
+
+def run_benchmark(directory, force_ocr=False):
+    """Push each PDF in a directory through the processing pipeline, returning
+    the results"""
+    # pylint: disable=too-many-locals
+    if not isinstance(storage, LocalStorage):
+        raise ValueError("The benchmark must be run with ENVIRONMENT=local")
+    file_names = corpus_files(directory)
+    if not file_names:
+        raise ValueError(f"No PDFs found in {directory}")
+
+    stages = defaultdict(lambda: defaultdict(list))
+    page_counts = {}
+    errors = Counter()
+    counts = Counter()
+
+    def record(_redis, stage, _doc_class, metrics, timestamp=None):
+        # pylint: disable=unused-argument
+        for metric, value in metrics.items():
+            stages[stage][metric].append(value)
+
+    def request(_redis, method, url, json_):
+        # Stands in for the API, noting what processing reports back to it
+        doc_id = int(url.split("/")[1])
+        if url.endswith("/errors/"):
+            errors[doc_id] += 1
+        elif method == "patch" and "page_count" in json_:
+            page_counts[doc_id] = json_["page_count"]
+
+    document_seconds = []
+    initial_eager = celery_app.conf.task_always_eager
+    celery_app.conf.task_always_eager = True
+    try:
+        # Functions run in this process for their telemetry to be collected,
+        # and documents are started straight away to measure processing alone
+        with patch("documentcloud.common.serverless.telemetry.record", record), patch(
+            "documentcloud.common.serverless.utils.request", request
+        ), patch(
+            "documentcloud.common.serverless.error_handling.USE_TIMEOUT", False
+        ), patch(
+            "documentcloud.common.serverless.scheduler.SCHEDULER_ENABLED", False
+        ), patch(
+            "documentcloud.common.serverless.asset_cache.ASSET_CACHE_ENABLED", False
+        ):
+            for doc_id, file_name in zip(
+                range(FIRST_DOC_ID, -(10**9), -1), file_names
+            ):
+                storage.upload_file(path.doc_path(doc_id, SLUG), file_name)
+                start = time.perf_counter()
+                with count_storage(counts):
+                    process_doc(
+                        {
+                            "method": "process_pdf",
+                            "doc_id": doc_id,
+                            "slug": SLUG,
+                            "access": Access.private,
+                            "ocr_engine": "tess4",
+                            "force_ocr": force_ocr,
+                        }
+                    )
+                document_seconds.append(time.perf_counter() - start)
+                shutil.rmtree(
+                    os.path.join(settings.MEDIA_ROOT, path.path(doc_id)),
+                    ignore_errors=True,
+                )
+    finally:
+        celery_app.conf.task_always_eager = initial_eager
+
+    pages = sum(page_counts.values())
+    seconds = sum(document_seconds)
+    return {
+        "commit": git_commit(),
+        "created_at": datetime.now(timezone.utc).isoformat(),
+        "settings": {"directory": directory, "force_ocr": force_ocr},
+        "documents": len(file_names),
+        "pages": pages,
+        "seconds": seconds,
+        "pages_per_second": pages / seconds if seconds else None,
+        "document_seconds": summarize(document_seconds),
+        "bytes_read": counts["bytes_read"],
+        "bytes_written": counts["bytes_written"],
+        "bytes_moved": counts["bytes_read"] + counts["bytes_written"],
+        "errors": sum(errors.values()),
+        "stages": {
+            stage: {
+                "invocations": len(metrics["run_seconds"]),
+                "pages": sum(metrics.get("pages", [])),
+                "run_seconds": summarize(metrics["run_seconds"]),
+            }
+            for stage, metrics in sorted(stages.items())
+        },
+        "peak_rss_mb": peak_rss_mb(),
+    }
+
+
+def compare(results, baseline):
+    """The relative change of the throughput, bytes moved and stage latencies
+    from a baseline's, as (measure, baseline, current, change) rows"""
+    rows = []
+
+    def add(measure, before, after):
+        if before is None or after is None:
+            return
+        change = (after - before) / before if before else None
+        rows.append((measure, before, after, change))
+
+    for measure in ("pages_per_second", "bytes_moved", "peak_rss_mb"):
+        add(measure, baseline.get(measure), results.get(measure))
+    for stage, latencies in results.get("stages", {}).items():
+        before = baseline.get("stages", {}).get(stage, {}).get("run_seconds", {})
+        for measure, value in latencies["run_seconds"].items():
+            add(f"{stage} {measure}", before.get(measure), value)
+    return rows
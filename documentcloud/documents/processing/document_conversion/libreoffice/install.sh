@@ -26,9 +26,11 @@ echo "lo_sources_ver=6.2.1.2" >> sources.ver
 ccache --max-size 32 G && ccache -s
 
 apt-get update -y
-apt-get --assume-yes install autoconf gperf libxslt1-dev xsltproc libxml2-utils libcurl4-nss-dev libnspr4-dev libnss3-dev bison flex zip libgl-dev nasm liblangtag-common
+apt-get --assume-yes install autoconf gperf libxslt1-dev xsltproc libxml2-utils libcurl4-nss-dev libnspr4-dev libnss3-dev bison flex zip libgl-dev nasm liblangtag-common python3-dev
 
 # the most important part. Run ./autogen.sh --help to see what each option means
+# python is enabled for the pyuno bridge, which conversions use to drive the
+# running office; build against the same python version as the function runtime
 ./autogen.sh \
     --disable-avahi \
     --disable-cairo-canvas \
@@ -57,7 +59,7 @@ apt-get --assume-yes install autoconf gperf libxslt1-dev xsltproc libxml2-utils
     --disable-ooenv \
     --disable-pch \
     --disable-postgresql-sdbc \
-    --disable-python \
+    --enable-python=system \
     --disable-randr \
     --disable-report-builder \
     --disable-scripting-beanshell \
@@ -2,11 +2,10 @@
 import locale
 import logging
 import os
-import shlex
 import shutil
 import tarfile
 import tempfile
-from pathlib import Path
+import time
 
 # Third Party
 import environ
@@ -30,6 +29,7 @@ if env.str("ENVIRONMENT").startswith("local"):
     from documentcloud.common.extensions import EXTENSIONS
     from documentcloud.common.serverless import utils
     from documentcloud.common.serverless.error_handling import pubsub_function
+    from documentcloud.documents.processing.document_conversion.office import Office
 else:
     # Third Party
     # only initialize sentry on serverless
@@ -45,6 +45,7 @@ else:
     from common.extensions import EXTENSIONS
     from common.serverless import utils
     from common.serverless.error_handling import pubsub_function
+    from office import Office
     from sentry_sdk.integrations.aws_lambda import AwsLambdaIntegration
     from sentry_sdk.integrations.redis import RedisIntegration
 
@@ -56,6 +57,16 @@ else:
 
 DOCUMENT_SIZE_LIMIT = env.int("DOCUMENT_SIZE_LIMIT", 26 * 1024 * 1024)
 SUPPORTED_DOCUMENT_EXTENSIONS = env.list("DOCUMENT_TYPES", default=EXTENSIONS)
+LIBRE_OFFICE_PORT = env.int(
+    "LIBRE_OFFICE_PORT", default=2002
+)  # Local port the running LibreOffice listens on
+LIBRE_OFFICE_START_TIMEOUT = env.int(
+    "LIBRE_OFFICE_START_TIMEOUT", default=60
+)  # Seconds to wait for LibreOffice to start
+LIBRE_OFFICE_CONVERT_TIMEOUT = env.int(
+    "LIBRE_OFFICE_CONVERT_TIMEOUT",
+    default=max(min(env.list("TIMEOUTS", cast=int)) - 30, 1),
+)  # Seconds a batch may take to convert, within the shortest function timeout
 
 REDIS = utils.get_redis()
 
@@ -92,85 +103,153 @@ class DocumentSizeError(Exception):
     pass
 
 
-def libre_office_convert(input_filename):
+# The LibreOffice instance kept running between invocations
+OFFICE = Office(
+    LIBRE_OFFICE_BINARY,
+    LIBRE_OFFICE_PATH,
+    LIBRE_OFFICE_PORT,
+    LIBRE_OFFICE_START_TIMEOUT,
+)
+
+
+def libre_office_convert(input_paths, output_directory):
+    """Convert files to PDF, returning the output path of each input path
+    converted"""
+    if not input_paths:
+        return {}
+
     # If not already uncompressed, uncompress
     if not os.path.exists(LIBRE_OFFICE_PATH):
         with tarfile.open(LIBRE_OFFICE_ARCHIVE, "r:gz") as tar_file:
             tar_file.extractall(path=LIBRE_OFFICE_PATH)
 
-    # Run LibreOffice
-    # Adapted from https://github.com/vladgolubev/serverless-libreoffice/blob/master/src/libreoffice.js
-    command = (
-        f"cd {shlex.quote(LIBRE_OFFICE_PATH)} && export "
-        f"HOME={shlex.quote(LIBRE_OFFICE_PATH)} && SAL_DISABLE_CPD=true "
-        f"{shlex.quote(LIBRE_OFFICE_BINARY)} --headless --norestore --invisible "
-        f"--nodefault --nofirststartwizard --nolockcheck --nologo --convert-to "
-        f'"pdf:writer_pdf_Export" --outdir '
-        f"{shlex.quote(os.path.dirname(input_filename))} "
-        f"{shlex.quote(input_filename)}"
+    return OFFICE.convert(
+        input_paths, output_directory, time.time() + LIBRE_OFFICE_CONVERT_TIMEOUT
     )
-    if os.system(command) != 0:
-        # For unknown reasons, run twice
-        # https://github.com/vladgolubev/serverless-libreoffice/blob/master/src/libreoffice.js#L19
-        if os.system(command) != 0:
-            raise DocumentConversionError()
 
 
-def convert(input_filename, doc_id, slug):
+def convert(documents):
+    """Convert the original files of documents to PDF together, streaming them
+    to and from storage.
+
+    Returns:
+        The documents which were converted.
+    """
     # Provision a temporary directory in which to handle document conversion
     document_directory = tempfile.mkdtemp(prefix=TMP_DIR)
-
-    # Grab file from storage to tmp
-    tmp_path = os.path.join(document_directory, Path(input_filename).name)
-    with storage.open(input_filename, "rb") as document_file:
-        with open(tmp_path, "wb") as tmp_file:
-            tmp_file.write(document_file.read())
-
-    # Run LibreOffice
-    libre_office_convert(tmp_path)
-    # Remove created file (early, just to free RAM that might be needed later)
-    os.remove(tmp_path)
-
-    # Put converted file back in storage
-    # We expect the filename to be the same but with a pdf extension
-    # (LibreOffice offers no mechanism to specify a precise name)
-    output_path = str(Path(tmp_path).with_suffix(".pdf"))
-    output_filename = path.doc_path(doc_id, slug)
-    with storage.open(output_filename, "wb") as output_document_file:
-        with open(output_path, "rb") as pdf_file:
-            output_document_file.write(pdf_file.read())
-
-    # Remove temporary directory
-    shutil.rmtree(document_directory)
-
-
-@pubsub_function(REDIS, DOCUMENT_CONVERT_TOPIC)
-def run_document_conversion(data, _context=None):
-    """Converts document passed in to PDF and triggers PDF extraction."""
-    data = get_pubsub_data(data)
-    doc_id = data["doc_id"]
-    slug = data["slug"]
-    extension = data["extension"]
-
-    logger.info("[DOCUMENT CONVERSION] doc_id %s extension %s", doc_id, extension)
-
+    output_directory = os.path.join(document_directory, "output")
+    try:
+        # Grab files from storage to tmp, named by document so that their
+        # outputs do not collide
+        inputs = []
+        for document in documents:
+            input_path = os.path.join(
+                document_directory, f"{document['doc_id']}.{document['extension']}"
+            )
+            try:
+                storage.download_file(
+                    path.original_path(
+                        document["doc_id"], document["slug"], document["extension"]
+                    ),
+                    input_path,
+                )
+            except Exception as exc:  # pylint: disable=broad-except
+                # Leave the document out, without failing the rest of the batch
+                logger.warning(
+                    "[DOCUMENT CONVERSION] doc_id %s download failed: %s",
+                    document["doc_id"],
+                    exc,
+                    exc_info=exc,
+                )
+                continue
+            inputs.append((document, input_path))
+
+        # Run LibreOffice
+        output_paths = libre_office_convert(
+            [input_path for _, input_path in inputs], output_directory
+        )
+
+        # Put converted files back in storage
+        converted = []
+        for document, input_path in inputs:
+            if input_path not in output_paths:
+                continue
+            storage.upload_file(
+                path.doc_path(document["doc_id"], document["slug"]),
+                output_paths[input_path],
+            )
+            converted.append(document)
+        return converted
+    finally:
+        # Remove temporary directory
+        shutil.rmtree(document_directory, ignore_errors=True)
+
+
+def check_document(document):
+    """Ensure a document may be converted"""
     # Ensure whitelisted file extension
-    if extension.lower().strip() not in SUPPORTED_DOCUMENT_EXTENSIONS:
+    if document["extension"].lower().strip() not in SUPPORTED_DOCUMENT_EXTENSIONS:
         raise DocumentExtensionError()
 
-    input_file = path.original_path(doc_id, slug, extension)
+    input_file = path.original_path(
+        document["doc_id"], document["slug"], document["extension"]
+    )
 
     # Ensure non-PDF document size is within the limit
     if storage.size(input_file) > DOCUMENT_SIZE_LIMIT:
         # If not, remove the PDF
-        storage.delete(path.path(doc_id))
+        storage.delete(path.path(document["doc_id"]))
         raise DocumentSizeError()
 
-    # Run conversion
-    convert(input_file, doc_id, slug)
 
-    # Delete the original file
-    storage.delete(input_file)
+@pubsub_function(REDIS, DOCUMENT_CONVERT_TOPIC)
+def run_document_conversion(data, _context=None):
+    """Converts documents passed in to PDF and triggers PDF extraction.
 
-    # Trigger PDF processing (output file should be expected doc path)
-    publisher.publish(PDF_PROCESS_TOPIC, data=encode_pubsub_data(data))
+    The data is either a single document, or a batch of documents under
+    "documents" to convert together.
+    """
+    data = get_pubsub_data(data)
+    batch = "documents" in data
+    documents = data["documents"] if batch else [data]
+
+    errors = {}
+    checked = []
+    for document in documents:
+        doc_id = document["doc_id"]
+        logger.info(
+            "[DOCUMENT CONVERSION] doc_id %s extension %s",
+            doc_id,
+            document["extension"],
+        )
+        if batch and not utils.still_processing(REDIS, doc_id):
+            continue
+        try:
+            check_document(document)
+        except (DocumentExtensionError, DocumentSizeError) as exc:
+            errors[doc_id] = exc
+        else:
+            checked.append(document)
+
+    # Run conversion
+    converted = convert(checked) if checked else []
+    converted_ids = {document["doc_id"] for document in converted}
+    for document in checked:
+        if document["doc_id"] not in converted_ids:
+            errors[document["doc_id"]] = DocumentConversionError()
+
+    for document in converted:
+        # Delete the original file
+        storage.delete(
+            path.original_path(
+                document["doc_id"], document["slug"], document["extension"]
+            )
+        )
+
+        # Trigger PDF processing (output file should be expected doc path)
+        publisher.publish(PDF_PROCESS_TOPIC, data=encode_pubsub_data(document))
+
+    if not batch and errors:
+        raise errors[data["doc_id"]]
+    for doc_id, exc in errors.items():
+        utils.send_error(REDIS, doc_id, exc=exc)
@@ -0,0 +1,317 @@
+"""
+A LibreOffice instance kept running between document conversions.
+
+Starting LibreOffice takes far longer than converting the typical small
+document, so the office is started once and left listening on a local port.
+Documents are converted by driving the office over that connection with UNO,
+one at a time, rather than with further soffice invocations.
+
+Conversions may run in a different process than the one which started the
+office, so the office's process id is kept in a file in its directory.  A
+document the office fails to convert is left out.  If the office dies or hangs
+on a document, it is killed and started again for the documents after it.
+Every document of a conversion shares a single deadline, so a conversion never
+runs past the time it has been given.
+
+LibreOffice's Python bridge is loaded from the office's program directory.  If
+it is missing, documents are converted with a soffice invocation instead, which
+hands them to the running office over its profile's pipe.
+"""
+
+# Standard Library
+import fcntl
+import logging
+import os
+import signal
+import socket
+import subprocess
+import sys
+import time
+from concurrent import futures
+from pathlib import Path
+
+logger = logging.getLogger(__name__)
+
+OFFICE_ARGS = [
+    "--headless",
+    "--invisible",
+    "--nodefault",
+    "--norestore",
+    "--nofirststartwizard",
+    "--nolockcheck",
+    "--nologo",
+]
+
+# The PDF export filter for each kind of document, by the service it supports,
+# falling back to the text document filter
+PDF_FILTERS = [
+    ("com.sun.star.sheet.SpreadsheetDocument", "calc_pdf_Export"),
+    ("com.sun.star.presentation.PresentationDocument", "impress_pdf_Export"),
+    ("com.sun.star.drawing.DrawingDocument", "draw_pdf_Export"),
+]
+DEFAULT_PDF_FILTER = "writer_pdf_Export"
+
+
+class OfficeError(Exception):
+    pass
+
+
+def import_uno(program_directory):
+    """Import LibreOffice's Python bridge from the office's program directory"""
+    # pylint: disable=import-outside-toplevel, import-error
+    if program_directory not in sys.path:
+        sys.path.append(program_directory)
+    os.environ.setdefault(
+        "URE_BOOTSTRAP",
+        "vnd.sun.star.pathname:" + os.path.join(program_directory, "fundamentalrc"),
+    )
+    # Third Party
+    import uno
+
+    return uno
+
+
+class UnoClient:
+    """Converts documents with an office over its UNO connection"""
+
+    def __init__(self, binary, port):
+        self.uno = import_uno(os.path.dirname(binary))
+        local_context = self.uno.getComponentContext()
+        resolver = local_context.ServiceManager.createInstanceWithContext(
+            "com.sun.star.bridge.UnoUrlResolver", local_context
+        )
+        context = resolver.resolve(
+            f"uno:socket,host=127.0.0.1,port={port};urp;StarOffice.ComponentContext"
+        )
+        self.desktop = context.ServiceManager.createInstanceWithContext(
+            "com.sun.star.frame.Desktop", context
+        )
+
+    def properties(self, **values):
+        properties = []
+        for name, value in values.items():
+            prop = self.uno.createUnoStruct("com.sun.star.beans.PropertyValue")
+            prop.Name = name
+            prop.Value = value
+            properties.append(prop)
+        return tuple(properties)
+
+    def convert(self, input_path, output_path):
+        """Convert a document to PDF"""
+        document = self.desktop.loadComponentFromURL(
+            self.uno.systemPathToFileUrl(input_path),
+            "_blank",
+            0,
+            self.properties(Hidden=True, ReadOnly=True),
+        )
+        if document is None:
+            raise OfficeError(f"Unable to load {input_path}")
+        try:
+            pdf_filter = next(
+                (
+                    pdf_filter
+                    for service, pdf_filter in PDF_FILTERS
+                    if document.supportsService(service)
+                ),
+                DEFAULT_PDF_FILTER,
+            )
+            document.storeToURL(
+                self.uno.systemPathToFileUrl(output_path),
+                self.properties(FilterName=pdf_filter),
+            )
+        finally:
+            document.close(True)
+
+
+class Office:
+    """A resident LibreOffice process listening on a local port"""
+
+    def __init__(self, binary, directory, port, start_timeout, client=UnoClient):
+        # pylint: disable=too-many-arguments
+        self.binary = binary
+        self.directory = directory
+        self.port = port
+        self.start_timeout = start_timeout
+        self.client = client
+        self.profile = os.path.join(directory, "profile")
+        self.pid_path = os.path.join(directory, "office.pid")
+        self.lock_path = os.path.join(directory, "office.lock")
+
+    def command(self, *args):
+        return [
+            self.binary,
+            *OFFICE_ARGS,
+            f"-env:UserInstallation=file://{self.profile}",
+            *args,
+        ]
+
+    def environment(self):
+        return {**os.environ, "HOME": self.directory, "SAL_DISABLE_CPD": "true"}
+
+    def pid(self):
+        """The process id of the office, or None if it is not alive"""
+        try:
+            with open(self.pid_path) as pid_file:
+                pid = int(pid_file.read())
+            # Check the process is still the office, as process ids are reused
+            with open(f"/proc/{pid}/cmdline", "rb") as cmdline_file:
+                cmdline = cmdline_file.read()
+        except (OSError, ValueError):
+            return None
+        return pid if self.binary.encode("utf8") in cmdline else None
+
+    def listening(self):
+        try:
+            with socket.create_connection(("127.0.0.1", self.port), timeout=1):
+                return True
+        except OSError:
+            return False
+
+    def running(self):
+        """Whether the office has been started and is still alive"""
+        return self.pid() is not None and self.listening()
+
+    def start(self, timeout=None):
+        """Start the office if it is not running, waiting until it listens"""
+        if timeout is None:
+            timeout = self.start_timeout
+        os.makedirs(self.directory, exist_ok=True)
+        with open(self.lock_path, "w") as lock_file:
+            # Only one process may start the office
+            fcntl.flock(lock_file, fcntl.LOCK_EX)
+            if self.running():
+                return
+            self.stop()
+
+            logger.info("[OFFICE] starting")
+            start_time = time.time()
+            # The office is started in its own session, so that it outlives the
+            # process starting it
+            process = subprocess.Popen(  # pylint: disable=consider-using-with
+                self.command(f"--accept=socket,host=127.0.0.1,port={self.port};urp;"),
+                cwd=self.directory,
+                env=self.environment(),
+                stdin=subprocess.DEVNULL,
+                stdout=subprocess.DEVNULL,
+                stderr=subprocess.DEVNULL,
+                start_new_session=True,
+            )
+            with open(self.pid_path, "w") as pid_file:
+                pid_file.write(str(process.pid))
+
+            while not self.listening():
+                if process.poll() is not None:
+                    raise OfficeError(f"Office exited with {process.returncode}")
+                if time.time() - start_time > timeout:
+                    self.stop()
+                    raise OfficeError("Office did not start in time")
+                time.sleep(0.1)
+            logger.info("[OFFICE] started in %.2fs", time.time() - start_time)
+
+    def stop(self):
+        """Kill the office, if it was started"""
+        pid = self.pid()
+        if pid is not None:
+            try:
+                os.killpg(pid, signal.SIGKILL)
+            except OSError:
+                pass
+        try:
+            os.remove(self.pid_path)
+        except OSError:
+            pass
+
+    def call(self, func, *args, timeout):
+        """Call a function driving the office, killing the office if the call
+        does not return in time, which also ends the call"""
+        executor = futures.ThreadPoolExecutor(max_workers=1)
+        try:
+            return executor.submit(func, *args).result(timeout=timeout)
+        except futures.TimeoutError as exc:
+            self.stop()
+            raise OfficeError("Office did not convert in time") from exc
+        finally:
+            executor.shutdown(wait=False)
+
+    def connect(self, deadline):
+        """A client for the running office, or a soffice invocation converting
+        with it if the Python bridge is missing"""
+        try:
+            return self.client(self.binary, self.port)
+        except ImportError as exc:
+            logger.warning("[OFFICE] converting without UNO: %s", exc)
+            return SofficeClient(self, deadline)
+
+    def convert(self, input_paths, output_directory, deadline):
+        """Convert files to PDF with the running office by the deadline,
+        starting it if need be and restarting it if it dies or hangs.  Returns
+        the output path of each input path converted."""
+        os.makedirs(output_directory, exist_ok=True)
+        output_paths = {}
+        client = None
+        for i, input_path in enumerate(input_paths):
+            timeout = deadline - time.time()
+            if timeout <= 0:
+                logger.warning(
+                    "[OFFICE] out of time with %d files left", len(input_paths) - i
+                )
+                break
+            if client is None:
+                try:
+                    self.start(min(self.start_timeout, timeout))
+                    client = self.connect(deadline)
+                except Exception as exc:  # pylint: disable=broad-except
+                    logger.error("[OFFICE] unable to start: %s", exc, exc_info=exc)
+                    break
+
+            # LibreOffice names each output after its input, with a pdf extension
+            output_path = os.path.join(
+                output_directory, Path(input_path).with_suffix(".pdf").name
+            )
+            try:
+                self.call(
+                    client.convert,
+                    input_path,
+                    output_path,
+                    timeout=deadline - time.time(),
+                )
+            except Exception as exc:  # pylint: disable=broad-except
+                logger.warning(
+                    "[OFFICE] unable to convert %s: %s", input_path, exc, exc_info=exc
+                )
+                if not self.running():
+                    # Start the office again for the next file
+                    client = None
+                continue
+            if os.path.exists(output_path):
+                output_paths[input_path] = output_path
+        return output_paths
+
+
+class SofficeClient:
+    """Converts documents with a soffice invocation sharing the running office's
+    profile, for offices without the Python bridge"""
+
+    def __init__(self, office, deadline):
+        self.office = office
+        self.deadline = deadline
+
+    def convert(self, input_path, output_path):
+        # The invocation is killed at the deadline, in case it started an
+        # office of its own rather than handing the file over
+        subprocess.run(
+            self.office.command(
+                "--convert-to",
+                "pdf",
+                "--outdir",
+                os.path.dirname(output_path),
+                input_path,
+            ),
+            cwd=self.office.directory,
+            env=self.office.environment(),
+            stdin=subprocess.DEVNULL,
+            stdout=subprocess.DEVNULL,
+            stderr=subprocess.DEVNULL,
+            timeout=max(self.deadline - time.time(), 0),
+            check=True,
+        )
@@ -7,6 +7,9 @@ The abstraction allows for in-memory PDF files passed in as
 BytesIO objects instead of files on the filesystem.
 """
 
+# Standard Library
+from pathlib import Path
+
 
 class MockPath:
     """Mocks a filesystem-like object with a non-zero file size."""
@@ -46,7 +49,9 @@ class GraftContext:
         redo_ocr = False
         keep_temporary_files = False
 
-    def __init__(self, graft_module, pdf_document_mem_file, pdf_document):
+    def __init__(
+        self, graft_module, pdf_document_mem_file, pdf_document, temp_directory=None
+    ):
         self.origin = pdf_document_mem_file
         self.doc = pdf_document
         self.pdfinfo = PdfInfo(self.doc)
@@ -56,4 +61,7 @@ class GraftContext:
 
         # Hook up other mocks
         self.options = GraftContext.GraftOptions
-        self.get_path = lambda _: None
+        # Intermediate files are written to the temporary directory, if given
+        self.get_path = lambda name: (
+            Path(temp_directory) / name if temp_directory is not None else None
+        )
@@ -0,0 +1,497 @@
+"""
+Redaction of a PDF file's pages as an incremental update.
+
+Rather than rewriting the whole file, each redacted page is replaced by a new
+page object drawing an image of the redacted page.  The new objects are appended
+to the file along with a cross-reference section and trailer for just them, as
+a table or, if the file's last section is one, a stream, so the rest of the
+file is left byte for byte as it was.
+
+So that nothing redacted can be recovered from the earlier revision of the file,
+the data of every stream reachable from the replaced pages (their content
+streams, thumbnails and everything their resources lead to, such as XObjects,
+masks, patterns, shadings, Type 3 glyphs and soft mask groups) is overwritten
+with zeros in place, which keeps the offset of every other object valid.
+Streams reachable from anywhere else in the page tree are left alone, as their
+contents are visible there anyway.
+
+Files which are encrypted, which have been updated incrementally before (as
+earlier revisions of the scrubbed objects would be left in the file), whose
+redacted pages have annotations or inherit their resources, whose structure
+tree has alternate or replacement text for the redacted pages, or which have
+streams to scrub that can not be located, raise IncrementalRedactionError for
+the caller to rewrite the whole file instead.
+"""
+
+# Standard Library
+import io
+import re
+import uuid
+import zlib
+
+# Third Party
+import pikepdf
+from pikepdf import Array, Dictionary, Name, Stream
+
+# How far from the start of the file to look for the PDF header
+HEAD_SIZE = 1024
+# How far from the end of the file to look for the last cross-reference section
+TAIL_SIZE = 1024
+# The end of a stream's dictionary, up to the start of its data
+STREAM_KEYWORD = re.compile(rb">>\s*stream(\r\n|\n)")
+# The length of the file a linearization dictionary is for
+LINEARIZED_LENGTH = re.compile(rb"<<[^>]*/Linearized\b[^>]*/L\s+(\d+)")
+# Structure element entries holding text kept outside of the pages' streams
+STRUCTURE_TEXT_KEYS = ("/ActualText", "/Alt", "/E")
+
+
+class IncrementalRedactionError(Exception):
+    """The file can not be redacted with an incremental update"""
+
+
+class StorageFile(io.RawIOBase):
+    """A read-only file object over a StorageHandler, for pikepdf to parse a file
+    in storage reading only the parts of it that it needs"""
+
+    def __init__(self, handler):
+        super().__init__()
+        self.handler = handler
+        self.position = 0
+
+    def readable(self):
+        return True
+
+    def seekable(self):
+        return True
+
+    def seek(self, position, whence=io.SEEK_SET):
+        if whence == io.SEEK_CUR:
+            position += self.position
+        elif whence == io.SEEK_END:
+            position += self.handler.size
+        self.position = max(position, 0)
+        return self.position
+
+    def tell(self):
+        return self.position
+
+    def readinto(self, buffer):
+        size = min(len(buffer), self.handler.size - self.position)
+        if size <= 0:
+            return 0
+        buffer[:size] = self.handler.read(self.position, size)
+        self.position += size
+        return size
+
+
+def find_page(pdf, page_number):
+    """The object of a page, found by descending the page tree by the page counts
+    of its nodes rather than listing every page"""
+    node = pdf.Root.Pages
+    while True:
+        for kid in node.Kids:
+            if "/Kids" in kid:
+                count = int(kid.Count)
+                if page_number < count:
+                    node = kid
+                    break
+                page_number -= count
+            elif page_number == 0:
+                return kid
+            else:
+                page_number -= 1
+        else:
+            raise IncrementalRedactionError("Page is missing from the page tree")
+
+
+def add_reachable_streams(node, streams, skipped=("/Parent",)):
+    """Add the object numbers and generations of every stream reachable from a
+    page or page tree node to a set, other than through the skipped keys.  Other
+    pages and page tree nodes are not descended into."""
+    visited = set()
+    objects = [node[key] for key in node.keys() if key not in skipped]
+    while objects:
+        obj = objects.pop()
+        if isinstance(obj, Array):
+            objects.extend(obj)
+            continue
+        if not isinstance(obj, (Dictionary, Stream)):
+            continue
+        if obj.is_indirect:
+            if obj.objgen in visited:
+                continue
+            visited.add(obj.objgen)
+            if isinstance(obj, Stream):
+                streams.add(obj.objgen)
+        if obj.get("/Type") in (Name.Page, Name.Pages):
+            continue
+        objects.extend(obj[key] for key in obj.keys() if key != "/Parent")
+
+
+def shared_streams(pdf, excluded):
+    """The streams reachable from anywhere in the page tree other than the
+    excluded pages, including the annotations of other pages, or from the
+    interactive form"""
+    streams = set()
+    visited = set()
+    nodes = [pdf.Root.Pages]
+    while nodes:
+        node = nodes.pop()
+        if node.objgen in visited or node.objgen in excluded:
+            continue
+        visited.add(node.objgen)
+        add_reachable_streams(node, streams, ("/Parent", "/Kids"))
+        nodes.extend(node.get("/Kids", []))
+    acroform = pdf.Root.get("/AcroForm")
+    if acroform is not None:
+        add_reachable_streams(acroform, streams)
+    return streams
+
+
+def structure_pages(element, page, redacted, visited):
+    """The pages the content of a structure element is on, as object numbers
+    and generations.  Raises if an element with alternate or replacement text
+    has content on a redacted page, or on no known page, as that text is not in
+    any stream to scrub."""
+    if not isinstance(element, Dictionary):
+        # Marked content on the page of its parent element
+        return {page} if page is not None else set()
+    if element.is_indirect:
+        if element.objgen in visited:
+            return set()
+        visited.add(element.objgen)
+    if "/Pg" in element:
+        page = element.Pg.objgen
+
+    if element.get("/Type") in (Name.MCR, Name.OBJR):
+        pages = {page} if page is not None else set()
+    else:
+        kids = element.get("/K")
+        if kids is None:
+            kids = []
+        elif not isinstance(kids, Array):
+            kids = [kids]
+        pages = set()
+        for kid in kids:
+            pages |= structure_pages(kid, page, redacted, visited)
+
+    if any(key in element for key in STRUCTURE_TEXT_KEYS) and (
+        not pages or pages & redacted
+    ):
+        raise IncrementalRedactionError(
+            "The structure tree has text for a redacted page"
+        )
+    return pages
+
+
+def header_offset(head):
+    """The offset of the PDF header from the start of a file, which offsets in
+    the file are relative to"""
+    offset = head.find(b"%PDF-")
+    if offset < 0:
+        raise IncrementalRedactionError("Unable to find the PDF header")
+    return offset
+
+
+def updated(trailer, head, size):
+    """Whether a file has been updated incrementally.  A linearized file's first
+    page section points back to the rest of its cross-reference without being an
+    update, as long as the file has its linearized length."""
+    if "/Prev" not in trailer:
+        return False
+    match = LINEARIZED_LENGTH.search(head)
+    return match is None or int(match.group(1)) != size
+
+
+def start_xref(tail):
+    """The offset of the last cross-reference section from the end of a file"""
+    matches = list(re.finditer(rb"startxref\s+(\d+)", tail))
+    if not matches:
+        raise IncrementalRedactionError("Unable to find the cross-reference offset")
+    return int(matches[-1].group(1))
+
+
+def number(value):
+    """Format a number for PDF syntax"""
+    return f"{value:.4f}".rstrip("0").rstrip(".").encode("ascii")
+
+
+def image_object(image):
+    """An image XObject of a PIL image"""
+    data = zlib.compress(image.convert("RGB").tobytes())
+    return (
+        b"<< /Type /XObject /Subtype /Image /Width %d /Height %d "
+        b"/ColorSpace /DeviceRGB /BitsPerComponent 8 /Filter /FlateDecode "
+        b"/Length %d >>\nstream\n%s\nendstream"
+        % (image.width, image.height, len(data), data)
+    )
+
+
+def content_object(width, height):
+    """A content stream drawing the page's image over the whole page"""
+    content = b"q %s 0 0 %s 0 0 cm /Im0 Do Q" % (number(width), number(height))
+    return b"<< /Length %d >>\nstream\n%s\nendstream" % (len(content), content)
+
+
+def page_object(parent, width, height, image_number, content_number):
+    """A page drawing just an image.  The boxes and rotation are set explicitly
+    to override any inherited from the page tree."""
+    box = b"[0 0 %s %s]" % (number(width), number(height))
+    return (
+        b"<< /Type /Page /Parent %d %d R /MediaBox %s /CropBox %s /Rotate 0 "
+        b"/Resources << /XObject << /Im0 %d 0 R >> >> /Contents %d 0 R >>"
+        % (*parent, box, box, image_number, content_number)
+    )
+
+
+def object_runs(offsets):
+    """The objects of the given offsets, in runs of consecutive object numbers"""
+    objects = sorted(offsets)
+    runs = []
+    run_start = 0
+    for i, (object_number, _) in enumerate(objects):
+        if i + 1 < len(objects) and objects[i + 1][0] == object_number + 1:
+            continue
+        runs.append(objects[run_start : i + 1])
+        run_start = i + 1
+    return runs
+
+
+def xref_section(offsets):
+    """A cross-reference table for the given objects' offsets, with a subsection
+    for each run of consecutive object numbers"""
+    lines = [b"xref\n"]
+    for run in object_runs(offsets):
+        lines.append(b"%d %d\n" % (run[0][0], len(run)))
+        lines.extend(
+            b"%010d %05d n\r\n" % (offsets[objgen], objgen[1]) for objgen in run
+        )
+    return b"".join(lines)
+
+
+def xref_stream(offsets, trailer):
+    """A cross-reference stream for the given objects' offsets, including its
+    own, with the trailer's entries"""
+    runs = object_runs(offsets)
+    offset_width = max(4, -(-max(offsets.values()).bit_length() // 8))
+    data = b"".join(
+        b"\x01"
+        + offsets[objgen].to_bytes(offset_width, "big")
+        + objgen[1].to_bytes(2, "big")
+        for run in runs
+        for objgen in run
+    )
+    index = b" ".join(b"%d %d" % (run[0][0], len(run)) for run in runs)
+    dictionary = b"/Type /XRef /W [1 %d 2] /Index [%s] %s" % (
+        offset_width,
+        index,
+        b" ".join(trailer),
+    )
+    return b"<< %s /Length %d >>\nstream\n%s\nendstream" % (dictionary, len(data), data)
+
+
+class IncrementalRedaction:
+    """Redaction of pages of a PDF file opened through a StorageHandler"""
+
+    def __init__(self, pdf_file, page_numbers):
+        self.pdf_file = pdf_file
+        self.page_numbers = sorted(page_numbers)
+        try:
+            self.pdf = pikepdf.open(
+                StorageFile(pdf_file), access_mode=pikepdf.AccessMode.stream
+            )
+        except pikepdf.PdfError as exc:
+            raise IncrementalRedactionError(f"Unable to parse the file: {exc}") from exc
+
+        try:
+            self.pages = self.find_pages()
+        except Exception:
+            self.close()
+            raise
+
+    def find_pages(self):
+        """The objects of the redacted pages, by page number"""
+        if self.pdf.is_encrypted:
+            raise IncrementalRedactionError("The file is encrypted")
+        size = self.pdf_file.size
+        if updated(self.pdf.trailer, self.pdf_file.read(0, min(HEAD_SIZE, size)), size):
+            raise IncrementalRedactionError("The file has been updated incrementally")
+
+        pages = {}
+        for page_number in self.page_numbers:
+            try:
+                page = find_page(self.pdf, page_number)
+            except (AttributeError, KeyError, ValueError, pikepdf.PdfError) as exc:
+                raise IncrementalRedactionError(
+                    f"Unable to read the page tree: {exc}"
+                ) from exc
+            if "/Annots" in page:
+                raise IncrementalRedactionError("A redacted page has annotations")
+            if "/Resources" not in page:
+                raise IncrementalRedactionError("A redacted page inherits resources")
+            pages[page_number] = page
+        structure = self.pdf.Root.get("/StructTreeRoot")
+        if structure is not None:
+            redacted = {page.objgen for page in pages.values()}
+            structure_pages(structure, None, redacted, set())
+        self.check_damage()
+        return pages
+
+    def check_damage(self):
+        """Raise if parsing the file ran into any damage, as its offsets can not
+        be trusted to be appended to"""
+        for warning in self.pdf.get_warnings():
+            if "file is damaged" in warning:
+                raise IncrementalRedactionError(warning)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+
+    def close(self):
+        self.pdf.close()
+
+    def locate_stream_data(self, stream):
+        """The (start, end) range of a stream's data in the file.
+
+        The stream's object is looked for in the ranges read to open the file and
+        load its pages, which hold every object the redacted pages read.
+        """
+        data = stream.read_raw_bytes()
+        header = re.compile(rb"(?<![0-9])%d\s+%d\s+obj\b" % stream.objgen)
+        for start, contents in self.pdf_file.prefetched:
+            for match in header.finditer(contents):
+                keyword = STREAM_KEYWORD.search(contents, match.end())
+                if keyword is None:
+                    continue
+                data_start = start + keyword.end()
+                if self.pdf_file.read(data_start, len(data)) == data:
+                    return data_start, data_start + len(data)
+        raise IncrementalRedactionError(f"Unable to locate stream {stream.objgen}")
+
+    def scrubbed_ranges(self):
+        """The ranges of the data of the streams only the redacted pages reach"""
+        pages = {page.objgen for page in self.pages.values()}
+        reachable = set()
+        for page in self.pages.values():
+            add_reachable_streams(page, reachable)
+        ranges = [
+            self.locate_stream_data(self.pdf.get_object(objgen))
+            for objgen in reachable - shared_streams(self.pdf, pages)
+        ]
+        self.check_damage()
+        return sorted(ranges)
+
+    def update(self, images):
+        """Build the incremental update replacing the redacted pages.
+
+        `images` maps each redacted page number to its rendered image, with its
+        width and height in points.
+
+        Returns:
+            The update to append to the file, the (start, end) ranges of its
+            cross-reference section and trailer, and a dict of the ranges of each
+            page's new objects, all as offsets in the updated file.
+        """
+        # pylint: disable=too-many-locals
+        size = self.pdf_file.size
+        header = header_offset(self.pdf_file.read(0, min(HEAD_SIZE, size)))
+        tail_start = max(size - TAIL_SIZE, 0)
+        previous_xref = start_xref(self.pdf_file.read(tail_start, size - tail_start))
+        # The update's cross-reference section is of the same kind as the last
+        xref_table = (
+            self.pdf_file.read(header + previous_xref, 16).lstrip().startswith(b"xref")
+        )
+        next_number = int(self.pdf.trailer.Size)
+
+        objects = {}
+        page_objects = {}
+        for page_number in self.page_numbers:
+            image, width, height = images[page_number]
+            page = self.pages[page_number]
+            image_number, content_number = next_number, next_number + 1
+            next_number += 2
+            objects[(image_number, 0)] = image_object(image)
+            objects[(content_number, 0)] = content_object(width, height)
+            objects[page.objgen] = page_object(
+                page.Parent.objgen, width, height, image_number, content_number
+            )
+            page_objects[page_number] = [
+                page.objgen,
+                (image_number, 0),
+                (content_number, 0),
+            ]
+
+        # The update starts on a new line after the end of the file
+        parts = [b"\n"]
+        position = size + 1
+        offsets = {}
+        ranges = {}
+        for objgen, body in sorted(objects.items()):
+            contents = b"%d %d obj\n%s\nendobj\n" % (*objgen, body)
+            offsets[objgen] = position - header
+            ranges[objgen] = (position, position + len(contents))
+            parts.append(contents)
+            position += len(contents)
+
+        if not xref_table:
+            xref_objgen = (next_number, 0)
+            next_number += 1
+        trailer = [
+            b"/Size %d" % next_number,
+            b"/Root %d %d R" % self.pdf.Root.objgen,
+            b"/Prev %d" % previous_xref,
+        ]
+        info = self.pdf.trailer.get("/Info")
+        if info is not None and info.is_indirect:
+            trailer.append(b"/Info %d %d R" % info.objgen)
+        document_id = self.pdf.trailer.get("/ID")
+        if document_id is not None:
+            trailer.append(
+                b"/ID [<%s> <%s>]"
+                % (bytes(document_id[0]).hex().encode(), uuid.uuid4().hex.encode())
+            )
+        xref_start = position
+        if xref_table:
+            parts.append(xref_section(offsets))
+            parts.append(b"trailer\n<< %s >>\n" % b" ".join(trailer))
+        else:
+            offsets[xref_objgen] = xref_start - header
+            parts.append(
+                b"%d %d obj\n%s\nendobj\n"
+                % (*xref_objgen, xref_stream(offsets, trailer))
+            )
+        parts.append(b"startxref\n%d\n%%%%EOF\n" % (xref_start - header))
+
+        contents = b"".join(parts)
+        return (
+            contents,
+            [(xref_start, size + len(contents))],
+            {
+                page_number: [ranges[objgen] for objgen in objgens]
+                for page_number, objgens in page_objects.items()
+            },
+        )
+
+
+def compose_parts(filename, size, scrubbed, update):
+    """The parts of the updated file, as (filename, start, end) ranges of the
+    original file and bytes, for `storage.compose`"""
+    parts = []
+    position = 0
+    for start, end in scrubbed:
+        if start < position:
+            # Overlapping ranges have already been scrubbed
+            start = position
+        if start >= end:
+            continue
+        if position < start:
+            parts.append((filename, position, start))
+        parts.append(bytes(end - start))
+        position = end
+    if position < size:
+        parts.append((filename, position, size))
+    parts.append(update)
+    return parts
@@ -2,20 +2,18 @@
 import collections
 import copy
 import csv
-import gzip
 import io
 import itertools
 import json
 import logging
-import pickle
+import os
+import tempfile
 import time
 from random import randint
 from urllib.parse import urljoin
 
 # Third Party
 import environ
-import pdfplumber
-import redis
 import requests
 from botocore.exceptions import ClientError
 from listcrunch import crunch_collection
@@ -35,25 +33,50 @@ logging.getLogger("pdfminer").setLevel(logging.WARNING)
 if env.str("ENVIRONMENT").startswith("local"):
     # DocumentCloud
     from documentcloud.documents.processing.info_and_image import graft
-    from documentcloud.common import access_choices, path, redis_fields
+    from documentcloud.common import access_choices, path, redis_fields, text_positions
+    from documentcloud.common.page_map import ANGLE_TABLE, build_page_map
+    from documentcloud.common.page_text import PageTextStore
     from documentcloud.common.environment import (
         encode_pubsub_data,
         get_pubsub_data,
         publisher,
         storage,
     )
-    from documentcloud.common.serverless import utils
+    from documentcloud.common.serverless import (
+        asset_cache,
+        checkpoint,
+        telemetry,
+        utils,
+    )
     from documentcloud.common.serverless.utils import REDIS_TTL
+    from documentcloud.common.serverless.batch_planner import (
+        IMAGE_STAGE,
+        OCR_STAGE,
+        TEXT_POSITION_STAGE,
+        BatchPlanner,
+        page_weights,
+    )
     from documentcloud.common.serverless.error_handling import (
         pubsub_function,
         pubsub_function_import,
     )
+    from documentcloud.common.text_positions import TEXT_POSITION_PACKED
     from documentcloud.documents.processing.info_and_image.graft_adapter import (
         GraftContext,
     )
+    from documentcloud.documents.processing.info_and_image.incremental import (
+        IncrementalRedaction,
+        IncrementalRedactionError,
+        compose_parts,
+    )
+    from documentcloud.documents.processing.info_and_image.page_index import (
+        PageIndex,
+        accesses_to_ranges,
+    )
     from documentcloud.documents.processing.info_and_image.pdfium import (
         StorageHandler,
         Workspace,
+        storage_sha1,
     )
 else:
     # Third Party
@@ -61,18 +84,34 @@ else:
 
     # only initialize sentry on serverless
     import sentry_sdk
-    from common import access_choices, path, redis_fields
+    from common import access_choices, path, redis_fields, text_positions
+    from common.page_map import ANGLE_TABLE, build_page_map
+    from common.page_text import PageTextStore
     from common.environment import (
         encode_pubsub_data,
         get_pubsub_data,
         publisher,
         storage,
     )
-    from common.serverless import utils
+    from common.serverless import asset_cache, checkpoint, telemetry, utils
     from common.serverless.utils import REDIS_TTL
+    from common.serverless.batch_planner import (
+        IMAGE_STAGE,
+        OCR_STAGE,
+        TEXT_POSITION_STAGE,
+        BatchPlanner,
+        page_weights,
+    )
     from common.serverless.error_handling import pubsub_function, pubsub_function_import
+    from common.text_positions import TEXT_POSITION_PACKED
     from graft_adapter import GraftContext
-    from pdfium import StorageHandler, Workspace
+    from incremental import (
+        IncrementalRedaction,
+        IncrementalRedactionError,
+        compose_parts,
+    )
+    from page_index import PageIndex, accesses_to_ranges
+    from pdfium import StorageHandler, Workspace, storage_sha1
     from sentry_sdk.integrations.aws_lambda import AwsLambdaIntegration
     from sentry_sdk.integrations.redis import RedisIntegration
 
@@ -81,21 +120,61 @@ else:
     )
 
 
-IMAGE_SUFFIX = ".gif"
+IMAGE_CONTENT_TYPE = f"image/{path.IMAGE_SUFFIX}"
 IMAGE_BATCH = env.int(
     "EXTRACT_IMAGE_BATCH", default=55
 )  # Number of images to extract with each function
+IMAGE_UPLOAD_BATCH = env.int(
+    "IMAGE_UPLOAD_BATCH", default=IMAGE_BATCH
+)  # Number of pages worth of images to upload concurrently
 OCR_BATCH = env.int("OCR_BATCH", 1)  # Number of pages to OCR with each function
 TEXT_POSITION_BATCH = env.int(
     "TEXT_POSITION_BATCH", 3
 )  # Number of pages to pull text positions from with each function
+IMAGE_BATCH_MAX = env.int(
+    "EXTRACT_IMAGE_BATCH_MAX", default=200
+)  # Most images to extract with each function when batches are planned
+OCR_BATCH_MAX = env.int(
+    "OCR_BATCH_MAX", 8
+)  # Most pages to OCR with each function when batches are planned
+TEXT_POSITION_BATCH_MAX = env.int(
+    "TEXT_POSITION_BATCH_MAX", 30
+)  # Most pages to pull text positions from with each function when planned
 PDF_SIZE_LIMIT = env.int("PDF_SIZE_LIMIT", 501 * 1024 * 1024)
 BLOCK_SIZE = env.int(
     "BLOCK_SIZE", 8 * 1024 * 1024
 )  # Block size to use for reading chunks of the PDF
+BLOCK_CACHE_SIZE = env.int(
+    "BLOCK_CACHE_SIZE", 64 * 1024 * 1024
+)  # Most bytes of the PDF to keep in memory as cached blocks
+CACHE_BLOCKS = max(BLOCK_CACHE_SIZE // BLOCK_SIZE, 1)
+READ_AHEAD_BLOCKS = env.int(
+    "READ_AHEAD_BLOCKS", 1
+)  # Blocks of the PDF to read ahead in the background when read sequentially
+INDEX_PAGE_RANGES = env.bool(
+    "INDEX_PAGE_RANGES", default=True
+)  # Whether to index the ranges read to load each page, not just the document
+PREFETCH_GAP = env.int(
+    "PREFETCH_GAP", 64 * 1024
+)  # Indexed ranges closer than this are fetched with a single ranged read
+SPOOL_DIRECTORY = env.str(
+    "SPOOL_DIRECTORY", default=tempfile.gettempdir()
+)  # Local directory to spool PDFs which must be read in full
 TEXT_READ_BATCH = env.int("TEXT_READ_BATCH", 1000)
 IMPORT_OCR_VERSION = env.str("IMPORT_OCR_VERSION", default="dc-import")
+OCR_INLINE = env.bool(
+    "OCR_INLINE", default=False
+)  # OCR pages straight from the render when OCR runs alongside extraction (local)
+TEXT_POSITION_INLINE = env.bool(
+    "TEXT_POSITION_INLINE", default=True
+)  # Extract text positions of pages with embedded text during image extraction
 IMPORT_DOCS_BATCH = env.int("IMPORT_DOCS_BATCH", 10000)
+GRAFT_WINDOW = env.int(
+    "GRAFT_WINDOW", 100
+)  # Number of pages to graft between checkpoints of the grafted PDF to disk
+MODIFY_COPY_ASSETS = env.bool(
+    "MODIFY_COPY_ASSETS", default=True
+)  # Copy the assets of unrotated pages to their new positions when modifying
 
 
 def parse_extract_width(width_str):
@@ -120,6 +199,13 @@ IMAGE_WIDTHS = [
 OCR_IMAGE_INDEX = env.int("IMAGE_EXTRACT_OCR_INDEX", 1)
 REDIS = utils.get_redis()
 
+# Planners sizing the batches handed to each stage
+IMAGE_PLANNER = BatchPlanner(REDIS, IMAGE_STAGE, IMAGE_BATCH, IMAGE_BATCH_MAX)
+OCR_PLANNER = BatchPlanner(REDIS, OCR_STAGE, OCR_BATCH, OCR_BATCH_MAX)
+TEXT_POSITION_PLANNER = BatchPlanner(
+    REDIS, TEXT_POSITION_STAGE, TEXT_POSITION_BATCH, TEXT_POSITION_BATCH_MAX
+)
+
 # Topic names for the messaging queue
 PDF_PROCESS_TOPIC = publisher.topic_path(
     "documentcloud", env.str("PDF_PROCESS_TOPIC", default="pdf-process")
@@ -156,8 +242,6 @@ FINISH_IMPORT_TOPIC = publisher.topic_path(
     "documentcloud", env.str("FINISH_IMPORT_TOPIC", default="finish-import")
 )
 
-ANGLE_TABLE = {"": 0, "cc": 1, "hw": 2, "ccw": 3}
-
 
 def millis():
     """Get the current time in milliseconds"""
@@ -170,52 +254,43 @@ class PdfSizeError(Exception):
 
 def initialize_redis_page_data(doc_id, page_count):
     """Initialize Redis fields to manage page dimensions and processing"""
-    dimensions_field = redis_fields.dimensions(doc_id)
     image_bits_field = redis_fields.image_bits(doc_id)
     text_bits_field = redis_fields.text_bits(doc_id)
     text_position_bits_field = redis_fields.text_position_bits(doc_id)
 
-    def dimensions_field_update(pipeline):
-        existing_dimensions = pipeline.smembers(dimensions_field)
+    pipeline = REDIS.pipeline()
 
-        # Put the pipeline back in multi mode
-        pipeline.multi()
+    # Set the page count field
+    pipeline.set(redis_fields.page_count(doc_id), page_count, ex=REDIS_TTL)
 
-        # Set the page count field
-        pipeline.set(redis_fields.page_count(doc_id), page_count, ex=REDIS_TTL)
+    # Set pages and texts remaining to page count
+    pipeline.set(redis_fields.images_remaining(doc_id), page_count, ex=REDIS_TTL)
+    pipeline.set(redis_fields.texts_remaining(doc_id), page_count, ex=REDIS_TTL)
+    pipeline.set(
+        redis_fields.text_positions_remaining(doc_id), page_count, ex=REDIS_TTL
+    )
 
-        # Set pages and texts remaining to page count
-        pipeline.set(redis_fields.images_remaining(doc_id), page_count, ex=REDIS_TTL)
-        pipeline.set(redis_fields.texts_remaining(doc_id), page_count, ex=REDIS_TTL)
-        pipeline.set(
-            redis_fields.text_positions_remaining(doc_id), page_count, ex=REDIS_TTL
-        )
+    # Set Redis bit arrays flooded to 0 to track each page
+    pipeline.delete(image_bits_field)
+    pipeline.delete(text_bits_field)
+    pipeline.delete(text_position_bits_field)
+    pipeline.setbit(image_bits_field, page_count - 1, 0)
+    pipeline.setbit(text_bits_field, page_count - 1, 0)
+    pipeline.setbit(text_position_bits_field, page_count - 1, 0)
+    pipeline.expire(image_bits_field, REDIS_TTL)
+    pipeline.expire(text_bits_field, REDIS_TTL)
+    pipeline.expire(text_position_bits_field, REDIS_TTL)
 
-        # Set Redis bit arrays flooded to 0 to track each page
-        pipeline.delete(image_bits_field)
-        pipeline.delete(text_bits_field)
-        pipeline.delete(text_position_bits_field)
-        pipeline.setbit(image_bits_field, page_count - 1, 0)
-        pipeline.setbit(text_bits_field, page_count - 1, 0)
-        pipeline.setbit(text_position_bits_field, page_count - 1, 0)
-        pipeline.expire(image_bits_field, REDIS_TTL)
-        pipeline.expire(text_bits_field, REDIS_TTL)
-        pipeline.expire(text_position_bits_field, REDIS_TTL)
-
-        # Remove any existing dimensions that may be lingering
-        if existing_dimensions is not None:
-            for dimension in existing_dimensions:
-                dimension = dimension.decode("utf8")
-                pipeline.delete(redis_fields.page_dimension(doc_id, dimension))
-        pipeline.delete(dimensions_field)
-
-        # Remove any existing page text
-        pipeline.delete(redis_fields.page_text(doc_id))
-        pipeline.delete(redis_fields.page_text_pdf(doc_id))
-
-    # Ensure atomicity while getting a value with the transaction wrapper around WATCH
-    # See https://pypi.org/project/redis/#pipelines for details
-    REDIS.transaction(dimensions_field_update, dimensions_field)
+    # Remove any existing dimensions that may be lingering
+    pipeline.delete(redis_fields.page_dimensions(doc_id))
+
+    # Remove any existing page text
+    pipeline.delete(redis_fields.page_text(doc_id))
+    pipeline.delete(redis_fields.page_text_pdf(doc_id))
+    pipeline.delete(redis_fields.page_text_positions(doc_id))
+
+    # Execute the pipeline atomically
+    pipeline.execute()
 
 
 def initialize_partial_redis_page_data(doc_id, page_count, dirty_pages):
@@ -257,27 +332,57 @@ def initialize_partial_redis_page_data(doc_id, page_count, dirty_pages):
     # Remove any existing page text
     pipeline.delete(redis_fields.page_text(doc_id))
     pipeline.delete(redis_fields.page_text_pdf(doc_id))
+    pipeline.delete(redis_fields.page_text_positions(doc_id))
 
     # Execute the pipeline atomically
     pipeline.execute()
 
 
-def write_cache(filename, cache):
-    """Helper method to write a cache file."""
-    mem_file = io.BytesIO()
-    with gzip.open(mem_file, "wb") as zip_file:
-        pickle.dump(cache, zip_file)
+def index_document(doc, pdf_file, page_ranges=INDEX_PAGE_RANGES):
+    """Record the ranges of a PDF file read to open it and load its pages.
+
+    `pdf_file` must be a recording StorageHandler the document was opened from.
+
+    Returns:
+        The encoded page index.
+    """
+    # Load the final page to memoize the accesses to the whole page tree
+    page_count = doc.page_count
+    with doc.load_page(page_count - 1):
+        pass
+    document_ranges = accesses_to_ranges(pdf_file.accesses)
+
+    pages = [[] for _ in range(page_count)]
+    if page_ranges:
+        # Load each remaining page to record what it reads beyond that
+        for page_number in range(page_count - 1):
+            mark = len(pdf_file.accesses)
+            with doc.load_page(page_number):
+                pass
+            pages[page_number] = accesses_to_ranges(pdf_file.accesses[mark:])
 
-    storage.simple_upload(filename, mem_file.getvalue(), access=access_choices.PRIVATE)
-    mem_file.close()
+    return PageIndex.encode(pdf_file.size, document_ranges, pages)
+
+
+def write_cache(filename, cache):
+    """Helper method to write a page index file."""
+    storage.simple_upload(filename, cache, access=access_choices.PRIVATE)
 
 
 def read_cache(filename):
-    """Helper method to read a cache file."""
-    with storage.open(filename, "rb") as pickle_file, gzip.open(
-        pickle_file, "rb"
-    ) as zip_file:
-        return pickle.load(zip_file)
+    """Helper method to read a page index file.
+
+    Returns:
+        The page index, or None if it is not in a supported format (e.g. an
+        index written by a previous version).
+    """
+    with storage.open(filename, "rb") as index_file:
+        contents = index_file.read()
+    try:
+        return PageIndex(contents)
+    except ValueError as exc:
+        logger.warning("[READ CACHE] unable to read %s: %s", filename, exc)
+        return None
 
 
 def write_text_file(text_path, text, access):
@@ -304,7 +409,11 @@ def extract_pagecount(doc_id, slug):
     # Get the page sizes and initialize a cache of page positions
     doc_path = path.doc_path(doc_id, slug)
     with Workspace() as workspace, StorageHandler(
-        storage, doc_path, record=False, block_size=BLOCK_SIZE
+        storage,
+        doc_path,
+        record=False,
+        block_size=BLOCK_SIZE,
+        cache_blocks=CACHE_BLOCKS,
     ) as pdf_file, workspace.load_document_custom(pdf_file) as doc:
         page_count = doc.page_count
 
@@ -324,58 +433,92 @@ def redact_document_and_overwrite(doc_id, slug, access, redactions):
         new_doc.save(storage, doc_path, access)
 
 
-def get_redis_pagespec(doc_id):
-    """Get the dimensions of all pages in a convenient format using Redis"""
-    # pylint: disable=too-many-nested-blocks
-    dimensions_field = redis_fields.dimensions(doc_id)
+def redact_document_incrementally(doc_id, slug, access, redactions):
+    """Redacts a document's pages with an incremental update to its PDF, reading
+    and writing little more than the redacted pages, and patches its page index.
 
-    pipeline = REDIS.pipeline()
+    Returns:
+        The patched page index.
 
-    # We cannot use the convenience transacation wrapper since values we watch
-    # are dynamic
-    # See https://pypi.org/project/redis/#pipelines for details
-    while True:
-        try:
-            # Start collecting page specs (resets if there's a watch error)
-            pagespec = collections.defaultdict(list)
-
-            pipeline.watch(dimensions_field)
-            # Restart if the dimensions are altered during runtime
-            page_dimensions = pipeline.smembers(dimensions_field)
-            if page_dimensions is None:
-                # If there are no page dimensions, exit with empty pagespec
-                pipeline.execute()
-                break
+    Raises:
+        IncrementalRedactionError: if the document can not be redacted
+        incrementally, for it to be rewritten instead.
+    """
+    # pylint: disable=too-many-locals
+    doc_path = path.doc_path(doc_id, slug)
+    index_path = path.index_path(doc_id, slug)
+    page_index = read_cache(index_path) if storage.exists(index_path) else None
+    if page_index is None or page_index.file_size != storage.size(doc_path):
+        raise IncrementalRedactionError("The document has no up to date page index")
+
+    redactions_by_page = collections.defaultdict(list)
+    for redaction in redactions:
+        redactions_by_page[redaction["page_number"]].append(redaction)
+    page_numbers = sorted(redactions_by_page)
 
-            for page_dimension in page_dimensions:
-                page_dimension = page_dimension.decode("utf8")
-                page_dimension_field = redis_fields.page_dimension(
-                    doc_id, page_dimension
+    # Open the PDF file, prefetching the ranges the page index has for the
+    # redacted pages, which hold every object they read
+    with StorageHandler(
+        storage,
+        doc_path,
+        prefetch=page_index.ranges(page_numbers, PREFETCH_GAP),
+        block_size=BLOCK_SIZE,
+        cache_blocks=CACHE_BLOCKS,
+    ) as pdf_file, IncrementalRedaction(pdf_file, page_numbers) as redaction:
+        scrubbed = redaction.scrubbed_ranges()
+
+        images = {}
+        with Workspace() as workspace, workspace.load_document_custom(pdf_file) as doc:
+            for page_number in page_numbers:
+                page, page_bitmap = doc.redact_page(
+                    page_number, redactions_by_page[page_number]
                 )
-                # Restart if any page dimension is altered during runtime
-                pipeline.watch(page_dimension_field)
-                page_numbers = pipeline.smembers(page_dimension_field)
-                if page_numbers is not None:
-                    for page_number in page_numbers:
-                        page_number = int(page_number.decode("utf8"))
-                        # Set the pagespec for each page number and dimension
-                        pagespec[page_dimension].append(page_number)
+                with page, page_bitmap:
+                    images[page_number] = (
+                        page_bitmap.get_image(),
+                        page.width,
+                        page.height,
+                    )
 
-            # Run the pipeline
-            pipeline.execute()
-            break
-        except redis.exceptions.WatchError:
-            continue
-        finally:
-            pipeline.reset()
+        update, document_ranges, page_ranges = redaction.update(images)
+        storage.compose(
+            doc_path,
+            compose_parts(doc_path, pdf_file.size, scrubbed, update),
+            access=access,
+        )
+        telemetry.add(bytes_read=pdf_file.bytes_read())
 
+    # Page cache processing is skipped, so hash the redacted file here for it
+    # to be sent back once processing is complete
+    REDIS.set(
+        redis_fields.file_hash(doc_id), storage_sha1(storage, doc_path), ex=REDIS_TTL
+    )
+
+    logger.info(
+        "[REDACT DOC] doc_id %s appended %d bytes and scrubbed %d streams",
+        doc_id,
+        len(update),
+        len(scrubbed),
+    )
+    index = page_index.patch(pdf_file.size + len(update), document_ranges, page_ranges)
+    write_cache(index_path, index)
+    return PageIndex(index)
+
+
+def get_redis_pagespec(doc_id):
+    """Get the dimensions of all pages in a convenient format using Redis"""
+    # Each page's dimension is in its own slot, so they are all read at once,
+    # in page order, leaving each dimension's pages sorted for crunching
+    pagespec = collections.defaultdict(list)
+    for page_number, page_dimension in utils.read_page_dimensions(REDIS, doc_id):
+        pagespec[page_dimension].append(page_number)
     return pagespec
 
 
 def write_concatenated_text_file(doc_id, slug, access, page_jsons):
     """Assemble and write the concatenated text file given json pages"""
     concatenated_text = b"\n\n".join(
-        [page["contents"].encode("utf-8") for page in page_jsons]
+        [page.get("contents", "").encode("utf-8") for page in page_jsons]
     )
 
     # Write the concatenated text file
@@ -428,13 +571,11 @@ def apply_modification(workspace, new_doc, context, modification):
             page_spec = page_spec[1:]
 
         logger.info("[APPLY MODIFICATIONS] load pages page %s", page)
-        # Now, grab the json text paths of the affected document and
-        # plan downloading the json text files in parallel
-        json_file_path = path.json_text_path(import_doc_id, import_doc_slug)
-        context["page_text_download_urls"].add(json_file_path)
+        # Now, plan reading the page text of the affected document, so that
+        # each document's pages are read together
         context["page_text_todo"].append(
             {
-                "file_path": json_file_path,
+                "doc": (import_doc_id, import_doc_slug),
                 "page": page,
                 "new_page": context["current_page_index"] + i,
             }
@@ -467,95 +608,347 @@ def apply_rotation_modification(new_doc, context, modification):
 
 
 def download_modification_page_text(context):
-    """Download necessary page text for modifications in parallel"""
-    page_text_json = []
-    page_text_urls = list(context["page_text_download_urls"])
-    logger.info("[DLMPT] %s", page_text_urls)
-    page_text_download_files = [
-        json.loads(contents) for contents in storage.async_download(page_text_urls)
-    ]
-    page_text_json_map = dict(zip(page_text_urls, page_text_download_files))
+    """Read necessary page text for modifications, reading only the shards
+    containing the pages needed from each document"""
+    doc_pages = collections.defaultdict(set)
+    for page_text_item in context["page_text_todo"]:
+        doc_pages[page_text_item["doc"]].add(page_text_item["page"])
+    logger.info("[DLMPT] %s", list(doc_pages))
+
+    doc_page_texts = {
+        (doc_id, slug): PageTextStore(storage, doc_id, slug).read_pages(pages)
+        for (doc_id, slug), pages in doc_pages.items()
+    }
 
+    page_text_json = []
     for page_text_item in context["page_text_todo"]:
-        # Construct the page text json from the downloaded page text
-        page_text_json_file = page_text_json_map[page_text_item["file_path"]]
-        page_text = page_text_json_file["pages"][page_text_item["page"]]
+        # Construct the page text json from the read page text
+        page_text = dict(
+            doc_page_texts[page_text_item["doc"]].get(page_text_item["page"], {})
+        )
         page_text["page"] = page_text_item["new_page"]
         page_text_json.append(page_text)
 
     return page_text_json
 
 
-def extract_text_position_for_page(pdf, doc_id, slug, page_number, access, in_memory):
-    # If in-memory, the page number is always 0 (first and only overlay page)
-    extract_page_number = 0 if in_memory else page_number
-    page = pdf.pages[extract_page_number]
-    words = [
-        {
-            "text": word["text"],
-            "x1": float(word["x0"]) / float(page.width),
-            "x2": float(word["x1"]) / float(page.width),
-            "y1": float(word["top"]) / float(page.height),
-            "y2": float(word["bottom"]) / float(page.height),
-            "upright": word["upright"],
-            "direction": word["direction"],
-        }
-        for word in page.extract_words(use_text_flow=True)
+def modification_page_sources(doc_id, slug, modifications):
+    """The source document id, slug, page number and rotation of each page of a
+    modified document"""
+    page_map, page_count = build_page_map(doc_id, modifications)
+    slugs = {
+        modification.get("id", doc_id): modification.get("slug", slug)
+        for modification in modifications
+    }
+    page_sources = [None] * page_count
+    for (source_id, old_page), new_pages in page_map.items():
+        for new_page, rotation in new_pages:
+            page_sources[new_page] = (source_id, slugs[source_id], old_page, rotation)
+    return page_sources
+
+
+def plan_page_asset_copies(doc_id, slug, page_sources, source_files):
+    """Plan copying the per-page files of a modified document's pages from the
+    pages they were taken from.
+
+    `source_files` maps each source document id to the set of its per-page
+    files in storage.  Rotated pages, and pages whose images are missing, are
+    not copied but extracted again.
+
+    Returns:
+        The (source, destination) paths to copy, the set of the document's
+        per-page files to keep and the page numbers to extract again.
+    """
+    copies = []
+    kept = set()
+    extract_pages = []
+    for page_number, (source_id, source_slug, old_page, rotation) in enumerate(
+        page_sources
+    ):
+        files = source_files[source_id]
+        paths = [
+            (
+                path.page_image_path(source_id, source_slug, old_page, image_suffix),
+                path.page_image_path(doc_id, slug, page_number, image_suffix),
+            )
+            for image_suffix, _ in IMAGE_WIDTHS
+        ]
+        if rotation % 4 != 0 or any(source not in files for source, _ in paths):
+            extract_pages.append(page_number)
+            continue
+
+        paths.append(
+            (
+                path.page_text_path(source_id, source_slug, old_page),
+                path.page_text_path(doc_id, slug, page_number),
+            )
+        )
+        paths.append(
+            (
+                path.page_text_position_path(source_id, source_slug, old_page),
+                path.page_text_position_path(doc_id, slug, page_number),
+            )
+        )
+        for source, destination in paths:
+            if source not in files:
+                continue
+            kept.add(destination)
+            if source != destination:
+                copies.append((source, destination))
+
+    return copies, kept, extract_pages
+
+
+def pack_modification_text_positions(doc_id, slug, access, page_sources, extract_pages):
+    """Pack the text positions of a modified document's pages from the packed
+    text positions of the pages they were taken from.  The pages to extract
+    again are packed in once they have been extracted."""
+    # pylint: disable=too-many-arguments
+    packed = {}
+    for source_id, source_slug, _, _ in page_sources:
+        if source_id in packed:
+            continue
+        file_name = path.text_positions_path(source_id, source_slug)
+        packed[source_id] = None
+        if storage.exists(file_name):
+            with storage.open(file_name, "rb") as packed_file:
+                packed[source_id] = text_positions.PackedTextPositions(
+                    packed_file.read()
+                )
+
+    extract_pages = set(extract_pages)
+    blocks = [
+        packed[source_id].block(old_page)
+        if packed[source_id] is not None and page_number not in extract_pages
+        else None
+        for page_number, (source_id, _, old_page, _) in enumerate(page_sources)
     ]
-    # Write the json positional words file
     storage.simple_upload(
-        path.page_text_position_path(doc_id, slug, page_number),
-        json.dumps(words).encode("utf-8"),
+        path.text_positions_path(doc_id, slug),
+        text_positions.pack(blocks),
+        content_type="application/octet-stream",
         access=access,
     )
 
 
+def copy_page_assets(doc_id, slug, access, page_sources):
+    """Copy the per-page files of a modified document's pages server side from
+    the pages they were taken from, and remove the document's per-page files
+    which were not carried over.
+
+    Returns:
+        The page numbers which must be extracted again.
+    """
+    source_ids = {doc_id} | {source_id for source_id, _, _, _ in page_sources}
+    source_files = {
+        source_id: set(storage.list(path.pages_path(source_id)))
+        for source_id in source_ids
+    }
+    copies, kept, extract_pages = plan_page_asset_copies(
+        doc_id, slug, page_sources, source_files
+    )
+
+    # A copy may overwrite a file of the document's own pages which is still to
+    # be copied elsewhere, so those files are set aside first
+    destinations = {destination for _, destination in copies}
+    pages_path = path.pages_path(doc_id)
+    staging_path = path.artifacts_path(doc_id) + "modify/"
+    staged = {
+        source: staging_path + source[len(pages_path) :]
+        for source, _ in copies
+        if source in destinations
+    }
+    asset_cache.copy_files(list(staged.items()), access)
+    asset_cache.copy_files(
+        [(staged.get(source, source), destination) for source, destination in copies],
+        access,
+    )
+
+    if TEXT_POSITION_PACKED:
+        pack_modification_text_positions(
+            doc_id, slug, access, page_sources, extract_pages
+        )
+
+    # Remove the files of pages no longer in the document, or to be extracted
+    # again
+    storage.delete_files(sorted(source_files[doc_id] - kept))
+    if staged:
+        storage.delete(staging_path)
+
+    logger.info(
+        "[MODIFY DOC] doc_id %s copied %d files, extracting %d pages again",
+        doc_id,
+        len(copies),
+        len(extract_pages),
+    )
+    return extract_pages
+
+
+def extract_text_position_for_page(page, doc_id, slug, page_number, uploads):
+    """Extract the positions of the words on a pdfium page.
+
+    The json positional words file is appended to `uploads` to be uploaded in
+    bulk with `upload_page_files`.  If text positions are packed, the words are
+    stored to be packed once every page's text positions have been extracted.
+    """
+    words = page.get_words()
+    if TEXT_POSITION_PACKED:
+        utils.write_page_text_positions(REDIS, doc_id, {page_number: words})
+        return
+    uploads.append(
+        (
+            path.page_text_position_path(doc_id, slug, page_number),
+            json.dumps(words).encode("utf-8"),
+            "application/json",
+        )
+    )
+
+
+def load_page_text_pdf(workspace, contents):
+    """Load the text-only PDF of an OCRd page"""
+    return workspace.load_document_bytes(contents)
+
+
+def register_text_positions(
+    doc_id, slug, access, partial, page_modification, page_numbers
+):
+    """Register pages' text positions as extracted, moving on once every page's
+    text positions have been"""
+    # pylint: disable=too-many-arguments
+    text_positions_finished = utils.register_text_positions_extracted(
+        REDIS, doc_id, page_numbers
+    )
+    logger.info(
+        "[EXTRACT TEXT POSITION] doc_id %s finished %s",
+        doc_id,
+        text_positions_finished,
+    )
+    if not text_positions_finished:
+        return
+
+    finish_text_positions(doc_id, slug, access, partial, page_modification)
+
+
+def finish_text_positions(doc_id, slug, access, partial, page_modification):
+    """Move on once every page's text positions have been extracted"""
+    if TEXT_POSITION_PACKED:
+        # The pages copied by a page modification have already been packed
+        copied = page_modification is not None and "pages" in page_modification
+        utils.pack_text_positions(REDIS, doc_id, slug, access, partial or copied)
+
+    if page_modification is not None:
+        # Normally, processing entails assembling text once
+        # finished. In page modification mode, the consolidated
+        # json has already been created, so now we defer to
+        # finishing steps.
+        raw_pagespec = get_redis_pagespec(doc_id)
+        pagespec = crunch_collection(raw_pagespec)
+        filehash = utils.pop_file_hash(REDIS, doc_id)
+        utils.send_modification_post_processing(
+            REDIS,
+            doc_id,
+            {
+                "modifications": page_modification["modifications"],
+                "pagespec": pagespec,
+                "filehash": filehash,
+            },
+        )
+    else:
+        # Move on to assembling/grafting the text back into the pdf
+        publisher.publish(
+            ASSEMBLE_TEXT_TOPIC,
+            encode_pubsub_data(
+                {
+                    "doc_id": doc_id,
+                    "slug": slug,
+                    "access": access,
+                    "partial": partial,
+                }
+            ),
+        )
+
+
 def graft_ocr_in_pdf(doc_id, slug, access):
-    """Reinjects the OCR'd text-only PDFs back into the main PDF."""
-    page_text_pdf_field = redis_fields.page_text_pdf(doc_id)
-    redis_pdf_pages = REDIS.hkeys(page_text_pdf_field)
+    """Reinjects the OCR'd text-only PDFs back into the main PDF.
+
+    The PDF is grafted on disk in windows of pages.  Each window's text-only
+    PDFs are fetched from Redis together, and the grafted PDF is checkpointed
+    and reopened between windows to bound memory use.
+    """
+    text_pdf_pages = utils.page_text_pdf_pages(REDIS, doc_id)
     doc_path = path.doc_path(doc_id, slug)
 
-    # Load PDF in memory
-    handler = StorageHandler(storage, doc_path, False, False, None, read_all=True)
-    with Workspace() as workspace, workspace.load_document_custom(handler) as mem_pdf:
-        mem_file = handler.mem_file  # Grab document as BytesIO instance
-
-        # Graft all the pages
-        grafter = graft.OcrGrafter(GraftContext(graft, mem_file, mem_pdf))
-        for redis_page_key in redis_pdf_pages:
-            page_number = int(redis_page_key)
-            # Load overlay PDF in memory
-            overlay_mem_file = io.BytesIO(
-                REDIS.hget(page_text_pdf_field, redis_page_key)
-            )
-            grafter.graft_page(
-                pageno=page_number,
-                image=None,
-                textpdf=overlay_mem_file,
-                autorotate_correction=0,
-            )
+    with tempfile.TemporaryDirectory(dir=SPOOL_DIRECTORY) as directory:
+        base_path = os.path.join(directory, "base.pdf")
+        storage.download_file(doc_path, base_path)
+
+        with Workspace() as workspace, workspace.load_document(base_path) as pdf:
+            grafter = graft.OcrGrafter(GraftContext(graft, base_path, pdf, directory))
+
+            for start in range(0, len(text_pdf_pages), GRAFT_WINDOW):
+                window = text_pdf_pages[start : start + GRAFT_WINDOW]
+                if start > 0:
+                    # Write out the pages grafted so far and reopen them from
+                    # disk, releasing their memory
+                    grafter.save_and_reload()
+
+                # Graft the window's pages
+                for page_number, text_pdf in zip(
+                    window, utils.read_page_text_pdfs(REDIS, doc_id, window)
+                ):
+                    grafter.graft_page(
+                        pageno=page_number,
+                        image=None,
+                        textpdf=io.BytesIO(text_pdf),
+                        autorotate_correction=0,
+                    )
+
+            output_path = grafter.finalize()
 
         # Overwrite source PDF
-        with storage.open(doc_path, "wb", access=access) as output_file:
-            grafter.output_file = output_file
-            grafter.finalize()
+        storage.upload_file(doc_path, str(output_path), access=access)
 
 
-def patch_partial_page_text(doc_id, slug, results):
-    """Patch/assemble page text from a partial update."""
-    with storage.open(path.json_text_path(doc_id, slug), "rb") as json_file:
-        old_results = json.loads(json_file.read())
+def patch_partial_page_text(doc_id, slug, access, results):
+    """Patch the pages from a partial update into the page text store.
 
-    for result in results["pages"]:
-        page = result["page"]
-        # Patch in the new page
-        old_results["pages"][page] = result
+    Only the shards containing the updated pages are rewritten, but the
+    concatenated and json text files are regenerated from the store straight
+    away, so that no text a redaction removed is served once it completes.
+    """
+    store = PageTextStore(storage, doc_id, slug)
+    store.write_pages(results["pages"], results["updated"], access)
+    json_text = store.regenerate_legacy(access)
+    write_concatenated_text_file(doc_id, slug, access, json_text["pages"])
 
-    # Patch in the updated time
-    old_results["updated"] = results["updated"]
 
-    return old_results
+def write_json_text_file(doc_id, slug, access, results):
+    """Write the text of every page to the page text store and json text file"""
+    PageTextStore(storage, doc_id, slug).write_all(results, access)
+
+
+def reuse_assets(doc_id, slug, access, page_count, key):
+    """Copy the assets of a prior document processed from the same file with
+    the same OCR settings, finishing processing.
+
+    Returns:
+        Whether the assets were reused.
+    """
+    entry = asset_cache.lookup(REDIS, key, doc_id, page_count)
+    if entry is None:
+        return False
+
+    logger.info("[REUSE ASSETS] doc_id %s from doc_id %s", doc_id, entry["doc_id"])
+    try:
+        asset_cache.copy_assets(entry, doc_id, slug, access)
+    except Exception as exc:  # pylint: disable=broad-except
+        # Fall back to processing the document
+        logger.warning("[REUSE ASSETS] doc_id %s failed: %s", doc_id, exc, exc_info=exc)
+        return False
+
+    utils.send_update(REDIS, doc_id, {"page_spec": entry["page_spec"]})
+    utils.send_complete(REDIS, doc_id)
+    return True
 
 
 @pubsub_function(REDIS, PAGE_CACHE_TOPIC)
@@ -578,23 +971,18 @@ def process_page_cache(data, _context=None):
 
     doc_path = path.doc_path(doc_id, slug)
 
-    # Read the entire document into memory
+    # Spool the entire document locally
     with Workspace() as workspace, StorageHandler(
-        storage, doc_path, record=True, playback=False, cache=None, read_all=True
+        storage, doc_path, record=True, spool=True, spool_directory=SPOOL_DIRECTORY
     ) as pdf_file, workspace.load_document_custom(pdf_file) as doc:
-        # Load the final page to memoize all page accesses
         page_count = doc.page_count
-        doc.load_page(page_count - 1)
-        cached = pdf_file.cache
 
         # Set the file hash in Redis to go out with the next update
         REDIS.set(redis_fields.file_hash(doc_id), pdf_file.sha1, ex=REDIS_TTL)
 
-        # Create an index file that stores the memory locations of each page of the
-        # PDF file.
-        write_cache(path.index_path(doc_id, slug), cached)
-
-        # check AI credits if using premium OCR engine
+        # check AI credits if using premium OCR engine, before any assets are
+        # reused, so that reused premium OCR is charged for and is only reused
+        # by organizations able to pay for it
         if ocr_engine == "textract":
             resp = requests.post(
                 urljoin(utils.API_CALLBACK, f"organizations/{org_id}/ai_credits/"),
@@ -605,40 +993,76 @@ def process_page_cache(data, _context=None):
             if resp.status_code != 200:
                 ocr_engine = "tess4"
 
-        # Method to publish image batches
-        def pub(pages):
-            if pages:
-                publisher.publish(
-                    IMAGE_EXTRACT_TOPIC,
-                    data=encode_pubsub_data(
-                        {
-                            "doc_id": doc_id,
-                            "slug": slug,
-                            "access": access,
-                            "ocr_code": ocr_code,
-                            "pages": pages,
-                            "partial": dirty,
-                            "force_ocr": force_ocr,
-                            "ocr_engine": ocr_engine,
-                            "page_count": page_count,
-                            "org_id": org_id,
-                            "page_modification": page_modification,
-                        }
-                    ),
-                )
+        # Reuse the assets of a prior upload of the same file if there is one
+        full = not dirty and page_modification is None
+        if full and reuse_assets(
+            doc_id,
+            slug,
+            access,
+            page_count,
+            asset_cache.cache_key(pdf_file.sha1, ocr_code, ocr_engine, force_ocr),
+        ):
+            telemetry.add(bytes_read=pdf_file.bytes_read())
+            return
+
+        # Create an index file that stores the byte ranges read to load each page
+        # of the PDF file.
+        index = index_document(doc, pdf_file)
+        write_cache(path.index_path(doc_id, slug), index)
+        telemetry.add(bytes_read=pdf_file.bytes_read())
+
+        if full:
+            # Record the document as a source of assets once it finishes
+            asset_cache.remember(
+                REDIS,
+                doc_id,
+                asset_cache.cache_key(pdf_file.sha1, ocr_code, ocr_engine, force_ocr),
+            )
+
+        page_numbers = None
+        if page_modification is not None and "pages" in page_modification:
+            # Only extract the pages whose files were not copied by the page
+            # modification
+            page_numbers = page_modification["pages"]
+            if not page_numbers:
+                finish_text_positions(doc_id, slug, access, False, page_modification)
+                return
 
         # Trigger image extraction tasks for each page
         if dirty:
             # If only dirty pages are flagged, process the relevant ones in batches
             dirty = sorted(dirty)
-            for i in range(0, len(dirty), IMAGE_BATCH):
-                pages = [dirty[j] for j in range(i, min(i + IMAGE_BATCH, len(dirty)))]
-                pub(pages)
-        else:
-            # Otherwise, process all pages in batches
-            for i in range(0, page_count, IMAGE_BATCH):
-                pages = list(range(i, min(i + IMAGE_BATCH, page_count)))
-                pub(pages)
+        publish_image_batches(
+            PageIndex(index),
+            {
+                "doc_id": doc_id,
+                "slug": slug,
+                "access": access,
+                "ocr_code": ocr_code,
+                "partial": dirty,
+                "force_ocr": force_ocr,
+                "ocr_engine": ocr_engine,
+                "page_count": page_count,
+                "org_id": org_id,
+                "page_modification": page_modification,
+            },
+            page_numbers,
+        )
+
+
+def publish_image_batches(page_index, data, page_numbers=None):
+    """Publish batches of the pages to extract images from, which are the
+    given pages, or the partial pages if there are any and otherwise every page"""
+    if page_numbers is None:
+        page_numbers = data["partial"] or list(range(data["page_count"]))
+    # Batches are planned from recent timings, weighing each page by the
+    # bytes the index reads to load it
+    weights = page_weights(page_index, page_numbers)
+    for pages in IMAGE_PLANNER.plan(data["doc_id"], page_numbers, weights):
+        if pages:
+            publisher.publish(
+                IMAGE_EXTRACT_TOPIC, data=encode_pubsub_data({**data, "pages": pages})
+            )
 
 
 @pubsub_function(REDIS, PDF_PROCESS_TOPIC)
@@ -671,7 +1095,14 @@ def process_pdf(data, _context=None):
 
     # Extract the page count and store it in Redis
     page_count = extract_pagecount(doc_id, slug)
-    initialize_redis_page_data(doc_id, page_count)
+    if page_modification is not None and "pages" in page_modification:
+        # Only the pages whose files were not copied by the page modification
+        # are extracted
+        initialize_partial_redis_page_data(
+            doc_id, page_count, set(page_modification["pages"])
+        )
+    else:
+        initialize_redis_page_data(doc_id, page_count)
 
     # Update the model with the page count
     utils.send_update(REDIS, doc_id, {"page_count": page_count})
@@ -701,40 +1132,109 @@ def get_large_image_path(doc_id, slug, page_number):
     return path.page_image_path(doc_id, slug, page_number, IMAGE_WIDTHS[0][0])
 
 
-def extract_single_page(doc_id, slug, access, page, page_number, large_image_path):
-    """Internal method to extract a single page from a PDF file as an image.
+def derive_page_images(img_buffer):
+    """Encode an image at each of the configured image widths.
+
+    The sizes are built progressively: each size is resized from the smallest
+    already derived image that is still at least as wide, rather than from the
+    full resolution render, so every resize works on a smaller source.
+
+    Returns:
+        A list of (image size, encoded image contents) pairs.
+    """
+    images = []
+    img = img_buffer
+    for [image_suffix, image_width] in IMAGE_WIDTHS:
+        # Fall back to the full render if the widths are not in descending order
+        source = img if img.width >= image_width else img_buffer
+        if source.width != image_width:
+            # Keep the aspect ratio of the original render to avoid drift
+            img = source.resize(
+                (
+                    image_width,
+                    max(round(img_buffer.height * (image_width / img_buffer.width)), 1),
+                ),
+                Image.ANTIALIAS,
+            )
+        else:
+            img = source
+
+        mem_file = io.BytesIO()
+        img.save(mem_file, format=path.IMAGE_SUFFIX)
+        images.append((image_suffix, mem_file.getvalue()))
+        mem_file.close()
+
+    return images
+
+
+def upload_page_files(uploads, access):
+    """Upload queued (path, contents, content type) page files concurrently"""
+    if not uploads:
+        return
+
+    file_names = [file_name for file_name, _, _ in uploads]
+    contents = [content for _, content, _ in uploads]
+    content_types = [content_type for _, _, content_type in uploads]
+    storage.async_upload(file_names, contents, content_types, access=access)
+    uploads.clear()
+
+
+def extract_single_page(doc_id, slug, page, page_number, uploads):
+    """Internal method to extract a single page from a PDF file as images.
+
+    The encoded images are appended to `uploads` as (path, contents, content type)
+    tuples to be uploaded in bulk with `upload_page_files`.
 
     Returns:
         The page dimensions.
     """
 
-    # Extract the page as an image with a certain width
-    bmp = page.get_bitmap(IMAGE_WIDTHS[0][1], None)
-    img_buffer = bmp.render(storage, large_image_path, access)
+    # Extract the page as an image with the largest width
+    with page.get_bitmap(IMAGE_WIDTHS[0][1], None) as bmp:
+        img_buffer = bmp.get_image()
 
-    # Resize to render smaller page sizes
-    for [image_suffix, image_width] in IMAGE_WIDTHS[1:]:
-        img = img_buffer.resize(
+    # Derive and queue every page size
+    for image_suffix, contents in derive_page_images(img_buffer):
+        uploads.append(
             (
-                image_width,
-                max(round(img_buffer.height * (image_width / img_buffer.width)), 1),
-            ),
-            Image.ANTIALIAS,
+                path.page_image_path(doc_id, slug, page_number, image_suffix),
+                contents,
+                IMAGE_CONTENT_TYPE,
+            )
         )
 
-        mem_file = io.BytesIO()
-        img.save(mem_file, format=IMAGE_SUFFIX[1:].lower())
-        storage.simple_upload(
-            path.page_image_path(doc_id, slug, page_number, image_suffix),
-            mem_file.getvalue(),
-            access=access,
-        )
-        mem_file.close()
-
     return (page.width, page.height)
 
 
-@pubsub_function(REDIS, IMAGE_EXTRACT_TOPIC)
+def ocr_single_page(doc_id, slug, page, page_number, access, ocr_code, ocr_engine):
+    """Internal method to OCR a page straight from its pdfium render, for when
+    OCR runs co-located with image extraction.
+
+    Returns:
+        The page text and text-only PDF contents.
+    """
+    # pylint: disable=too-many-arguments, import-outside-toplevel
+    # The OCR function's dependencies are only present alongside extraction in
+    # local environments
+    # DocumentCloud
+    from documentcloud.documents.processing.ocr.main import DESIRED_WIDTH, ocr_image
+
+    with page.get_bitmap(DESIRED_WIDTH, None) as bmp:
+        img = bmp.get_image()
+
+    return ocr_image(
+        doc_id,
+        ocr_engine,
+        img,
+        path.page_text_path(doc_id, slug, page_number),
+        access,
+        ocr_code,
+        slug,
+        page_number,
+    )
+
+
+@pubsub_function(REDIS, IMAGE_EXTRACT_TOPIC, work_key="pages")
 def extract_image(data, _context=None):
     """Renders (extracts) an image from a PDF file."""
     # pylint: disable=too-many-locals, too-many-statements, too-many-branches
@@ -759,8 +1259,34 @@ def extract_image(data, _context=None):
     # Store a queue of pages to OCR/extract text positions to fill the batch
     ocr_queue = []
     text_position_queue = []
-
-    def flush(queue, topic):
+    # Pages OCR'd inline have their text-only PDFs in Redis
+    ocr_text_position_queue = []
+    ocr_inline = OCR_INLINE and ocr_engine != "textract"
+    if force_ocr:
+        ocr_version = f"{ocr_engine}_force"
+    else:
+        ocr_version = ocr_engine
+
+    # Page images are uploaded in bulk. Until their images are in storage, pages
+    # are held back from being registered as extracted and from being queued
+    # for OCR/text position extraction.
+    image_uploads = []
+    pending_dimensions = []
+    pending_texts = {}
+    pending_ocr_texts = {}
+    pending_ocr_pdfs = {}
+    pending_text_positions = []
+    pending_ocr_queue = []
+    pending_text_position_queue = []
+    pending_ocr_text_position_queue = []
+    # Pages are finished once they have been handed off to the next stages
+    handled_pages = []
+    # The time spent extracting and uploading images, which is all that is
+    # recorded for the stage, as pages may also be OCR'd inline
+    image_times = []
+    image_count = 0
+
+    def flush(queue, topic, in_memory=False):
         if not queue:
             return
 
@@ -780,77 +1306,176 @@ def extract_image(data, _context=None):
                     "ocr_engine": ocr_engine,
                     "org_id": org_id,
                     "page_modification": page_modification,
+                    "in_memory": in_memory,
+                    # Lets the next stages class the document for telemetry
+                    "page_count": data.get("page_count"),
                 }
             ),
         )
 
         queue.clear()
 
-    def check_and_flush(queue, topic, batch):
-        if len(queue) >= batch:
-            flush(queue, topic)
+    # The batch size of each stage pages are handed to, planned the first time
+    # pages are queued for it from every page of the document going through the
+    # stage, rather than this function's share of them
+    batch_sizes = {}
+    stage_page_count = (
+        len(partial) if partial else data.get("page_count", len(page_numbers))
+    )
 
-    # Open the PDF file with the cached index
-    cached = read_cache(path.index_path(doc_id, slug))
+    def check_and_flush(queue, topic, planner, in_memory=False):
+        if not queue:
+            return
+        if planner.stage not in batch_sizes:
+            batch_sizes[planner.stage] = planner.plan_size(doc_id, stage_page_count)
+        batch = batch_sizes[planner.stage]
+        # Publish full batches, leaving the remainder to fill up
+        while len(queue) >= batch:
+            batch_queue = queue[:batch]
+            del queue[:batch]
+            flush(batch_queue, topic, in_memory)
+
+    def flush_images():
+        logger.info(
+            "[EXTRACT IMAGE] doc_id %s uploading %d images",
+            doc_id,
+            len(image_uploads),
+        )
+        upload_start = time.time()
+        upload_page_files(image_uploads, access)
+        image_times.append(time.time() - upload_start)
+
+        if not partial:
+            # Update the page dimensions in Redis atomically
+            utils.write_page_dimensions(REDIS, doc_id, pending_dimensions)
+
+        if pending_dimensions:
+            images_finished = utils.register_pages_extracted(
+                REDIS, doc_id, [page_number for page_number, _ in pending_dimensions]
+            )
+
+            # Write the pagespec dimensions if all images have finished and
+            # it's not a partial update or modification.
+            if images_finished and not partial and page_modification is None:
+                update_pagespec(doc_id)
+        pending_dimensions.clear()
+
+        # Write the batch's page texts in a single round trip
+        pipeline = REDIS.pipeline(transaction=False)
+        utils.write_page_texts(pipeline, doc_id, pending_texts, None)
+        utils.write_page_texts(
+            pipeline, doc_id, pending_ocr_texts, ocr_version, ocr_code
+        )
+        for page_number, pdf_contents in pending_ocr_pdfs.items():
+            utils.write_page_text_pdf(pipeline, doc_id, page_number, pdf_contents)
+        pipeline.execute()
+
+        # Decrement the texts remaining
+        ocrd_page_numbers = (
+            pending_text_positions
+            + pending_text_position_queue
+            + pending_ocr_text_position_queue
+        )
+        if ocrd_page_numbers:
+            utils.register_pages_ocrd(REDIS, doc_id, ocrd_page_numbers)
+        pending_texts.clear()
+        pending_ocr_texts.clear()
+        pending_ocr_pdfs.clear()
+
+        # Text positions extracted inline were uploaded with the images
+        if pending_text_positions:
+            register_text_positions(
+                doc_id, slug, access, partial, page_modification, pending_text_positions
+            )
+            pending_text_positions.clear()
+
+        # The held back pages are now safe to hand off
+        ocr_queue.extend(pending_ocr_queue)
+        pending_ocr_queue.clear()
+        text_position_queue.extend(pending_text_position_queue)
+        pending_text_position_queue.clear()
+        ocr_text_position_queue.extend(pending_ocr_text_position_queue)
+        pending_ocr_text_position_queue.clear()
+        check_and_flush(ocr_queue, OCR_TOPIC, OCR_PLANNER)
+        check_and_flush(
+            text_position_queue, TEXT_POSITION_EXTRACT_TOPIC, TEXT_POSITION_PLANNER
+        )
+        check_and_flush(
+            ocr_text_position_queue,
+            TEXT_POSITION_EXTRACT_TOPIC,
+            TEXT_POSITION_PLANNER,
+            in_memory=True,
+        )
+
+        # Record the pages which are no longer waiting to fill a batch
+        queued = {page_number for page_number, _ in ocr_queue}
+        queued.update(text_position_queue, ocr_text_position_queue)
+        checkpoint.done(
+            *[page_number for page_number in handled_pages if page_number not in queued]
+        )
+        handled_pages[:] = [
+            page_number for page_number in handled_pages if page_number in queued
+        ]
+
+    # Open the PDF file, prefetching the ranges the page index has for the pages
+    page_index = read_cache(path.index_path(doc_id, slug))
+    prefetch = (
+        page_index.ranges(page_numbers, PREFETCH_GAP)
+        if page_index is not None
+        else None
+    )
 
     with Workspace() as workspace, StorageHandler(
         storage,
         doc_path,
-        record=False,
-        playback=True,
-        cache=cached,
+        prefetch=prefetch,
         read_all=False,
         block_size=BLOCK_SIZE,
+        cache_blocks=CACHE_BLOCKS,
+        read_ahead=READ_AHEAD_BLOCKS,
     ) as pdf_file, workspace.load_document_custom(pdf_file) as doc:
+        # Look up which pages were already processed in bulk
+        extracted_pages = utils.pages_extracted(REDIS, doc_id, page_numbers)
+        ocrd_pages = utils.pages_ocrd(REDIS, doc_id, page_numbers)
+        # In page modification mode, the batch's page text is read on demand
+        modification_texts = None
+
         # Iterate each page number
+        page_count = 0
         for page_number in page_numbers:
+            if checkpoint.expired():
+                # Leave the remaining pages to be retried
+                logger.info(
+                    "[EXTRACT IMAGE] doc_id %s out of time after %d pages",
+                    doc_id,
+                    page_count,
+                )
+                break
             logger.info("[EXTRACT IMAGE] doc_id %s page_number %s", doc_id, page_number)
             # Only process if it has not processed previously
-            large_image_path = path.page_image_path(
-                doc_id, slug, page_number, IMAGE_WIDTHS[0][0]
-            )
             page = None
-            if not utils.page_extracted(REDIS, doc_id, page_number):
+            if page_number not in extracted_pages:
                 # Extract the image if not already extracted
+                image_start = time.time()
                 if page is None:
                     page = doc.load_page(page_number)
                 width, height = extract_single_page(
-                    doc_id, slug, access, page, page_number, large_image_path
+                    doc_id, slug, page, page_number, image_uploads
                 )
-                page_dimension = f"{width}x{height}"
-
-                if not partial:
-                    # Update the page dimensions in Redis atomically
-                    pipeline = REDIS.pipeline()
-                    pipeline.sadd(redis_fields.dimensions(doc_id), page_dimension)
-                    pipeline.expire(redis_fields.dimensions(doc_id), REDIS_TTL)
-                    pipeline.sadd(
-                        redis_fields.page_dimension(doc_id, page_dimension), page_number
-                    )
-                    pipeline.expire(
-                        redis_fields.page_dimension(doc_id, page_dimension), REDIS_TTL
-                    )
-                    pipeline.execute()
+                image_times.append(time.time() - image_start)
+                image_count += 1
+                pending_dimensions.append((page_number, f"{width}x{height}"))
 
-                images_finished = utils.register_page_extracted(
-                    REDIS, doc_id, page_number
-                )
-
-                # Write the pagespec dimensions if all images have finished and
-                # it's not a partial update or modification.
-                if images_finished and not partial and page_modification is None:
-                    update_pagespec(doc_id)
-
-            if not utils.page_ocrd(REDIS, doc_id, page_number):
+            if page_number not in ocrd_pages:
                 # Extract page text if possible
                 if page_modification is not None:
                     # In page modification mode, extract page text from the
-                    # consolidated json file
-                    with storage.open(
-                        path.json_text_path(doc_id, slug), "rb"
-                    ) as json_file:
-                        json_text = json.loads(json_file.read())
-                        text = json_text["pages"][page_number]["contents"]
+                    # page text store
+                    if modification_texts is None:
+                        modification_texts = PageTextStore(
+                            storage, doc_id, slug
+                        ).read_pages(page_numbers)
+                    text = modification_texts.get(page_number, {}).get("contents")
                 elif force_ocr:
                     text = None
                 else:
@@ -865,28 +1490,62 @@ def extract_image(data, _context=None):
 
                     write_text_file(text_path, text, access)
                     if page_modification is None:
-                        utils.write_page_text(REDIS, doc_id, page_number, text, None)
-
-                    # Decrement the texts remaining
-                    utils.register_page_ocrd(REDIS, doc_id, page_number)
-
-                    # Extract text position
-                    text_position_queue.append(page_number)
-                    check_and_flush(
-                        text_position_queue,
-                        TEXT_POSITION_EXTRACT_TOPIC,
-                        TEXT_POSITION_BATCH,
+                        pending_texts[page_number] = text
+
+                    # Register as OCRd and extract text position
+                    if TEXT_POSITION_INLINE:
+                        if page is None:
+                            page = doc.load_page(page_number)
+                        try:
+                            extract_text_position_for_page(
+                                page, doc_id, slug, page_number, image_uploads
+                            )
+                        except Exception as exc:  # pylint: disable=broad-except
+                            logger.exception(
+                                "[Extracting text position doc_id %s page %d failed]",
+                                doc_id,
+                                page_number,
+                                exc_info=exc,
+                            )
+                        pending_text_positions.append(page_number)
+                    else:
+                        pending_text_position_queue.append(page_number)
+                elif ocr_inline:
+                    # OCR the page from memory rather than its stored image
+                    if page is None:
+                        page = doc.load_page(page_number)
+                    text, pdf_contents = ocr_single_page(
+                        doc_id, slug, page, page_number, access, ocr_code, ocr_engine
                     )
+                    pending_ocr_texts[page_number] = text
+                    pending_ocr_pdfs[page_number] = pdf_contents
+
+                    pending_ocr_text_position_queue.append(page_number)
                 else:
                     # Prepare the image to be OCRd.
                     ocr_image_path = path.page_image_path(
                         doc_id, slug, page_number, IMAGE_WIDTHS[OCR_IMAGE_INDEX][0]
                     )
-                    ocr_queue.append([page_number, ocr_image_path])
-                    check_and_flush(ocr_queue, OCR_TOPIC, OCR_BATCH)
+                    pending_ocr_queue.append([page_number, ocr_image_path])
+
+            handled_pages.append(page_number)
+            page_count += 1
+            if len(pending_dimensions) >= IMAGE_UPLOAD_BATCH:
+                flush_images()
+
+        flush_images()
+
+        logger.info(
+            "[EXTRACT IMAGE] doc_id %s pdf reads %s", doc_id, pdf_file.cache_stats()
+        )
+        telemetry.add(bytes_read=pdf_file.bytes_read())
 
     flush(ocr_queue, OCR_TOPIC)
     flush(text_position_queue, TEXT_POSITION_EXTRACT_TOPIC)
+    flush(ocr_text_position_queue, TEXT_POSITION_EXTRACT_TOPIC, in_memory=True)
+    checkpoint.done(*handled_pages)
+
+    IMAGE_PLANNER.record(image_count, sum(image_times))
 
     return "Ok"
 
@@ -909,26 +1568,27 @@ def assemble_page_text(data, _context=None):
     except Exception as exc:  # pylint: disable=broad-except
         logger.exception("[Grafting doc_id %s failed]", doc_id, exc_info=exc)
 
-    # Remove the in-memory text PDFs from Redis
+    # Remove the intermediate text PDFs
     # (now that the PDF is grafted, OCR does not have to run if reprocessed)
-    REDIS.delete(redis_fields.page_text_pdf(doc_id))
+    utils.delete_page_text_pdfs(REDIS, doc_id)
 
     results = utils.get_all_page_text(REDIS, doc_id)
 
     if partial:
         # Patch the old results in if it's a partial update
-        results = patch_partial_page_text(doc_id, slug, results)
+        patch_partial_page_text(doc_id, slug, access, results)
+    else:
+        # Compile and write concatenated text only outside of import mode
+        # (we don't want to overwrite the previous file)
+        write_concatenated_text_file(doc_id, slug, access, results["pages"])
 
-    # Compile and write concatenated text only outside of import mode
-    # (we don't want to overwrite the previous file)
-    write_concatenated_text_file(doc_id, slug, access, results["pages"])
+        # Write the json text file
+        write_json_text_file(doc_id, slug, access, results)
 
-    # Write the json text file
-    storage.simple_upload(
-        path.json_text_path(doc_id, slug),
-        json.dumps(results).encode("utf-8"),
-        access=access,
-    )
+        # Let later uploads of the same file reuse this document's assets
+        asset_cache.store(
+            REDIS, doc_id, slug, crunch_collection(get_redis_pagespec(doc_id))
+        )
 
     # All done processing the doc now
     utils.send_complete(REDIS, doc_id)
@@ -954,107 +1614,83 @@ def extract_text_position(data, _context=None):
     logger.info(
         "[EXTRACT TEXT POSITION] doc_id %s page_numbers %s", doc_id, page_numbers
     )
+    start_time = time.time()
 
-    page_text_pdf_field = redis_fields.page_text_pdf(doc_id)
-
-    # Grab the PDF
-    errored = False
-    pdf = None
-    if not in_memory:
-        # If not using in-memory Redis PDFs, read the whole doc file into memory
-        with storage.open(doc_path, "rb") as doc_file:
-            contents = doc_file.read()
-            mem_file = io.BytesIO(contents)
-        try:
-            pdf = pdfplumber.open(mem_file)
-        except Exception as exc:  # pylint: disable=broad-except
-            logger.exception(
-                "[Opening pdfplumber doc_id %s failed]", doc_id, exc_info=exc
-            )
-            errored = True
-
-    # Write all the text positions to file
-
-    # Go through each page
-    for page_number in page_numbers:
-        logger.info(
-            "[EXTRACT TEXT POSITION] doc_id %s page_number %s", doc_id, page_number
-        )
+    uploads = []
+    with Workspace() as workspace:
         if in_memory:
-            # If in-memory, use the Redis overlay PDF
-            errored = False
-            overlay_mem_file = io.BytesIO(
-                REDIS.hget(page_text_pdf_field, f"{page_number}")
-            )
-            try:
-                pdf = pdfplumber.open(overlay_mem_file)
-            except Exception as exc:  # pylint: disable=broad-except
-                logger.exception(
-                    "[Opening pdfplumber doc_id %s failed]", doc_id, exc_info=exc
-                )
-                errored = True
-
-        if not errored:
-            try:
-                extract_text_position_for_page(
-                    pdf, doc_id, slug, page_number, access, in_memory
-                )
-            except Exception as exc:  # pylint: disable=broad-except
-                logger.exception(
-                    "[Extracting pdfplumber doc_id %s page %d failed]",
+            # If in-memory, use the stored overlay PDFs, whose first and only
+            # page is the OCRd page
+            text_pdfs = utils.read_page_text_pdfs(REDIS, doc_id, page_numbers)
+            for page_number, text_pdf in zip(page_numbers, text_pdfs):
+                logger.info(
+                    "[EXTRACT TEXT POSITION] doc_id %s page_number %s",
                     doc_id,
                     page_number,
-                    exc_info=exc,
                 )
+                try:
+                    with load_page_text_pdf(workspace, text_pdf) as overlay:
+                        extract_text_position_for_page(
+                            overlay.load_page(0), doc_id, slug, page_number, uploads
+                        )
+                except Exception as exc:  # pylint: disable=broad-except
+                    logger.exception(
+                        "[Extracting text position doc_id %s page %d failed]",
+                        doc_id,
+                        page_number,
+                        exc_info=exc,
+                    )
+        else:
+            # Otherwise read just the pages' ranges of the document
+            page_index = read_cache(path.index_path(doc_id, slug))
+            prefetch = (
+                page_index.ranges(page_numbers, PREFETCH_GAP)
+                if page_index is not None
+                else None
+            )
+            try:
+                with StorageHandler(
+                    storage,
+                    doc_path,
+                    prefetch=prefetch,
+                    block_size=BLOCK_SIZE,
+                    cache_blocks=CACHE_BLOCKS,
+                    read_ahead=READ_AHEAD_BLOCKS,
+                ) as pdf_file, workspace.load_document_custom(pdf_file) as doc:
+                    for page_number in page_numbers:
+                        logger.info(
+                            "[EXTRACT TEXT POSITION] doc_id %s page_number %s",
+                            doc_id,
+                            page_number,
+                        )
+                        try:
+                            extract_text_position_for_page(
+                                doc.load_page(page_number),
+                                doc_id,
+                                slug,
+                                page_number,
+                                uploads,
+                            )
+                        except Exception as exc:  # pylint: disable=broad-except
+                            logger.exception(
+                                "[Extracting text position doc_id %s page %d failed]",
+                                doc_id,
+                                page_number,
+                                exc_info=exc,
+                            )
+                    telemetry.add(bytes_read=pdf_file.bytes_read())
+            except Exception as exc:  # pylint: disable=broad-except
+                logger.exception("[Opening doc_id %s failed]", doc_id, exc_info=exc)
 
-        if in_memory and pdf:
-            # Close pdfplumber on the overlay pdf
-            pdf.close()
+    # Write all the text positions to file
+    upload_page_files(uploads, access)
 
-        # Check if all text positions have been extracted
-        text_positions_finished = utils.register_text_position_extracted(
-            REDIS, doc_id, page_number
-        )
-        logger.info(
-            "[EXTRACT TEXT POSITION] doc_id %s finished %s",
-            doc_id,
-            text_positions_finished,
-        )
-        if text_positions_finished:
-            if page_modification is not None:
-                # Normally, processing entails assembling text once
-                # finished. In page modification mode, the consolidated
-                # json has already been created, so now we defer to
-                # finishing steps.
-                raw_pagespec = get_redis_pagespec(doc_id)
-                pagespec = crunch_collection(raw_pagespec)
-                filehash = utils.pop_file_hash(REDIS, doc_id)
-                utils.send_modification_post_processing(
-                    REDIS,
-                    doc_id,
-                    {
-                        "modifications": page_modification["modifications"],
-                        "pagespec": pagespec,
-                        "filehash": filehash,
-                    },
-                )
-            else:
-                # Move on to assembling/grafting the text back into the pdf
-                publisher.publish(
-                    ASSEMBLE_TEXT_TOPIC,
-                    encode_pubsub_data(
-                        {
-                            "doc_id": doc_id,
-                            "slug": slug,
-                            "access": access,
-                            "partial": partial,
-                        }
-                    ),
-                )
+    # Register the batch's text positions and check if all have been extracted
+    register_text_positions(
+        doc_id, slug, access, partial, page_modification, page_numbers
+    )
 
-    if not in_memory and pdf:
-        # Close pdfplumber
-        pdf.close()
+    TEXT_POSITION_PLANNER.record(len(page_numbers), time.time() - start_time)
 
     return "Ok"
 
@@ -1081,14 +1717,45 @@ def redact_doc(data, _context=None):
     for redaction in redactions:
         dirty_pages.add(redaction["page_number"])
 
-    # Perform the actual redactions
+    # The document's assets are about to change
+    asset_cache.forget(REDIS, doc_id)
+
+    # Perform the actual redactions, as an incremental update to the PDF if
+    # possible
+    try:
+        page_index = redact_document_incrementally(doc_id, slug, access, redactions)
+    except IncrementalRedactionError as exc:
+        logger.info("[REDACT DOC] doc_id %s rewriting the document: %s", doc_id, exc)
+        page_index = None
+
+    dirty_pages_list = sorted(dirty_pages)
+    if page_index is not None:
+        # The page index has been patched for the redacted pages, so go
+        # straight to extracting them
+        initialize_partial_redis_page_data(doc_id, page_index.page_count, dirty_pages)
+        publish_image_batches(
+            page_index,
+            {
+                "doc_id": doc_id,
+                "slug": slug,
+                "access": access,
+                "ocr_code": ocr_code,
+                "partial": dirty_pages_list,
+                "force_ocr": False,
+                "ocr_engine": "tess4",
+                "page_count": page_index.page_count,
+                "org_id": None,
+                "page_modification": None,
+            },
+        )
+        return "Ok"
+
     redact_document_and_overwrite(doc_id, slug, access, redactions)
 
     page_count = extract_pagecount(doc_id, slug)
     initialize_partial_redis_page_data(doc_id, page_count, dirty_pages)
 
     # Kick off page cache processing
-    dirty_pages_list = sorted(dirty_pages)
     publisher.publish(
         PAGE_CACHE_TOPIC,
         data=encode_pubsub_data(
@@ -1119,13 +1786,15 @@ def modify_doc(data, _context=None):
         "[MODIFY DOC] doc_id %s modifications %s", doc_id, json.dumps(modifications)
     )
 
+    # The document's assets are about to change
+    asset_cache.forget(REDIS, doc_id)
+
     # Construct modified pdf
     modify_context = {
         "doc_id": doc_id,
         "slug": slug,
         "current_page_index": 0,
         "page_text_todo": [],
-        "page_text_download_urls": set(),
     }
 
     with Workspace() as workspace:
@@ -1159,32 +1828,60 @@ def modify_doc(data, _context=None):
 
         # Assemble full json structure and write to file
         full_page_text_json = {"updated": millis(), "pages": page_text_json}
-        page_text_json_path = path.json_text_path(doc_id, slug)
-        storage.simple_upload(
-            page_text_json_path,
-            json.dumps(full_page_text_json).encode("utf-8"),
-            access=access,
-        )
+        write_json_text_file(doc_id, slug, access, full_page_text_json)
 
         logger.info("[MODIFY DOC] doc_id %s overwrite text file", doc_id)
 
         # Write concatenated text file as well
         write_concatenated_text_file(doc_id, slug, access, page_text_json)
 
-        logger.info("[MODIFY DOC] doc_id %s delete old page files", doc_id)
+        page_modification = {
+            "page_text_json_file": path.json_text_path(doc_id, slug),
+            "modifications": backup_modifications,
+        }
+        extract_pages = None
+        if MODIFY_COPY_ASSETS:
+            logger.info("[MODIFY DOC] doc_id %s copy page files", doc_id)
+            page_sources = modification_page_sources(doc_id, slug, backup_modifications)
+            try:
+                extract_pages = copy_page_assets(doc_id, slug, access, page_sources)
+            except Exception as exc:  # pylint: disable=broad-except
+                # Fall back to extracting every page
+                logger.warning(
+                    "[MODIFY DOC] doc_id %s copying page files failed: %s",
+                    doc_id,
+                    exc,
+                    exc_info=exc,
+                )
+
+        if extract_pages is None:
+            logger.info("[MODIFY DOC] doc_id %s delete old page files", doc_id)
 
-        # Delete old page files
-        storage.delete(path.pages_path(doc_id))
+            # Delete old page files
+            storage.delete(path.pages_path(doc_id))
 
         logger.info("[MODIFY DOC] doc_id %s process new pdf", doc_id)
 
         # Kick off processing tasks to
         #  * extract new index file for PDF and ensure PDF file is within size limits
-        #  * reextract all image files and derive page spec
+        #  * reextract the image files of pages which were not copied and derive
+        #    page spec
         #  * create text files from consolidated page text json
         #  * copy temporary directory into original directory
         utils.clean_up(REDIS, doc_id)
         utils.initialize(REDIS, doc_id)
+        if extract_pages is not None:
+            # The copied pages are not extracted, so record their dimensions
+            extract_set = set(extract_pages)
+            page_dimensions = []
+            for page_number in range(new_doc.page_count):
+                if page_number not in extract_set:
+                    with new_doc.load_page(page_number) as page:
+                        page_dimensions.append(
+                            (page_number, f"{page.width}x{page.height}")
+                        )
+            utils.write_page_dimensions(REDIS, doc_id, page_dimensions)
+            page_modification["pages"] = extract_pages
         publisher.publish(
             PDF_PROCESS_TOPIC,
             data=encode_pubsub_data(
@@ -1192,10 +1889,7 @@ def modify_doc(data, _context=None):
                     "doc_id": doc_id,
                     "slug": slug,
                     "access": access,
-                    "page_modification": {
-                        "page_text_json_file": page_text_json_path,
-                        "modifications": backup_modifications,
-                    },
+                    "page_modification": page_modification,
                 }
             ),
         )
@@ -1291,12 +1985,16 @@ def import_document(data, _context=None):
     doc_path = path.doc_path(doc_id, slug)
     try:
         with Workspace() as workspace, StorageHandler(
-            storage, doc_path, record=True, playback=False, cache=None, read_all=True
+            storage,
+            doc_path,
+            record=True,
+            spool=True,
+            spool_directory=SPOOL_DIRECTORY,
         ) as pdf_file, workspace.load_document_custom(pdf_file) as doc:
-            # Load the final page to memoize all page accesses
+            # Imports only index the document ranges, to avoid loading every
+            # page twice
             page_count = doc.page_count
-            doc.load_page(page_count - 1)
-            cached = pdf_file.cache
+            cached = index_document(doc, pdf_file, page_ranges=False)
 
             # Write the index file
             # simple retry for s3 errors
@@ -1337,7 +2035,7 @@ def import_document(data, _context=None):
     pagespec = collections.defaultdict(list)
     try:
         with Workspace() as workspace, StorageHandler(
-            storage, doc_path, record=False, playback=False, cache=None, read_all=True
+            storage, doc_path, spool=True, spool_directory=SPOOL_DIRECTORY
         ) as pdf_file, workspace.load_document_custom(pdf_file) as doc:
             for page_number in range(page_count):
                 page = doc.load_page(page_number)
@@ -0,0 +1,134 @@
+"""
+A compact index of the byte ranges of a PDF file that pdfium reads to open the
+document and to load each of its pages.
+
+The index only stores ranges, not the data in them, so image extraction can
+fetch just what a batch of pages needs with a few ranged reads.  Ranges are
+packed as fixed-width records so that a page's ranges can be read without
+decoding the rest of the index.
+
+Layout (little-endian):
+    header: magic, version, file size, page count, document range count
+    document ranges: (offset, length) for each document range
+    page table: (first page range, page range count) for each page
+    page ranges: (offset, length) for each page range, in page order
+"""
+
+# Standard Library
+import struct
+
+MAGIC = b"DCPX"
+VERSION = 1
+
+HEADER = struct.Struct("<4sHQII")
+RANGE = struct.Struct("<QI")
+PAGE = struct.Struct("<II")
+
+
+def merge_ranges(ranges, gap=0):
+    """Merge (start, end) ranges which overlap or are within `gap` bytes of each
+    other, returning sorted (start, end) ranges"""
+    merged = []
+    for start, end in sorted(ranges):
+        if merged and start <= merged[-1][1] + gap:
+            if end > merged[-1][1]:
+                merged[-1][1] = end
+        else:
+            merged.append([start, end])
+    return [(start, end) for start, end in merged]
+
+
+def accesses_to_ranges(accesses):
+    """Convert recorded (position, size) reads to merged (start, end) ranges"""
+    return merge_ranges((position, position + size) for position, size in accesses)
+
+
+class PageIndex:
+    """Lazily decoded view over an encoded page index"""
+
+    def __init__(self, contents):
+        self.contents = memoryview(contents)
+        if len(self.contents) < HEADER.size:
+            raise ValueError("Page index is truncated")
+        (
+            magic,
+            version,
+            self.file_size,
+            self.page_count,
+            self.document_range_count,
+        ) = HEADER.unpack_from(self.contents)
+        if magic != MAGIC:
+            raise ValueError("Not a page index")
+        if version != VERSION:
+            raise ValueError(f"Unsupported page index version: {version}")
+
+        self.page_table_offset = HEADER.size + self.document_range_count * RANGE.size
+        self.page_ranges_offset = self.page_table_offset + self.page_count * PAGE.size
+        if len(self.contents) < self.page_ranges_offset:
+            raise ValueError("Page index is truncated")
+
+    @staticmethod
+    def encode(file_size, document_ranges, page_ranges):
+        """Encode an index from (start, end) ranges needed to open the document
+        and lists of (start, end) ranges needed to load each page"""
+        document_ranges = merge_ranges(document_ranges)
+        page_ranges = [merge_ranges(ranges) for ranges in page_ranges]
+
+        parts = [
+            HEADER.pack(
+                MAGIC, VERSION, file_size, len(page_ranges), len(document_ranges)
+            )
+        ]
+        parts.extend(RANGE.pack(start, end - start) for start, end in document_ranges)
+        first = 0
+        for ranges in page_ranges:
+            parts.append(PAGE.pack(first, len(ranges)))
+            first += len(ranges)
+        for ranges in page_ranges:
+            parts.extend(RANGE.pack(start, end - start) for start, end in ranges)
+        return b"".join(parts)
+
+    def _ranges(self, offset, count):
+        return [
+            (start, start + length)
+            for start, length in RANGE.iter_unpack(
+                self.contents[offset : offset + count * RANGE.size]
+            )
+        ]
+
+    def document_ranges(self):
+        """The ranges read to open the document"""
+        return self._ranges(HEADER.size, self.document_range_count)
+
+    def page_ranges(self, page_number):
+        """The ranges read to load a page, beyond those already read to open the
+        document or to load earlier pages"""
+        if not 0 <= page_number < self.page_count:
+            return []
+        first, count = PAGE.unpack_from(
+            self.contents, self.page_table_offset + page_number * PAGE.size
+        )
+        return self._ranges(self.page_ranges_offset + first * RANGE.size, count)
+
+    def ranges(self, page_numbers, gap=0):
+        """The merged ranges needed to open the document and load the pages"""
+        ranges = self.document_ranges()
+        for page_number in page_numbers:
+            ranges.extend(self.page_ranges(page_number))
+        return merge_ranges(ranges, gap)
+
+    def patch(self, file_size, document_ranges, page_ranges):
+        """Encode a copy of the index for a file which has been appended to,
+        adding (start, end) ranges to the document's and to the given pages'.
+
+        `page_ranges` maps page numbers to the ranges to add to them.  The
+        ranges of every other page are kept as they are.
+        """
+        return PageIndex.encode(
+            file_size,
+            self.document_ranges() + list(document_ranges),
+            [
+                self.page_ranges(page_number) + list(page_ranges.get(page_number, []))
+                for page_number in range(self.page_count)
+            ],
+        )
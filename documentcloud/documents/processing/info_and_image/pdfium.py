@@ -1,9 +1,15 @@
 # Standard Library
+import bisect
 import collections
 import ctypes
 import hashlib
 import io
+import itertools
+import mmap
 import os
+import tempfile
+import threading
+from concurrent.futures import ThreadPoolExecutor
 from ctypes import (
     CFUNCTYPE,
     POINTER,
@@ -14,6 +20,7 @@ from ctypes import (
     c_float,
     c_int,
     c_ubyte,
+    c_uint,
     c_uint8,
     c_uint32,
     c_ulong,
@@ -25,12 +32,25 @@ from ctypes import (
 # Third Party
 import PIL.Image
 
+c_double_p = POINTER(c_double)
 c_float_p = POINTER(c_float)
+c_int_p = POINTER(c_int)
 c_ushort_p = POINTER(c_ushort)
 c_ubyte_p = POINTER(c_ubyte)
 c_uint8_p = POINTER(c_uint8)
 
 INT_MAX = 2147483647
+SPOOL_CHUNK_SIZE = 1024 * 1024
+
+# Device units per point when mapping character boxes to page positions
+WORD_SCALE = 100
+# Character matrices for each page rotation, in quarter turns clockwise
+ROTATION_MATRICES = {
+    0: (1, 0, 0, 1),
+    1: (0, -1, 1, 0),
+    2: (-1, 0, 0, -1),
+    3: (0, 1, -1, 0),
+}
 
 # Adapted from https://github.com/gersonkurz/pydfium
 
@@ -51,6 +71,26 @@ class FPDFFileWrite(Structure):
     ]
 
 
+class FSRectF(Structure):
+    _fields_ = [
+        ("left", c_float),
+        ("top", c_float),
+        ("right", c_float),
+        ("bottom", c_float),
+    ]
+
+
+class FSMatrix(Structure):
+    _fields_ = [
+        ("a", c_float),
+        ("b", c_float),
+        ("c", c_float),
+        ("d", c_float),
+        ("e", c_float),
+        ("f", c_float),
+    ]
+
+
 class FPDFFileAccess(Structure):
     _fields_ = [
         ("m_FileLen", c_ulong),
@@ -88,13 +128,13 @@ class Bitmap:
             self.bitmap, self.page, 0, 0, self.width, self.height, 0, 0x800
         )
 
-        stride = self.workspace.fpdf_bitmap_get_stride(self.bitmap)
+        self.stride = self.workspace.fpdf_bitmap_get_stride(self.bitmap)
 
         # Safety checks to make sure that the bitmap is rendered correctly
         if (
-            (stride < 0)
+            (self.stride < 0)
             or (self.width > INT_MAX / self.height)
-            or ((stride * self.height) > (INT_MAX / 3))
+            or ((self.stride * self.height) > (INT_MAX / 3))
         ):
             raise RuntimeError("Invalid bitmap")
 
@@ -121,18 +161,23 @@ class Bitmap:
         )
 
     def get_image(self):
-        # Use PIL to get an image buffer
-        bufflen = self.width * self.height * 4
+        # Use PIL to get an image buffer. pdfium lays out pixels as BGRx, so
+        # decoding with the BGRX raw mode swaps the channels to RGB in a single
+        # pass instead of splitting and merging channel copies. The decoded
+        # image owns its memory, so it outlives the bitmap.
+        bufflen = self.stride * self.height
         bitmap = self.workspace.fpdf_get_bitmap_buffer(self.bitmap)
         bitmap = ctypes.cast(bitmap, ctypes.POINTER((bufflen * ctypes.c_ubyte)))
 
-        img = PIL.Image.frombuffer(
-            "RGBA", (self.width, self.height), bitmap.contents, "raw", "RGBA", 0, 1
+        return PIL.Image.frombuffer(
+            "RGB",
+            (self.width, self.height),
+            bitmap.contents,
+            "raw",
+            "BGRX",
+            self.stride,
+            1,
         )
-        # pylint: disable=invalid-name, unbalanced-tuple-unpacking
-        b, g, r, _a = img.split()
-        img = PIL.Image.merge("RGB", (r, g, b))
-        return img
 
     def render(self, storage, filename, access, image_format="gif"):
         img = self.get_image()
@@ -147,6 +192,7 @@ class Document:
         self.workspace = workspace
         self.doc = doc
         self.size = size  # File size, passed in in some cases
+        self.contents = None  # The buffer of a document loaded from memory
         self.loaded_fonts = []
 
         self._serif = None
@@ -221,16 +267,9 @@ class Document:
                 page_number = operation["page"]
 
                 # Apply redactions
-                old_page = self.load_page(page_number)
-                page_bitmap = old_page.get_bitmap(old_page.width * 2, None)
-                for redaction in redactions_by_page[page_number]:
-                    page_bitmap.fill_rect(
-                        redaction["x1"],
-                        redaction["y1"],
-                        redaction["x2"],
-                        redaction["y2"],
-                        0xFF000000,  # black
-                    )
+                old_page, page_bitmap = self.redact_page(
+                    page_number, redactions_by_page[page_number]
+                )
                 redacted_page = new_doc.add_page(old_page.width, old_page.height)
                 redacted_page.add_bitmap(
                     page_bitmap, 0, 0, old_page.width, old_page.height
@@ -242,6 +281,24 @@ class Document:
 
         return new_doc
 
+    def redact_page(self, page_number, redactions):
+        """Render a page with its redactions filled in black.
+
+        Returns:
+            The page and the bitmap it was rendered to.
+        """
+        page = self.load_page(page_number)
+        page_bitmap = page.get_bitmap(page.width * 2, None)
+        for redaction in redactions:
+            page_bitmap.fill_rect(
+                redaction["x1"],
+                redaction["y1"],
+                redaction["x2"],
+                redaction["y2"],
+                0xFF000000,  # black
+            )
+        return page, page_bitmap
+
     def load_page(self, page_number):
         result = self.workspace.fpdf_load_page(self.doc, page_number)
         if not result:
@@ -441,6 +498,172 @@ class Page:
     def rotation(self):
         return self.workspace.fpdf_get_page_rotation(self.page)
 
+    def get_char_box(self, text_page, index):
+        """The (left, bottom, right, top) box of a character in page space,
+        preferring the font-height box where pdfium supports it"""
+        if self.workspace.fpdf_text_get_loose_char_box is not None:
+            rect = FSRectF()
+            if self.workspace.fpdf_text_get_loose_char_box(
+                text_page, index, byref(rect)
+            ):
+                return (rect.left, rect.bottom, rect.right, rect.top)
+            return None
+
+        left = c_double(0)
+        right = c_double(0)
+        bottom = c_double(0)
+        top = c_double(0)
+        if not self.workspace.fpdf_text_get_char_box(
+            text_page, index, byref(left), byref(right), byref(bottom), byref(top)
+        ):
+            return None
+        return (left.value, bottom.value, right.value, top.value)
+
+    def char_upright(self, text_page, index, rotation):
+        """Whether a character is upright as displayed, as pdfminer judges it"""
+        rotation_matrix = ROTATION_MATRICES[rotation % 4]
+        if self.workspace.fpdf_text_get_matrix is None:
+            a, b, c, d = rotation_matrix
+        else:
+            matrix = FSMatrix()
+            if not self.workspace.fpdf_text_get_matrix(text_page, index, byref(matrix)):
+                return rotation % 2 == 0
+            a, b, c, d = multiply_matrices(
+                (matrix.a, matrix.b, matrix.c, matrix.d), rotation_matrix
+            )
+        return 0 < a * d and b * c <= 0
+
+    def page_to_device(self, size_x, size_y, page_x, page_y):
+        device_x = c_int(0)
+        device_y = c_int(0)
+        self.workspace.fpdf_page_to_device(
+            self.page,
+            0,
+            0,
+            size_x,
+            size_y,
+            0,
+            page_x,
+            page_y,
+            byref(device_x),
+            byref(device_y),
+        )
+        return (device_x.value, device_y.value)
+
+    def get_words(self, x_tolerance=3, y_tolerance=3):
+        """Extract the words on the page with their positions, normalized to the
+        page size, matching pdfplumber's `extract_words(use_text_flow=True)`"""
+        # pylint: disable=too-many-locals
+        size_x = max(round(self.width * WORD_SCALE), 1)
+        size_y = max(round(self.height * WORD_SCALE), 1)
+        rotation = self.rotation
+
+        chars = []
+        text_page = self.workspace.fpdf_text_load_page(self.page)
+        try:
+            for index in range(self.workspace.fpdf_text_count_chars(text_page)):
+                text = chr(self.workspace.fpdf_text_get_unicode(text_page, index))
+                box = None if text.isspace() else self.get_char_box(text_page, index)
+                if box is None:
+                    # Whitespace separates words
+                    chars.append(None)
+                    continue
+
+                # Map the box into top-down device space, which applies the page
+                # rotation and crop box
+                left, bottom, right, top = box
+                corner_x1, corner_y1 = self.page_to_device(size_x, size_y, left, bottom)
+                corner_x2, corner_y2 = self.page_to_device(size_x, size_y, right, top)
+                chars.append(
+                    {
+                        "text": text,
+                        "x0": min(corner_x1, corner_x2),
+                        "x1": max(corner_x1, corner_x2),
+                        "top": min(corner_y1, corner_y2),
+                        "bottom": max(corner_y1, corner_y2),
+                        "upright": self.char_upright(text_page, index, rotation),
+                    }
+                )
+        finally:
+            self.workspace.fpdf_text_close_page(text_page)
+
+        return [
+            {
+                "text": word["text"],
+                "x1": word["x0"] / size_x,
+                "x2": word["x1"] / size_x,
+                "y1": word["top"] / size_y,
+                "y2": word["bottom"] / size_y,
+                "upright": word["upright"],
+                "direction": word["direction"],
+            }
+            for word in group_words(
+                chars, x_tolerance * WORD_SCALE, y_tolerance * WORD_SCALE
+            )
+        ]
+
+
+def multiply_matrices(first, second):
+    """Multiply two (a, b, c, d) matrices, in PDF's row vector convention"""
+    a1, b1, c1, d1 = first
+    a2, b2, c2, d2 = second
+    return (
+        a1 * a2 + b1 * c2,
+        a1 * b2 + b1 * d2,
+        c1 * a2 + d1 * c2,
+        c1 * b2 + d1 * d2,
+    )
+
+
+def group_words(chars, x_tolerance, y_tolerance):
+    """Group characters in text flow order into words, the way pdfplumber's
+    word extractor does.  `chars` holds dicts with the text, x0, x1, top,
+    bottom and upright of each character, or None for whitespace."""
+
+    def begins_new_word(word, char):
+        # Characters outside the tolerance of the word so far start a new word
+        upright = word["upright"]
+        intraline_tolerance = x_tolerance if upright else y_tolerance
+        interline_tolerance = y_tolerance if upright else x_tolerance
+        return (
+            char["x0"] > word["x1"] + intraline_tolerance
+            or char["x1"] < word["x0"] - intraline_tolerance
+            or char["top"] > word["bottom"] + interline_tolerance
+            or char["bottom"] < word["top"] - interline_tolerance
+        )
+
+    def finish_word(word):
+        # Recombine any surrogate pairs split across characters
+        word["text"] = (
+            "".join(word["text"])
+            .encode("utf-16-le", "surrogatepass")
+            .decode("utf-16-le", "replace")
+        )
+        # pdfplumber reads both horizontal and vertical text forwards
+        word["direction"] = 1
+        return word
+
+    words = []
+    word = None
+    for char in chars:
+        if char is None or (word is not None and begins_new_word(word, char)):
+            if word is not None:
+                words.append(finish_word(word))
+                word = None
+        if char is None:
+            continue
+        if word is None:
+            word = dict(char, text=[char["text"]])
+        else:
+            word["text"].append(char["text"])
+            word["x0"] = min(word["x0"], char["x0"])
+            word["x1"] = max(word["x1"], char["x1"])
+            word["top"] = min(word["top"], char["top"])
+            word["bottom"] = max(word["bottom"], char["bottom"])
+    if word is not None:
+        words.append(finish_word(word))
+    return words
+
 
 def fpdf_string(text):
     if text is not None:
@@ -473,6 +696,9 @@ class Workspace:
             ("FPDF_LoadCustomDocument", self.pdfium)
         )
 
+        prototype = CFUNCTYPE(c_void_p, c_char_p, c_int, c_char_p)
+        self.fpdf_load_mem_document = prototype(("FPDF_LoadMemDocument", self.pdfium))
+
         prototype = CFUNCTYPE(None, c_void_p)
         self.fpdf_close_document = prototype(("FPDF_CloseDocument", self.pdfium))
 
@@ -527,6 +753,40 @@ class Workspace:
         prototype = CFUNCTYPE(c_int, c_void_p, c_int, c_int, c_ushort_p)
         self.fpdf_text_get_text = prototype(("FPDFText_GetText", self.pdfium))
 
+        prototype = CFUNCTYPE(c_uint, c_void_p, c_int)
+        self.fpdf_text_get_unicode = prototype(("FPDFText_GetUnicode", self.pdfium))
+
+        prototype = CFUNCTYPE(
+            c_int, c_void_p, c_int, c_double_p, c_double_p, c_double_p, c_double_p
+        )
+        self.fpdf_text_get_char_box = prototype(("FPDFText_GetCharBox", self.pdfium))
+
+        # Only in more recent pdfium builds
+        prototype = CFUNCTYPE(c_int, c_void_p, c_int, POINTER(FSRectF))
+        self.fpdf_text_get_loose_char_box = self.optional_function(
+            prototype, "FPDFText_GetLooseCharBox"
+        )
+
+        prototype = CFUNCTYPE(c_int, c_void_p, c_int, POINTER(FSMatrix))
+        self.fpdf_text_get_matrix = self.optional_function(
+            prototype, "FPDFText_GetMatrix"
+        )
+
+        prototype = CFUNCTYPE(
+            c_int,
+            c_void_p,
+            c_int,
+            c_int,
+            c_int,
+            c_int,
+            c_int,
+            c_double,
+            c_double,
+            c_int_p,
+            c_int_p,
+        )
+        self.fpdf_page_to_device = prototype(("FPDF_PageToDevice", self.pdfium))
+
         # PDF editing
         prototype = CFUNCTYPE(c_void_p)
         self.fpdf_create_new_document = prototype(
@@ -626,6 +886,13 @@ class Workspace:
         prototype = CFUNCTYPE(c_int, c_void_p, c_void_p, c_ulong)
         self.fpdf_save_as_copy = prototype(("FPDF_SaveAsCopy", self.pdfium))
 
+    def optional_function(self, prototype, name):
+        """Bind a function which older pdfium builds may not export"""
+        try:
+            return prototype((name, self.pdfium))
+        except AttributeError:
+            return None
+
     def free_library(self):
         if self.pdfium is not None:
             self.pdfium.FPDF_DestroyLibrary()
@@ -647,8 +914,22 @@ class Workspace:
 
         return Document(self, result)
 
+    def load_document_bytes(self, contents, password=None):
+        """Load a document held in memory"""
+        result = self.fpdf_load_mem_document(
+            contents, len(contents), fpdf_string(password)
+        )
+        if not result:
+            error = self.pdfium.FPDF_GetLastError()
+            assert False, f"ERROR {error}: unable to load document from memory"
+
+        document = Document(self, result, len(contents))
+        # pdfium reads from the buffer for as long as the document is open
+        document.contents = contents
+        return document
+
     def load_document_entirely(self, storage, path, password=None):
-        handler = StorageHandler(storage, path, False, False, None, read_all=True)
+        handler = StorageHandler(storage, path, read_all=True)
         return self.load_document_custom(handler, password)
 
     def load_document_custom(self, handler, password=None):
@@ -668,21 +949,49 @@ class Workspace:
 
 
 class StorageCacher:
-    """Wraps a file handle into a structure that caches evenly sized blocks."""
+    """Random access to a file in storage through ranged reads of evenly sized
+    blocks, keeping the most recently used blocks in memory.
+
+    Adjacent missing blocks are fetched with a single ranged read, and when
+    blocks are accessed sequentially the following blocks are read ahead in
+    the background.
+    """
 
-    def __init__(self, handle, file_size, block_size):
-        self.handle = handle
+    # pylint: disable=too-many-instance-attributes
+    def __init__(
+        self, storage, filename, file_size, block_size, max_blocks=None, read_ahead=0
+    ):
+        # pylint: disable=too-many-arguments
+        self.storage = storage
+        self.filename = filename
         # The size of the actual file being wrapped
         self.file_size = file_size
 
         # The internal block size
         self.block_size = block_size
+        self.last_block_idx = max(file_size - 1, 0) // block_size
+
+        # The most blocks to keep in memory (unbounded if None)
+        self.max_blocks = max_blocks
+
+        # The number of blocks to read ahead of sequential access
+        self.read_ahead = read_ahead
+        self.executor = ThreadPoolExecutor(max_workers=1) if read_ahead else None
 
         # The current seek position
         self.seek_position = 0
 
-        # Create all the possible blocks
-        self.blocks = {}
+        # Cached blocks, least recently used first
+        self.blocks = collections.OrderedDict()
+        # Futures for blocks being read ahead
+        self.pending = {}
+        self.previous_idx = None
+
+        # Counters
+        self.hits = 0
+        self.misses = 0
+        self.bytes_fetched = 0
+        self.lock = threading.Lock()
 
     def seek(self, position, _flag):
         self.seek_position = position
@@ -691,39 +1000,200 @@ class StorageCacher:
         return self._read(self.seek_position, num_bytes)
 
     def close(self):
-        self.handle.close()
-
-    def _get_block(self, idx):
-        assert idx <= (self.file_size - 1) // self.block_size
-        if idx in self.blocks:
-            # The block is already cached
-            return self.blocks[idx]
+        if self.executor is not None:
+            self.executor.shutdown(wait=True)
+        self.blocks.clear()
+        self.pending.clear()
+
+    def stats(self):
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "bytes_fetched": self.bytes_fetched,
+        }
+
+    def _fetch(self, first_idx, last_idx):
+        """Fetch a run of blocks with a single ranged read"""
+        start = first_idx * self.block_size
+        end = min((last_idx + 1) * self.block_size, self.file_size)
+        contents = self.storage.read_range(self.filename, start, end)
+        with self.lock:
+            self.bytes_fetched += len(contents)
+        return {
+            idx: contents[
+                (idx - first_idx)
+                * self.block_size : (idx - first_idx + 1)
+                * self.block_size
+            ]
+            for idx in range(first_idx, last_idx + 1)
+        }
+
+    def _store(self, blocks):
+        for idx, contents in blocks.items():
+            self.blocks[idx] = contents
+            self.blocks.move_to_end(idx)
+        if self.max_blocks is not None:
+            while len(self.blocks) > self.max_blocks:
+                self.blocks.popitem(last=False)
+
+    def _get_blocks(self, first_idx, last_idx):
+        """Return the contents of a run of blocks by index"""
+        assert last_idx <= self.last_block_idx
+        blocks = {}
+        missing = []
+        for idx in range(first_idx, last_idx + 1):
+            if idx in blocks:
+                # Already resolved along with a block read ahead
+                continue
+            if idx in self.blocks:
+                self.hits += 1
+                blocks[idx] = self.blocks[idx]
+            elif idx in self.pending:
+                # Wait for the read ahead to finish
+                self.hits += 1
+                fetched = self.pending[idx].result()
+                for fetched_idx in fetched:
+                    self.pending.pop(fetched_idx, None)
+                self._store(fetched)
+                blocks.update(
+                    (fetched_idx, contents)
+                    for fetched_idx, contents in fetched.items()
+                    if first_idx <= fetched_idx <= last_idx
+                )
+            else:
+                self.misses += 1
+                missing.append(idx)
 
-        # Request the block and cache it
-        self.handle.seek(idx * self.block_size, os.SEEK_SET)
-        self.blocks[idx] = self.handle.read(self.block_size)
-        return self.blocks[idx]
+        # Fetch each run of adjacent missing blocks at once
+        for _, run in itertools.groupby(
+            enumerate(missing), lambda item: item[1] - item[0]
+        ):
+            run = [idx for _, idx in run]
+            fetched = self._fetch(run[0], run[-1])
+            self._store(fetched)
+            blocks.update(fetched)
+
+        for idx in blocks:
+            if idx in self.blocks:
+                self.blocks.move_to_end(idx)
+
+        self._schedule_read_ahead(first_idx, last_idx)
+        return blocks
+
+    def _schedule_read_ahead(self, first_idx, last_idx):
+        sequential = self.previous_idx is not None and first_idx in (
+            self.previous_idx,
+            self.previous_idx + 1,
+        )
+        self.previous_idx = last_idx
+        if self.executor is None or not sequential:
+            return
+
+        # Read ahead the blocks up to the first one already cached or pending,
+        # in a single request
+        run = list(
+            itertools.takewhile(
+                lambda idx: idx not in self.blocks and idx not in self.pending,
+                range(
+                    last_idx + 1,
+                    min(last_idx + self.read_ahead, self.last_block_idx) + 1,
+                ),
+            )
+        )
+        if run:
+            future = self.executor.submit(self._fetch, run[0], run[-1])
+            for idx in run:
+                self.pending[idx] = future
 
     def _read(self, start_pos, num_bytes):
-        # Calculate which block to read from
-        block_idx = start_pos // self.block_size
-
-        # Calculate offsets
-        block_start = block_idx * self.block_size
-        block_start_offset = start_pos - block_start
-        block_end_offset = min(block_start_offset + num_bytes, self.block_size)
-
-        # Extract the appropriate contents from the block
-        contents = self._get_block(block_idx)[block_start_offset:block_end_offset]
-
-        if num_bytes > block_end_offset - block_start_offset:
-            # If the read contents span an additional block, recursively return that
-            return contents + self._read(
-                block_start + self.block_size,
-                num_bytes - block_end_offset + block_start_offset,
-            )
+        if num_bytes <= 0 or start_pos >= self.file_size:
+            return b""
+        num_bytes = min(num_bytes, self.file_size - start_pos)
+
+        # Calculate which blocks to read from
+        first_idx = start_pos // self.block_size
+        last_idx = (start_pos + num_bytes - 1) // self.block_size
+        offset = start_pos - first_idx * self.block_size
+
+        blocks = self._get_blocks(first_idx, last_idx)
+        if first_idx == last_idx:
+            return blocks[first_idx][offset : offset + num_bytes]
+
+        # The read spans multiple blocks
+        contents = b"".join(blocks[idx] for idx in range(first_idx, last_idx + 1))
+        return contents[offset : offset + num_bytes]
+
+
+def storage_sha1(storage, filename, chunk_size=None):
+    """The sha1 hash of a file in storage, streamed a chunk at a time"""
+    if chunk_size is None:
+        chunk_size = SPOOL_CHUNK_SIZE
+    sha1 = hashlib.sha1()
+    with storage.open(filename, "rb") as storage_file:
+        while True:
+            chunk = storage_file.read(chunk_size)
+            if not chunk:
+                break
+            sha1.update(chunk)
+    return sha1.hexdigest()
+
+
+class StorageSpool:
+    """Streams a file from storage into a local spool file, hashing it along
+    the way, and reads it back through a read-only memory map.
+
+    The file's contents live in the page cache rather than the Python heap, so
+    the whole file can be read without holding it in memory.
+    """
+
+    def __init__(self, storage, filename, directory=None, chunk_size=None):
+        if chunk_size is None:
+            chunk_size = SPOOL_CHUNK_SIZE
+        sha1 = hashlib.sha1()
+        # The spool file is unlinked as soon as it is created, so it is cleaned
+        # up even if the process dies
+        self.file = tempfile.TemporaryFile(dir=directory)
+        with storage.open(filename, "rb") as storage_file:
+            while True:
+                chunk = storage_file.read(chunk_size)
+                if not chunk:
+                    break
+                sha1.update(chunk)
+                self.file.write(chunk)
+        self.file.flush()
+
+        self.sha1 = sha1.hexdigest()
+        self.size = self.file.tell()
+        if self.size:
+            self.map = mmap.mmap(self.file.fileno(), 0, access=mmap.ACCESS_READ)
         else:
-            return contents
+            # Empty files cannot be memory-mapped
+            self.map = io.BytesIO()
+
+    def seek(self, position, whence=os.SEEK_SET):
+        return self.map.seek(position, whence)
+
+    def read(self, num_bytes=-1):
+        return self.map.read(num_bytes)
+
+    def tell(self):
+        return self.map.tell()
+
+    def seekable(self):
+        return True
+
+    def readable(self):
+        return True
+
+    def close(self):
+        self.map.close()
+        self.file.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
 
 
 class StorageHandler:
@@ -733,16 +1203,23 @@ class StorageHandler:
         storage,
         filename,
         record=False,
-        playback=False,
-        cache=None,
+        prefetch=None,
         read_all=False,
         block_size=None,
+        cache_blocks=None,
+        read_ahead=0,
+        spool=False,
+        spool_directory=None,
     ):
         # pylint: disable=too-many-arguments
         self.filename = filename
         self.read_all = read_all
-        self.cache = {} if cache is None else cache
         self.record = record
+        # The (position, size) of each read, if recording
+        self.accesses = []
+        # Bytes read through an unwrapped storage handle
+        self.handle_bytes_read = 0
+        self.whole_file = read_all or spool
 
         if self.read_all:
             # Create a temporary file in memory and cache the entire file
@@ -752,33 +1229,47 @@ class StorageHandler:
                 self.mem_file = io.BytesIO(contents)
             self.size = self.mem_file.getbuffer().nbytes
             self.handle = self.mem_file.__enter__()
+        elif spool:
+            # Stream the file to a local spool, hashing it on the way
+            self.handle = StorageSpool(storage, filename, spool_directory)
+            self.sha1 = self.handle.sha1
+            self.size = self.handle.size
         else:
             # Read from abstracted storage
-            self.handle = storage.open(filename, "rb").__enter__()
             self.size = storage.size(filename)
-            # The sha1 hash is only computed if the whole file is read into
-            # memory. Technically the hash could be computed in chunks, but the
-            # primary caller of this code will read the whole file into memory
-            # at least once.
+            if block_size is not None:
+                # Reads are wrapped into retrieving blocks with ranged reads,
+                # for more efficient read access.
+                self.handle = StorageCacher(
+                    storage,
+                    filename,
+                    self.size,
+                    block_size,
+                    max_blocks=cache_blocks,
+                    read_ahead=read_ahead,
+                )
+            else:
+                self.handle = storage.open(filename, "rb").__enter__()
+            # The sha1 hash is only computed if the whole file is read, either
+            # into memory or into a spool
             self.sha1 = None
 
-        # If block size is used, storage cacher wraps the reads into retrieving
-        # blocks, for more efficient read access.
-        if block_size is not None:
-            self.handle = StorageCacher(self.handle, self.size, block_size)
+        # Fetch the given (start, end) ranges up front with ranged reads, to
+        # serve reads within them from memory
+        self.prefetched_starts = []
+        self.prefetched = []
+        if prefetch:
+            for start, end in prefetch:
+                end = min(end, self.size)
+                if start < end:
+                    self.prefetched_starts.append(start)
+                    self.prefetched.append(
+                        (start, storage.read_range(filename, start, end))
+                    )
 
         @CFUNCTYPE(c_int, c_void_p, c_ulong, c_ubyte_p, c_ulong)
         def get_block(_param, position, p_buf, size):
-            if playback and (position, size) in self.cache:
-                data = self.cache[(position, size)]
-            else:
-                # Seek in PDF file
-                self.handle.seek(position, os.SEEK_SET)
-
-                data = self.handle.read(size)
-
-            if record:
-                self.cache[(position, size)] = data
+            data = self.read(position, size)
 
             # Copy over data
             ctypes.memmove(p_buf, c_char_p(data), size)
@@ -786,6 +1277,45 @@ class StorageHandler:
 
         self.get_block = get_block
 
+    def read(self, position, size):
+        """Read bytes from the file, from the prefetched ranges if possible"""
+        data = self.prefetched_range(position, size)
+        if data is None:
+            # Seek in PDF file
+            self.handle.seek(position, os.SEEK_SET)
+
+            data = self.handle.read(size)
+            self.handle_bytes_read += len(data)
+
+        if self.record:
+            self.accesses.append((position, size))
+        return data
+
+    def cache_stats(self):
+        """Hit, miss and bytes fetched counters for block cached reads"""
+        if isinstance(self.handle, StorageCacher):
+            return self.handle.stats()
+        return None
+
+    def bytes_read(self):
+        """The number of bytes read from storage"""
+        prefetched = sum(len(contents) for _, contents in self.prefetched)
+        if self.whole_file:
+            return self.size + prefetched
+        if isinstance(self.handle, StorageCacher):
+            return self.handle.bytes_fetched + prefetched
+        return self.handle_bytes_read + prefetched
+
+    def prefetched_range(self, position, size):
+        """The bytes at the position if they were prefetched, otherwise None"""
+        idx = bisect.bisect_right(self.prefetched_starts, position) - 1
+        if idx < 0:
+            return None
+        start, contents = self.prefetched[idx]
+        if position + size > start + len(contents):
+            return None
+        return contents[position - start : position - start + size]
+
     def __enter__(self):
         return self
 
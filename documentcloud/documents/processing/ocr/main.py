@@ -1,9 +1,14 @@
 # Standard Library
+import collections
+import io
 import json
 import logging
 import os
 import tempfile
+import threading
 import time
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from contextlib import contextmanager
 from pathlib import Path
 
 # Third Party
@@ -29,8 +34,14 @@ if env.str("ENVIRONMENT").startswith("local"):
         publisher,
         storage,
     )
-    from documentcloud.common.serverless import utils
+    from documentcloud.common.serverless import checkpoint, utils
+    from documentcloud.common.serverless.batch_planner import (
+        OCR_STAGE,
+        TEXT_POSITION_STAGE,
+        BatchPlanner,
+    )
     from documentcloud.common.serverless.error_handling import pubsub_function
+    from documentcloud.common.text_positions import TEXT_POSITION_PACKED
     from documentcloud.documents.processing.ocr.tess import Tesseract
 else:
     # Third Party
@@ -43,8 +54,14 @@ else:
         publisher,
         storage,
     )
-    from common.serverless import utils
+    from common.serverless import checkpoint, utils
+    from common.serverless.batch_planner import (
+        OCR_STAGE,
+        TEXT_POSITION_STAGE,
+        BatchPlanner,
+    )
     from common.serverless.error_handling import pubsub_function
+    from common.text_positions import TEXT_POSITION_PACKED
     from sentry_sdk.integrations.aws_lambda import AwsLambdaIntegration
     from sentry_sdk.integrations.redis import RedisIntegration
 
@@ -70,6 +87,16 @@ ASSEMBLE_TEXT_TOPIC = publisher.topic_path(
 TEXT_POSITION_BATCH = env.int(
     "TEXT_POSITION_BATCH", 3
 )  # Number of pages to pull text positions from with each function
+TEXT_POSITION_BATCH_MAX = env.int(
+    "TEXT_POSITION_BATCH_MAX", 30
+)  # Most pages to pull text positions from with each function when planned
+
+# The OCR planner only records timings here, batches are planned upstream
+OCR_PLANNER = BatchPlanner(REDIS, OCR_STAGE, 1, 1)
+TEXT_POSITION_PLANNER = BatchPlanner(
+    REDIS, TEXT_POSITION_STAGE, TEXT_POSITION_BATCH, TEXT_POSITION_BATCH_MAX
+)
+
 OCR_VERSION = env.str("OCR_VERSION", default="tess4")
 OCR_DATA_DIRECTORY = env.str("OCR_DATA_DIRECTORY", default="ocr-languages")
 OCR_DATA_EXTENSION = env.str("OCR_DATA_EXTENSION", default=".traineddata")
@@ -85,6 +112,27 @@ CPU_DIFFICULTY = env.int("CPU_DIFFICULTY", default=20)
 
 # Width of images to use with OCR (aspect ratio is preserved)
 DESIRED_WIDTH = env.int("OCR_WIDTH", default=700)
+# Resolution to report for page images, which carry no resolution of their own
+# (70 ppi is what Tesseract assumes for such images)
+OCR_RESOLUTION = env.int("OCR_RESOLUTION", default=70)
+# Tesseract can only write PDFs to files, so they are rendered into scratch
+# space (memory-backed where available) and read straight back
+OCR_SCRATCH_DIRECTORY = env.str(
+    "OCR_SCRATCH_DIRECTORY",
+    default="/dev/shm" if os.path.isdir("/dev/shm") else tempfile.gettempdir(),
+)
+OCR_THREADS = env.int(
+    "OCR_THREADS", default=0
+)  # Number of pages to OCR at once in an invocation (0 for one per available core)
+TESSERACT_POOL_SIZE = env.int(
+    "TESSERACT_POOL_SIZE", default=2
+)  # Number of languages to keep Tesseract engines loaded for
+# Language to load an engine for on import, so it is inherited by every
+# invocation on a warm container (empty to disable)
+OCR_WARM_LANGUAGE = env.str(
+    "OCR_WARM_LANGUAGE",
+    default="" if env.str("ENVIRONMENT").startswith("local") else "eng",
+)
 
 LARGE_IMAGE_SUFFIX = "-large"
 TXT_EXTENSION = ".txt"
@@ -104,8 +152,17 @@ def local_folder_size(folder_path):
     )
 
 
+# Serializes downloads, as pages may be OCR'd from several threads at once
+download_lock = threading.Lock()
+
+
 def download_tmp_file(relative_path):
     """Downloads the requested data file to a tmp directory."""
+    with download_lock:
+        _download_tmp_file(relative_path)
+
+
+def _download_tmp_file(relative_path):
     Path(TMP_DIRECTORY).mkdir(
         parents=True, exist_ok=True
     )  # Make tmp directory if it doesn't exist
@@ -134,6 +191,59 @@ def download_language_pack(ocr_code):
     download_tmp_file(f"{ocr_code}{OCR_DATA_EXTENSION}")
 
 
+# Idle Tesseract engines by language, least recently used language first
+tesseract_pool = collections.OrderedDict()
+tesseract_pool_lock = threading.Lock()
+
+
+@contextmanager
+def checkout_tesseract(ocr_code):
+    """Check out a Tesseract engine for the language for the duration of the
+    context, reusing an idle pooled engine if possible.  Language data is only
+    downloaded when an engine is initialized."""
+    with tesseract_pool_lock:
+        engines = tesseract_pool.get(ocr_code)
+        tess = engines.pop() if engines else None
+
+    if tess is None:
+        logger.info("[OCR] initializing Tesseract for %s", ocr_code)
+        download_language_pack(ocr_code)
+        tess = Tesseract(ocr_code)
+
+    try:
+        yield tess
+    finally:
+        with tesseract_pool_lock:
+            tesseract_pool.setdefault(ocr_code, []).append(tess)
+            tesseract_pool.move_to_end(ocr_code)
+            # Evict the least recently used languages to bound memory
+            while len(tesseract_pool) > max(TESSERACT_POOL_SIZE, 1):
+                tesseract_pool.popitem(last=False)
+
+
+def warm_tesseract():
+    """Load the engine for the warm language ahead of the first page, skipping
+    it if the language pack is missing"""
+    if not OCR_WARM_LANGUAGE:
+        return
+    try:
+        download_language_pack(OCR_WARM_LANGUAGE)
+    except OSError as exc:
+        logger.info("[OCR] not warming Tesseract for %s: %s", OCR_WARM_LANGUAGE, exc)
+        return
+    try:
+        with checkout_tesseract(OCR_WARM_LANGUAGE):
+            pass
+    except Exception as exc:  # pylint: disable=broad-except
+        # OCR will try again when it needs the engine
+        logger.warning(
+            "[OCR] unable to warm Tesseract for %s: %s",
+            OCR_WARM_LANGUAGE,
+            exc,
+            exc_info=exc,
+        )
+
+
 def ocr_page(
     doc_id,
     ocr_engine,
@@ -150,21 +260,8 @@ def ocr_page(
         The page text.
     """
     # pylint: disable=too-many-arguments
-    # Download the requisite language data
     logger.info("[OCR PAGE] doc_id %s", doc_id)
-    download_language_pack(ocr_code)
-    download_tmp_file(PDF_FONT_FILE)
-
-    logger.info("[OCR PAGE] download complete doc_id %s", doc_id)
 
-    # Initialize temporary files
-    tmp_files = {
-        "img": tempfile.mkstemp(suffix=".png")[1],
-        "pdf": tempfile.mkstemp()[1],
-        "text": tempfile.mkstemp()[1],
-    }
-
-    # Capture the page image as a temporary PNG file
     with storage.open(page_path, "rb") as image_file:
         img = Image.open(image_file).convert("RGB")
         # Resize only if image is too big (OCR computation is slow with large images)
@@ -173,56 +270,93 @@ def ocr_page(
             img = img.resize(
                 (DESIRED_WIDTH, round(img.height * resize)), Image.ANTIALIAS
             )
-    img.save(tmp_files["img"], "png")
 
     logger.info("[OCR PAGE] image resized doc_id %s", doc_id)
 
-    try:
-        if ocr_engine == "textract":
-            return ocr_page_textract(
-                doc_id, tmp_files, upload_text_path, access, slug, page_number
-            )
-        else:
-            return ocr_page_tesseract(
-                doc_id, ocr_code, tmp_files, upload_text_path, access
-            )
-    finally:
-        logger.info("[OCR PAGE] cleanup doc_id %s", doc_id)
-        os.remove(tmp_files["pdf"])
-        os.remove(tmp_files["text"])
-        os.remove(tmp_files["img"])
+    return ocr_image(
+        doc_id, ocr_engine, img, upload_text_path, access, ocr_code, slug, page_number
+    )
+
+
+def ocr_image(
+    doc_id,
+    ocr_engine,
+    img,
+    upload_text_path,
+    access,
+    ocr_code,
+    slug,
+    page_number,
+):
+    """Run OCR on an in-memory RGB page image.
 
+    Callers running alongside image extraction can pass the pdfium render
+    directly, rendered at DESIRED_WIDTH.
 
-def ocr_page_tesseract(doc_id, ocr_code, tmp_files, upload_text_path, access):
-    """Use Tesseract OCR to render a text-only PDF and txt file"""
-    tess = Tesseract(ocr_code)
-    text = ""
-    pdf_contents = b""
+    Returns:
+        The page text and text-only PDF contents.
+    """
+    # pylint: disable=too-many-arguments
+    if ocr_engine == "textract":
+        return ocr_page_textract(
+            doc_id, img, upload_text_path, access, slug, page_number
+        )
+    else:
+        return ocr_page_tesseract(doc_id, ocr_code, img, upload_text_path, access)
 
-    tess.create_renderer(tmp_files["pdf"], tmp_files["text"])
-    tess.render(tmp_files["img"])
-    tess.destroy_renderer()
 
-    logger.info("[OCR PAGE] rendered doc_id %s", doc_id)
+def ocr_page_tesseract(doc_id, ocr_code, img, upload_text_path, access):
+    """Use Tesseract OCR to render a text-only PDF and text"""
+    # Download the invisible font for the PDF renderer
+    download_tmp_file(PDF_FONT_FILE)
 
-    # Get txt and text-only pdf file contents
-    with open(tmp_files["pdf"] + ".pdf", "rb") as pdf_file:
-        pdf_contents = pdf_file.read()
-    with storage.open(upload_text_path, "w", access=access) as new_text_file:
-        with open(tmp_files["text"] + ".txt", "r", encoding="utf-8") as text_file:
-            # Store text locally to return (gets used by Redis later)
-            text = text_file.read()
-            # Also upload text file to s3
-            new_text_file.write(text)
+    with checkout_tesseract(ocr_code) as tess:
+        logger.info("[OCR PAGE] engine ready doc_id %s", doc_id)
+        text, pdf_contents = render_tesseract(doc_id, tess, img)
+
+    # Upload the text file
+    write_text_file(upload_text_path, text, access)
     logger.info("[OCR PAGE] data stored doc_id %s", doc_id)
 
     return text, pdf_contents
 
 
-def ocr_page_textract(doc_id, tmp_files, upload_text_path, access, slug, page_number):
+def render_tesseract(doc_id, tess, img):
+    """Recognize an image with the engine, returning its text and text-only PDF"""
+    # Hand the raw pixels to Tesseract rather than going through an image file
+    tess.set_image(img.tobytes(), img.width, img.height, 3)
+    tess.set_source_resolution(OCR_RESOLUTION)
+
+    pdf_fd, pdf_base = tempfile.mkstemp(dir=OCR_SCRATCH_DIRECTORY)
+    os.close(pdf_fd)
+    try:
+        tess.create_pdf_renderer(pdf_base)
+        tess.render_image()
+        # Destroying the renderer closes out the PDF file
+        tess.destroy_renderer()
+
+        logger.info("[OCR PAGE] rendered doc_id %s", doc_id)
+
+        text = tess.get_text()
+        with open(pdf_base + ".pdf", "rb") as pdf_file:
+            pdf_contents = pdf_file.read()
+    finally:
+        logger.info("[OCR PAGE] cleanup doc_id %s", doc_id)
+        tess.destroy_renderer()
+        # Reset the engine for the next page
+        tess.clear()
+        for scratch_path in (pdf_base, pdf_base + ".pdf"):
+            if os.path.exists(scratch_path):
+                os.remove(scratch_path)
+
+    return text, pdf_contents
+
+
+def ocr_page_textract(doc_id, img, upload_text_path, access, slug, page_number):
     """Use Textract OCR to render a txt file"""
-    with open(tmp_files["img"], "rb") as document:
-        image_bytes = bytearray(document.read())
+    with io.BytesIO() as mem_file:
+        img.save(mem_file, "png")
+        image_bytes = bytearray(mem_file.getvalue())
 
     textract = boto3.client(
         "textract",
@@ -263,19 +397,38 @@ def ocr_page_textract(doc_id, tmp_files, upload_text_path, access, slug, page_nu
         for word in response["Blocks"]
         if word["BlockType"] == "WORD"
     ]
-    # Write the json positional words file
-    storage.simple_upload(
-        path.page_text_position_path(doc_id, slug, page_number),
-        json.dumps(words).encode("utf-8"),
-        access=access,
-    )
+    if TEXT_POSITION_PACKED:
+        utils.write_page_text_positions(REDIS, doc_id, {page_number: words})
+    else:
+        # Write the json positional words file
+        storage.simple_upload(
+            path.page_text_position_path(doc_id, slug, page_number),
+            json.dumps(words).encode("utf-8"),
+            access=access,
+        )
 
     logger.info("[OCR PAGE] textract extracted text position  stored doc_id %s", doc_id)
 
     return text, b""
 
 
-@pubsub_function(REDIS, OCR_TOPIC)
+def ocr_thread_count(page_count):
+    """The number of pages to OCR at once for a batch of pages.
+
+    Tesseract releases the GIL while recognizing, so threads (each with its own
+    engine) OCR on separate cores.  Processes are avoided as invocations
+    already run in a daemonic process, which may not have children.
+    """
+    threads = OCR_THREADS
+    if threads <= 0:
+        try:
+            threads = len(os.sched_getaffinity(0))
+        except AttributeError:
+            threads = os.cpu_count() or 1
+    return max(min(threads, page_count), 1)
+
+
+@pubsub_function(REDIS, OCR_TOPIC, work_key="paths_and_numbers")
 def run_tesseract(data, _context=None):
     """Runs OCR on the images passed in, storing the extracted text."""
     # pylint: disable=too-many-locals, too-many-statements
@@ -339,6 +492,11 @@ def run_tesseract(data, _context=None):
 
     # Queue up text position extraction tasks
     queue = []
+    # Pages are finished once they have been handed off
+    items = {item[0]: item for item in paths_and_numbers}
+    text_position_batch = TEXT_POSITION_PLANNER.plan_size(
+        doc_id, len(paths_and_numbers)
+    )
 
     def flush(queue):
         if not queue:
@@ -346,12 +504,13 @@ def run_tesseract(data, _context=None):
 
         if ocr_engine == "textract":
             # textract also extracts text position, so skip to assemble text
-            for page_number in queue:
-                # Check if all text positions have been extracted
-                text_positions_finished = utils.register_text_position_extracted(
-                    REDIS, doc_id, page_number
-                )
+            # Check if all text positions have been extracted
+            text_positions_finished = utils.register_text_positions_extracted(
+                REDIS, doc_id, queue
+            )
             if text_positions_finished:
+                if TEXT_POSITION_PACKED:
+                    utils.pack_text_positions(REDIS, doc_id, slug, access, partial)
                 # Move on to assembling/grafting the text back into the pdf
                 publisher.publish(
                     ASSEMBLE_TEXT_TOPIC,
@@ -377,27 +536,22 @@ def run_tesseract(data, _context=None):
                         "ocr_code": ocr_code,
                         "partial": partial,
                         "in_memory": True,
+                        "page_count": data.get("page_count"),
                     }
                 ),
             )
 
+        checkpoint.done(*[items[page_number] for page_number in queue])
         queue.clear()
 
     def check_and_flush(queue):
-        if len(queue) >= TEXT_POSITION_BATCH:
+        if len(queue) >= text_position_batch:
             flush(queue)
 
-    # Loop through all paths and numbers
-    for page_number, image_path in paths_and_numbers:
-
-        ocrd = utils.page_ocrd(REDIS, doc_id, page_number)
-        logger.info(
-            "[RUN TESSERACT] doc_id %s page_number %s ocrd %s",
-            doc_id,
-            page_number,
-            ocrd,
-        )
-
+    def ocr_timed_page(page_number, image_path):
+        if checkpoint.expired():
+            # Leave the page to be retried
+            return None
         text_path = path.page_text_path(doc_id, slug, page_number)
 
         # Benchmark OCR speed
@@ -418,30 +572,61 @@ def run_tesseract(data, _context=None):
             slug,
             page_number,
         )
-
-        elapsed_time = time.time() - start_time
-        elapsed_times.append(elapsed_time)
-        logger.info(
-            "[RUN TESSERACT] doc_id %s page %s elapsed_time %s",
-            doc_id,
-            page_number,
-            elapsed_time,
+        return text, pdf_contents, time.time() - start_time
+
+    # OCR the pages concurrently, recording each page as its results arrive
+    with ThreadPoolExecutor(
+        max_workers=ocr_thread_count(len(paths_and_numbers))
+    ) as executor:
+        futures = {}
+        ocrd_pages = utils.pages_ocrd(
+            REDIS, doc_id, [page_number for page_number, _ in paths_and_numbers]
         )
+        for page_number, image_path in paths_and_numbers:
+            logger.info(
+                "[RUN TESSERACT] doc_id %s page_number %s ocrd %s",
+                doc_id,
+                page_number,
+                page_number in ocrd_pages,
+            )
+            futures[
+                executor.submit(ocr_timed_page, page_number, image_path)
+            ] = page_number
+
+        for future in as_completed(futures):
+            page_number = futures[future]
+            page_result = future.result()
+            if page_result is None:
+                continue
+            text, pdf_contents, elapsed_time = page_result
+            elapsed_times.append(elapsed_time)
+            logger.info(
+                "[RUN TESSERACT] doc_id %s page %s elapsed_time %s",
+                doc_id,
+                page_number,
+                elapsed_time,
+            )
 
-        # Write the output text and pdf to Redis
-        utils.write_page_text(REDIS, doc_id, page_number, text, ocr_version, ocr_code)
-        utils.write_page_text_pdf(REDIS, doc_id, page_number, pdf_contents)
+            # Write the output text and pdf to Redis in a single round trip
+            pipeline = REDIS.pipeline()
+            utils.write_page_text(
+                pipeline, doc_id, page_number, text, ocr_version, ocr_code
+            )
+            utils.write_page_text_pdf(pipeline, doc_id, page_number, pdf_contents)
+            pipeline.execute()
 
-        # Decrement the texts remaining
-        utils.register_page_ocrd(REDIS, doc_id, page_number)
+            # Decrement the texts remaining
+            utils.register_page_ocrd(REDIS, doc_id, page_number)
 
-        # Queue text position extraction tasks
-        queue.append(page_number)
-        check_and_flush(queue)
+            # Queue text position extraction tasks
+            queue.append(page_number)
+            check_and_flush(queue)
 
     # Flush the remaining queue
     flush(queue)
 
+    OCR_PLANNER.record(len(elapsed_times), time.time() - overall_start)
+
     result["doc_id"] = doc_id
     result["elapsed"] = elapsed_times
     result["status"] = "Ok"
@@ -449,3 +634,7 @@ def run_tesseract(data, _context=None):
     if PROFILE_CPU:
         result["speed_after"] = profile_cpu()
     return json.dumps(result)
+
+
+# Warm the pool on import, before invocations are forked off
+warm_tesseract()
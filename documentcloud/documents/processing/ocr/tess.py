@@ -77,9 +77,28 @@ class Tesseract:
             ctypes.c_int,
         )  # bytes_per_line
 
-        lib.TessBaseAPIGetUTF8Text.restype = ctypes.c_char_p
+        lib.TessBaseAPIClear.restype = None
+        lib.TessBaseAPIClear.argtypes = (cls.TessBaseAPI,)  # handle
+
+        lib.TessBaseAPISetSourceResolution.restype = None
+        lib.TessBaseAPISetSourceResolution.argtypes = (
+            cls.TessBaseAPI,  # handle
+            ctypes.c_int,
+        )  # ppi
+
+        lib.TessBaseAPIRecognize.restype = ctypes.c_int
+        lib.TessBaseAPIRecognize.argtypes = (
+            cls.TessBaseAPI,  # handle
+            ctypes.c_void_p,
+        )  # monitor
+
+        # Returned text is owned by the caller and freed with TessDeleteText
+        lib.TessBaseAPIGetUTF8Text.restype = ctypes.c_void_p
         lib.TessBaseAPIGetUTF8Text.argtypes = (cls.TessBaseAPI,)  # handle
 
+        lib.TessDeleteText.restype = None
+        lib.TessDeleteText.argtypes = (ctypes.c_void_p,)
+
         lib.TessBaseAPIGetHOCRText.restype = ctypes.c_char_p
         lib.TessBaseAPIGetHOCRText.argtypes = (cls.TessBaseAPI,)  # handle
 
@@ -102,6 +121,9 @@ class Tesseract:
             ctypes.c_char_p,
         )
 
+        lib.TessResultRendererAddImage.restype = ctypes.c_int
+        lib.TessResultRendererAddImage.argtypes = (ctypes.c_void_p, cls.TessBaseAPI)
+
         lib.TessResultRendererEndDocument.restype = ctypes.c_int
         lib.TessResultRendererEndDocument.argtypes = (ctypes.c_void_p,)
 
@@ -156,14 +178,26 @@ class Tesseract:
             self._api, imagedata, width, height, bytes_per_pixel, bytes_per_line
         )
 
-    def get_utf8_text(self):
+    def clear(self):
+        """Free the image and recognition results, keeping the language model
+        loaded so the engine can be reused for the next image"""
         self._check_setup()
-        return self._lib.TessBaseAPIGetUTF8Text(self._api)
+        self._lib.TessBaseAPIClear(self._api)
 
-    def get_text(self):
+    def set_source_resolution(self, ppi):
+        self._check_setup()
+        self._lib.TessBaseAPISetSourceResolution(self._api, ppi)
+
+    def get_utf8_text(self):
         self._check_setup()
         result = self._lib.TessBaseAPIGetUTF8Text(self._api)
-        return result.decode("utf-8")
+        try:
+            return ctypes.string_at(result)
+        finally:
+            self._lib.TessDeleteText(result)
+
+    def get_text(self):
+        return self.get_utf8_text().decode("utf-8")
 
     def get_hocr(self):
         self._check_setup()
@@ -182,6 +216,13 @@ class Tesseract:
             ),
         )
 
+    def create_pdf_renderer(self, pdf_base):
+        """Create a text-only PDF renderer, leaving text to be read from the API"""
+        self._check_setup()
+        self.renderer = self._lib.TessPDFRendererCreate(
+            os.path.abspath(pdf_base).encode("utf-8"), self.datapath.encode("utf-8"), 1
+        )
+
     def destroy_renderer(self):
         if self.renderer:
             self._lib.TessDeleteResultRenderer(self.renderer)
@@ -208,3 +249,27 @@ class Tesseract:
 
         if not self._lib.TessResultRendererEndDocument(self.renderer):
             raise TesseractError("could not end document")
+
+    def render_image(self):
+        """Recognize the image passed to set_image and render it.
+
+        Unlike render, the image is never read from disk. The recognized text
+        can be read with get_text afterwards.
+        """
+        self._check_setup()
+        if not self.renderer:
+            raise TesseractError("Set up renderer")
+
+        if not self._lib.TessResultRendererBeginDocument(
+            self.renderer, "".encode("utf-8")
+        ):
+            raise TesseractError("could not begin document")
+
+        if self._lib.TessBaseAPIRecognize(self._api, None) != 0:
+            raise TesseractError("recognition failed")
+
+        if not self._lib.TessResultRendererAddImage(self.renderer, self._api):
+            raise TesseractError("render failed")
+
+        if not self._lib.TessResultRendererEndDocument(self.renderer):
+            raise TesseractError("could not end document")
@@ -8,12 +8,11 @@ import functools
 from contextlib import ExitStack
 from unittest.mock import patch
 
-# Third Party
-from config import celery_app
-
 # DocumentCloud
+from config import celery_app
 from documentcloud.common import path
 from documentcloud.common.serverless.utils import get_redis, initialize
+from documentcloud.documents.processing.info_and_image.page_index import PageIndex
 from documentcloud.documents.processing.tests.pipeline_tests.fake_pdf import FakePage
 
 docs = {}
@@ -96,7 +95,7 @@ def page_text_partially_patched(doc_id, slug, results):
     pass
 
 
-def page_text_position_extracted(pdf, doc_id, slug, page_number, access, in_memory):
+def page_text_position_extracted(page, doc_id, slug, page_number, uploads):
     pass
 
 
@@ -134,14 +133,19 @@ class Workspace:
         return self.doc.page_count
 
     def trigger_cache(self, number):
-        """Simulate loading a page and needing to access all previous pages."""
+        """Simulate loading a page and needing to access all previous pages.
+
+        Each page is simulated as a single byte of the file, which is a hit if
+        it has already been read or was prefetched from the page index."""
         for page in range(number + 1):
-            if page in self.handler.cache:
+            if (page, 1) in self.handler.accesses or (
+                self.handler.prefetched_range(page, 1) is not None
+            ):
                 cache_hit(page)
             else:
                 cache_miss(page)
                 if self.handler.record:
-                    self.handler.cache[page] = True
+                    self.handler.accesses.append((page, 1))
 
     def load_page(self, number):
         page_loaded(number)
@@ -155,7 +159,11 @@ def storage_simple_upload(_path, contents, access):
 
 
 def storage_size(filename):
-    return 1  # Every document is 1 byte for testing
+    return docs[filename].page_count  # Every page is 1 byte for testing
+
+
+def storage_read_range(filename, start, end):
+    return bytes(end - start)
 
 
 class StorageOpen:
@@ -178,11 +186,11 @@ class StorageOpen:
         pass
 
 
-class PdfPlumberOpen:
-    """pdfplumber open mock, simulating successfully opening a pdf"""
+class PageTextPdf:
+    """Text-only PDF mock, simulating successfully opening an OCRd page's PDF"""
 
-    def __init__(self, filename):
-        self.filename = filename
+    def __init__(self, workspace, contents):
+        self.contents = contents
 
     def __enter__(self):
         return self
@@ -190,8 +198,8 @@ class PdfPlumberOpen:
     def __exit__(self, *args):
         pass
 
-    def close(self):
-        pass
+    def load_page(self, number):
+        return FakePage(True)
 
 
 # Simulate cache files to accurately measure cache misses/hits
@@ -206,12 +214,12 @@ def write_cache(filename, cache):
 def read_cache(filename):
     if filename in files_cached:
         cache_read(filename, files_cached[filename])
-        return files_cached[filename]
+        return PageIndex(files_cached[filename])
     else:
         raise KeyError("Cache file not found")
 
 
-def extract_single_page(doc_id, slug, access, page, page_number, large_image_path):
+def extract_single_page(doc_id, slug, page, page_number, uploads):
     page_extracted(page_number)
     return (100, 200)  # Arbitrary width / height
 
@@ -241,17 +249,20 @@ def graft_ocr_in_pdf(doc_id, slug, access):
     pdf_grafted(doc_id, slug, access)
 
 
-def patch_partial_page_text(doc_id, slug, results):
+def patch_partial_page_text(doc_id, slug, access, results):
     page_text_partially_patched(doc_id, slug, results)
-    return {"pages": []}  # empty concatenated text
 
 
 def write_concatenated_text_file(doc_id, slug, access, page_jsons):
     pass
 
 
-def extract_text_position_for_page(pdf, doc_id, slug, page_number, access, in_memory):
-    page_text_position_extracted(pdf, doc_id, slug, page_number, access, in_memory)
+def write_json_text_file(doc_id, slug, access, results):
+    pass
+
+
+def extract_text_position_for_page(page, doc_id, slug, page_number, uploads):
+    page_text_position_extracted(page, doc_id, slug, page_number, uploads)
 
 
 def write_text_file(text_path, text, access):
@@ -287,7 +298,8 @@ def patch_pipeline(func):
     STORAGE_OPEN_MOCK = f"{ENVIRONMENT}.storage.open"
     STORAGE_SIMPLE_UPLOAD_MOCK = f"{ENVIRONMENT}.storage.simple_upload"
     STORAGE_SIZE_MOCK = f"{ENVIRONMENT}.storage.size"
-    PDF_PLUMBER_OPEN_MOCK = "pdfplumber.open"
+    STORAGE_READ_RANGE_MOCK = f"{ENVIRONMENT}.storage.read_range"
+    LOAD_PAGE_TEXT_PDF_MOCK = f"{INFO_AND_IMAGE}.main.load_page_text_pdf"
     WRITE_CACHE_MOCK = f"{INFO_AND_IMAGE}.main.write_cache"
     READ_CACHE_MOCK = f"{INFO_AND_IMAGE}.main.read_cache"
     EXTRACT_SINGLE_PAGE_MOCK = f"{INFO_AND_IMAGE}.main.extract_single_page"
@@ -298,6 +310,7 @@ def patch_pipeline(func):
     WRITE_CONCATENATED_TEXT_FILE_MOCK = (
         f"{INFO_AND_IMAGE}.main.write_concatenated_text_file"
     )
+    WRITE_JSON_TEXT_FILE_MOCK = f"{INFO_AND_IMAGE}.main.write_json_text_file"
     EXTRACT_TEXT_POSITION_MOCK = f"{INFO_AND_IMAGE}.main.extract_text_position_for_page"
     WRITE_TEXT_FILE_II_MOCK = f"{INFO_AND_IMAGE}.main.write_text_file"
     WRITE_TEXT_FILE_OCR_MOCK = f"{OCR}.main.write_text_file"
@@ -327,9 +340,10 @@ def patch_pipeline(func):
     # Replaced methods
     @patch(WORKSPACE_LOAD_MOCK, Workspace)
     @patch(STORAGE_OPEN_MOCK, StorageOpen)
-    @patch(PDF_PLUMBER_OPEN_MOCK, PdfPlumberOpen)
+    @patch(LOAD_PAGE_TEXT_PDF_MOCK, PageTextPdf)
     @patch(STORAGE_SIMPLE_UPLOAD_MOCK, storage_simple_upload)
     @patch(STORAGE_SIZE_MOCK, storage_size)
+    @patch(STORAGE_READ_RANGE_MOCK, storage_read_range)
     @patch(WRITE_CACHE_MOCK, write_cache)
     @patch(READ_CACHE_MOCK, read_cache)
     @patch(EXTRACT_SINGLE_PAGE_MOCK, extract_single_page)
@@ -338,6 +352,7 @@ def patch_pipeline(func):
     @patch(GRAFT_OCR_MOCK, graft_ocr_in_pdf)
     @patch(PARTIAL_PAGE_TEXT_PATCH_MOCK, patch_partial_page_text)
     @patch(WRITE_CONCATENATED_TEXT_FILE_MOCK, write_concatenated_text_file)
+    @patch(WRITE_JSON_TEXT_FILE_MOCK, write_json_text_file)
     @patch(EXTRACT_TEXT_POSITION_MOCK, extract_text_position_for_page)
     @patch(WRITE_TEXT_FILE_II_MOCK, write_text_file)
     @patch(WRITE_TEXT_FILE_OCR_MOCK, write_text_file)
@@ -346,6 +361,8 @@ def patch_pipeline(func):
     @patch(SEND_COMPLETE_MOCK, send_complete)
     @patch(SEND_ERROR_MOCK, send_error)
     @patch(f"{SERVERLESS}.error_handling.USE_TIMEOUT", False)
+    # Every mocked file has the same hash, so processed assets are not reused
+    @patch(f"{SERVERLESS}.asset_cache.ASSET_CACHE_ENABLED", False)
     @functools.wraps(func)
     def functor(
         test,
@@ -83,7 +83,8 @@ class PipelineTest(TestCase):
         trigger_redacting([1])
         # Only 1 page should be processed, but the cache is rebuilt
         assert mocks["cache_miss"].call_count == 3
-        assert mocks["page_loaded"].call_count == 2  # 1 + 1
+        # Indexing loads every page
+        assert mocks["page_loaded"].call_count == 4  # 3 + 1
         assert mocks["page_extracted"].call_count == 1
         assert mocks["page_ocrd"].call_count == 1
         assert mocks["page_text_position_extracted"].call_count == 1
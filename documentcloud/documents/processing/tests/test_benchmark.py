@@ -0,0 +1,89 @@
+# Django
+from django.test import TestCase, override_settings
+
+# Standard Library
+import os
+import shutil
+import tempfile
+from collections import Counter
+
+# DocumentCloud
+from documentcloud.common.environment import storage
+from documentcloud.documents.processing.benchmark import (
+    compare,
+    corpus_files,
+    count_storage,
+    run_benchmark,
+)
+
+base_dir = os.path.dirname(os.path.abspath(__file__))
+pdfs = os.path.join(base_dir, "pdfs")
+
+
+class BenchmarkTest(TestCase):
+    def test_run_benchmark(self):
+        with tempfile.TemporaryDirectory() as directory:
+            shutil.copy(os.path.join(pdfs, "shakespeare.pdf"), directory)
+            results = run_benchmark(directory)
+        assert results["documents"] == 1
+        assert results["pages"] > 0
+        assert results["errors"] == 0
+        assert results["stages"]["process_pdf"]["invocations"] == 1
+        assert results["stages"]["extract_image"]["pages"] == results["pages"]
+        assert results["bytes_read"] > 0
+        assert results["bytes_written"] > 0
+
+    def test_count_storage(self):
+        counts = Counter()
+        with tempfile.TemporaryDirectory() as directory, override_settings(
+            MEDIA_ROOT=directory
+        ):
+            with count_storage(counts):
+                storage.simple_upload("doc.pdf", b"contents")
+                assert storage.read_range("doc.pdf", 2, 5) == b"nte"
+            storage.read_range("doc.pdf", 0, 8)
+        assert counts == {"bytes_written": 8, "bytes_read": 3}
+
+    def test_count_storage_whole_files(self):
+        counts = Counter()
+        with tempfile.TemporaryDirectory() as directory, override_settings(
+            MEDIA_ROOT=directory
+        ):
+            local_path = os.path.join(directory, "local.pdf")
+            with open(local_path, "wb") as local_file:
+                local_file.write(b"contents")
+            with count_storage(counts):
+                storage.upload_file("doc.pdf", local_path)
+                storage.download_file("doc.pdf", local_path)
+        assert counts == {"bytes_written": 8, "bytes_read": 8}
+
+    def test_corpus_files(self):
+        with tempfile.TemporaryDirectory() as directory:
+            for file_name in ("b.pdf", "a.PDF", "notes.txt"):
+                with open(os.path.join(directory, file_name), "wb"):
+                    pass
+            assert corpus_files(directory) == [
+                os.path.join(directory, "a.PDF"),
+                os.path.join(directory, "b.pdf"),
+            ]
+
+    def test_compare(self):
+        baseline = {
+            "pages_per_second": 100,
+            "bytes_moved": 10,
+            "stages": {"process_pdf": {"run_seconds": {"p50": 0.5}}},
+        }
+        results = {
+            "pages_per_second": 150,
+            "bytes_moved": 10,
+            "peak_rss_mb": 200,
+            "stages": {
+                "process_pdf": {"run_seconds": {"p50": 0.25}},
+                "run_tesseract": {"run_seconds": {"p50": 2.0}},
+            },
+        }
+        assert compare(results, baseline) == [
+            ("pages_per_second", 100, 150, 0.5),
+            ("bytes_moved", 10, 10, 0.0),
+            ("process_pdf p50", 0.5, 0.25, -0.5),
+        ]
@@ -0,0 +1,100 @@
+# Standard Library
+import ctypes
+import glob
+import io
+import os
+import time
+
+# Third Party
+import PIL.Image
+import pytest
+
+# DocumentCloud
+from documentcloud.common.environment.local.storage import storage
+from documentcloud.documents.processing.info_and_image.main import (
+    IMAGE_WIDTHS,
+    derive_page_images,
+)
+from documentcloud.documents.processing.info_and_image.pdfium import (
+    StorageHandler,
+    Workspace,
+)
+from documentcloud.documents.processing.tests.report_test_case import ReportTestCase
+
+base_dir = os.path.dirname(os.path.abspath(__file__))
+pdfs = os.path.join(base_dir, "pdfs")
+
+
+def legacy_page_images(bmp):
+    """The previous image pipeline: split/merge the channels and resize each size
+    from the full render, for benchmarking"""
+    bufflen = bmp.width * bmp.height * 4
+    bitmap = bmp.workspace.fpdf_get_bitmap_buffer(bmp.bitmap)
+    bitmap = ctypes.cast(bitmap, ctypes.POINTER((bufflen * ctypes.c_ubyte)))
+    img = PIL.Image.frombuffer(
+        "RGBA", (bmp.width, bmp.height), bitmap.contents, "raw", "RGBA", 0, 1
+    )
+    # pylint: disable=invalid-name, unbalanced-tuple-unpacking
+    b, g, r, _a = img.split()
+    img_buffer = PIL.Image.merge("RGB", (r, g, b))
+
+    images = []
+    for [image_suffix, image_width] in IMAGE_WIDTHS:
+        img = img_buffer
+        if image_width != img_buffer.width:
+            img = img_buffer.resize(
+                (
+                    image_width,
+                    max(round(img_buffer.height * (image_width / img_buffer.width)), 1),
+                ),
+                PIL.Image.ANTIALIAS,
+            )
+        mem_file = io.BytesIO()
+        img.save(mem_file, format="gif")
+        images.append((image_suffix, mem_file.getvalue()))
+    return images
+
+
+@pytest.mark.slow
+class ImagePipelineTest(ReportTestCase):
+    def test_benchmark_page_images(self) -> None:
+        """Derive page images for every fixture PDF with both pipelines"""
+        legacy_elapsed = 0
+        elapsed = 0
+        pages = 0
+
+        for pdf_path in sorted(glob.glob(os.path.join(pdfs, "*.pdf"))):
+            self.report_generator.add_subheading(os.path.basename(pdf_path))
+            with Workspace() as workspace, StorageHandler(
+                storage, pdf_path
+            ) as file_, workspace.load_document_custom(file_) as doc:
+                for i in range(doc.page_count):
+                    page = doc.load_page(i)
+                    with page.get_bitmap(IMAGE_WIDTHS[0][1], None) as bmp:
+                        start = time.perf_counter()
+                        legacy_images = legacy_page_images(bmp)
+                        legacy_elapsed += time.perf_counter() - start
+
+                        start = time.perf_counter()
+                        images = derive_page_images(bmp.get_image())
+                        elapsed += time.perf_counter() - start
+                    pages += 1
+
+                    # Every size is produced, at the same dimensions as before
+                    self.assertEqual(
+                        [size for size, _ in images],
+                        [size for size, _ in legacy_images],
+                    )
+                    for (_, contents), (_, legacy_contents) in zip(
+                        images, legacy_images
+                    ):
+                        with PIL.Image.open(io.BytesIO(contents)) as img:
+                            with PIL.Image.open(io.BytesIO(legacy_contents)) as legacy:
+                                self.assertEqual(img.size, legacy.size)
+
+        self.report_generator.add_subheading("Results")
+        self.report_generator.add_text(
+            f"{pages} pages: legacy {legacy_elapsed:.3f}s "
+            f"({legacy_elapsed / pages:.3f}s/page), "
+            f"progressive {elapsed:.3f}s ({elapsed / pages:.3f}s/page)"
+        )
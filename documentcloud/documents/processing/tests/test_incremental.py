@@ -0,0 +1,335 @@
+# Standard Library
+import io
+import os
+
+# Third Party
+import pikepdf
+import pytest
+from pikepdf import Array, Dictionary, Name, String
+from PIL import Image
+
+# DocumentCloud
+from documentcloud.documents.processing.info_and_image.incremental import (
+    IncrementalRedaction,
+    IncrementalRedactionError,
+    compose_parts,
+    xref_section,
+)
+
+base_dir = os.path.dirname(os.path.abspath(__file__))
+pdfs = os.path.join(base_dir, "pdfs")
+
+
+class MemoryHandler:
+    """A StorageHandler over a file in memory, with all of it prefetched"""
+
+    def __init__(self, contents):
+        self.contents = contents
+        self.size = len(contents)
+        self.prefetched = [(0, contents)]
+
+    def read(self, position, size):
+        return self.contents[position : position + size]
+
+
+def build_pdf(resources, structure=None, **options):
+    """A two page PDF whose second page has the given resources, made by
+    `resources(pdf, marker)` with `marker` making streams with the given data,
+    and a structure tree from `structure(pages)` if given, saved uncompressed
+    unless overridden by `options`"""
+    pdf = pikepdf.new()
+    for _ in range(2):
+        pdf.add_blank_page(page_size=(612, 792))
+
+    def marker(data, **kwargs):
+        return pdf.make_stream(data, Dictionary(**kwargs))
+
+    # Streams used by both pages are left as they are
+    shared = marker(b"SHARED", Type=Name.XObject, Subtype=Name.Form, BBox=[0, 0, 1, 1])
+    for page in pdf.pages:
+        page.obj.Contents = pdf.make_stream(b"/Shared Do")
+        page.obj.Resources = Dictionary(XObject=Dictionary(Shared=shared))
+    for key, value in resources(pdf, marker).items():
+        pdf.pages[1].obj.Resources[key] = value
+    if structure is not None:
+        pdf.Root.StructTreeRoot = pdf.make_indirect(
+            Dictionary(
+                Type=Name.StructTreeRoot,
+                K=structure([page.obj for page in pdf.pages]),
+            )
+        )
+
+    output = io.BytesIO()
+    pdf.save(
+        output,
+        **{
+            "compress_streams": False,
+            "object_stream_mode": pikepdf.ObjectStreamMode.disable,
+            **options,
+        },
+    )
+    return output.getvalue()
+
+
+def image(marker, **kwargs):
+    return marker(
+        b"IMAGE",
+        Type=Name.XObject,
+        Subtype=Name.Image,
+        Width=1,
+        Height=1,
+        ColorSpace=Name.DeviceGray,
+        BitsPerComponent=8,
+        **kwargs,
+    )
+
+
+def form(marker, data):
+    return marker(data, Type=Name.XObject, Subtype=Name.Form, BBox=[0, 0, 1, 1])
+
+
+# The resources of a redacted page which lead to a stream holding SECRET
+RESOURCES = {
+    "smask": lambda pdf, marker: {
+        "/XObject": Dictionary(Im0=image(marker, SMask=image(marker, Decode=[0, 1])))
+    },
+    "mask": lambda pdf, marker: {
+        "/XObject": Dictionary(
+            Im0=image(
+                marker,
+                Mask=marker(
+                    b"SECRET",
+                    Type=Name.XObject,
+                    Subtype=Name.Image,
+                    Width=1,
+                    Height=1,
+                    ImageMask=True,
+                ),
+            )
+        )
+    },
+    "pattern": lambda pdf, marker: {
+        "/Pattern": Dictionary(
+            P0=marker(
+                b"SECRET",
+                PatternType=1,
+                PaintType=1,
+                TilingType=1,
+                BBox=[0, 0, 1, 1],
+                XStep=1,
+                YStep=1,
+                Resources=Dictionary(),
+            )
+        )
+    },
+    "shading": lambda pdf, marker: {
+        "/Shading": Dictionary(
+            Sh0=marker(
+                b"SECRET",
+                ShadingType=4,
+                ColorSpace=Name.DeviceGray,
+                BitsPerCoordinate=8,
+                BitsPerComponent=8,
+                BitsPerFlag=8,
+                Decode=[0, 1, 0, 1, 0, 1],
+            )
+        )
+    },
+    "type3": lambda pdf, marker: {
+        "/Font": Dictionary(
+            F0=Dictionary(
+                Type=Name.Font,
+                Subtype=Name.Type3,
+                FontBBox=[0, 0, 1, 1],
+                FontMatrix=[1, 0, 0, 1, 0, 0],
+                CharProcs=Dictionary(a=marker(b"SECRET")),
+                Encoding=Dictionary(Differences=[97, Name.a]),
+                FirstChar=97,
+                LastChar=97,
+                Widths=[1],
+            )
+        )
+    },
+    "extgstate": lambda pdf, marker: {
+        "/ExtGState": Dictionary(
+            GS0=Dictionary(
+                Type=Name.ExtGState,
+                SMask=Dictionary(
+                    Type=Name.Mask, S=Name.Luminosity, G=form(marker, b"SECRET")
+                ),
+            )
+        )
+    },
+}
+
+
+def redact(contents, page_number):
+    """Redact a page of a file incrementally, returning the updated file and
+    the update"""
+    with IncrementalRedaction(MemoryHandler(contents), [page_number]) as redaction:
+        scrubbed = redaction.scrubbed_ranges()
+        update, _, _ = redaction.update(
+            {page_number: (Image.new("RGB", (2, 2)), 612, 792)}
+        )
+    return compose(contents, compose_parts("", len(contents), scrubbed, update)), update
+
+
+def compose(contents, parts):
+    return b"".join(
+        part if isinstance(part, bytes) else contents[part[1] : part[2]]
+        for part in parts
+    )
+
+
+class TestIncrementalRedaction:
+    def test_xref_section(self):
+        assert xref_section({(5, 0): 100, (6, 0): 200, (9, 1): 300}) == (
+            b"xref\n"
+            b"5 2\n0000000100 00000 n\r\n0000000200 00000 n\r\n"
+            b"9 1\n0000000300 00001 n\r\n"
+        )
+
+    def test_compose_parts(self):
+        assert compose_parts("doc.pdf", 60, [(10, 20), (15, 30), (40, 50)], b"!") == [
+            ("doc.pdf", 0, 10),
+            bytes(10),
+            bytes(10),
+            ("doc.pdf", 30, 40),
+            bytes(10),
+            ("doc.pdf", 50, 60),
+            b"!",
+        ]
+
+    def test_redact(self):
+        with open(os.path.join(pdfs, "doc_3.pdf"), "rb") as pdf_file:
+            contents = pdf_file.read()
+        with pikepdf.open(io.BytesIO(contents)) as pdf:
+            redacted_content = pdf.pages[1].Contents.read_raw_bytes()
+            unchanged_content = pdf.pages[0].Contents.read_raw_bytes()
+
+        handler = MemoryHandler(contents)
+        with IncrementalRedaction(handler, [1]) as redaction:
+            scrubbed = redaction.scrubbed_ranges()
+            update, document_ranges, page_ranges = redaction.update(
+                {1: (Image.new("RGB", (20, 30)), 612, 792)}
+            )
+
+        new_contents = compose(
+            contents, compose_parts("", len(contents), scrubbed, update)
+        )
+        # The original file is kept as it was, other than the redacted page's
+        # scrubbed streams
+        assert new_contents.startswith(contents[: scrubbed[0][0]])
+        assert redacted_content not in new_contents
+        assert unchanged_content in new_contents
+        assert len(new_contents) == len(contents) + len(update)
+
+        with pikepdf.open(io.BytesIO(new_contents)) as pdf:
+            assert len(pdf.pages) == 3
+            page = pdf.pages[1]
+            assert [float(value) for value in page.MediaBox] == [0, 0, 612, 792]
+            assert list(page.Resources.XObject.keys()) == ["/Im0"]
+            assert page.Contents.read_bytes() == b"q 612 0 0 792 0 0 cm /Im0 Do Q"
+            assert pdf.pages[0].Contents.read_raw_bytes() == unchanged_content
+
+        # The ranges for the page index cover the new objects and trailer
+        assert document_ranges[0][1] == len(new_contents)
+        for start, end in page_ranges[1]:
+            assert new_contents[start:end].endswith(b"endobj\n")
+
+    def test_unparseable(self):
+        with pytest.raises(IncrementalRedactionError):
+            IncrementalRedaction(MemoryHandler(bytes(1000)), [0])
+
+    @pytest.mark.parametrize("resources", RESOURCES)
+    def test_scrub_resources(self, resources):
+        contents = build_pdf(RESOURCES[resources])
+        assert b"SECRET" in contents or b"IMAGE" in contents
+
+        with IncrementalRedaction(MemoryHandler(contents), [1]) as redaction:
+            scrubbed = redaction.scrubbed_ranges()
+            update, _, _ = redaction.update({1: (Image.new("RGB", (2, 2)), 612, 792)})
+        new_contents = compose(
+            contents, compose_parts("", len(contents), scrubbed, update)
+        )
+
+        # Every stream reachable from the redacted page is scrubbed, other than
+        # those the other page draws
+        assert b"SECRET" not in new_contents
+        assert b"IMAGE" not in new_contents
+        assert b"SHARED" in new_contents
+        with pikepdf.open(io.BytesIO(new_contents)) as pdf:
+            assert len(pdf.pages) == 2
+
+    @pytest.mark.parametrize("key", ["/ActualText", "/Alt"])
+    def test_structure_text(self, key):
+        def structure(pages):
+            element = Dictionary(S=Name.Figure, Pg=pages[1], K=0)
+            element[key] = String("SECRET")
+            return Array([element])
+
+        contents = build_pdf(lambda pdf, marker: {}, structure)
+        # The text is not in a stream, so the file is rewritten instead
+        with pytest.raises(IncrementalRedactionError):
+            IncrementalRedaction(MemoryHandler(contents), [1])
+        # Text for pages which are not redacted is kept
+        with IncrementalRedaction(MemoryHandler(contents), [0]):
+            pass
+
+    def test_structure_text_inherited(self):
+        def structure(pages):
+            # The element's page is only known from its marked content
+            return Dictionary(
+                S=Name.Figure,
+                Alt=String("SECRET"),
+                K=Array([Dictionary(Type=Name.MCR, Pg=pages[1], MCID=0)]),
+            )
+
+        contents = build_pdf(lambda pdf, marker: {}, structure)
+        with pytest.raises(IncrementalRedactionError):
+            IncrementalRedaction(MemoryHandler(contents), [1])
+        with IncrementalRedaction(MemoryHandler(contents), [0]):
+            pass
+
+    def test_unlocated_stream(self):
+        contents = build_pdf(RESOURCES["pattern"])
+        handler = MemoryHandler(contents)
+        # Streams to scrub must be in the ranges read for the page
+        handler.prefetched = [(0, contents[: contents.index(b"SECRET") - 100])]
+        with IncrementalRedaction(handler, [1]) as redaction, pytest.raises(
+            IncrementalRedactionError
+        ):
+            redaction.scrubbed_ranges()
+
+    def test_updated(self):
+        # Earlier revisions of the scrubbed objects could be left in a file
+        # which has already been updated, so it is rewritten instead
+        new_contents, _ = redact(build_pdf(RESOURCES["pattern"]), 1)
+        with pytest.raises(IncrementalRedactionError):
+            IncrementalRedaction(MemoryHandler(new_contents), [0])
+
+    def test_linearized(self):
+        # The first page section of a linearized file is not an update
+        contents = build_pdf(RESOURCES["pattern"], linearize=True)
+        with pikepdf.open(io.BytesIO(contents)) as pdf:
+            assert "/Prev" in pdf.trailer
+        new_contents, _ = redact(contents, 1)
+        assert b"SECRET" not in new_contents
+
+    def test_xref_stream(self):
+        contents = build_pdf(
+            RESOURCES["pattern"],
+            object_stream_mode=pikepdf.ObjectStreamMode.generate,
+        )
+        new_contents, update = redact(contents, 1)
+        # The update has a cross-reference stream like the file it updates
+        assert b"/Type /XRef" in update
+        assert b"trailer" not in update
+        assert b"SECRET" not in new_contents
+
+        with pikepdf.open(io.BytesIO(new_contents)) as pdf:
+            assert not pdf.get_warnings()
+            assert len(pdf.pages) == 2
+            assert list(pdf.pages[1].Resources.XObject.keys()) == ["/Im0"]
+            assert pdf.pages[1].Contents.read_bytes().endswith(b"/Im0 Do Q")
+            assert pdf.pages[0].Contents.read_bytes() == b"/Shared Do"
@@ -0,0 +1,70 @@
+# DocumentCloud
+from documentcloud.common import path
+from documentcloud.documents.processing.info_and_image.main import (
+    IMAGE_WIDTHS,
+    modification_page_sources,
+    plan_page_asset_copies,
+)
+
+
+def page_files(doc_id, slug, page_number, text=True):
+    files = {
+        path.page_image_path(doc_id, slug, page_number, image_suffix)
+        for image_suffix, _ in IMAGE_WIDTHS
+    }
+    files.add(path.page_text_position_path(doc_id, slug, page_number))
+    if text:
+        files.add(path.page_text_path(doc_id, slug, page_number))
+    return files
+
+
+class TestModification:
+    def test_page_sources(self):
+        assert modification_page_sources(
+            1,
+            "doc",
+            [
+                {"page_spec": [[1, 2]]},
+                {"id": 2, "slug": "other", "page_spec": [0]},
+                {
+                    "page_spec": [0],
+                    "modifications": [{"type": "rotate", "angle": "hw"}],
+                },
+            ],
+        ) == [(1, "doc", 1, 0), (1, "doc", 2, 0), (2, "other", 0, 0), (1, "doc", 0, 2)]
+
+    def test_plan_page_asset_copies(self):
+        # The document's first page is removed, the second is rotated, the
+        # third moves up and a page without text is imported
+        page_sources = [(1, "doc", 1, 1), (1, "doc", 2, 0), (2, "other", 0, 0)]
+        source_files = {
+            1: page_files(1, "doc", 0)
+            | page_files(1, "doc", 1)
+            | page_files(1, "doc", 2),
+            2: page_files(2, "other", 0, text=False),
+        }
+        copies, kept, extract_pages = plan_page_asset_copies(
+            1, "doc", page_sources, source_files
+        )
+
+        assert extract_pages == [0]
+        assert sorted(copies) == sorted(
+            zip(
+                sorted(page_files(1, "doc", 2)),
+                sorted(page_files(1, "doc", 1)),
+            )
+        ) + sorted(
+            zip(
+                sorted(page_files(2, "other", 0, text=False)),
+                sorted(page_files(1, "doc", 2, text=False)),
+            )
+        )
+        assert kept == page_files(1, "doc", 1) | page_files(1, "doc", 2, text=False)
+
+    def test_plan_missing_images(self):
+        copies, kept, extract_pages = plan_page_asset_copies(
+            1, "doc", [(2, "other", 0, 0)], {2: set()}
+        )
+        assert copies == []
+        assert kept == set()
+        assert extract_pages == [0]
@@ -0,0 +1,36 @@
+# DocumentCloud
+from documentcloud.common.serverless.batch_planner import OCR_STAGE, TEXT_POSITION_STAGE
+from documentcloud.documents.processing.ocr import main
+
+
+class TestOcr:
+    def test_planners(self):
+        assert main.OCR_PLANNER.stage == OCR_STAGE
+        assert main.TEXT_POSITION_PLANNER.stage == TEXT_POSITION_STAGE
+        assert main.TEXT_POSITION_PLANNER.default_batch == main.TEXT_POSITION_BATCH
+        assert main.TEXT_POSITION_PLANNER.max_batch == main.TEXT_POSITION_BATCH_MAX
+
+    def test_warm_tesseract(self, monkeypatch):
+        initialized = []
+        monkeypatch.setattr(main, "OCR_WARM_LANGUAGE", "eng")
+        monkeypatch.setattr(main, "tesseract_pool", main.collections.OrderedDict())
+        monkeypatch.setattr(main, "download_language_pack", lambda ocr_code: None)
+        monkeypatch.setattr(main, "Tesseract", initialized.append)
+
+        main.warm_tesseract()
+        assert initialized == ["eng"]
+        assert list(main.tesseract_pool) == ["eng"]
+
+    def test_warm_tesseract_missing(self, monkeypatch):
+        def download_language_pack(ocr_code):
+            raise FileNotFoundError(ocr_code)
+
+        initialized = []
+        monkeypatch.setattr(main, "OCR_WARM_LANGUAGE", "eng")
+        monkeypatch.setattr(main, "tesseract_pool", main.collections.OrderedDict())
+        monkeypatch.setattr(main, "download_language_pack", download_language_pack)
+        monkeypatch.setattr(main, "Tesseract", initialized.append)
+
+        main.warm_tesseract()
+        assert not initialized
+        assert not main.tesseract_pool
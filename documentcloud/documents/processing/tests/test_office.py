@@ -0,0 +1,168 @@
+# Standard Library
+import os
+import shutil
+import signal
+import socket
+import sys
+import textwrap
+import time
+
+# Third Party
+import pytest
+
+# DocumentCloud
+from documentcloud.documents.processing.document_conversion.office import (
+    Office,
+    OfficeError,
+)
+
+# Stands in for LibreOffice: it listens when started with --accept, and
+# otherwise converts files by copying them, only if there is an office listening
+FAKE_OFFICE = textwrap.dedent(
+    f"""\
+    #!{sys.executable}
+    import os, socket, sys, time
+
+    port = int(os.environ["FAKE_OFFICE_PORT"])
+    if any(arg.startswith("--accept") for arg in sys.argv):
+        server = socket.socket()
+        server.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+        server.bind(("127.0.0.1", port))
+        server.listen()
+        while True:
+            server.accept()[0].close()
+    outdir = sys.argv[sys.argv.index("--outdir") + 1]
+    profile = [arg for arg in sys.argv if arg.startswith("-env:")][0]
+    if profile.endswith("/profile"):
+        socket.create_connection(("127.0.0.1", port)).close()
+    os.makedirs(outdir, exist_ok=True)
+    for input_path in sys.argv[sys.argv.index("--outdir") + 2 :]:
+        name = os.path.splitext(os.path.basename(input_path))[0] + ".pdf"
+        with open(input_path, "rb") as in_file, open(
+            os.path.join(outdir, name), "wb"
+        ) as out_file:
+            out_file.write(in_file.read())
+    """
+)
+
+
+def free_port():
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+class FakeClient:
+    """Stands in for the UNO connection to the office, converting files by
+    copying them, failing on files named bad and hanging on files named hang"""
+
+    def __init__(self, binary, port):
+        self.port = port
+        socket.create_connection(("127.0.0.1", port)).close()
+
+    def convert(self, input_path, output_path):
+        if "bad" in os.path.basename(input_path):
+            raise OfficeError("Unable to load")
+        if "hang" in os.path.basename(input_path):
+            time.sleep(3)
+        socket.create_connection(("127.0.0.1", self.port)).close()
+        shutil.copyfile(input_path, output_path)
+
+
+class MissingClient:
+    def __init__(self, binary, port):
+        raise ImportError("No module named 'uno'")
+
+
+@pytest.fixture
+def make_office(tmp_path, monkeypatch):
+    offices = []
+
+    def make_office(client=FakeClient):
+        binary = tmp_path / "soffice.bin"
+        binary.write_text(FAKE_OFFICE)
+        binary.chmod(0o755)
+        port = free_port()
+        monkeypatch.setenv("FAKE_OFFICE_PORT", str(port))
+        office = Office(str(binary), str(tmp_path / "office"), port, 10, client)
+        offices.append(office)
+        return office
+
+    yield make_office
+    for office in offices:
+        office.stop()
+
+
+@pytest.fixture
+def office(make_office):
+    return make_office()
+
+
+def write_inputs(tmp_path, names):
+    paths = []
+    for name in names:
+        input_path = tmp_path / name
+        input_path.write_bytes(name.encode("utf8"))
+        paths.append(str(input_path))
+    return paths
+
+
+def deadline(seconds=10):
+    return time.time() + seconds
+
+
+class TestOffice:
+    def test_convert(self, office, tmp_path):
+        input_paths = write_inputs(tmp_path, ["1.docx", "2.xlsx"])
+        output_directory = str(tmp_path / "output")
+
+        output_paths = office.convert(input_paths, output_directory, deadline())
+
+        assert office.running()
+        assert sorted(output_paths) == sorted(input_paths)
+        with open(output_paths[input_paths[1]], "rb") as output_file:
+            assert output_file.read() == b"2.xlsx"
+
+        # The same office converts the next files
+        pid = office.pid()
+        office.convert(write_inputs(tmp_path, ["3.doc"]), output_directory, deadline())
+        assert office.pid() == pid
+
+    def test_restart(self, office, tmp_path):
+        output_directory = str(tmp_path / "output")
+        office.convert(write_inputs(tmp_path, ["1.docx"]), output_directory, deadline())
+        pid = office.pid()
+        os.killpg(pid, signal.SIGKILL)
+        os.waitpid(pid, 0)
+        assert not office.running()
+
+        input_paths = write_inputs(tmp_path, ["2.docx"])
+        output_paths = office.convert(input_paths, output_directory, deadline())
+        assert list(output_paths) == input_paths
+        assert office.running()
+        assert office.pid() != pid
+
+    def test_bad_file(self, office, tmp_path):
+        input_paths = write_inputs(tmp_path, ["1.docx", "bad.docx", "3.docx"])
+        output_paths = office.convert(input_paths, str(tmp_path / "output"), deadline())
+        assert list(output_paths) == [input_paths[0], input_paths[2]]
+        assert office.running()
+
+    def test_deadline(self, office, tmp_path):
+        input_paths = write_inputs(tmp_path, ["1.docx", "hang.docx", "3.docx"])
+        start = time.time()
+        output_paths = office.convert(
+            input_paths, str(tmp_path / "output"), deadline(1)
+        )
+        # The office hanging on a file is killed at the deadline, leaving the
+        # files after it unconverted
+        assert time.time() - start < 2
+        assert list(output_paths) == input_paths[:1]
+        assert not office.running()
+
+    def test_without_uno(self, make_office, tmp_path):
+        office = make_office(MissingClient)
+        input_paths = write_inputs(tmp_path, ["1.docx", "2.xlsx"])
+        output_paths = office.convert(input_paths, str(tmp_path / "output"), deadline())
+        assert sorted(output_paths) == sorted(input_paths)
+        assert office.running()
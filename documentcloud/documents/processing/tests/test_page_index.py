@@ -0,0 +1,69 @@
+# Third Party
+import pytest
+
+# DocumentCloud
+from documentcloud.documents.processing.info_and_image.page_index import (
+    HEADER,
+    MAGIC,
+    PageIndex,
+    accesses_to_ranges,
+    merge_ranges,
+)
+
+
+class TestPageIndex:
+    def test_merge_ranges(self):
+        assert merge_ranges([(10, 20), (0, 5), (15, 30), (5, 8)]) == [
+            (0, 8),
+            (10, 30),
+        ]
+        assert merge_ranges([(0, 5), (10, 20)], gap=5) == [(0, 20)]
+        assert merge_ranges([(0, 5), (11, 20)], gap=5) == [(0, 5), (11, 20)]
+
+    def test_accesses_to_ranges(self):
+        assert accesses_to_ranges([(0, 10), (10, 10), (100, 5)]) == [
+            (0, 20),
+            (100, 105),
+        ]
+
+    def test_round_trip(self):
+        contents = PageIndex.encode(
+            1000,
+            [(900, 1000), (0, 10)],
+            [[(100, 200)], [], [(300, 350), (350, 400)]],
+        )
+        index = PageIndex(contents)
+        assert index.file_size == 1000
+        assert index.page_count == 3
+        assert index.document_ranges() == [(0, 10), (900, 1000)]
+        assert index.page_ranges(0) == [(100, 200)]
+        assert index.page_ranges(1) == []
+        assert index.page_ranges(2) == [(300, 400)]
+        assert index.page_ranges(3) == []
+        assert index.ranges([0, 2]) == [
+            (0, 10),
+            (100, 200),
+            (300, 400),
+            (900, 1000),
+        ]
+        assert index.ranges([0, 2], gap=100) == [(0, 400), (900, 1000)]
+
+    def test_patch(self):
+        index = PageIndex(
+            PageIndex.encode(1000, [(900, 1000)], [[(100, 200)], [(300, 400)]])
+        )
+        patched = PageIndex(index.patch(1500, [(1400, 1500)], {1: [(1000, 1400)]}))
+        assert patched.file_size == 1500
+        assert patched.page_count == 2
+        assert patched.document_ranges() == [(900, 1000), (1400, 1500)]
+        assert patched.page_ranges(0) == [(100, 200)]
+        assert patched.page_ranges(1) == [(300, 400), (1000, 1400)]
+
+    def test_invalid(self):
+        with pytest.raises(ValueError):
+            PageIndex(b"\x1f\x8b legacy pickled index")
+        with pytest.raises(ValueError):
+            PageIndex(HEADER.pack(MAGIC, 2, 10, 0, 0))
+        contents = PageIndex.encode(10, [(0, 10)], [[]])
+        with pytest.raises(ValueError):
+            PageIndex(contents[:-1])
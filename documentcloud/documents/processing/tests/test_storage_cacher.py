@@ -0,0 +1,66 @@
+# Standard Library
+import os
+import random
+
+# DocumentCloud
+from documentcloud.documents.processing.info_and_image.pdfium import StorageCacher
+
+
+class RangeStorage:
+    """Storage serving ranged reads of a single file, recording each read"""
+
+    def __init__(self, contents):
+        self.contents = contents
+        self.reads = []
+
+    def read_range(self, _file_name, start, end):
+        self.reads.append((start, end))
+        return self.contents[start:end]
+
+
+def read(cacher, position, num_bytes):
+    cacher.seek(position, os.SEEK_SET)
+    return cacher.read(num_bytes)
+
+
+class TestStorageCacher:
+    def test_random_reads(self):
+        contents = os.urandom(10000)
+        cacher = StorageCacher(
+            RangeStorage(contents), "doc.pdf", len(contents), 1000, max_blocks=3
+        )
+        rand = random.Random(0)
+        for _ in range(200):
+            position = rand.randrange(len(contents))
+            num_bytes = rand.randrange(3000)
+            assert (
+                read(cacher, position, num_bytes)
+                == contents[position : position + num_bytes]
+            )
+            assert len(cacher.blocks) <= 3
+        cacher.close()
+
+    def test_coalesced_misses(self):
+        contents = os.urandom(10000)
+        storage = RangeStorage(contents)
+        cacher = StorageCacher(storage, "doc.pdf", len(contents), 1000)
+
+        read(cacher, 1500, 10)
+        # Blocks 0 and 2 to 4 are missing and fetched in two reads
+        assert read(cacher, 500, 4000) == contents[500:4500]
+        assert storage.reads == [(1000, 2000), (0, 1000), (2000, 5000)]
+        assert cacher.stats() == {"hits": 1, "misses": 5, "bytes_fetched": 5000}
+
+    def test_read_ahead(self):
+        contents = os.urandom(10000)
+        storage = RangeStorage(contents)
+        cacher = StorageCacher(
+            storage, "doc.pdf", len(contents), 1000, max_blocks=4, read_ahead=2
+        )
+        for position in range(0, len(contents), 500):
+            assert read(cacher, position, 500) == contents[position : position + 500]
+        cacher.close()
+
+        # Only the first block is read on demand, the rest are read ahead
+        assert cacher.misses == 1
+        assert cacher.bytes_fetched == len(contents)
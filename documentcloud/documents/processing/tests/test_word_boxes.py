@@ -0,0 +1,59 @@
+# DocumentCloud
+from documentcloud.documents.processing.info_and_image.pdfium import (
+    group_words,
+    multiply_matrices,
+)
+
+
+def char(text, x0, top, upright=True, width=10, height=12):
+    return {
+        "text": text,
+        "x0": x0,
+        "x1": x0 + width,
+        "top": top,
+        "bottom": top + height,
+        "upright": upright,
+    }
+
+
+class TestWordBoxes:
+    def test_whitespace_splits_words(self):
+        chars = [char("a", 0, 0), char("b", 10, 0), None, char("c", 25, 0)]
+        words = group_words(chars, 3, 3)
+        assert [word["text"] for word in words] == ["ab", "c"]
+        assert words[0] == {
+            "text": "ab",
+            "x0": 0,
+            "x1": 20,
+            "top": 0,
+            "bottom": 12,
+            "upright": True,
+            "direction": 1,
+        }
+
+    def test_gaps_split_words(self):
+        # Horizontal gaps beyond the tolerance and new lines split words
+        chars = [char("a", 0, 0), char("b", 12, 0), char("c", 30, 0), char("d", 40, 20)]
+        words = group_words(chars, 3, 3)
+        assert [word["text"] for word in words] == ["ab", "c", "d"]
+
+    def test_vertical_tolerances(self):
+        # Tolerances swap for characters which are not upright, as in pdfplumber
+        chars = [
+            char("a", 0, 0, upright=False),
+            char("b", 0, 14, upright=False),
+            char("c", 0, 40, upright=False),
+        ]
+        words = group_words(chars, 1, 3)
+        assert [word["text"] for word in words] == ["a", "b", "c"]
+        words = group_words(chars, 3, 1)
+        assert [word["text"] for word in words] == ["ab", "c"]
+
+    def test_surrogate_pairs(self):
+        chars = [char("\ud83d", 0, 0), char("\ude00", 10, 0)]
+        assert group_words(chars, 3, 3)[0]["text"] == "\U0001f600"
+
+    def test_multiply_matrices(self):
+        quarter_turn = (0, -1, 1, 0)
+        assert multiply_matrices((1, 0, 0, 1), quarter_turn) == quarter_turn
+        assert multiply_matrices(quarter_turn, quarter_turn) == (-1, 0, 0, -1)
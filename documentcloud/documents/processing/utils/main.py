@@ -25,7 +25,7 @@ if env.str("ENVIRONMENT").startswith("local"):
         processing_auth,
         publisher,
     )
-    from documentcloud.common.serverless import utils
+    from documentcloud.common.serverless import scheduler, telemetry, utils
     from documentcloud.common.serverless.error_handling import pubsub_function
 else:
     # Third Party
@@ -39,7 +39,7 @@ else:
         processing_auth,
         publisher,
     )
-    from common.serverless import utils
+    from common.serverless import scheduler, telemetry, utils
     from common.serverless.error_handling import pubsub_function
     from sentry_sdk.integrations.aws_lambda import AwsLambdaIntegration
     from sentry_sdk.integrations.redis import RedisIntegration
@@ -89,22 +89,37 @@ def process_doc(request, _context=None):
     # Launch PDF processing via pubsub
     if job_type == "process_pdf":
         if extension == "pdf":
-            publisher.publish(PDF_PROCESS_TOPIC, data=encode_pubsub_data(data))
+            topic = PDF_PROCESS_TOPIC
         else:
             # Non-PDF files require conversion first
-            publisher.publish(DOCUMENT_CONVERT_TOPIC, data=encode_pubsub_data(data))
+            topic = DOCUMENT_CONVERT_TOPIC
     elif job_type == "redact_doc":
-        publisher.publish(REDACT_TOPIC, data=encode_pubsub_data(data))
+        topic = REDACT_TOPIC
     elif job_type == "modify_doc":
-        publisher.publish(MODIFY_TOPIC, data=encode_pubsub_data(data))
+        topic = MODIFY_TOPIC
     elif job_type == "cancel_doc_processing":
         utils.clean_up(REDIS, doc_id)
+        scheduler.release(REDIS, doc_id)
+        return encode_response("Ok")
     else:
         logger.error(
             "Invalid doc processing type: %s", job_type, exc_info=sys.exc_info()
         )
         return "Error"
 
+    # Start the job once its priority and organization have a slot free.
+    # Conversions started together are batched, to be converted by a single
+    # invocation
+    scheduler.submit(
+        REDIS,
+        doc_id,
+        data.get("priority"),
+        data.get("org_id"),
+        topic,
+        data,
+        batch=topic == DOCUMENT_CONVERT_TOPIC,
+    )
+
     return encode_response("Ok")
 
 
@@ -159,6 +174,24 @@ def get_progress(request, _context=None):
     return encode_response(response)
 
 
+@processing_auth
+def get_telemetry(request, _context=None):
+    """Get the per-stage telemetry counters between two timestamps from redis"""
+    data = get_http_data(request)
+    end = data.get("end", time.time())
+    start = data.get("start", end - telemetry.TELEMETRY_BUCKET_SECONDS)
+
+    try:
+        response = telemetry.read(REDIS, start, end, data.get("stages"))
+    except RedisError as exc:
+        logger.error(
+            "RedisError during get_telemetry: %s", exc, exc_info=sys.exc_info()
+        )
+        response = []
+
+    return encode_response(response)
+
+
 @processing_auth
 def import_documents(request, _context=None):
     """Command to start the import process on an organization"""
@@ -19,6 +19,7 @@ import redis
 from requests.exceptions import HTTPError, RequestException
 
 # DocumentCloud
+from documentcloud.common import priority_choices
 from documentcloud.common.environment import httpsub, storage
 from documentcloud.core.choices import Language
 from documentcloud.documents import entity_extraction, modifications, solr
@@ -49,7 +50,14 @@ if settings.ENVIRONMENT.startswith("local"):
 
 
 @task(autoretry_for=(HTTPError,), retry_backoff=30)
-def fetch_file_url(file_url, document_pk, force_ocr, ocr_engine, auth=None):
+def fetch_file_url(
+    file_url,
+    document_pk,
+    force_ocr,
+    ocr_engine,
+    auth=None,
+    priority=priority_choices.INTERACTIVE,
+):
     """Download a file to S3 when given a URL on document creation"""
     document = Document.objects.get(pk=document_pk)
     if auth is not None:
@@ -80,6 +88,7 @@ def fetch_file_url(file_url, document_pk, force_ocr, ocr_engine, auth=None):
             document.user.pk,
             force_ocr,
             ocr_engine,
+            priority,
         )
 
 
@@ -124,7 +133,9 @@ def _httpsub_submit(url, document_pk, json, task_):
     retry_backoff=30,
     retry_kwargs={"max_retries": settings.HTTPSUB_RETRY_LIMIT},
 )
-def process(document_pk, user_pk, force_ocr, ocr_engine):
+def process(
+    document_pk, user_pk, force_ocr, ocr_engine, priority=priority_choices.INTERACTIVE
+):
     """Start the processing"""
     document = Document.objects.get(pk=document_pk)
     _httpsub_submit(
@@ -140,6 +151,7 @@ def process(document_pk, user_pk, force_ocr, ocr_engine):
             "org_id": document.organization_id,
             "force_ocr": force_ocr,
             "ocr_engine": ocr_engine,
+            "priority": priority,
         },
         process,
     )
@@ -164,6 +176,8 @@ def redact(document_pk, user_pk, redactions):
             "access": document.access,
             "ocr_code": Language.get_choice(document.language).ocr_code,
             "redactions": redactions,
+            "org_id": document.organization_id,
+            "priority": priority_choices.INTERACTIVE,
         },
         redact,
     )
@@ -188,6 +202,8 @@ def modify(document_pk, user_pk, modification_data):
             "slug": document.slug,
             "access": document.access,
             "modifications": modification_data,
+            "org_id": document.organization_id,
+            "priority": priority_choices.INTERACTIVE,
         },
         modify,
     )
@@ -310,6 +326,14 @@ def set_page_text(document_pk, page_text_infos):
             document.index_on_commit(**kwargs)
 
 
+@task
+def regenerate_text(document_pk):
+    """Regenerate the full text files of a document after pages have been
+    updated individually"""
+    document = Document.objects.get(pk=document_pk)
+    document.regenerate_text()
+
+
 # new solr
 
 
@@ -8,7 +8,7 @@ from rest_framework import status
 import pytest
 
 # DocumentCloud
-from documentcloud.common import path
+from documentcloud.common import path, priority_choices
 from documentcloud.core.tests import run_commit_hooks
 from documentcloud.documents.choices import Access, Status
 from documentcloud.documents.models import Document, DocumentError, Note, Section
@@ -637,6 +637,39 @@ class TestDocumentAPI:
         )
         assert response.status_code == status.HTTP_200_OK
 
+    def test_positions(self, client, mocker):
+        """Test reading the positions of the words on a page"""
+        words = [{"text": "Page", "x1": 0.1, "x2": 0.2, "y1": 0.1, "y2": 0.2}]
+        mock_get_page_positions = mocker.patch.object(
+            Document, "get_page_positions", return_value=words
+        )
+        document = DocumentFactory(page_count=2, access=Access.public)
+        response = client.get(f"/api/documents/{document.pk}/positions/?page=1")
+        assert response.status_code == status.HTTP_200_OK
+        assert response.json() == words
+        mock_get_page_positions.assert_called_once_with(1)
+
+    def test_positions_missing(self, client, mocker):
+        """Test reading the positions of a page without a positions file"""
+        mocker.patch(
+            "documentcloud.documents.models.document.storage.exists",
+            return_value=False,
+        )
+        mocker.patch(
+            "documentcloud.documents.models.document.storage.open",
+            side_effect=FileNotFoundError,
+        )
+        document = DocumentFactory(page_count=2, access=Access.public)
+        response = client.get(f"/api/documents/{document.pk}/positions/?page=1")
+        assert response.status_code == status.HTTP_200_OK
+        assert response.json() == []
+
+    def test_positions_bad_page(self, client):
+        """Test reading the positions of the words on a bad page"""
+        document = DocumentFactory(page_count=2, access=Access.public)
+        response = client.get(f"/api/documents/{document.pk}/positions/?page=2")
+        assert response.status_code == status.HTTP_400_BAD_REQUEST
+
     def test_bulk_update(self, client, user):
         """Test updating multiple documents"""
         client.force_authenticate(user=user)
@@ -992,6 +1025,24 @@ class TestDocumentAPI:
             document.refresh_from_db()
             assert document.status == Status.pending
 
+    def test_bulk_process_priority(self, client, user, mocker):
+        """Documents processed in bulk are scheduled at bulk priority"""
+        mock_process = mocker.patch("documentcloud.documents.views.process")
+        # pretend the files exists
+        mocker.patch(
+            "documentcloud.common.environment.storage.exists", return_value=True
+        )
+        document = DocumentFactory(user=user)
+        client.force_authenticate(user=user)
+        response = client.post(
+            "/api/documents/process/", [{"id": document.pk}], format="json"
+        )
+        run_commit_hooks()
+        assert response.status_code == status.HTTP_200_OK
+        mock_process.delay.assert_called_once_with(
+            document.pk, user.pk, False, "tess4", priority_choices.BULK
+        )
+
     def test_bulk_process_no_data(self, client, user, mocker):
         """Test processing multiple documents without specifying the documents"""
         mocker.patch("documentcloud.documents.views.process")
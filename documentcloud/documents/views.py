@@ -27,6 +27,7 @@ from rest_flex_fields.utils import split_levels
 # DocumentCloud
 from documentcloud.addons.choices import Event
 from documentcloud.addons.models import AddOnEvent
+from documentcloud.common import priority_choices
 from documentcloud.common.environment import httpsub
 from documentcloud.core.filters import ChoicesFilter, ModelMultipleChoiceFilter
 from documentcloud.core.permissions import (
@@ -74,6 +75,7 @@ from documentcloud.documents.tasks import (
     process,
     process_cancel,
     redact,
+    regenerate_text,
     set_page_text,
     solr_delete_note,
     solr_index_note,
@@ -174,6 +176,9 @@ class DocumentViewSet(BulkModelMixin, FlexFieldsModelViewSet):
         if not bulk:
             documents = [documents]
 
+        # Bulk uploads are scheduled behind documents uploaded one at a time
+        priority = priority_choices.BULK if bulk else priority_choices.INTERACTIVE
+
         for document, file_url, force_ocr, ocr_engine in zip(
             documents, file_urls, force_ocrs, ocr_engines
         ):
@@ -184,7 +189,7 @@ class DocumentViewSet(BulkModelMixin, FlexFieldsModelViewSet):
                     # fmt: off
                     lambda d=document, fu=file_url, fo=force_ocr, oe=ocr_engine:
                     fetch_file_url.delay(
-                        fu, d.pk, fo, oe
+                        fu, d.pk, fo, oe, priority=priority
                     )
                     # fmt: on
                 )
@@ -250,7 +255,12 @@ class DocumentViewSet(BulkModelMixin, FlexFieldsModelViewSet):
         }
 
         for document in documents:
-            self._process(document, force_ocr[document.pk], ocr_engine[document.pk])
+            self._process(
+                document,
+                force_ocr[document.pk],
+                ocr_engine[document.pk],
+                priority_choices.BULK,
+            )
         documents.update(status=Status.pending)
         return Response("OK", status=status.HTTP_200_OK)
 
@@ -265,7 +275,9 @@ class DocumentViewSet(BulkModelMixin, FlexFieldsModelViewSet):
 
         return None
 
-    def _process(self, document, force_ocr, ocr_engine):
+    def _process(
+        self, document, force_ocr, ocr_engine, priority=priority_choices.INTERACTIVE
+    ):
         """Process a document after you have uploaded the file"""
         transaction.on_commit(
             lambda: process.delay(
@@ -273,6 +285,7 @@ class DocumentViewSet(BulkModelMixin, FlexFieldsModelViewSet):
                 self.request.user.pk,
                 force_ocr,
                 ocr_engine,
+                priority,
             )
         )
         document.index_on_commit(field_updates={"status": "set"})
@@ -379,6 +392,7 @@ class DocumentViewSet(BulkModelMixin, FlexFieldsModelViewSet):
             self._update_access(instance, old_access, validated_data)
             self._update_solr(instance, old_processing, old_data_key, validated_data)
             self._update_cache(instance, old_processing)
+            self._regenerate_text(instance, old_processing)
             self._run_addons(instance, old_processing)
             self._set_page_text(instance, validated_data.get("pages"))
             self._create_revision(instance, old_processing, old_revision_control)
@@ -435,6 +449,12 @@ class DocumentViewSet(BulkModelMixin, FlexFieldsModelViewSet):
         if old_processing and not document.processing and document.cache_dirty:
             transaction.on_commit(lambda: invalidate_cache.delay(document.pk))
 
+    def _regenerate_text(self, document, old_processing):
+        """Regenerate the full text files once finished processing, in case they
+        were left stale by a partial update which failed to regenerate them"""
+        if old_processing and document.status == Status.success:
+            transaction.on_commit(lambda: regenerate_text.delay(document.pk))
+
     def _run_addons(self, document, old_processing):
         """Run upload add-ons once the document is succesfully processed"""
         if old_processing and document.status == Status.success:
@@ -526,6 +546,21 @@ class DocumentViewSet(BulkModelMixin, FlexFieldsModelViewSet):
         else:
             return Response(results.highlighting.get(pk, {}))
 
+    @action(detail=True, methods=["get"])
+    def positions(self, request, pk=None):
+        """The positions of the words on a single page of the document"""
+        document = self.get_object()
+        try:
+            page_number = int(request.query_params.get("page", 0))
+        except ValueError:
+            page_number = -1
+        if not 0 <= page_number < document.page_count:
+            return Response(
+                {"error": "Must be a valid page for the document"},
+                status=status.HTTP_400_BAD_REQUEST,
+            )
+        return Response(document.get_page_positions(page_number))
+
     @action(detail=False, methods=["get"])
     def pending(self, request):
         """Get the progress status on all of the current users pending documents"""
@@ -2,7 +2,7 @@
 from django.contrib import admin
 
 # DocumentCloud
-from documentcloud.statistics.models import Statistics
+from documentcloud.statistics.models import ProcessingStatistics, Statistics
 
 
 @admin.register(Statistics)
@@ -20,3 +20,22 @@ class StatisticsAdmin(admin.ModelAdmin):
 
     def get_readonly_fields(self, request, obj=None):
         return [field.name for field in self.opts.local_fields if field.name != "id"]
+
+
+@admin.register(ProcessingStatistics)
+class ProcessingStatisticsAdmin(admin.ModelAdmin):
+    list_display = (
+        "date",
+        "stage",
+        "doc_class",
+        "invocations",
+        "errors",
+        "timeouts",
+        "run_seconds",
+        "pages",
+    )
+    list_filter = ("stage", "doc_class")
+    date_hierarchy = "date"
+
+    def get_readonly_fields(self, request, obj=None):
+        return [field.name for field in self.opts.local_fields if field.name != "id"]
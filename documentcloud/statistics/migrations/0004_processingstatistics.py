@@ -0,0 +1,35 @@
+# Generated by Django 3.2.9 on 2026-10-18 12:00
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('statistics', '0003_auto_20210323_1522'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ProcessingStatistics',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('date', models.DateField(help_text='The date these statistics were taken')),
+                ('stage', models.CharField(help_text='The processing function these statistics are for', max_length=255)),
+                ('doc_class', models.CharField(help_text='The size class of the documents these statistics are for', max_length=255)),
+                ('invocations', models.IntegerField(help_text='The number of times the stage was run')),
+                ('errors', models.IntegerField(help_text='The number of runs which errored')),
+                ('timeouts', models.IntegerField(help_text='The number of runs which timed out')),
+                ('retries', models.IntegerField(help_text='The number of runs which were retries of a timed out run')),
+                ('run_seconds', models.FloatField(help_text='The total time spent running')),
+                ('queue_wait_seconds', models.FloatField(help_text='The total time spent waiting in the queue before running')),
+                ('pages', models.BigIntegerField(help_text='The total number of pages processed')),
+                ('bytes_read', models.BigIntegerField(help_text='The total number of bytes read from storage')),
+            ],
+            options={
+                'verbose_name_plural': 'processing statistics',
+                'ordering': ['-date', 'stage', 'doc_class'],
+                'unique_together': {('date', 'stage', 'doc_class')},
+            },
+        ),
+    ]
@@ -127,3 +127,42 @@ class Statistics(models.Model):
     class Meta:
         ordering = ["-date"]
         verbose_name_plural = "statistics"
+
+
+class ProcessingStatistics(models.Model):
+    """Daily totals of the processing telemetry for each stage and class of
+    document"""
+
+    date = models.DateField(help_text=_("The date these statistics were taken"))
+    stage = models.CharField(
+        max_length=255, help_text=_("The processing function these statistics are for")
+    )
+    doc_class = models.CharField(
+        max_length=255,
+        help_text=_("The size class of the documents these statistics are for"),
+    )
+
+    invocations = models.IntegerField(
+        help_text=_("The number of times the stage was run")
+    )
+    errors = models.IntegerField(help_text=_("The number of runs which errored"))
+    timeouts = models.IntegerField(help_text=_("The number of runs which timed out"))
+    retries = models.IntegerField(
+        help_text=_("The number of runs which were retries of a timed out run")
+    )
+    run_seconds = models.FloatField(help_text=_("The total time spent running"))
+    queue_wait_seconds = models.FloatField(
+        help_text=_("The total time spent waiting in the queue before running")
+    )
+    pages = models.BigIntegerField(help_text=_("The total number of pages processed"))
+    bytes_read = models.BigIntegerField(
+        help_text=_("The total number of bytes read from storage")
+    )
+
+    def __str__(self):
+        return f"Processing stats for {self.stage} ({self.doc_class}) on {self.date}"
+
+    class Meta:
+        ordering = ["-date", "stage", "doc_class"]
+        unique_together = ("date", "stage", "doc_class")
+        verbose_name_plural = "processing statistics"
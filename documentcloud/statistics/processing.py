@@ -0,0 +1,41 @@
+# Django
+from django.conf import settings
+
+# Standard Library
+from collections import defaultdict
+
+# DocumentCloud
+from documentcloud.common.environment import httpsub
+from documentcloud.common.serverless.telemetry import METRICS, TIME_METRICS
+
+
+def get_telemetry(start, end, stages=None):
+    """Get the processing telemetry buckets between two timestamps"""
+    response = httpsub.post(
+        settings.TELEMETRY_URL,
+        json={"start": start, "end": end, "stages": stages},
+        timeout=settings.TELEMETRY_TIMEOUT,
+    )
+    response.raise_for_status()
+    return response.json()
+
+
+def total_telemetry(rows):
+    """Sum telemetry buckets for each stage and class of document.  Counts are
+    kept as floats in Redis, so are rounded back to integers."""
+    totals = defaultdict(lambda: dict.fromkeys(METRICS, 0))
+    for row in rows:
+        total = totals[row["stage"], row["doc_class"]]
+        for metric in METRICS:
+            total[metric] += row.get(metric, 0)
+    return [
+        {
+            "stage": stage,
+            "doc_class": doc_class,
+            **{
+                metric: value if metric in TIME_METRICS else round(value)
+                for metric, value in total.items()
+            },
+        }
+        for (stage, doc_class), total in sorted(totals.items())
+    ]
@@ -10,13 +10,17 @@ from django.db.models.query_utils import Q
 
 # Standard Library
 import logging
-from datetime import date, timedelta
+from datetime import date, datetime, time, timedelta, timezone
+
+# Third Party
+from requests.exceptions import RequestException
 
 # DocumentCloud
 from documentcloud.documents.choices import Access, Status
 from documentcloud.documents.models import Document, Note
 from documentcloud.projects.models import Project
-from documentcloud.statistics.models import Statistics
+from documentcloud.statistics.models import ProcessingStatistics, Statistics
+from documentcloud.statistics.processing import get_telemetry, total_telemetry
 
 logger = logging.getLogger(__name__)
 
@@ -117,6 +121,35 @@ def store_statistics():
     logger.info("[STORE STATS] Done")
 
 
+@periodic_task(
+    run_every=crontab(hour=5, minute=45), time_limit=600, soft_time_limit=600
+)
+def store_processing_statistics():
+    """Store the daily totals of the processing telemetry"""
+
+    logger.info("[STORE PROCESSING STATS] Begin")
+
+    yesterday = date.today() - timedelta(1)
+    start = datetime.combine(yesterday, time(), tzinfo=timezone.utc).timestamp()
+    # The end is inclusive, so stop short of today's first bucket
+    end = start + 86400 - 1
+
+    try:
+        rows = get_telemetry(start, end)
+    except RequestException as exc:
+        logger.error("[STORE PROCESSING STATS] Error getting telemetry: %s", exc)
+        return
+
+    for total in total_telemetry(rows):
+        ProcessingStatistics.objects.update_or_create(
+            date=yesterday,
+            stage=total.pop("stage"),
+            doc_class=total.pop("doc_class"),
+            defaults=total,
+        )
+    logger.info("[STORE PROCESSING STATS] Done")
+
+
 @periodic_task(
     run_every=crontab(hour=6, minute=0), time_limit=1800, soft_time_limit=1740
 )
@@ -1,5 +1,9 @@
+# Django
+from rest_framework import status
+
 # Standard Library
 from datetime import date, timedelta
+from unittest.mock import MagicMock, patch
 
 # Third Party
 import pytest
@@ -8,8 +12,27 @@ import pytest
 from documentcloud.documents.choices import Access
 from documentcloud.documents.tests.factories import DocumentFactory, NoteFactory
 from documentcloud.projects.tests.factories import ProjectFactory
-from documentcloud.statistics.models import Statistics
-from documentcloud.statistics.tasks import store_statistics
+from documentcloud.statistics.models import ProcessingStatistics, Statistics
+from documentcloud.statistics.processing import total_telemetry
+from documentcloud.statistics.tasks import store_processing_statistics, store_statistics
+from documentcloud.users.tests.factories import UserFactory
+
+TELEMETRY = [
+    {
+        "stage": "extract_image",
+        "bucket": bucket,
+        "doc_class": "small",
+        "invocations": 2.0,
+        "errors": 0.0,
+        "timeouts": 0.0,
+        "retries": 0.0,
+        "run_seconds": 3.5,
+        "queue_wait_seconds": 1.0,
+        "pages": 10.0,
+        "bytes_read": 1000.0,
+    }
+    for bucket in (0, 300)
+]
 
 
 @pytest.mark.django_db()
@@ -76,3 +99,58 @@ def test_store_statistics():
     assert stats.total_organizations_public_uploaded == doc_data[0][1] - 2
     assert stats.total_organizations_organization_uploaded == doc_data[1][1]
     assert stats.total_organizations_private_uploaded == doc_data[2][1]
+
+
+def test_total_telemetry():
+    (total,) = total_telemetry(TELEMETRY)
+    # Counts are stored as integers, while times are kept as floats
+    assert total["invocations"] == 4
+    assert isinstance(total["invocations"], int)
+    assert isinstance(total["bytes_read"], int)
+    assert total["run_seconds"] == 7.0
+
+
+@pytest.mark.django_db()
+def test_store_processing_statistics():
+    response = MagicMock()
+    response.json.return_value = TELEMETRY
+    with patch("documentcloud.statistics.processing.httpsub.post") as post:
+        post.return_value = response
+        store_processing_statistics()
+    stats = ProcessingStatistics.objects.get()
+    assert stats.date == date.today() - timedelta(1)
+    assert stats.stage == "extract_image"
+    assert stats.doc_class == "small"
+    assert stats.invocations == 4
+    assert stats.run_seconds == 7.0
+    assert stats.bytes_read == 2000
+
+
+@pytest.mark.django_db()
+def test_processing_statistics_view(client):
+    response = MagicMock()
+    response.json.return_value = TELEMETRY
+    with patch("documentcloud.statistics.processing.httpsub.post") as post:
+        post.return_value = response
+
+        client.force_authenticate(user=UserFactory())
+        response = client.get("/api/statistics/processing/")
+        assert response.status_code == status.HTTP_403_FORBIDDEN
+
+        client.force_authenticate(user=UserFactory(is_staff=True))
+        response = client.get("/api/statistics/processing/", {"total": 1})
+        assert response.status_code == status.HTTP_200_OK
+        assert response.json() == [
+            {
+                "stage": "extract_image",
+                "doc_class": "small",
+                "invocations": 4,
+                "errors": 0,
+                "timeouts": 0,
+                "retries": 0,
+                "run_seconds": 7.0,
+                "queue_wait_seconds": 2.0,
+                "pages": 20,
+                "bytes_read": 2000,
+            }
+        ]
@@ -0,0 +1,56 @@
+# Django
+from rest_framework import permissions, status
+from rest_framework.response import Response
+from rest_framework.views import APIView
+
+# Standard Library
+import logging
+import sys
+import time
+
+# Third Party
+from requests.exceptions import RequestException
+
+# DocumentCloud
+from documentcloud.statistics.processing import get_telemetry, total_telemetry
+
+logger = logging.getLogger(__name__)
+
+# The telemetry buckets are only kept for about a week
+MAX_HOURS = 7 * 24
+
+
+class ProcessingStatisticsView(APIView):
+    """Live processing telemetry for staff"""
+
+    permission_classes = [permissions.IsAdminUser]
+
+    def get(self, request, format=None):
+        """Get the telemetry of the last `hours` hours, in time buckets, or
+        totalled for each stage and class of document if `total` is set"""
+        # pylint: disable=redefined-builtin, unused-argument
+        try:
+            hours = min(max(float(request.query_params.get("hours", 1)), 0), MAX_HOURS)
+        except ValueError:
+            return Response(
+                {"error": "`hours` must be a number"},
+                status=status.HTTP_400_BAD_REQUEST,
+            )
+        stages = request.query_params.get("stages")
+        stages = stages.split(",") if stages else None
+
+        end = time.time()
+        try:
+            rows = get_telemetry(end - hours * 3600, end, stages)
+        except RequestException as exc:
+            logger.warning(
+                "Error getting telemetry exception %s", exc, exc_info=sys.exc_info()
+            )
+            return Response(
+                {"error": "Unable to get telemetry"},
+                status=status.HTTP_503_SERVICE_UNAVAILABLE,
+            )
+
+        if request.query_params.get("total"):
+            rows = total_telemetry(rows)
+        return Response(rows)
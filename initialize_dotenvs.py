@@ -58,6 +58,7 @@ CONFIG = [
                         "mock://sidekick.dev.documentcloud.org",
                     ),
                     ("PROGRESS_URL", "mock://progress.dev.documentcloud.org"),
+                    ("TELEMETRY_URL", "mock://telemetry.dev.documentcloud.org"),
                     ("IMPORT_URL", "mock://import.dev.documentcloud.org"),
                     ("API_CALLBACK", "https://api.dev.documentcloud.org/api/"),
                     ("PROCESSING_TOKEN", lambda: random_string(64)),